@@ -87,10 +87,13 @@ setup(
         # dependencies). You can install these using the following syntax,
         # for example:
         # $ pip install -e .[dev,test]
-        #extras_require={
-        #    'dev': ['check-manifest'],
-        #    'test': ['coverage'],
-        #},
+        extras_require={
+            # Packed neighbor lists are returned as numpy arrays if numpy is installed, and
+            # tempest_db.local requires numpy
+            'numpy': ['numpy'],
+            # Subgraph.adjacency_matrix returns a scipy sparse matrix
+            'scipy': ['numpy', 'scipy'],
+        },
 
         # If there are data files included in your packages that need to be
         # installed, specify them here.  If using Python 2.6 or less, then these
@@ -26,8 +26,17 @@ __all__ = [
     'TempestDBService',
     'TempestClient',
     'client',
+    'ClientCache',
+    'ClientMetrics',
     'Node',
+    'PackedNodes',
+    'Subgraph',
+    'NodeTable',
+    'NodeAttributeColumn',
+    'BulkLoadException',
+    'BufferedWriter',
     'BidirectionalPPRParams',
+    'FilterPath',
 
     'InvalidArgumentException',
     'SQLException',
@@ -37,11 +46,13 @@ __all__ = [
 
     'twitter_2010_example']
 
-import ttypes
+from tempest_db import ttypes
 from tempest_db import TempestDBService
 MonteCarloPageRankParams = ttypes.MonteCarloPageRankParams
 BidirectionalPPRParams = ttypes.BidirectionalPPRParams
+RecommendParams = ttypes.RecommendParams
 DegreeFilterTypes = ttypes.DegreeFilterTypes
+FilterPath = ttypes.FilterPath
 InvalidArgumentException = ttypes.InvalidArgumentException
 SQLException = ttypes.SQLException
 UndefinedGraphException = ttypes.UndefinedGraphException
@@ -50,23 +61,66 @@ InvalidIndexException = ttypes.InvalidIndexException
 BidirectionalPPRParams = ttypes.BidirectionalPPRParams
 Node = ttypes.Node
 
-import twitter_2010_example
+from tempest_db import twitter_2010_example
+from tempest_db.pool import ConnectionPool, PoolTimeoutException
+from tempest_db.routing import create_router
+from tempest_db.cache import ClientCache
+from tempest_db.metrics import ClientMetrics, CountingSocket
+from tempest_db.packed import PackedNodes, unpack_node_list, pack_tempest_ids
+from tempest_db.subgraph import Subgraph, unpack_subgraph
+from tempest_db.columns import NodeAttributeColumn, unpack_attribute_column
+from tempest_db.node_table import NodeTable, packed_node_list, packed_node_map
+from tempest_db import bulk_load
+from tempest_db.bulk_load import BulkLoadException
+from tempest_db.buffered_writer import BufferedWriter
 
 from thrift.transport import TSocket
 from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
 
 import sys
-
-def get_thrift_client(host, port):
+import time
+
+# Calls with a deadline_ms time out this many milliseconds after their deadline, to leave time for
+# the server to convert and send its partial result.
+DeadlineGraceMillis = 1000
+
+def protocol_factory(protocol='binary', accelerated=True):
+    """ Return the thrift protocol factory for the given protocol, 'binary' or 'compact'.  If
+    accelerated, use the C implementation from thrift's fastbinary extension when it is installed,
+    which decodes large responses several times faster than the pure-Python protocol and is
+    compatible with it on the wire."""
+    if protocol == 'binary':
+        if accelerated:
+            return TBinaryProtocol.TBinaryProtocolAcceleratedFactory()
+        return TBinaryProtocol.TBinaryProtocolFactory()
+    elif protocol == 'compact':
+        # Older thrift versions only accelerate the binary protocol
+        if accelerated and hasattr(TCompactProtocol, 'TCompactProtocolAcceleratedFactory'):
+            return TCompactProtocol.TCompactProtocolAcceleratedFactory()
+        return TCompactProtocol.TCompactProtocolFactory()
+    raise ValueError("Unknown thrift protocol %s (expected 'binary' or 'compact')" % protocol)
+
+def get_thrift_client(host, port, protocol='binary', framed_transport=False, accelerated=True,
+                      count_bytes=False, timeout_ms=None):
+    """ Return a thrift client connected to the server on the given host and port.  The protocol
+    ('binary' or 'compact') and framed_transport must match the server's thriftProtocol and
+    framedTransport config settings.  If count_bytes is True, client.socket counts the bytes
+    sent and received (used by ClientMetrics).  If timeout_ms is given, connecting and each
+    socket read or write time out after that many milliseconds."""
     # Make socket
-    transport = TSocket.TSocket(host, port)
+    socket = CountingSocket(host, port) if count_bytes else TSocket.TSocket(host, port)
+    socket.setTimeout(timeout_ms)
 
-    # Buffering is critical. Raw sockets are very slow
-    transport = TTransport.TBufferedTransport(transport)
+    if framed_transport:
+        transport = TTransport.TFramedTransport(socket)
+    else:
+        # Buffering is critical. Raw sockets are very slow
+        transport = TTransport.TBufferedTransport(socket)
 
     # Wrap in a protocol
-    protocol = TBinaryProtocol.TBinaryProtocol(transport)
+    protocol = protocol_factory(protocol, accelerated).getProtocol(transport)
 
     # Create a client to use the protocol encoder
     client = TempestDBService.Client(protocol)
@@ -75,88 +129,249 @@ def get_thrift_client(host, port):
     transport.open()
 
     client.close = transport.close # Useful for closing transport later
+    client.socket = socket # Used by ConnectionPool to health-check idle connections
 
     return client
 
 class TempestClient:
-    """Client class for querying TempestDB."""
-
-    def __init__(self, host='localhost', port=10001):
-        """ Create a new client to a Tempest server on the given host and port."""
-        self.__host = host
-        self.__port = port
-        self.__thrift_client = get_thrift_client(host, port)
+    """Client class for querying TempestDB.  A TempestClient may be shared by many threads: each
+    call checks a connection out of a pool of at most pool_max_size connections and checks it
+    back in when the call completes.
+
+    If a ClientCache is given, degrees, neighbors and attributes are cached in process.  Writes
+    made through this client invalidate cached results for the nodes they touch.
+
+    If several endpoints serving the same graphs are given, writes go to the first (the primary),
+    and reads go to the endpoint with the lowest recent latency; see tempest_db.routing.
+
+    If a ClientMetrics is given, the latency, bytes and errors of every call are recorded in it."""
+
+    def __init__(self, host='localhost', port=10001, pool_min_size=1, pool_max_size=8,
+                 max_idle_seconds=300.0, max_concurrent_reconnects=1, checkout_timeout=None,
+                 cache=None, protocol='binary', framed_transport=False, accelerated=True,
+                 endpoints=None, metrics=None, timeout_ms=None, **routing_options):
+        """ Create a new client to a Tempest server on the given host and port.
+        The pool keeps at least pool_min_size connections open, and opens at most pool_max_size
+        connections at once; threads calling when all connections are busy wait up to
+        checkout_timeout seconds (forever if None) for one to be checked in.  Idle connections
+        beyond pool_min_size are closed after max_idle_seconds.  At most max_concurrent_reconnects
+        threads reconnect to the server at once after transport errors.
+        The protocol, framed_transport, accelerated and timeout_ms options are passed to
+        get_thrift_client.
+
+        endpoints is an optional list of 'host:port' strings or (host, port) pairs to use instead
+        of host and port, starting with the primary; each has its own pool.  routing_options (e.g.
+        hedge_percentile=95 or ejection_seconds) are passed to tempest_db.routing.Router."""
+        if endpoints is None:
+            endpoints = [(host, port)]
+        count_bytes = metrics is not None
+        connect = lambda host, port: get_thrift_client(host, port, protocol, framed_transport,
+                                                       accelerated, count_bytes, timeout_ms)
+        self.__router = create_router(endpoints, connect,
+                                      dict(min_size=pool_min_size,
+                                           max_size=pool_max_size,
+                                           max_idle_seconds=max_idle_seconds,
+                                           max_concurrent_reconnects=max_concurrent_reconnects,
+                                           checkout_timeout=checkout_timeout),
+                                      dict(routing_options, metrics=metrics))
+        self.__cache = cache
         self.__max_retries = 3
+        self.__timeout_ms = timeout_ms
 
-    def __with_retries(self, f):
-        """ Call the given function (which typically contains a reference to self.__thrift_client), retrying
-        on error, and return whatever it returns.
+    def __with_retries(self, method, f):
+        """ Call the given function on a pooled thrift client of the best endpoint, retrying on
+        transport errors, and return whatever it returns.  method is the name of the calling
+        method, used for metrics.
         """
-        retry_count = 0
-        while retry_count < self.__max_retries:
+        try:
+            return self.__router.read(method, f, self.__max_retries)
+        except KeyboardInterrupt:
+            print('Interrupted')
+            return None
+
+    def __with_deadline(self, method, deadline_ms, f):
+        """ Like __with_retries, but if deadline_ms is given, the call is attempted only once, and
+        times out DeadlineGraceMillis after the deadline."""
+        if deadline_ms is None:
+            return self.__with_retries(method, f)
+
+        def call_with_timeout(client):
+            socket = getattr(client, 'socket', None)
+            if socket is None:
+                return f(client)
+            socket.setTimeout(deadline_ms + DeadlineGraceMillis)
             try:
-                return f()
-            except (TTransport.TTransportException, IOError):
-                sys.stderr.write("(Tempest client reconnecting to server...)\n")
-                # Note that get_thrift_client might throw an exception if the server still isn't
-                # available, which we just allow.
-                self.__thrift_client = get_thrift_client(self.__host, self.__port)
-                retry_count += 1
-            except KeyboardInterrupt:
-                print 'Interrupted'
-                # Try to close the old client, ignoring any failure.
-                try: self.__thrift_client.close()
-                except TTransport.TTransportException: pass
-                self.__thrift_client = get_thrift_client(self.__host, self.__port)
-                return None
+                return f(client)
+            finally:
+                socket.setTimeout(self.__timeout_ms)
+        return self.__router.read(method, call_with_timeout, 1)
+
+    def __with_connection(self, method, f):
+        """ Call the given function on a pooled thrift client of the primary without retrying, and
+        return whatever it returns.  Used for writes, which aren't safe to repeat.
+        """
+        return self.__router.write(method, f)
+
+    def endpoint_status(self):
+        """ Return a list with a dictionary describing the latency and health of each endpoint."""
+        return self.__router.status()
+
+    def __cached(self, method, edge_type, node, f):
+        """ Return the cached result of the given method on the given node, or call f to compute
+        and cache it."""
+        cache = self.__cache
+        if cache is None or not cache.is_cached(method):
+            return f()
+        key = (edge_type, node_key(node))
+        hit, value = cache.get(method, key)
+        if hit:
+            # Copy lists so callers can't modify the cached value.
+            return list(value) if isinstance(value, list) else value
+        generation = cache.generation()
+        value = f()
+        if value is not None:
+            cache.put(method, key, list(value) if isinstance(value, list) else value,
+                      [node_key(node)], generation)
+        return value
+
+    def __invalidate(self, nodes):
+        if self.__cache is not None:
+            self.__cache.invalidate_nodes([node_key(node) for node in nodes])
 
     def node_count(self, edge_type):
         """ Return the number of nodes."""
-        return self.__with_retries(lambda: self.__thrift_client.nodeCount(edge_type))
+        return self.__with_retries('node_count', lambda client: client.nodeCount(edge_type))
 
     def edge_count(self, edge_type):
         """ Return the number of edges."""
-        return self.__with_retries(lambda: self.__thrift_client.edgeCount(edge_type))
+        return self.__with_retries('edge_count', lambda client: client.edgeCount(edge_type))
+
+    def warm(self, edge_types, pin=False, wait=False, poll_seconds=1.0):
+        """ Ask the server to read the graphs of the given edge types into RAM in the background, so
+        later queries on them don't wait for disk reads.  If pin is True, the graphs are then locked
+        in RAM.  If wait is True, return the GraphResidency of each edge type once the server has
+        finished warming them.  With several endpoints, use a client of just the server to warm."""
+        self.__with_retries('warm', lambda client: client.warm(edge_types, pin))
+        if not wait:
+            return None
+        while True:
+            residencies = [self.residency(edge_type) for edge_type in edge_types]
+            if not any(residency.warming for residency in residencies):
+                return residencies
+            time.sleep(poll_seconds)
+
+    def residency(self, edge_type):
+        """ Return the GraphResidency of the given edge type: the size of its graph (fileBytes), how
+        much of it is in the server's RAM (residentBytes and residentFraction, or -1 if the server
+        can't tell), whether it is being warmed, and whether it is pinned in RAM."""
+        return self.__with_retries('residency', lambda client: client.residency(edge_type))
 
     def out_degree(self, edge_type, node):
         """ Return the out-degree of the given node."""
-        return self.__with_retries(lambda: self.__thrift_client.outDegree(edge_type, node))
+        return self.__cached('out_degree', edge_type, node,
+                             lambda: self.__with_retries('out_degree', lambda client: client.outDegree(edge_type, node)))
 
     def out_neighbors(self, edge_type, node):
         """ Return the out-neighbors of the given node."""
-        return self.__with_retries(lambda: self.__thrift_client.outNeighbors(edge_type, node))
+        return self.__cached('out_neighbors', edge_type, node,
+                             lambda: self.__with_retries('out_neighbors', lambda client: client.outNeighbors(edge_type, node)))
 
     def out_neighbor(self, edge_type, node, i):
         """ Return the ith out-neighbor of the given node."""
-        return self.__with_retries(lambda: self.__thrift_client.outNeighbor(edge_type, node, i))
+        return self.__with_retries('out_neighbor', lambda client: client.outNeighbor(edge_type, node, i))
 
     def in_degree(self, edge_type, node):
         """ Return the in-degree of the given node."""
-        return self.__with_retries(lambda: self.__thrift_client.inDegree(edge_type, node))
+        return self.__cached('in_degree', edge_type, node,
+                             lambda: self.__with_retries('in_degree', lambda client: client.inDegree(edge_type, node)))
 
     def in_neighbors(self, edge_type, node):
         """ Return the in-neighbors of the given node."""
-        return self.__with_retries(lambda: self.__thrift_client.inNeighbors(edge_type, node))
+        return self.__cached('in_neighbors', edge_type, node,
+                             lambda: self.__with_retries('in_neighbors', lambda client: client.inNeighbors(edge_type, node)))
 
     def in_neighbor(self, edge_type, node, i):
         """ Return the ith in-neighbor of the given node."""
-        return self.__with_retries(lambda: self.__thrift_client.inNeighbor(edge_type, node, i))
+        return self.__with_retries('in_neighbor', lambda client: client.inNeighbor(edge_type, node, i))
+
+    def multi_out_degree(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its out-degree, using a single
+        request."""
+        return self.__with_retries('multi_out_degree', lambda client: dict(zip(nodes, client.multiOutDegree(edge_type, nodes))))
+
+    def multi_in_degree(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its in-degree, using a single
+        request."""
+        return self.__with_retries('multi_in_degree', lambda client: dict(zip(nodes, client.multiInDegree(edge_type, nodes))))
+
+    def multi_out_neighbors(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its list of out-neighbors, using
+        a single request."""
+        return self.__with_retries('multi_out_neighbors', lambda client: dict(zip(nodes, client.multiOutNeighbors(edge_type, nodes))))
+
+    def multi_in_neighbors(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its list of in-neighbors, using
+        a single request."""
+        return self.__with_retries('multi_in_neighbors', lambda client: dict(zip(nodes, client.multiInNeighbors(edge_type, nodes))))
+
+    def out_neighbors_packed(self, edge_type, node):
+        """ Return the out-neighbors of the given node as PackedNodes, whose tempest_ids is a numpy
+        int32 array.  This is much faster and smaller than out_neighbors for high-degree nodes."""
+        return self.__with_retries('out_neighbors_packed', lambda client: unpack_node_list(client.outNeighborsPacked(edge_type, node)))
+
+    def in_neighbors_packed(self, edge_type, node):
+        """ Return the in-neighbors of the given node as PackedNodes, whose tempest_ids is a numpy
+        int32 array.  This is much faster and smaller than in_neighbors for high-degree nodes."""
+        return self.__with_retries('in_neighbors_packed', lambda client: unpack_node_list(client.inNeighborsPacked(edge_type, node)))
+
+    def tempest_ids_to_nodes(self, node_type, tempest_ids):
+        """ Return the list of Nodes of the given type with the given tempest ids (as found in
+        PackedNodes), using a single request."""
+        packed_ids = pack_tempest_ids(tempest_ids)
+        ids = self.__with_retries('tempest_ids_to_nodes', lambda client: client.tempestIdsToNodeIds(node_type, packed_ids))
+        return [Node(node_type, id) for id in ids]
 
     def ppr_single_target(self, edge_type, seeds, target, relative_error=0.1, reset_probability=0.3,
-                          min_probability=None):
+                          min_probability=None, cache=True, max_staleness=None, deadline_ms=None):
         """Return the Personalized PageRank of the target node personalized to the seed nodes.
         If the PPR is greater than min_probability (default 0.25 / node_count),
         the estimate will have relative error less than the given relative error bound (on average).
-        If the PPR is is less than min_probability, return 0.0."""
+        If the PPR is is less than min_probability, return 0.0.
+        The server caches results until edges of edge_type are added; see ppr_undirected for the
+        cache, max_staleness and deadline_ms arguments."""
+        params = bidirectional_ppr_params(relative_error, reset_probability, min_probability, cache,
+                                          max_staleness, deadline_ms)
+        return self.__with_deadline('ppr_single_target', deadline_ms, lambda client: client.pprSingleTarget(edge_type, seeds, target, params))
+
+    def ppr_single_target_with_stats(self, edge_type, seeds, target, deadline_ms, relative_error=0.1,
+                                     reset_probability=0.3, min_probability=None, cache=True,
+                                     max_staleness=None):
+        """Like ppr_single_target, but return a pair (ppr, stats), where stats is a
+        PPREstimateStats giving the number of forward walks (walkCount) and reverse pushes
+        (pushCount) done before the deadline, whether the estimate is complete, and an approximate
+        95% bound on its additive error (errorBound)."""
+        params = bidirectional_ppr_params(relative_error, reset_probability, min_probability, cache,
+                                          max_staleness, deadline_ms)
+        estimate = self.__with_deadline('ppr_single_target_with_stats', deadline_ms, lambda client:
+            client.pprSingleTargetWithStats(edge_type, seeds, target, params))
+        return estimate.ppr, estimate.stats
+
+    def ppr_multi_target(self, edge_type, seeds, targets, relative_error=0.1, reset_probability=0.3,
+                         min_probability=None):
+        """Return a dictionary from each of the given target nodes (at most 10000) to its
+        Personalized PageRank personalized to the seed nodes, with the same error bounds as
+        ppr_single_target.  The server shares its random walks between targets, so ranking many
+        candidate targets costs little more than a single ppr_single_target call."""
         params = BidirectionalPPRParams(relativeError=relative_error,
                                         resetProbability=reset_probability)
         if min_probability:
             params.minProbability = min_probability
-        return self.__with_retries(lambda: self.__thrift_client.pprSingleTarget(edge_type, seeds, target, params))
+        return self.__with_retries('ppr_multi_target', lambda client: client.pprMultiTarget(edge_type, seeds, targets, params))
 
 
     # TempestDB methods
-    def ppr_undirected(self, edge_types, seeds, num_steps=100000, reset_probability=0.3, max_results = None):
+    def ppr_undirected(self, edge_types, seeds, num_steps=100000, reset_probability=0.3, max_results = None,
+                       node_table=None, cache=True, max_staleness=None, deadline_ms=None):
         """Return a dictionary from node to Personalized PageRank, personalized to the
         seed node ids.  Compute this by doing the given number of random
 -        walks. Seed_node_type and target_node_type are the node types of the seeds and targets, and they must be one of
@@ -165,18 +380,137 @@ class TempestClient:
         For example, if alternating=False, and the graph is Twitter, the walk might go from a user Alice, to a user she
         follows like Obama, to a user he follows like Biden.  Wheras if alternating=True, the walk might go from
         Alice to Obama to some other person who follows Obama, say Bob.  For bipartite graphs it's mandatory that alternating=True.
-        See MonteCarloPPR.scala for a more detailed explanation of PPR parameters."""
-        params = MonteCarloPageRankParams(numSteps=num_steps, resetProbability=reset_probability)
-        if max_results:
-            params.maxResultCount = max_results
-        return self.__with_retries(lambda: self.__thrift_client.pprUndirected(edge_types, seeds, params))
-
-    def connected_component(self, source, edge_types, max_size = (1 << 31) - 1):
-        return self.__with_retries(lambda: self.__thrift_client.connectedComponent(source, edge_types, max_size))
+        See MonteCarloPPR.scala for a more detailed explanation of PPR parameters.
+        If a NodeTable is given, the result is interned into it and returned as a NodeMap, which
+        keeps much less memory than a dictionary for large results.
+        The server caches results by edge types, seeds and parameters until edges of one of the
+        edge types are added.  If cache is False the cache isn't used, and if max_staleness is given,
+        cached results computed more than max_staleness seconds ago are recomputed.
+        If deadline_ms is given, the server stops walking after deadline_ms milliseconds and returns
+        the estimate from the steps done so far, and the call is not retried and times out
+        DeadlineGraceMillis after the deadline.  Use ppr_undirected_with_stats to find out how
+        much of the walk was done."""
+        params = monte_carlo_ppr_params(num_steps, reset_probability, max_results, cache,
+                                        max_staleness, deadline_ms)
+        if node_table is not None:
+            return self.__ppr_undirected_node_map('ppr_undirected', edge_types, seeds, params,
+                                                  deadline_ms, node_table)[0]
+        return self.__with_deadline('ppr_undirected', deadline_ms, lambda client: client.pprUndirected(edge_types, seeds, params))
+
+    def ppr_undirected_with_stats(self, edge_types, seeds, deadline_ms, num_steps=100000,
+                                  reset_probability=0.3, max_results=None, node_table=None,
+                                  cache=True, max_staleness=None):
+        """Like ppr_undirected, but return a pair (pprs, stats), where stats is a
+        PPREstimateStats giving the number of walk steps done before the deadline (walkCount),
+        whether all num_steps were done (complete), and an approximate 95% bound on the additive
+        error of each PPR value (errorBound)."""
+        params = monte_carlo_ppr_params(num_steps, reset_probability, max_results, cache,
+                                        max_staleness, deadline_ms)
+        if node_table is not None:
+            return self.__ppr_undirected_node_map('ppr_undirected_with_stats', edge_types, seeds,
+                                                  params, deadline_ms, node_table)
+        estimate = self.__with_deadline('ppr_undirected_with_stats', deadline_ms, lambda client:
+            client.pprUndirectedWithStats(edge_types, seeds, params))
+        return estimate.pprs, estimate.stats
+
+    def __ppr_undirected_node_map(self, method, edge_types, seeds, params, deadline_ms, node_table):
+        """ Return the pprUndirected estimate as a pair (NodeMap, stats), with the nodes interned
+        into node_table.  The estimate is received packed, so no Nodes are created."""
+        estimate = self.__with_deadline(method, deadline_ms, lambda client:
+            client.pprUndirectedPacked(edge_types, seeds, params))
+        id_lists = self.__node_id_lists(estimate.nodeLists)
+        return packed_node_map(node_table, estimate.nodeLists, id_lists, estimate.pprs), estimate.stats
+
+    def __node_id_lists(self, node_lists):
+        """ Return the list of node ids of each of the given PackedNodeLists, using one request
+        per list."""
+        return [self.__with_retries('tempest_ids_to_nodes', lambda client:
+                    client.tempestIdsToNodeIds(nodes.nodeType, nodes.tempestIds))
+                for nodes in node_lists]
+
+    def ppr_cache_stats(self):
+        """ Return the CacheStats (hits, misses, hitRatio, sizeBytes, ...) of the server's cache of
+        ppr_undirected and ppr_single_target results."""
+        return self.__with_retries('ppr_cache_stats', lambda client: client.pprCacheStats())
+
+    def recommend(self, edge_type, seed, max_results=10, attribute_names=(), exclude_seed=True,
+                  exclude_out_neighbors=True, exclude_in_neighbors=False,
+                  max_out_degree=None, max_in_degree=None, min_out_degree=None, min_in_degree=None,
+                  max_seed_out_degree=None, min_seed_out_degree=None,
+                  num_steps=100000, reset_probability=0.3):
+        """ Return up to max_results recommendations for the seed node, as a list of
+        (node, score, attributes) tuples in decreasing order of score, using one request.
+        Candidates are nodes of the target type of edge_type, scored by their PPR personalized to
+        the seed (as in ppr_undirected).  The seed itself, the nodes it has an edge to (and from, if
+        exclude_in_neighbors), and nodes outside the given degree bounds are excluded on the
+        server before the top results are chosen.  If the seed's out-degree is outside
+        max_seed_out_degree or min_seed_out_degree, there are no recommendations.  attributes is a
+        dictionary of the given attribute names of the node, omitting null values."""
+        page_rank_params = MonteCarloPageRankParams(numSteps=num_steps, resetProbability=reset_probability)
+        rec_params = RecommendParams(
+            maxResults=max_results,
+            excludeSeed=exclude_seed,
+            excludeOutNeighbors=exclude_out_neighbors,
+            excludeInNeighbors=exclude_in_neighbors,
+            degreeFilter=degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree),
+            seedDegreeFilter=degree_filter(max_out_degree=max_seed_out_degree,
+                                           min_out_degree=min_seed_out_degree),
+            attributeNames=list(attribute_names))
+        recommendations = self.__with_retries('recommend', lambda client:
+            client.recommend(edge_type, seed, page_rank_params, rec_params))
+        if recommendations is None:
+            return None
+        return [(recommendation.node, recommendation.score,
+                 {name: jsonToValue(value) for name, value in (recommendation.attributesAsJSON or {}).items()})
+                for recommendation in recommendations]
+
+    def connected_component(self, source, edge_types, max_size = (1 << 31) - 1, node_table=None):
+        """ Return the nodes reachable from source using the given edge types in either
+        direction, up to max_size nodes.  If a NodeTable is given, the nodes are interned into it
+        and returned as a NodeList, which keeps much less memory than a list for large
+        components."""
+        if node_table is not None:
+            node_lists = self.__with_retries('connected_component', lambda client: client.connectedComponentPacked(source, edge_types, max_size))
+            return packed_node_list(node_table, node_lists, self.__node_id_lists(node_lists))
+        return self.__with_retries('connected_component', lambda client: client.connectedComponent(source, edge_types, max_size))
+
+    def induced_subgraph(self, edge_type, nodes=None, seed=None, hops=2, max_nodes=1000000):
+        """ Return the subgraph of the given edge type induced by the given nodes, or if seed is
+        given instead, by the nodes at most hops steps from seed in either direction (its ego
+        network), as a Subgraph whose offsets and targets are numpy arrays in compressed sparse row
+        form (see Subgraph).  At most max_nodes nodes are included."""
+        if (nodes is None) == (seed is None):
+            raise ValueError('Pass either nodes or seed')
+        if nodes is not None:
+            return self.__with_retries('induced_subgraph', lambda client: unpack_subgraph(
+                client.inducedSubgraph(edge_type, list(nodes), max_nodes)))
+        return self.__with_retries('induced_subgraph', lambda client: unpack_subgraph(
+            client.egoSubgraph(edge_type, seed, hops, max_nodes)))
 
     def nodes(self, graph_name, filter):
         """Return all nodes satisfying the given SQL-like filter clause"""
-        return self.__with_retries(lambda: self.__thrift_client.nodes(graph_name, filter))
+        return self.__with_retries('nodes', lambda client: client.nodes(graph_name, filter))
+
+    def iter_nodes(self, node_type, filter="", page_size=10000):
+        """ Yield the nodes satisfying the given SQL-like filter clause (all nodes if it is empty),
+        in order of tempest id.  Nodes are requested page_size at a time as the generator is
+        consumed, so results arrive right away and memory use stays bounded."""
+        return self.__iter_pages('iter_nodes', lambda client, page_token:
+            client.nodesPage(node_type, filter, page_size, page_token))
+
+    def __iter_pages(self, method, fetch_page):
+        """ Yield the nodes of each page returned by fetch_page(client, page_token), starting with
+        an empty page token and continuing until a page has no next page token."""
+        page_token = ""
+        while True:
+            page = self.__with_retries(method, lambda client: fetch_page(client, page_token))
+            if page is None:
+                return
+            for node in page.nodes:
+                yield node
+            if page.nextPageToken is None:
+                return
+            page_token = page.nextPageToken
 
     def multi_hop_out_neighbors(self, edge_type, source_node, max_hops, filter="",
                                 max_out_degree=None, max_in_degree=None,
@@ -184,13 +518,9 @@ class TempestClient:
                                 alternating=True):
         """ Return all nodes which are max_hops out-neighbor steps from the source node,
         optionally filtered by the given SQL filter max/min degree bounds."""
-        degreeFilter={}
-        if max_out_degree: degreeFilter[DegreeFilterTypes.OUTDEGREE_MAX] = max_out_degree
-        if min_out_degree: degreeFilter[DegreeFilterTypes.OUTDEGREE_MIN] = min_out_degree
-        if max_in_degree: degreeFilter[DegreeFilterTypes.INDEGREE_MAX] = max_in_degree
-        if min_in_degree: degreeFilter[DegreeFilterTypes.INDEGREE_MIN] = min_in_degree
-        return self.__with_retries(lambda:
-            self.__thrift_client.kStepOutNeighborsFiltered(edge_type, source_node, max_hops, filter, degreeFilter, alternating))
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return self.__with_retries('multi_hop_out_neighbors', lambda client:
+            client.kStepOutNeighborsFiltered(edge_type, source_node, max_hops, filter, degreeFilter, alternating))
 
     def multi_hop_in_neighbors(self, edge_type, source_node, max_hops, filter="",
                                max_out_degree=None, max_in_degree=None,
@@ -198,13 +528,74 @@ class TempestClient:
                                alternating=True):
         """ Return all nodes which are max_hops in-neighbor steps from the source node,
         optionally filtered by the given SQL filter max/min degree bounds."""
-        degreeFilter={}
-        if max_out_degree: degreeFilter[DegreeFilterTypes.OUTDEGREE_MAX] = max_out_degree
-        if min_out_degree: degreeFilter[DegreeFilterTypes.OUTDEGREE_MIN] = min_out_degree
-        if max_in_degree: degreeFilter[DegreeFilterTypes.INDEGREE_MAX] = max_in_degree
-        if min_in_degree: degreeFilter[DegreeFilterTypes.INDEGREE_MIN] = min_in_degree
-        return self.__with_retries(lambda:
-            self.__thrift_client.kStepInNeighborsFiltered(edge_type, source_node, max_hops, filter, degreeFilter, alternating))
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return self.__with_retries('multi_hop_in_neighbors', lambda client:
+            client.kStepInNeighborsFiltered(edge_type, source_node, max_hops, filter, degreeFilter, alternating))
+
+    def multi_hop_out_neighbors_with_stats(self, edge_type, source_node, max_hops, filter="",
+                                           max_out_degree=None, max_in_degree=None,
+                                           min_out_degree=None, min_in_degree=None,
+                                           alternating=True):
+        """ Like multi_hop_out_neighbors, but return a pair (nodes, stats), where stats is a
+        FilterStats giving the number of nodes before filtering (candidateCount) and after
+        (resultCount), the time spent on the filter (filterMillis), and whether it was evaluated
+        against the server's in-memory attributes (path == FilterPath.MEMORY) or by Postgres
+        (FilterPath.SQL)."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        result = self.__with_retries('multi_hop_out_neighbors_with_stats', lambda client:
+            client.kStepOutNeighborsFilteredWithStats(edge_type, source_node, max_hops, filter, degreeFilter, alternating))
+        return result.nodes, result.stats
+
+    def multi_hop_in_neighbors_with_stats(self, edge_type, source_node, max_hops, filter="",
+                                          max_out_degree=None, max_in_degree=None,
+                                          min_out_degree=None, min_in_degree=None,
+                                          alternating=True):
+        """ Like multi_hop_in_neighbors, but return a pair (nodes, stats); see
+        multi_hop_out_neighbors_with_stats."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        result = self.__with_retries('multi_hop_in_neighbors_with_stats', lambda client:
+            client.kStepInNeighborsFilteredWithStats(edge_type, source_node, max_hops, filter, degreeFilter, alternating))
+        return result.nodes, result.stats
+
+    def iter_multi_hop_out_neighbors(self, edge_type, source_node, max_hops, filter="",
+                                     max_out_degree=None, max_in_degree=None,
+                                     min_out_degree=None, min_in_degree=None,
+                                     alternating=True, page_size=10000):
+        """ Like multi_hop_out_neighbors, but yield the nodes in order of tempest id, requesting
+        them page_size at a time as the generator is consumed."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return self.__iter_pages('iter_multi_hop_out_neighbors', lambda client, page_token:
+            client.kStepOutNeighborsFilteredPage(edge_type, source_node, max_hops, filter, degreeFilter,
+                                                 alternating, page_size, page_token))
+
+    def iter_multi_hop_in_neighbors(self, edge_type, source_node, max_hops, filter="",
+                                    max_out_degree=None, max_in_degree=None,
+                                    min_out_degree=None, min_in_degree=None,
+                                    alternating=True, page_size=10000):
+        """ Like multi_hop_in_neighbors, but yield the nodes in order of tempest id, requesting
+        them page_size at a time as the generator is consumed."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return self.__iter_pages('iter_multi_hop_in_neighbors', lambda client, page_token:
+            client.kStepInNeighborsFilteredPage(edge_type, source_node, max_hops, filter, degreeFilter,
+                                                alternating, page_size, page_token))
+
+    def multi_hop_out_neighbors_packed(self, edge_type, source_node, max_hops, filter="",
+                                       max_out_degree=None, max_in_degree=None,
+                                       min_out_degree=None, min_in_degree=None,
+                                       alternating=True):
+        """ Like multi_hop_out_neighbors, but return the nodes as PackedNodes."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return self.__with_retries('multi_hop_out_neighbors_packed', lambda client: unpack_node_list(
+            client.kStepOutNeighborsFilteredPacked(edge_type, source_node, max_hops, filter, degreeFilter, alternating)))
+
+    def multi_hop_in_neighbors_packed(self, edge_type, source_node, max_hops, filter="",
+                                      max_out_degree=None, max_in_degree=None,
+                                      min_out_degree=None, min_in_degree=None,
+                                      alternating=True):
+        """ Like multi_hop_in_neighbors, but return the nodes as PackedNodes."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return self.__with_retries('multi_hop_in_neighbors_packed', lambda client: unpack_node_list(
+            client.kStepInNeighborsFilteredPacked(edge_type, source_node, max_hops, filter, degreeFilter, alternating)))
 
     def node_attribute(self, node, attribute_name):
         # get will return None if attribute_name isn't found (e.g. if it was null in the database)
@@ -213,44 +604,155 @@ class TempestClient:
     def multi_node_attribute(self, nodes, attribute_name):
         """ Return a dictionary mapping node to attribute value for the given nodes and attribute name.
         Omits node ids which have a null attribute value."""
-        return  self.__with_retries(lambda:
+        cache = self.__cache
+        if cache is None or not cache.is_cached('node_attribute'):
+            return self.__fetch_multi_node_attribute(nodes, attribute_name)
+
+        result = {}
+        missing_nodes = []
+        for node in nodes:
+            hit, value = cache.get('node_attribute', (attribute_name, node_key(node)))
+            if not hit:
+                missing_nodes.append(node)
+            elif value is not None:
+                result[node] = value
+        if missing_nodes:
+            generation = cache.generation()
+            fetched = self.__fetch_multi_node_attribute(missing_nodes, attribute_name)
+            if fetched is None:
+                return None
+            # Null attributes are cached as None, so they aren't requested again.
+            fetched_by_key = {node_key(node): value for node, value in fetched.items()}
+            for node in missing_nodes:
+                value = fetched_by_key.get(node_key(node))
+                cache.put('node_attribute', (attribute_name, node_key(node)), value,
+                          [node_key(node)], generation)
+            result.update(fetched)
+        return result
+
+    def node_attribute_columns(self, nodes, attribute_names):
+        """ Return a dictionary from each of the given attribute names to a NodeAttributeColumn of
+        its values for the given nodes, which must all have the same type, fetched in a single
+        request (of at most 1000000 nodes).  Values are typed arrays (numpy arrays if numpy is
+        installed), which is much faster than multi_node_attribute for many nodes or attributes.
+        Element i of each column corresponds to the ith node; nodes which don't exist have null
+        values.  Returns an empty dictionary if there are no nodes.  Results aren't cached."""
+        nodes = list(nodes)
+        node_types = set(node.type for node in nodes)
+        if len(node_types) > 1:
+            raise ValueError("All nodes must have the same type, not %s" % sorted(node_types))
+        if not nodes:
+            return {}
+        node_type = node_types.pop()
+        columns = self.__with_retries('node_attribute_columns', lambda client:
+            client.getNodeAttributeColumns(node_type, [node.id for node in nodes], list(attribute_names)))
+        if columns is None:
+            return None
+        return {column.name: unpack_attribute_column(column) for column in columns}
+
+    def __fetch_multi_node_attribute(self, nodes, attribute_name):
+        return self.__with_retries('multi_node_attribute', lambda client:
             {k: jsonToValue(v) for k, v in
-             self.__thrift_client.getMultiNodeAttributeAsJSON(nodes, attribute_name).items()})
+             client.getMultiNodeAttributeAsJSON(nodes, attribute_name).items()})
 
     def close(self):
-        """Close the TCP connection to the server."""
-        self.__thrift_client.close()
+        """Close the TCP connections to the server."""
+        self.__router.close()
 
     def add_node(self, node):
         """ Create the given node, so edges and attributes can be set on it."""
-        self.__thrift_client.addNode(node)
+        self.__with_connection('add_node', lambda client: client.addNode(node))
+        self.__invalidate([node])
 
     def add_nodes(self, nodes):
         """ Create the given nodes, so edges and attributes can be set on them."""
-        self.__thrift_client.addNodes(nodes)
+        self.__with_connection('add_nodes', lambda client: client.addNodes(nodes))
+        self.__invalidate(nodes)
 
     def add_new_nodes(self, nodes):
         """ Create the given nodes, so edges and attributes can be set on them."""
-        self.__thrift_client.addNewNodes(nodes)
+        self.__with_connection('add_new_nodes', lambda client: client.addNewNodes(nodes))
+        self.__invalidate(nodes)
 
     def set_node_attribute(self, node, attribute_name, attribute_value):
         """Set the given attribute on the given node, which must have been added previously."""
-        self.__thrift_client.setNodeAttribute(node, attribute_name, attribute_value)
+        self.__with_connection('set_node_attribute', lambda client: client.setNodeAttribute(node, attribute_name, attribute_value))
+        self.__invalidate([node])
+
+    def set_node_attributes(self, nodes, attribute_names, attribute_values):
+        """ Set attribute_names[i] of nodes[i] to attribute_values[i] for each i, using a single
+        request.  If any update fails, none are applied."""
+        self.__with_connection('set_node_attributes', lambda client: client.setNodeAttributes(nodes, attribute_names, attribute_values))
+        self.__invalidate(nodes)
 
     def add_edges(self, edge_type,  nodes1, nodes2):
         """ Adds edges from corresponding items in the given parallel lists to the graph. """
-        self.__thrift_client.addEdges(edge_type, nodes1, nodes2)
+        self.__with_connection('add_edges', lambda client: client.addEdges(edge_type, nodes1, nodes2))
+        self.__invalidate(list(nodes1) + list(nodes2))
 
     def add_nodes_and_edges(self, edge_type,  nodes1, nodes2, check_for_duplicates=False):
         """ Adds edges from corresponding items in the given parallel lists to the graph.
             Also ensures that the required nodes are added if necessary.
         """
-        self.__thrift_client.addNodesAndEdges(edge_type, nodes1, nodes2, check_for_duplicates)
+        self.__with_connection('add_nodes_and_edges', lambda client: client.addNodesAndEdges(edge_type, nodes1, nodes2, check_for_duplicates))
+        self.__invalidate(list(nodes1) + list(nodes2))
 
     def add_edge(self, edge_type,  node1, node2):
         """ Adds the given edge to the graph. """
         self.add_edges(edge_type, [node1], [node2])
 
+    def buffered_writer(self, **options):
+        """ Return a BufferedWriter which collects single writes and sends them through this client
+        in batches.  See BufferedWriter.__init__ for the supported options."""
+        return BufferedWriter(self, **options)
+
+    def bulk_load_edges(self, edge_type, csv_path, source_node_type, target_node_type, **options):
+        """ Add the edges in the given headerless "sourceId,targetId" csv file, and any nodes they
+        need, by streaming the file in chunks sent in parallel over pooled connections.  Returns
+        the final BulkLoadProgress.  See bulk_load.bulk_load_edges for the supported options."""
+        return bulk_load.bulk_load_edges(self, edge_type, csv_path, source_node_type, target_node_type,
+                                         **options)
+
+
+def degree_filter(max_out_degree=None, max_in_degree=None, min_out_degree=None, min_in_degree=None):
+    """ Return the DegreeFilter map for the given optional degree bounds."""
+    degreeFilter={}
+    if max_out_degree: degreeFilter[DegreeFilterTypes.OUTDEGREE_MAX] = max_out_degree
+    if min_out_degree: degreeFilter[DegreeFilterTypes.OUTDEGREE_MIN] = min_out_degree
+    if max_in_degree: degreeFilter[DegreeFilterTypes.INDEGREE_MAX] = max_in_degree
+    if min_in_degree: degreeFilter[DegreeFilterTypes.INDEGREE_MIN] = min_in_degree
+    return degreeFilter
+
+def set_call_params(params, cache, max_staleness, deadline_ms):
+    """ Set the useCache, maxStalenessMillis and deadlineMillis fields of the given PPR params."""
+    params.useCache = cache
+    if max_staleness is not None:
+        params.maxStalenessMillis = int(max_staleness * 1000)
+    if deadline_ms is not None:
+        params.deadlineMillis = int(deadline_ms)
+
+def monte_carlo_ppr_params(num_steps, reset_probability, max_results, cache, max_staleness,
+                           deadline_ms):
+    """ Return the MonteCarloPageRankParams of ppr_undirected."""
+    params = MonteCarloPageRankParams(numSteps=num_steps, resetProbability=reset_probability)
+    if max_results:
+        params.maxResultCount = max_results
+    set_call_params(params, cache, max_staleness, deadline_ms)
+    return params
+
+def bidirectional_ppr_params(relative_error, reset_probability, min_probability, cache,
+                             max_staleness, deadline_ms):
+    """ Return the BidirectionalPPRParams of ppr_single_target."""
+    params = BidirectionalPPRParams(relativeError=relative_error,
+                                    resetProbability=reset_probability)
+    if min_probability:
+        params.minProbability = min_probability
+    set_call_params(params, cache, max_staleness, deadline_ms)
+    return params
+
+def node_key(node):
+    """ Return a hashable key identifying the given node."""
+    return (node.type, node.id)
 
 def jsonToValue(json_attribute):
     if json_attribute[0] == '"':
@@ -265,6 +767,12 @@ def jsonToValue(json_attribute):
         # If this isn't an int, the server made a mistake, and there isn't much the client can do.
         return int(json_attribute)
 
-def client(host='localhost', port=10001):
-    """ Create a new client to a Tempest server on the given host and port."""
-    return TempestClient(host, port)
+def client(host='localhost', port=10001, **options):
+    """ Create a new client to a Tempest server on the given host and port.  See
+    TempestClient.__init__ for the supported connection pool and cache options."""
+    return TempestClient(host, port, **options)
+
+if sys.version_info >= (3, 5):
+    # The asyncio client uses async/await syntax, so it can't be imported on older Pythons.
+    from tempest_db.async_client import AsyncTempestClient
+    __all__.append('AsyncTempestClient')
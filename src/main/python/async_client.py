@@ -0,0 +1,631 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# An asyncio client for TempestDB (Python 3.5+ only).  It speaks the same TempestDBService thrift
+# protocol as TempestClient (binary protocol over an unframed socket), but encodes and decodes
+# messages itself so calls can be awaited from an event loop instead of blocking a thread.
+#
+# Example:
+#   client = AsyncTempestClient(host='localhost', port=10001)
+#   neighbor_lists = await asyncio.gather(*[client.out_neighbors("follows", u) for u in users])
+#   await client.close()
+#
+# Each connection pipelines requests: a request is written as soon as it is made, without
+# waiting for earlier responses on the same connection.  The server answers the requests on a
+# connection in order, so responses are matched to requests first-in-first-out.
+
+import asyncio
+import collections
+import io
+import struct
+import sys
+
+from thrift.Thrift import TApplicationException, TMessageType
+from thrift.transport import TTransport
+
+from tempest_db import TempestDBService, ttypes
+from tempest_db import degree_filter, jsonToValue, protocol_factory, DeadlineGraceMillis
+from tempest_db import bidirectional_ppr_params, monte_carlo_ppr_params
+from tempest_db.columns import unpack_attribute_column
+from tempest_db.node_table import packed_node_list, packed_node_map
+from tempest_db.subgraph import unpack_subgraph
+
+
+class AsyncTempestClient(object):
+    """asyncio client class for querying TempestDB.  Method names and arguments mirror
+    TempestClient, but every method is a coroutine."""
+
+    def __init__(self, host='localhost', port=10001, connection_count=4, protocol='binary',
+                 framed_transport=False, accelerated=True, timeout_ms=None):
+        """ Create a new client to a Tempest server on the given host and port.  Requests are
+        spread over at most connection_count connections, which are opened when first needed.
+        The protocol and framed_transport must match the server's thriftProtocol and
+        framedTransport settings; see get_thrift_client.  If timeout_ms is given, connecting and
+        each request time out after that many milliseconds, closing the connection."""
+        if connection_count < 1:
+            raise ValueError("connection_count must be positive")
+        self.__host = host
+        self.__port = port
+        self.__protocol_factory = protocol_factory(protocol, accelerated)
+        self.__framed_transport = framed_transport
+        self.__connection_count = connection_count
+        self.__timeout_ms = timeout_ms
+        self.__connections = []
+        self.__connect_lock = None
+        self.__max_retries = 3
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def __connection(self):
+        """ Return the open connection with the fewest requests in flight, opening a new
+        connection if every open connection is busy and fewer than connection_count are open."""
+        if self.__connect_lock is None:
+            self.__connect_lock = asyncio.Lock()
+        async with self.__connect_lock:
+            self.__connections = [c for c in self.__connections if not c.closed]
+            idle = [c for c in self.__connections if c.in_flight == 0]
+            if idle:
+                return idle[0]
+            if len(self.__connections) < self.__connection_count:
+                connection = await _PipelinedConnection.open(self.__host, self.__port,
+                                                             self.__protocol_factory,
+                                                             self.__framed_transport,
+                                                             self.__timeout_ms)
+                self.__connections.append(connection)
+                return connection
+            return min(self.__connections, key=lambda c: c.in_flight)
+
+    async def __call(self, method_name, *args):
+        """ Send a single request without retrying, and return its result."""
+        connection = await self.__connection()
+        return await connection.call(method_name, args)
+
+    async def __with_retries(self, method_name, *args):
+        """ Send a request, retrying on transport errors, and return its result."""
+        retry_count = 0
+        while True:
+            try:
+                return await self.__call(method_name, *args)
+            except (TTransport.TTransportException, IOError):
+                retry_count += 1
+                if retry_count >= self.__max_retries:
+                    raise
+                sys.stderr.write("(Tempest client reconnecting to server...)\n")
+
+    async def __with_deadline(self, deadline_ms, method_name, *args):
+        """ Like __with_retries, but if deadline_ms is given, send the request only once and raise
+        asyncio.TimeoutError if there is no response DeadlineGraceMillis after the deadline."""
+        if deadline_ms is None:
+            return await self.__with_retries(method_name, *args)
+        return await asyncio.wait_for(self.__call(method_name, *args),
+                                      (deadline_ms + DeadlineGraceMillis) / 1000.0)
+
+    async def node_count(self, edge_type):
+        """ Return the number of nodes."""
+        return await self.__with_retries('nodeCount', edge_type)
+
+    async def edge_count(self, edge_type):
+        """ Return the number of edges."""
+        return await self.__with_retries('edgeCount', edge_type)
+
+    async def warm(self, edge_types, pin=False, wait=False, poll_seconds=1.0):
+        """ See TempestClient.warm."""
+        await self.__with_retries('warm', edge_types, pin)
+        if not wait:
+            return None
+        while True:
+            residencies = []
+            for edge_type in edge_types:
+                residencies.append(await self.residency(edge_type))
+            if not any(residency.warming for residency in residencies):
+                return residencies
+            await asyncio.sleep(poll_seconds)
+
+    async def residency(self, edge_type):
+        """ See TempestClient.residency."""
+        return await self.__with_retries('residency', edge_type)
+
+    async def out_degree(self, edge_type, node):
+        """ Return the out-degree of the given node."""
+        return await self.__with_retries('outDegree', edge_type, node)
+
+    async def out_neighbors(self, edge_type, node):
+        """ Return the out-neighbors of the given node."""
+        return await self.__with_retries('outNeighbors', edge_type, node)
+
+    async def out_neighbor(self, edge_type, node, i):
+        """ Return the ith out-neighbor of the given node."""
+        return await self.__with_retries('outNeighbor', edge_type, node, i)
+
+    async def in_degree(self, edge_type, node):
+        """ Return the in-degree of the given node."""
+        return await self.__with_retries('inDegree', edge_type, node)
+
+    async def in_neighbors(self, edge_type, node):
+        """ Return the in-neighbors of the given node."""
+        return await self.__with_retries('inNeighbors', edge_type, node)
+
+    async def in_neighbor(self, edge_type, node, i):
+        """ Return the ith in-neighbor of the given node."""
+        return await self.__with_retries('inNeighbor', edge_type, node, i)
+
+    async def multi_out_degree(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its out-degree."""
+        return dict(zip(nodes, await self.__with_retries('multiOutDegree', edge_type, nodes)))
+
+    async def multi_in_degree(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its in-degree."""
+        return dict(zip(nodes, await self.__with_retries('multiInDegree', edge_type, nodes)))
+
+    async def multi_out_neighbors(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its list of out-neighbors."""
+        return dict(zip(nodes, await self.__with_retries('multiOutNeighbors', edge_type, nodes)))
+
+    async def multi_in_neighbors(self, edge_type, nodes):
+        """ Return a dictionary mapping each of the given nodes to its list of in-neighbors."""
+        return dict(zip(nodes, await self.__with_retries('multiInNeighbors', edge_type, nodes)))
+
+    async def ppr_single_target(self, edge_type, seeds, target, relative_error=0.1,
+                                reset_probability=0.3, min_probability=None, cache=True,
+                                max_staleness=None, deadline_ms=None):
+        """ See TempestClient.ppr_single_target."""
+        params = bidirectional_ppr_params(relative_error, reset_probability, min_probability, cache,
+                                          max_staleness, deadline_ms)
+        return await self.__with_deadline(deadline_ms, 'pprSingleTarget', edge_type, seeds, target,
+                                          params)
+
+    async def ppr_single_target_with_stats(self, edge_type, seeds, target, deadline_ms,
+                                           relative_error=0.1, reset_probability=0.3,
+                                           min_probability=None, cache=True, max_staleness=None):
+        """ See TempestClient.ppr_single_target_with_stats."""
+        params = bidirectional_ppr_params(relative_error, reset_probability, min_probability, cache,
+                                          max_staleness, deadline_ms)
+        estimate = await self.__with_deadline(deadline_ms, 'pprSingleTargetWithStats', edge_type,
+                                              seeds, target, params)
+        return estimate.ppr, estimate.stats
+
+    async def ppr_multi_target(self, edge_type, seeds, targets, relative_error=0.1,
+                               reset_probability=0.3, min_probability=None):
+        """ See TempestClient.ppr_multi_target."""
+        params = ttypes.BidirectionalPPRParams(relativeError=relative_error,
+                                               resetProbability=reset_probability)
+        if min_probability:
+            params.minProbability = min_probability
+        return await self.__with_retries('pprMultiTarget', edge_type, seeds, targets, params)
+
+    async def ppr_undirected(self, edge_types, seeds, num_steps=100000, reset_probability=0.3,
+                             max_results=None, node_table=None, cache=True, max_staleness=None,
+                             deadline_ms=None):
+        """ See TempestClient.ppr_undirected."""
+        params = monte_carlo_ppr_params(num_steps, reset_probability, max_results, cache,
+                                        max_staleness, deadline_ms)
+        if node_table is not None:
+            return (await self.__ppr_undirected_node_map(edge_types, seeds, params, deadline_ms,
+                                                         node_table))[0]
+        return await self.__with_deadline(deadline_ms, 'pprUndirected', edge_types, seeds, params)
+
+    async def ppr_undirected_with_stats(self, edge_types, seeds, deadline_ms, num_steps=100000,
+                                        reset_probability=0.3, max_results=None, node_table=None,
+                                        cache=True, max_staleness=None):
+        """ See TempestClient.ppr_undirected_with_stats."""
+        params = monte_carlo_ppr_params(num_steps, reset_probability, max_results, cache,
+                                        max_staleness, deadline_ms)
+        if node_table is not None:
+            return await self.__ppr_undirected_node_map(edge_types, seeds, params, deadline_ms,
+                                                        node_table)
+        estimate = await self.__with_deadline(deadline_ms, 'pprUndirectedWithStats', edge_types,
+                                              seeds, params)
+        return estimate.pprs, estimate.stats
+
+    async def __ppr_undirected_node_map(self, edge_types, seeds, params, deadline_ms, node_table):
+        """ See TempestClient.__ppr_undirected_node_map."""
+        estimate = await self.__with_deadline(deadline_ms, 'pprUndirectedPacked', edge_types,
+                                              seeds, params)
+        id_lists = await self.__node_id_lists(estimate.nodeLists)
+        return packed_node_map(node_table, estimate.nodeLists, id_lists, estimate.pprs), estimate.stats
+
+    async def __node_id_lists(self, node_lists):
+        """ See TempestClient.__node_id_lists."""
+        id_lists = []
+        for nodes in node_lists:
+            id_lists.append(await self.__with_retries('tempestIdsToNodeIds', nodes.nodeType,
+                                                      nodes.tempestIds))
+        return id_lists
+
+    async def ppr_cache_stats(self):
+        """ See TempestClient.ppr_cache_stats."""
+        return await self.__with_retries('pprCacheStats')
+
+    async def recommend(self, edge_type, seed, max_results=10, attribute_names=(), exclude_seed=True,
+                        exclude_out_neighbors=True, exclude_in_neighbors=False,
+                        max_out_degree=None, max_in_degree=None, min_out_degree=None,
+                        min_in_degree=None, max_seed_out_degree=None, min_seed_out_degree=None,
+                        num_steps=100000, reset_probability=0.3):
+        """ See TempestClient.recommend."""
+        page_rank_params = ttypes.MonteCarloPageRankParams(numSteps=num_steps,
+                                                           resetProbability=reset_probability)
+        rec_params = ttypes.RecommendParams(
+            maxResults=max_results,
+            excludeSeed=exclude_seed,
+            excludeOutNeighbors=exclude_out_neighbors,
+            excludeInNeighbors=exclude_in_neighbors,
+            degreeFilter=degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree),
+            seedDegreeFilter=degree_filter(max_out_degree=max_seed_out_degree,
+                                           min_out_degree=min_seed_out_degree),
+            attributeNames=list(attribute_names))
+        recommendations = await self.__with_retries('recommend', edge_type, seed, page_rank_params,
+                                                    rec_params)
+        return [(recommendation.node, recommendation.score,
+                 {name: jsonToValue(value) for name, value in (recommendation.attributesAsJSON or {}).items()})
+                for recommendation in recommendations]
+
+    async def connected_component(self, source, edge_types, max_size=(1 << 31) - 1, node_table=None):
+        """ See TempestClient.connected_component."""
+        if node_table is not None:
+            node_lists = await self.__with_retries('connectedComponentPacked', source, edge_types,
+                                                   max_size)
+            return packed_node_list(node_table, node_lists, await self.__node_id_lists(node_lists))
+        return await self.__with_retries('connectedComponent', source, edge_types, max_size)
+
+    async def induced_subgraph(self, edge_type, nodes=None, seed=None, hops=2, max_nodes=1000000):
+        """ See TempestClient.induced_subgraph."""
+        if (nodes is None) == (seed is None):
+            raise ValueError('Pass either nodes or seed')
+        if nodes is not None:
+            return unpack_subgraph(await self.__with_retries('inducedSubgraph', edge_type, list(nodes),
+                                                             max_nodes))
+        return unpack_subgraph(await self.__with_retries('egoSubgraph', edge_type, seed, hops, max_nodes))
+
+    async def nodes(self, graph_name, filter):
+        """ Return all nodes satisfying the given SQL-like filter clause"""
+        return await self.__with_retries('nodes', graph_name, filter)
+
+    async def multi_hop_out_neighbors(self, edge_type, source_node, max_hops, filter="",
+                                      max_out_degree=None, max_in_degree=None,
+                                      min_out_degree=None, min_in_degree=None,
+                                      alternating=True):
+        """ See TempestClient.multi_hop_out_neighbors."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return await self.__with_retries('kStepOutNeighborsFiltered', edge_type, source_node,
+                                         max_hops, filter, degreeFilter, alternating)
+
+    async def multi_hop_in_neighbors(self, edge_type, source_node, max_hops, filter="",
+                                     max_out_degree=None, max_in_degree=None,
+                                     min_out_degree=None, min_in_degree=None,
+                                     alternating=True):
+        """ See TempestClient.multi_hop_in_neighbors."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        return await self.__with_retries('kStepInNeighborsFiltered', edge_type, source_node,
+                                         max_hops, filter, degreeFilter, alternating)
+
+    async def multi_hop_out_neighbors_with_stats(self, edge_type, source_node, max_hops, filter="",
+                                                 max_out_degree=None, max_in_degree=None,
+                                                 min_out_degree=None, min_in_degree=None,
+                                                 alternating=True):
+        """ See TempestClient.multi_hop_out_neighbors_with_stats."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        result = await self.__with_retries('kStepOutNeighborsFilteredWithStats', edge_type,
+                                           source_node, max_hops, filter, degreeFilter, alternating)
+        return result.nodes, result.stats
+
+    async def multi_hop_in_neighbors_with_stats(self, edge_type, source_node, max_hops, filter="",
+                                                max_out_degree=None, max_in_degree=None,
+                                                min_out_degree=None, min_in_degree=None,
+                                                alternating=True):
+        """ See TempestClient.multi_hop_in_neighbors_with_stats."""
+        degreeFilter = degree_filter(max_out_degree, max_in_degree, min_out_degree, min_in_degree)
+        result = await self.__with_retries('kStepInNeighborsFilteredWithStats', edge_type,
+                                           source_node, max_hops, filter, degreeFilter, alternating)
+        return result.nodes, result.stats
+
+    async def node_attribute(self, node, attribute_name):
+        return (await self.multi_node_attribute([node], attribute_name)).get(node)
+
+    async def multi_node_attribute(self, nodes, attribute_name):
+        """ Return a dictionary mapping node to attribute value for the given nodes and attribute
+        name.  Omits node ids which have a null attribute value."""
+        node_to_json = await self.__with_retries('getMultiNodeAttributeAsJSON', nodes, attribute_name)
+        return {k: jsonToValue(v) for k, v in node_to_json.items()}
+
+    async def node_attribute_columns(self, nodes, attribute_names):
+        """ See TempestClient.node_attribute_columns."""
+        nodes = list(nodes)
+        node_types = set(node.type for node in nodes)
+        if len(node_types) > 1:
+            raise ValueError("All nodes must have the same type, not %s" % sorted(node_types))
+        if not nodes:
+            return {}
+        columns = await self.__with_retries('getNodeAttributeColumns', node_types.pop(),
+                                            [node.id for node in nodes], list(attribute_names))
+        return {column.name: unpack_attribute_column(column) for column in columns}
+
+    async def add_node(self, node):
+        """ Create the given node, so edges and attributes can be set on it."""
+        await self.__call('addNode', node)
+
+    async def add_nodes(self, nodes):
+        """ Create the given nodes, so edges and attributes can be set on them."""
+        await self.__call('addNodes', nodes)
+
+    async def add_new_nodes(self, nodes):
+        """ Create the given nodes, so edges and attributes can be set on them."""
+        await self.__call('addNewNodes', nodes)
+
+    async def set_node_attribute(self, node, attribute_name, attribute_value):
+        """ Set the given attribute on the given node, which must have been added previously."""
+        await self.__call('setNodeAttribute', node, attribute_name, attribute_value)
+
+    async def add_edges(self, edge_type, nodes1, nodes2):
+        """ Adds edges from corresponding items in the given parallel lists to the graph. """
+        await self.__call('addEdges', edge_type, nodes1, nodes2)
+
+    async def add_nodes_and_edges(self, edge_type, nodes1, nodes2, check_for_duplicates=False):
+        """ Adds edges from corresponding items in the given parallel lists to the graph.
+            Also ensures that the required nodes are added if necessary.
+        """
+        await self.__call('addNodesAndEdges', edge_type, nodes1, nodes2, check_for_duplicates)
+
+    async def add_edge(self, edge_type, node1, node2):
+        """ Adds the given edge to the graph. """
+        await self.add_edges(edge_type, [node1], [node2])
+
+    async def close(self):
+        """ Close the TCP connections to the server, failing any requests still in flight."""
+        connections, self.__connections = self.__connections, []
+        for connection in connections:
+            await connection.close()
+
+
+class _PipelinedConnection(object):
+    """A single connection to the server with any number of requests in flight."""
+
+    # The most bytes to read from the socket at once
+    ReadBytes = 1 << 16
+
+    # Unframed responses larger than this are decoded only after their size has doubled since the
+    # previous attempt, so decoding a large response is linear rather than quadratic in its size,
+    # or once no more data has arrived for a while (at least MinIdleDecodeSeconds), so a response
+    # just short of the doubled size isn't left waiting.
+    InitialDecodeAttemptBytes = 4096
+    MinIdleDecodeSeconds = 0.001
+
+    def __init__(self, reader, writer, protocol_factory, framed, timeout_ms=None):
+        self.__reader = reader
+        self.__writer = writer
+        self.__protocol_factory = protocol_factory
+        self.__framed = framed
+        self.__timeout_seconds = None if timeout_ms is None else timeout_ms / 1000.0
+        self.__seqid = 0
+        # (seqid, method_name, future) for each request whose response hasn't been read yet
+        self.__pending = collections.deque()
+        # Only one request at a time may be written, since on Python 3.9 and older concurrent
+        # drain() calls on one StreamWriter fail once its transport is paused.
+        self.__write_lock = asyncio.Lock()
+        self.closed = False
+        self.__reader_task = asyncio.ensure_future(self.__read_responses())
+
+    @classmethod
+    async def open(cls, host, port, protocol_factory, framed, timeout_ms=None):
+        timeout_seconds = None if timeout_ms is None else timeout_ms / 1000.0
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port),
+                                                    timeout_seconds)
+        except asyncio.TimeoutError:
+            raise TTransport.TTransportException(TTransport.TTransportException.TIMED_OUT,
+                                                 "Timed out connecting to Tempest server")
+        return cls(reader, writer, protocol_factory, framed, timeout_ms)
+
+    @property
+    def in_flight(self):
+        return len(self.__pending)
+
+    async def call(self, method_name, args):
+        future = asyncio.get_event_loop().create_future()
+        async with self.__write_lock:
+            # Requests are written in the order of their seqids, which is the order of __pending.
+            if self.closed:
+                raise TTransport.TTransportException(TTransport.TTransportException.NOT_OPEN,
+                                                     "Connection to Tempest server is closed")
+            self.__seqid += 1
+            message = self.__encode_request(method_name, args, self.__seqid)
+            self.__pending.append((self.__seqid, method_name, future))
+            self.__writer.write(message)
+            await self.__writer.drain()
+        try:
+            return await asyncio.wait_for(future, self.__timeout_seconds)
+        except asyncio.TimeoutError:
+            # The responses to later requests would queue behind this one, so give up on the
+            # connection; the client retries on a new one.
+            exception = TTransport.TTransportException(TTransport.TTransportException.TIMED_OUT,
+                                                       method_name + " timed out")
+            self.__fail_pending(exception)
+            self.__reader_task.cancel()
+            raise exception
+
+    def __encode_request(self, method_name, args, seqid):
+        args_struct = getattr(TempestDBService, method_name + '_args')(*args)
+        buffer = TTransport.TMemoryBuffer()
+        protocol = self.__protocol_factory.getProtocol(buffer)
+        protocol.writeMessageBegin(method_name, TMessageType.CALL, seqid)
+        args_struct.write(protocol)
+        protocol.writeMessageEnd()
+        message = buffer.getvalue()
+        if self.__framed:
+            message = struct.pack('!i', len(message)) + message
+        return message
+
+    async def __read_responses(self):
+        loop = asyncio.get_event_loop()
+        data = bytearray()
+        next_decode_size = 0
+        # The size of data when decoding it last failed, and how long to wait for more data
+        # before trying again anyway
+        failed_decode_size = 0
+        idle_decode_seconds = self.MinIdleDecodeSeconds
+        wait_seconds = None
+        # A read which is still waiting for data is kept rather than cancelled when the wait times
+        # out, since before Python 3.7 the StreamReader may still be waiting when the next read
+        # starts, which fails.
+        read = None
+        try:
+            while True:
+                if read is None:
+                    read = asyncio.ensure_future(self.__reader.read(self.ReadBytes))
+                await asyncio.wait([read], timeout=wait_seconds)
+                if not read.done():
+                    # An unframed response doesn't say how long it is, so once no more data is
+                    # arriving, try to decode it even if data hasn't doubled.
+                    next_decode_size = 0
+                else:
+                    chunk = read.result()
+                    read = None
+                    if not chunk:
+                        raise TTransport.TTransportException(
+                            TTransport.TTransportException.END_OF_FILE,
+                            "Tempest server closed the connection")
+                    data.extend(chunk)
+                while self.__pending and len(data) >= next_decode_size:
+                    decode_start = loop.time()
+                    consumed = self.__decode_response(data)
+                    if consumed is None:
+                        next_decode_size = self.__next_decode_size(data)
+                        failed_decode_size = len(data)
+                        # Wait longer than the failed attempt took, so at most about a third of
+                        # the time is spent on attempts that fail.
+                        idle_decode_seconds = max(self.MinIdleDecodeSeconds,
+                                                  2 * (loop.time() - decode_start))
+                        break
+                    del data[:consumed]
+                    next_decode_size = 0
+                    failed_decode_size = 0
+                if not self.__framed and self.__pending and len(data) > failed_decode_size:
+                    wait_seconds = idle_decode_seconds
+                else:
+                    wait_seconds = None
+        except asyncio.CancelledError:
+            # On Python 3.7 and older, CancelledError is an Exception, so this must come first
+            self.__fail_pending(TTransport.TTransportException(
+                TTransport.TTransportException.NOT_OPEN, "Connection to Tempest server was closed"))
+            raise
+        except Exception as e:
+            self.__fail_pending(e)
+        finally:
+            if read is not None:
+                read.cancel()
+
+    def __next_decode_size(self, data):
+        """ Return the number of bytes to wait for before trying to decode a response again."""
+        if not self.__framed:
+            return max(len(data) * 2, self.InitialDecodeAttemptBytes)
+        if len(data) < 4:
+            return 4
+        return 4 + struct.unpack('!i', bytes(data[:4]))[0]
+
+    def __decode_response(self, data):
+        """ Decode the response to the oldest pending request from the start of data, resolve its
+        future, and return the number of bytes consumed, or return None if data doesn't yet
+        contain the whole response."""
+        if self.__framed:
+            if len(data) < 4 or len(data) < self.__next_decode_size(data):
+                return None
+            frame_size = self.__next_decode_size(data)
+            buffer = _ResponseBuffer(bytes(data[4:frame_size]))
+        else:
+            buffer = _ResponseBuffer(bytes(data))
+        protocol = self.__protocol_factory.getProtocol(buffer)
+        seqid, method_name, future = self.__pending[0]
+        try:
+            (name, message_type, response_seqid) = protocol.readMessageBegin()
+            if message_type == TMessageType.EXCEPTION:
+                result = TApplicationException()
+            else:
+                result = getattr(TempestDBService, method_name + '_result')()
+            result.read(protocol)
+            protocol.readMessageEnd()
+        except (EOFError, TTransport.TTransportException):
+            return None
+        self.__pending.popleft()
+        if response_seqid != seqid:
+            raise TApplicationException(TApplicationException.BAD_SEQUENCE_ID,
+                                        method_name + " failed: out of sequence response")
+        if not future.done():
+            if message_type == TMessageType.EXCEPTION:
+                future.set_exception(result)
+            else:
+                self.__resolve(future, method_name, result)
+        if self.__framed:
+            return frame_size
+        return buffer.tell()
+
+    @staticmethod
+    def __resolve(future, method_name, result):
+        # Mirrors the generated client: declared exceptions are raised, then the result is
+        # returned (or None for void methods).
+        spec = result.thrift_spec
+        for field in spec[1:]:
+            if field is not None and getattr(result, field[2]) is not None:
+                future.set_exception(getattr(result, field[2]))
+                return
+        if spec[0] is None:
+            future.set_result(None)
+        elif result.success is not None:
+            future.set_result(result.success)
+        else:
+            future.set_exception(TApplicationException(TApplicationException.MISSING_RESULT,
+                                                       method_name + " failed: unknown result"))
+
+    def __fail_pending(self, exception):
+        self.closed = True
+        self.__writer.close()
+        while self.__pending:
+            _, _, future = self.__pending.popleft()
+            if not future.done():
+                future.set_exception(exception)
+
+    async def close(self):
+        self.closed = True
+        self.__reader_task.cancel()
+        try:
+            await self.__reader_task
+        except asyncio.CancelledError:
+            pass
+        self.__writer.close()
+
+
+class _ResponseBuffer(TTransport.TTransportBase, TTransport.CReadableTransport):
+    """A read-only transport over the bytes of a response, which tracks how many have been read.
+    It implements CReadableTransport so the accelerated protocols can decode from it."""
+
+    def __init__(self, value):
+        self.__buffer = io.BytesIO(value)
+
+    def isOpen(self):
+        return True
+
+    def read(self, sz):
+        return self.__buffer.read(sz)
+
+    def tell(self):
+        """ Return the number of bytes read so far."""
+        return self.__buffer.tell()
+
+    @property
+    def cstringio_buf(self):
+        return self.__buffer
+
+    def cstringio_refill(self, partialread, reqlen):
+        # The whole response is already buffered, so there is nothing more to read
+        raise EOFError()
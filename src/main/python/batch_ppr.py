@@ -0,0 +1,223 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Computes Personalized PageRank for many seed sets at once, reading binary graph files directly
+# (see tempest_db.local).  This computes the same estimate as the server's pprUndirected
+# (MonteCarloPPRTyped): a walk of num_steps steps which follows a random out- or in-neighbor, and
+# jumps back to a random seed with probability reset_probability (or at a node without
+# neighbors), with the fraction of steps spent at each node as its PPR.  Instead of one walk at a
+# time, the walks of a whole batch of seed sets advance together, one numpy operation per step,
+# and batches are spread across a pool of processes which share the memory-mapped graph files.
+#
+# Example:
+#   from tempest_db import batch_ppr
+#   user_ids = range(1, 500001)
+#   for user_id, pprs in zip(user_ids, batch_ppr.iter_ppr_undirected(
+#           ["/data/binary_graphs/follows.dat"], user_ids, num_steps=10000, max_results=100)):
+#       ...  # pprs is a dictionary from tempest id to PPR
+#
+# Requires numpy (pip install tempest_db[numpy]).
+
+import multiprocessing
+
+import numpy
+
+from tempest_db.local import GraphFile
+
+# Visits are counted after at most this many (walk, node) pairs have been recorded, which bounds
+# the memory used by uncounted visits.
+MaxUncountedVisits = 4 * 1000 * 1000
+
+
+class GraphWalker(object):
+    """Takes vectorized random steps on the undirected union of the given GraphFiles, which must
+    all have a single node type (e.g. "follows" from users to users), since tempest ids of different
+    node types would be confused."""
+
+    def __init__(self, graph_files):
+        self.graph_files = graph_files
+        self.node_count = max(graph_file.node_count() for graph_file in graph_files)
+        # As in TypedGraphUnion, the neighbors of a node are the out-neighbors then the
+        # in-neighbors in the first graph, then those in the next graph, etc.
+        self.__neighbor_lists = []
+        for graph_file in graph_files:
+            for unidirectional_graph in [graph_file.out_graph(), graph_file.in_graph()]:
+                if unidirectional_graph.max_node_id >= 0:
+                    self.__neighbor_lists.append((unidirectional_graph.max_node_id,
+                                                  unidirectional_graph.degrees(),
+                                                  unidirectional_graph.neighbors_pointers(),
+                                                  graph_file.data()))
+
+    def step(self, nodes, random_state):
+        """ Return (neighbors, has_neighbor), where neighbors holds a uniformly random neighbor of
+        each of the given nodes, for nodes where has_neighbor is True."""
+        degrees = [self.__degrees(neighbor_list, nodes) for neighbor_list in self.__neighbor_lists]
+        total_degrees = sum(degrees) if degrees else numpy.zeros(len(nodes), dtype=numpy.int64)
+        has_neighbor = total_degrees > 0
+        # The index of the chosen neighbor, relative to the current neighbor list below.
+        indexes = numpy.floor(random_state.random_sample(len(nodes)) * total_degrees).astype(numpy.int64)
+        neighbors = numpy.zeros(len(nodes), dtype=numpy.int64)
+        for neighbor_list, list_degrees in zip(self.__neighbor_lists, degrees):
+            chosen = has_neighbor & (indexes >= 0) & (indexes < list_degrees)
+            if chosen.any():
+                pointers, data = neighbor_list[2], neighbor_list[3]
+                offsets = pointers[nodes[chosen]] + 4 * indexes[chosen]
+                neighbors[chosen] = read_int32s(data, offsets)
+            indexes -= list_degrees
+        return neighbors, has_neighbor
+
+    def __degrees(self, neighbor_list, nodes):
+        max_node_id, degrees = neighbor_list[0], neighbor_list[1]
+        in_graph = nodes <= max_node_id
+        return numpy.where(in_graph, degrees[numpy.minimum(nodes, max_node_id)], 0).astype(numpy.int64)
+
+
+def read_int32s(data, offsets):
+    """ Return the int32s at the given byte offsets of the given uint8 array."""
+    if not (offsets & 3).any():
+        words = data[:len(data) // 4 * 4].view(numpy.int32)
+        return words[offsets >> 2]
+    # Neighbor lists are normally aligned, but the file format doesn't require it.
+    byte_indexes = offsets[:, numpy.newaxis] + numpy.arange(4)
+    return numpy.ascontiguousarray(data[byte_indexes]).view(numpy.int32).ravel()
+
+
+def walk_ppr(walker, seed_sets, num_steps, reset_probability, max_results, random_state):
+    """ Return a list containing a dictionary from tempest id to PPR for each seed set (a tempest
+    id or a sequence of tempest ids), with one walk per seed set advancing together."""
+    seed_sets = [[seeds] if numpy.isscalar(seeds) else list(seeds) for seeds in seed_sets]
+    if any(len(seeds) == 0 for seeds in seed_sets):
+        raise ValueError("Every seed set must contain at least one seed")
+    walk_count = len(seed_sets)
+    seed_counts = numpy.array([len(seeds) for seeds in seed_sets], dtype=numpy.int64)
+    seed_starts = numpy.concatenate([[0], numpy.cumsum(seed_counts)[:-1]]).astype(numpy.int64)
+    all_seeds = numpy.array([seed for seeds in seed_sets for seed in seeds], dtype=numpy.int64)
+    if (all_seeds < 0).any():
+        raise ValueError("Seeds must be non-negative tempest ids")
+    # Visits are recorded as walk index * node_count + node, so they can be counted together.
+    node_count = max(walker.node_count, int(all_seeds.max()) + 1)
+    walk_offsets = numpy.arange(walk_count, dtype=numpy.int64) * node_count
+
+    def random_starts(walk_indexes):
+        choices = numpy.floor(random_state.random_sample(len(walk_indexes)) *
+                              seed_counts[walk_indexes]).astype(numpy.int64)
+        return all_seeds[seed_starts[walk_indexes] + choices]
+
+    all_walks = numpy.arange(walk_count)
+    nodes = random_starts(all_walks)
+    counted_keys = numpy.empty(0, dtype=numpy.int64)
+    counts = numpy.empty(0, dtype=numpy.int64)
+    uncounted_keys = []
+    steps_per_count = max(1, MaxUncountedVisits // walk_count)
+
+    for step_index in range(num_steps):
+        uncounted_keys.append(walk_offsets + nodes)
+        if len(uncounted_keys) == steps_per_count or step_index == num_steps - 1:
+            counted_keys, counts = add_counts(counted_keys, counts, numpy.concatenate(uncounted_keys))
+            uncounted_keys = []
+        neighbors, has_neighbor = walker.step(nodes, random_state)
+        reset = ~has_neighbor | (random_state.random_sample(walk_count) < reset_probability)
+        nodes = numpy.where(reset, 0, neighbors)
+        if reset.any():
+            nodes[reset] = random_starts(all_walks[reset])
+
+    # counted_keys is sorted, so the visits of each walk are contiguous.
+    walk_boundaries = numpy.searchsorted(counted_keys, walk_offsets.tolist() + [walk_count * node_count])
+    results = []
+    for walk_index in range(walk_count):
+        start, end = walk_boundaries[walk_index], walk_boundaries[walk_index + 1]
+        walk_nodes = counted_keys[start:end] - walk_offsets[walk_index]
+        walk_pprs = counts[start:end] / float(num_steps)
+        if max_results is not None and len(walk_nodes) > max_results:
+            top = numpy.argsort(-walk_pprs, kind='mergesort')[:max_results]
+            walk_nodes, walk_pprs = walk_nodes[top], walk_pprs[top]
+        results.append(dict(zip(walk_nodes.tolist(), walk_pprs.tolist())))
+    return results
+
+
+def add_counts(keys, counts, new_keys):
+    """ Given sorted unique keys with their counts, return the sorted unique keys and counts after
+    counting each occurrence of new_keys."""
+    unique_new_keys, new_counts = numpy.unique(new_keys, return_counts=True)
+    all_keys, indexes = numpy.unique(numpy.concatenate([keys, unique_new_keys]), return_inverse=True)
+    all_counts = numpy.bincount(indexes.ravel(), weights=numpy.concatenate([counts, new_counts]))
+    return all_keys, all_counts.astype(numpy.int64)
+
+
+# The GraphWalker of each process in the pool, which opens the graph files once.
+_process_walker = None
+
+
+def _open_graph_files(graph_paths):
+    global _process_walker
+    _process_walker = GraphWalker([GraphFile(path) for path in graph_paths])
+
+
+def _walk_batch(args):
+    seed_sets, num_steps, reset_probability, max_results, random_seed = args
+    return walk_ppr(_process_walker, seed_sets, num_steps, reset_probability, max_results,
+                    numpy.random.RandomState(random_seed))
+
+
+def iter_ppr_undirected(graph_paths, seed_sets, num_steps=100000, reset_probability=0.3,
+                        max_results=None, batch_size=1000, processes=None, random_seed=None):
+    """ Yield a dictionary from tempest id to PPR for each of the given seed sets, in order.  Each
+    seed set is a tempest id or a sequence of tempest ids, and the PPR of each seed set is
+    estimated as by TempestClient.ppr_undirected(edge_types, seeds, num_steps, reset_probability,
+    max_results) on the edge types with the given graph files.
+
+    Seed sets are processed in batches of batch_size by processes worker processes (by default, one
+    per cpu; processes=1 computes everything in this process).  If random_seed is given, results
+    are reproducible for the same batch_size."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+    if not 0.0 < reset_probability <= 1.0:
+        raise ValueError("reset_probability must be in (0, 1]")
+    graph_paths = list(graph_paths)
+    base_seed = random_seed if random_seed is not None else \
+        numpy.random.RandomState().randint(0, 2 ** 31 - 1)
+
+    def batches():
+        batch = []
+        batch_index = 0
+        for seeds in seed_sets:
+            batch.append(seeds)
+            if len(batch) == batch_size:
+                yield (batch, num_steps, reset_probability, max_results, (base_seed + batch_index) % 2 ** 32)
+                batch = []
+                batch_index += 1
+        if batch:
+            yield (batch, num_steps, reset_probability, max_results, (base_seed + batch_index) % 2 ** 32)
+
+    # Open the graph files here first, so a missing or invalid file raises an exception instead
+    # of failing the initializer of every pool worker, which the pool would keep replacing.
+    _open_graph_files(graph_paths)
+    if processes == 1:
+        for args in batches():
+            for pprs in _walk_batch(args):
+                yield pprs
+        return
+
+    pool = multiprocessing.Pool(processes, initializer=_open_graph_files, initargs=(graph_paths,))
+    try:
+        for batch_results in pool.imap(_walk_batch, batches()):
+            for pprs in batch_results:
+                yield pprs
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def ppr_undirected(graph_paths, seed_sets, **options):
+    """ Return a list of the dictionaries yielded by iter_ppr_undirected."""
+    return list(iter_ppr_undirected(graph_paths, seed_sets, **options))
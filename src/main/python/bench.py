@@ -0,0 +1,365 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Measures the throughput and tail latency of a Tempest server under a mixed workload.  By default
+# this starts a TempestDBBenchmarkServer (from the assembly jar) on a synthetic "follows" graph
+# between users "user1" to "user<node count>", whose out- and in-degrees are skewed as in a
+# social network, then runs the same seeded sequence of operations at each concurrency level.  The
+# operations are modeled on twitter_2010_example: neighbor reads, filtered multi-hop queries, PPR,
+# attribute fetches and writes.  Results (QPS and p50/p95/p99 latency, overall and per operation)
+# are written as JSON so runs can be compared.
+#
+# Example:
+#   sbt assembly
+#   python -m tempest_db.bench --node-count 100000 --average-degree 20 --skew 0.8 \
+#       --concurrency 1,4,16 --operations 20000 --output before.json
+#
+# To benchmark an already running server with the same synthetic users, pass --no-server.
+
+from __future__ import print_function, division
+
+import argparse
+import json
+import math
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import tempest_db
+from tempest_db import Node
+
+BenchmarkServerClass = 'co.teapot.tempest.server.TempestDBBenchmarkServer'
+DefaultJar = 'target/scala-2.11/tempest-assembly.jar'
+
+# Operation name -> relative frequency.  Operations are defined in Workload.
+DefaultMix = [
+    ('out_neighbors', 25),
+    ('in_degree', 10),
+    ('multi_out_neighbors', 10),
+    ('multi_hop_filtered', 5),
+    ('ppr_undirected', 5),
+    ('ppr_single_target', 5),
+    ('node_attributes', 25),
+    ('set_node_attribute', 10),
+    ('add_edge', 5),
+]
+ReadOnlyOperations = ['out_neighbors', 'in_degree', 'multi_out_neighbors', 'multi_hop_filtered',
+                      'ppr_undirected', 'ppr_single_target', 'node_attributes']
+
+
+class SyntheticUsers(object):
+    """The sequence of the user Nodes of a TempestDBBenchmarkServer, without storing them."""
+
+    def __init__(self, node_count):
+        self.node_count = node_count
+
+    def __len__(self):
+        return self.node_count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.node_count:
+            raise IndexError(i)
+        return Node('user', 'user%d' % (i + 1))
+
+
+class Workload(object):
+    """A random mix of operations on the given nodes (a sequence of Nodes) and edge type."""
+
+    def __init__(self, nodes, edge_type='follows', mix=DefaultMix, batch_size=10, ppr_steps=10000,
+                 max_hops=2, hop_filter='login_count > 50', max_out_degree=1000,
+                 attribute_name='name'):
+        self.nodes = nodes
+        self.edge_type = edge_type
+        self.batch_size = batch_size
+        self.ppr_steps = ppr_steps
+        self.max_hops = max_hops
+        self.hop_filter = hop_filter
+        self.max_out_degree = max_out_degree
+        self.attribute_name = attribute_name
+        self.operation_names = []
+        self.__cumulative_weights = []
+        total = 0.0
+        for name, weight in mix:
+            if not hasattr(self, '_op_' + name):
+                raise ValueError("Unknown operation %s" % name)
+            if weight > 0:
+                total += weight
+                self.operation_names.append(name)
+                self.__cumulative_weights.append(total)
+        if not self.operation_names:
+            raise ValueError("The mix must contain an operation with positive weight")
+
+    def choose_operation(self, rand):
+        """ Return the name of a random operation, chosen with probability proportional to its
+        weight."""
+        x = rand.random() * self.__cumulative_weights[-1]
+        for name, cumulative_weight in zip(self.operation_names, self.__cumulative_weights):
+            if x < cumulative_weight:
+                return name
+        return self.operation_names[-1]
+
+    def run_operation(self, name, client, rand):
+        getattr(self, '_op_' + name)(client, rand)
+
+    def random_node(self, rand):
+        return self.nodes[rand.randrange(len(self.nodes))]
+
+    def random_nodes(self, rand):
+        return [self.random_node(rand) for i in range(self.batch_size)]
+
+    def _op_out_neighbors(self, client, rand):
+        client.out_neighbors(self.edge_type, self.random_node(rand))
+
+    def _op_in_degree(self, client, rand):
+        client.in_degree(self.edge_type, self.random_node(rand))
+
+    def _op_multi_out_neighbors(self, client, rand):
+        client.multi_out_neighbors(self.edge_type, self.random_nodes(rand))
+
+    def _op_multi_hop_filtered(self, client, rand):
+        client.multi_hop_out_neighbors(self.edge_type, self.random_node(rand), self.max_hops,
+                                       self.hop_filter, max_out_degree=self.max_out_degree)
+
+    # PPR operations bypass the server's PPR cache: every concurrency level repeats the seeds of
+    # the previous ones, so cached results would make the later levels look faster.
+    def _op_ppr_undirected(self, client, rand):
+        client.ppr_undirected([self.edge_type], [self.random_node(rand)], num_steps=self.ppr_steps,
+                              max_results=self.batch_size + 1, cache=False)
+
+    def _op_ppr_single_target(self, client, rand):
+        client.ppr_single_target(self.edge_type, [self.random_node(rand)], self.random_node(rand),
+                                 cache=False)
+
+    def _op_node_attributes(self, client, rand):
+        client.multi_node_attribute(self.random_nodes(rand), self.attribute_name)
+
+    def _op_set_node_attribute(self, client, rand):
+        # Attribute values are sent as strings, so write to the (string) attribute that is read
+        client.set_node_attribute(self.random_node(rand), self.attribute_name, 'user%d' % rand.randrange(100))
+
+    def _op_add_edge(self, client, rand):
+        client.add_edge(self.edge_type, self.random_node(rand), self.random_node(rand))
+
+
+def percentile(sorted_values, p):
+    """ Return the nearest-rank p-th percentile of the given sorted values (0.0 if empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = int(math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(latencies, error_count, elapsed_seconds):
+    """ Return a dictionary of the count, QPS and latency percentiles (in milliseconds) of the
+    given latencies (in seconds) of successful operations."""
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'errors': error_count,
+        'qps': len(latencies) / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+        'mean_ms': 1000.0 * sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50_ms': 1000.0 * percentile(latencies, 50),
+        'p95_ms': 1000.0 * percentile(latencies, 95),
+        'p99_ms': 1000.0 * percentile(latencies, 99),
+        'max_ms': 1000.0 * latencies[-1] if latencies else 0.0,
+    }
+
+
+def run_level(client, workload, concurrency, operation_count, seed):
+    """ Run operation_count operations of the workload, split between concurrency threads sharing
+    the given client, and return a dictionary of the results, overall and by operation.  Thread i
+    uses a random generator seeded by seed and i, so the same operations run in every run."""
+    latencies = {}  # operation name -> [seconds]
+    errors = {}  # operation name -> {exception type name -> count}
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def run_thread(thread_index):
+        rand = random.Random(seed * 1000003 + thread_index)
+        thread_latencies = {}
+        thread_errors = {}
+        start.wait()
+        count = operation_count // concurrency + (1 if thread_index < operation_count % concurrency else 0)
+        for i in range(count):
+            name = workload.choose_operation(rand)
+            operation_start = time.time()
+            try:
+                workload.run_operation(name, client, rand)
+                thread_latencies.setdefault(name, []).append(time.time() - operation_start)
+            except Exception as e:
+                name_errors = thread_errors.setdefault(name, {})
+                name_errors[type(e).__name__] = name_errors.get(type(e).__name__, 0) + 1
+        with lock:
+            for name, values in thread_latencies.items():
+                latencies.setdefault(name, []).extend(values)
+            for name, name_errors in thread_errors.items():
+                for error_type, error_count in name_errors.items():
+                    errors.setdefault(name, {})[error_type] = \
+                        errors.get(name, {}).get(error_type, 0) + error_count
+
+    threads = [threading.Thread(target=run_thread, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    start_time = time.time()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed_seconds = time.time() - start_time
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    result = summarize(all_latencies, sum(sum(e.values()) for e in errors.values()), elapsed_seconds)
+    result['concurrency'] = concurrency
+    result['elapsed_seconds'] = elapsed_seconds
+    result['operations'] = {}
+    for name in workload.operation_names:
+        name_errors = errors.get(name, {})
+        operation_result = summarize(latencies.get(name, []), sum(name_errors.values()), elapsed_seconds)
+        operation_result['error_types'] = name_errors
+        result['operations'][name] = operation_result
+    return result
+
+
+def run(client_factory, workload, concurrency_levels, operation_count, warmup_count=0, seed=1,
+        log=None):
+    """ Return a list of the results of run_level at each concurrency level.  client_factory is
+    called with the concurrency to create the client of each level, which is closed afterwards.
+    warmup_count operations (with a different seed) are run and discarded before each level."""
+    results = []
+    for concurrency in concurrency_levels:
+        client = client_factory(concurrency)
+        try:
+            if warmup_count > 0:
+                run_level(client, workload, concurrency, warmup_count, seed + 1000000)
+            result = run_level(client, workload, concurrency, operation_count, seed)
+        finally:
+            client.close()
+        if log is not None:
+            log('concurrency %3d: %8.1f qps, p50 %.2f ms, p95 %.2f ms, p99 %.2f ms, %d errors' % (
+                concurrency, result['qps'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['errors']))
+        results.append(result)
+    return results
+
+
+def start_server(jar, node_count, average_degree, skew, seed, port, log_file):
+    """ Start a TempestDBBenchmarkServer in a new java process, writing its output to log_file,
+    and return the process once the server accepts connections."""
+    command = ['java', '-cp', jar, BenchmarkServerClass,
+               '-nodeCount', str(node_count), '-averageDegree', str(average_degree),
+               '-skew', str(skew), '-seed', str(seed), '-port', str(port)]
+    process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError("Benchmark server exited with status %d; see %s" %
+                               (process.returncode, log_file.name))
+        try:
+            socket.create_connection(('localhost', port), timeout=1.0).close()
+            return process
+        except socket.error:
+            time.sleep(0.5)
+
+
+def parse_mix(mix):
+    """ Parse "operation=weight,operation=weight" into a list of (operation, weight) pairs."""
+    pairs = []
+    for item in mix.split(','):
+        name, weight = item.split('=')
+        pairs.append((name.strip(), float(weight)))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the throughput and latency of a Tempest server on a synthetic graph.')
+    parser.add_argument('--node-count', type=int, default=100000, help='number of synthetic users')
+    parser.add_argument('--average-degree', type=float, default=20.0, help='average out-degree')
+    parser.add_argument('--skew', type=float, default=0.8,
+                        help='Zipf exponent of user popularity (0 for uniformly random edges)')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the graph and the operations')
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help='comma-separated numbers of concurrent client threads')
+    parser.add_argument('--operations', type=int, default=10000,
+                        help='number of operations measured at each concurrency level')
+    parser.add_argument('--warmup', type=int, default=1000,
+                        help='number of unmeasured operations before each level')
+    parser.add_argument('--mix', default=','.join('%s=%d' % pair for pair in DefaultMix),
+                        help='operation weights, for example "out_neighbors=3,ppr_undirected=1"; '
+                             'operations: ' + ', '.join(name for name, weight in DefaultMix))
+    parser.add_argument('--read-only', action='store_true', help='leave writes out of the mix')
+    parser.add_argument('--ppr-steps', type=int, default=10000,
+                        help='number of walk steps of ppr_undirected operations')
+    parser.add_argument('--port', type=int, default=10021, help='port of the benchmark server')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--no-server', action='store_true',
+                        help="don't start a server; use the one running on --host and --port")
+    parser.add_argument('--jar', default=DefaultJar, help='tempest assembly jar')
+    parser.add_argument('--server-log', default='tempest_benchmark_server.log')
+    parser.add_argument('--protocol', default='binary', help="'binary' or 'compact'")
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if args.read_only:
+        mix = [(name, weight) for name, weight in mix if name in ReadOnlyOperations]
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    workload = Workload(SyntheticUsers(args.node_count), mix=mix, ppr_steps=args.ppr_steps)
+    log = lambda message: print(message, file=sys.stderr)
+
+    server = None
+    log_file = None
+    if not args.no_server:
+        log_file = open(args.server_log, 'w')
+        log('Starting benchmark server (log: %s)' % args.server_log)
+        server_start_time = time.time()
+        server = start_server(args.jar, args.node_count, args.average_degree, args.skew, args.seed,
+                              args.port, log_file)
+        log('Server started in %.1f seconds' % (time.time() - server_start_time))
+    try:
+        client_factory = lambda concurrency: tempest_db.client(
+            args.host, args.port, pool_max_size=concurrency, protocol=args.protocol)
+        results = run(client_factory, workload, concurrency_levels, args.operations,
+                      args.warmup, args.seed, log)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            log_file.close()
+
+    report = {
+        'config': {
+            'node_count': args.node_count,
+            'average_degree': args.average_degree,
+            'skew': args.skew,
+            'seed': args.seed,
+            'operations': args.operations,
+            'warmup': args.warmup,
+            'mix': dict(mix),
+            'ppr_steps': args.ppr_steps,
+            'protocol': args.protocol,
+        },
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'levels': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
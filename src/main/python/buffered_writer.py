@@ -0,0 +1,210 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# A write buffer for TempestClient, for callers which produce one write at a time (for example
+# event consumers).  Single writes are collected and sent as batched addNewNodes,
+# addNodesAndEdges and setNodeAttributes calls, so the cost of a round trip and a database
+# statement is shared by a whole batch.
+#
+# Example:
+#   with client.buffered_writer(max_batch_size=1000, max_age_seconds=1.0) as writer:
+#       for event in events:
+#           writer.add_edge("follows", event.follower, event.followee)
+#           writer.set_node_attribute(event.follower, "last_seen", event.time)
+#   # Everything has been flushed here.
+
+import collections
+import threading
+
+from tempest_db.bulk_load import max_edges_per_call
+
+
+class BufferedWriter(object):
+    """Buffers add_node, add_edge and set_node_attribute calls and sends them in batches.
+
+    Buffered writes are flushed when max_batch_size writes are pending, when the oldest pending
+    write is max_age_seconds old, on an explicit flush(), and on close() (including when leaving a
+    with block).  Within a flush, nodes are added first, then edges (adding any missing nodes),
+    then attributes, so attributes can be set on nodes added in the same batch.  Setting the same
+    attribute of the same node more than once before a flush only sends the last value.
+
+    Writes are only visible to readers after they are flushed.  Edges are sent in calls of at most
+    5000 or 10000 edges (see bulk_load.max_edges_per_call).  If a flush fails, the writes it
+    hasn't sent stay buffered and are retried by the next flush, so after an exception flush() or
+    close() can be called again; unless check_for_duplicates is True, retrying may add some edges
+    of the failed call twice.  If a flush started by the age timer fails, the exception is raised
+    by the next call to this writer."""
+
+    def __init__(self, client, max_batch_size=1000, max_age_seconds=1.0, check_for_duplicates=False):
+        """ client is the TempestClient used to send batches.  If check_for_duplicates is True,
+        edges which already exist aren't added again (see add_nodes_and_edges)."""
+        if max_batch_size < 1 or max_batch_size > 10000:
+            # The server limits the number of node ids in a single request to 10000.
+            raise ValueError("max_batch_size must be between 1 and 10000")
+        self.__client = client
+        self.__max_batch_size = max_batch_size
+        self.__max_age_seconds = max_age_seconds
+        self.__check_for_duplicates = check_for_duplicates
+
+        self.__lock = threading.Lock()  # Guards the buffers below
+        self.__flush_lock = threading.Lock()  # Keeps batches in order
+        self.__nodes = collections.OrderedDict()  # (type, id) -> Node
+        self.__edges = collections.OrderedDict()  # edge type -> ([source Node], [target Node])
+        self.__attributes = collections.OrderedDict()  # ((type, id), name) -> (Node, name, value)
+        self.__pending_count = 0
+        self.__timer = None
+        self.__timer_exception = None
+        self.__closed = False
+
+    def add_node(self, node):
+        """ Buffer the creation of the given node, which is skipped if it already exists."""
+        key = (node.type, node.id)
+        def add():
+            is_new = key not in self.__nodes
+            self.__nodes[key] = node
+            return is_new
+        self.__add(add)
+
+    def add_edge(self, edge_type, node1, node2):
+        """ Buffer the given edge, whose nodes are created if they don't exist."""
+        def add():
+            sources, targets = self.__edges.setdefault(edge_type, ([], []))
+            sources.append(node1)
+            targets.append(node2)
+            return True
+        self.__add(add)
+
+    def set_node_attribute(self, node, attribute_name, attribute_value):
+        """ Buffer setting the given attribute, replacing any value buffered for the same node and
+        attribute since the last flush."""
+        key = ((node.type, node.id), attribute_name)
+        def add():
+            # A repeated set keeps the position of the first set, but only the latest value is sent.
+            is_new = key not in self.__attributes
+            self.__attributes[key] = (node, attribute_name, attribute_value)
+            return is_new
+        self.__add(add)
+
+    def pending_count(self):
+        """ Return the number of buffered writes which haven't been flushed."""
+        with self.__lock:
+            return self.__pending_count
+
+    def flush(self):
+        """ Send all buffered writes, and return when the server has applied them."""
+        self.__raise_timer_exception()
+        self.__flush()
+
+    def close(self):
+        """ Flush buffered writes and stop the age timer.  The client isn't closed."""
+        with self.__lock:
+            self.__closed = True
+            self.__cancel_timer()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __add(self, add_to_buffers):
+        """ Call add_to_buffers, which returns False if it replaced a pending write, and start a
+        flush if the batch is full."""
+        self.__raise_timer_exception()
+        with self.__lock:
+            if self.__closed:
+                raise IOError("BufferedWriter is closed")
+            if add_to_buffers():
+                self.__pending_count += 1
+            batch_is_full = self.__pending_count >= self.__max_batch_size
+            if not batch_is_full and self.__timer is None:
+                self.__timer = threading.Timer(self.__max_age_seconds, self.__flush_from_timer)
+                self.__timer.daemon = True
+                self.__timer.start()
+        if batch_is_full:
+            self.__flush()
+
+    def __flush_from_timer(self):
+        try:
+            self.__flush()
+        except Exception as e:
+            self.__timer_exception = e
+
+    def __raise_timer_exception(self):
+        e, self.__timer_exception = self.__timer_exception, None
+        if e is not None:
+            raise e
+
+    def __cancel_timer(self):
+        # Called with the lock held.
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def __flush(self):
+        with self.__flush_lock:
+            with self.__lock:
+                nodes, self.__nodes = self.__nodes, collections.OrderedDict()
+                edges, self.__edges = self.__edges, collections.OrderedDict()
+                attributes, self.__attributes = self.__attributes, collections.OrderedDict()
+                self.__pending_count = 0
+                self.__cancel_timer()
+            try:
+                self.__send(nodes, edges, attributes)
+            finally:
+                if nodes or edges or attributes:
+                    self.__restore(nodes, edges, attributes)
+
+    def __send(self, nodes, edges, attributes):
+        """ Send the given buffered writes, removing each call's writes once it succeeds."""
+        keys_by_type = collections.OrderedDict()
+        for key, node in nodes.items():
+            keys_by_type.setdefault(node.type, []).append(key)
+        for keys in keys_by_type.values():
+            # The server requires all nodes in an addNewNodes call to have the same type.
+            self.__client.add_new_nodes([nodes[key] for key in keys])
+            for key in keys:
+                del nodes[key]
+        for edge_type in list(edges):
+            sources, targets = edges[edge_type]
+            call_size = min(max_edges_per_call(source.type, target.type)
+                            for source, target in zip(sources, targets))
+            while sources:
+                self.__client.add_nodes_and_edges(edge_type, sources[:call_size], targets[:call_size],
+                                                  self.__check_for_duplicates)
+                del sources[:call_size]
+                del targets[:call_size]
+            del edges[edge_type]
+        if attributes:
+            updates = list(attributes.values())
+            self.__client.set_node_attributes([update[0] for update in updates],
+                                              [update[1] for update in updates],
+                                              [update[2] for update in updates])
+            attributes.clear()
+
+    def __restore(self, nodes, edges, attributes):
+        """ Put writes which a failed flush didn't send back in front of those buffered since, so
+        the next flush retries them."""
+        with self.__lock:
+            nodes.update(self.__nodes)
+            self.__nodes = nodes
+            for edge_type, (sources, targets) in self.__edges.items():
+                unsent_sources, unsent_targets = edges.setdefault(edge_type, ([], []))
+                unsent_sources.extend(sources)
+                unsent_targets.extend(targets)
+            self.__edges = edges
+            # A value set since the failed flush replaces the unsent one.
+            attributes.update(self.__attributes)
+            self.__attributes = attributes
+            self.__pending_count = (len(nodes) + len(attributes) +
+                                    sum(len(sources) for sources, _ in edges.values()))
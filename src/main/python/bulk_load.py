@@ -0,0 +1,221 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Loads a large edge csv file into a running Tempest server.  The file is streamed in chunks,
+# and chunks are sent as addNodesAndEdges calls from several threads (each using its own pooled
+# connection).  A bounded queue between the reader and the sending threads provides
+# backpressure, so memory use doesn't depend on the file size.  By default chunks are sent with
+# checkForDuplicates, so a failed chunk can be retried without adding its edges twice.
+#
+# Example:
+#   client = tempest_db.client(port=10001, pool_max_size=8)
+#   client.bulk_load_edges("follows", "/data/new_follows.csv", "user", "user", parallelism=8)
+
+from __future__ import print_function
+
+import csv
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from tempest_db.ttypes import Node, InvalidArgumentException, UndefinedGraphException
+
+
+class BulkLoadException(Exception):
+    """Raised when a chunk of edges still fails after all its retries."""
+    pass
+
+
+class BulkLoadProgress(object):
+    """Counts of edges and chunks loaded so far, shared by the loading threads."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.edges_loaded = 0
+        self.chunks_loaded = 0
+        self.retries = 0
+        self.__lock = threading.Lock()
+
+    def record_chunk(self, edge_count):
+        with self.__lock:
+            self.edges_loaded += edge_count
+            self.chunks_loaded += 1
+
+    def record_retry(self):
+        with self.__lock:
+            self.retries += 1
+
+    def elapsed_seconds(self):
+        return time.time() - self.start_time
+
+    def edges_per_second(self):
+        elapsed = self.elapsed_seconds()
+        return self.edges_loaded / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return '%d edges (%d chunks, %d retries) in %.1f seconds: %.0f edges/second' % (
+            self.edges_loaded, self.chunks_loaded, self.retries, self.elapsed_seconds(),
+            self.edges_per_second())
+
+
+def print_progress(progress):
+    sys.stderr.write('(Tempest bulk load: %s)\n' % progress)
+
+
+def read_edge_chunks(csv_path, chunk_size):
+    """ Yield (first line number, source ids, target ids) for each chunk of at most chunk_size
+    lines of the given headerless "sourceId,targetId" csv file."""
+    with open(csv_path) as csv_file:
+        source_ids = []
+        target_ids = []
+        first_line_number = 1
+        for line_number, row in enumerate(csv.reader(csv_file), 1):
+            if not row:
+                continue
+            if len(row) != 2:
+                raise ValueError('Line %d of %s is not a pair "sourceId,targetId": %s' %
+                                 (line_number, csv_path, row))
+            if not source_ids:
+                first_line_number = line_number
+            source_ids.append(row[0].strip())
+            target_ids.append(row[1].strip())
+            if len(source_ids) == chunk_size:
+                yield first_line_number, source_ids, target_ids
+                source_ids = []
+                target_ids = []
+        if source_ids:
+            yield first_line_number, source_ids, target_ids
+
+
+def max_edges_per_call(source_node_type, target_node_type):
+    """ Return the largest number of edges an addNodesAndEdges call between the given node types
+    can have.  The server looks up the ids of an edge's source and target nodes together, and
+    limits a lookup to 10000 ids of one type, so edges between nodes of the same type count
+    twice."""
+    return 5000 if source_node_type == target_node_type else 10000
+
+
+def bulk_load_edges(client, edge_type, csv_path, source_node_type, target_node_type,
+                    chunk_size=5000, parallelism=4, max_retries=5, retry_delay_seconds=1.0,
+                    progress_callback=print_progress, progress_interval_seconds=10.0,
+                    check_for_duplicates=True):
+    """ Add the edges in the given headerless "sourceId,targetId" csv file to the given edge type,
+    adding any nodes which don't exist yet, and return the final BulkLoadProgress.
+
+    Chunks of chunk_size edges are sent from parallelism threads, so the client's pool_max_size
+    should be at least parallelism.  chunk_size can be at most 10000, or 5000 if
+    source_node_type and target_node_type are the same (see max_edges_per_call).  A chunk which
+    fails is retried up to max_retries times, waiting retry_delay_seconds (doubling each time) in
+    between; if it still fails, loading stops and BulkLoadException is raised.  Every
+    progress_interval_seconds, and when loading finishes, progress_callback is called with the
+    BulkLoadProgress.
+
+    If check_for_duplicates is True (the default), edges which are already in the graph when their
+    chunk is sent are skipped, which makes retrying a partially applied chunk safe.  Note that
+    this also skips csv edges which were in the graph before loading started, unlike
+    tempest_db.ingest and create_edge_type.sh, which keep repeated edges; repeated edges within one
+    chunk are all added either way.  If check_for_duplicates is False, every csv edge is added, but
+    a retried chunk may add some of its edges twice."""
+    max_chunk_size = max_edges_per_call(source_node_type, target_node_type)
+    if chunk_size < 1 or chunk_size > max_chunk_size:
+        raise ValueError("chunk_size must be between 1 and %d" % max_chunk_size)
+    if parallelism < 1:
+        raise ValueError("parallelism must be positive")
+
+    progress = BulkLoadProgress()
+    # Holding at most two chunks per thread keeps every thread busy without reading ahead further.
+    chunks = queue.Queue(maxsize=2 * parallelism)
+    failures = []
+    stop = threading.Event()
+
+    def load_chunk(source_ids, target_ids):
+        nodes1 = [Node(source_node_type, id) for id in source_ids]
+        nodes2 = [Node(target_node_type, id) for id in target_ids]
+        delay = retry_delay_seconds
+        for attempt in range(max_retries + 1):
+            try:
+                client.add_nodes_and_edges(edge_type, nodes1, nodes2,
+                                           check_for_duplicates=check_for_duplicates)
+                return
+            except (InvalidArgumentException, UndefinedGraphException):
+                raise # Retrying won't help
+            except Exception:
+                # Concurrent chunks creating the same new node can also fail here, and succeed
+                # when retried.
+                if attempt == max_retries or stop.is_set():
+                    raise
+                progress.record_retry()
+                time.sleep(delay)
+                delay *= 2
+
+    def send_chunks():
+        while True:
+            chunk = chunks.get()
+            try:
+                if chunk is None:
+                    return
+                first_line_number, source_ids, target_ids = chunk
+                if stop.is_set():
+                    continue
+                try:
+                    load_chunk(source_ids, target_ids)
+                    progress.record_chunk(len(source_ids))
+                except Exception as e:
+                    failures.append(BulkLoadException(
+                        'Failed to load the %d edges starting at line %d of %s: %r' %
+                        (len(source_ids), first_line_number, csv_path, e)))
+                    stop.set()
+            finally:
+                chunks.task_done()
+
+    threads = [threading.Thread(target=send_chunks) for i in range(parallelism)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    last_report_time = time.time()
+    try:
+        for chunk in read_edge_chunks(csv_path, chunk_size):
+            # Waits while the queue is full, so reading never gets far ahead of loading.
+            while not stop.is_set():
+                try:
+                    chunks.put(chunk, timeout=1.0)
+                    queued = True
+                except queue.Full:
+                    queued = False
+                if progress_callback and time.time() - last_report_time >= progress_interval_seconds:
+                    progress_callback(progress)
+                    last_report_time = time.time()
+                if queued:
+                    break
+            if stop.is_set():
+                break
+    except BaseException:
+        # E.g. a malformed line or KeyboardInterrupt: skip the chunks still queued.
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            chunks.put(None)
+        for thread in threads:
+            thread.join()
+
+    if progress_callback:
+        progress_callback(progress)
+    if failures:
+        raise failures[0]
+    return progress
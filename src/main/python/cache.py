@@ -0,0 +1,174 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# An opt-in client-side cache for TempestClient reads.
+#
+# Example:
+#   cache = ClientCache(max_bytes=256 * 1024 * 1024, ttls={'out_neighbors': 10.0})
+#   client = tempest_db.client(port=10001, cache=cache)
+#   client.out_degree("follows", alice)  # Sent to the server
+#   client.out_degree("follows", alice)  # Answered from the cache
+#   cache.stats()
+
+import collections
+import sys
+import threading
+import time
+
+
+class ClientCache(object):
+    """A thread-safe LRU cache of read results, bounded by the approximate number of bytes its
+    entries use.  Each entry expires after the TTL (in seconds) configured for the client method
+    that produced it.  Every entry is associated with the nodes it describes, and writes made
+    through the same TempestClient invalidate the entries of the nodes they touch.  Writes made
+    by other clients are only reflected after entries expire."""
+
+    DefaultTTLs = {
+        'out_degree': 60.0,
+        'in_degree': 60.0,
+        'out_neighbors': 60.0,
+        'in_neighbors': 60.0,
+        'node_attribute': 300.0,
+    }
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttls=None, clock=time.time):
+        """ Create a cache using at most about max_bytes of memory.  The given ttls dictionary
+        overrides DefaultTTLs for the methods it contains; methods with a TTL of 0 or None are
+        not cached."""
+        self.__max_bytes = max_bytes
+        self.__ttls = dict(ClientCache.DefaultTTLs)
+        self.__ttls.update(ttls or {})
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        # key -> (value, expiration time, size in bytes, nodes); least recently used first
+        self.__entries = collections.OrderedDict()
+        self.__keys_by_node = collections.defaultdict(set)
+        self.__byte_count = 0
+        # Incremented on every invalidation, so a result fetched before an invalidation isn't
+        # cached after it.
+        self.__generation = 0
+        self.__hits = collections.defaultdict(int)
+        self.__misses = collections.defaultdict(int)
+        self.__evictions = 0
+        self.__invalidations = 0
+
+    def is_cached(self, method):
+        """ Return True if results of the given client method are cached."""
+        return bool(self.__ttls.get(method))
+
+    def generation(self):
+        """ Return a token to pass to put, recording the cache state before a fetch."""
+        with self.__lock:
+            return self.__generation
+
+    def get(self, method, key):
+        """ Return a pair (hit, value), where hit is True if an unexpired value is cached for the
+        given method and key."""
+        cache_key = (method, key)
+        with self.__lock:
+            entry = self.__entries.get(cache_key)
+            if entry is not None and entry[1] <= self.__clock():
+                self.__remove(cache_key)
+                entry = None
+            if entry is None:
+                self.__misses[method] += 1
+                return False, None
+            # Move the entry to the most recently used end.
+            del self.__entries[cache_key]
+            self.__entries[cache_key] = entry
+            self.__hits[method] += 1
+            return True, entry[0]
+
+    def put(self, method, key, value, nodes, generation):
+        """ Cache the value of the given method and key, which describes the given nodes.  The
+        value is dropped if any entry was invalidated since generation() returned the given
+        token, because the value might predate that write."""
+        ttl = self.__ttls.get(method)
+        if not ttl:
+            return
+        cache_key = (method, key)
+        size = approximate_size(key) + approximate_size(value)
+        if size > self.__max_bytes:
+            return
+        nodes = tuple(nodes)
+        with self.__lock:
+            if generation != self.__generation:
+                return
+            if cache_key in self.__entries:
+                self.__remove(cache_key)
+            self.__entries[cache_key] = (value, self.__clock() + ttl, size, nodes)
+            self.__byte_count += size
+            for node in nodes:
+                self.__keys_by_node[node].add(cache_key)
+            while self.__byte_count > self.__max_bytes:
+                oldest_key = next(iter(self.__entries))
+                self.__remove(oldest_key)
+                self.__evictions += 1
+
+    def invalidate_nodes(self, nodes):
+        """ Remove all entries describing any of the given nodes."""
+        with self.__lock:
+            self.__generation += 1
+            for node in nodes:
+                for cache_key in list(self.__keys_by_node.get(node, ())):
+                    self.__remove(cache_key)
+                    self.__invalidations += 1
+
+    def clear(self):
+        """ Remove all entries."""
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+            self.__keys_by_node.clear()
+            self.__byte_count = 0
+
+    def stats(self):
+        """ Return a dictionary of hit, miss, eviction and invalidation counts and current size.
+        Hits and misses are also broken down by client method."""
+        with self.__lock:
+            hits = sum(self.__hits.values())
+            misses = sum(self.__misses.values())
+            return {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': float(hits) / (hits + misses) if hits + misses > 0 else 0.0,
+                'evictions': self.__evictions,
+                'invalidations': self.__invalidations,
+                'entries': len(self.__entries),
+                'bytes': self.__byte_count,
+                'hits_by_method': dict(self.__hits),
+                'misses_by_method': dict(self.__misses),
+            }
+
+    def __remove(self, cache_key):
+        # Called with the lock held.
+        value, expiration, size, nodes = self.__entries.pop(cache_key)
+        self.__byte_count -= size
+        for node in nodes:
+            keys = self.__keys_by_node.get(node)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self.__keys_by_node[node]
+
+
+def approximate_size(value):
+    """ Return the approximate number of bytes used by the given value, which may be a (nested)
+    list, tuple, dict, or thrift struct of primitive values."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(x) for x in value)
+    elif isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif hasattr(value, '__dict__'):
+        size += sum(sys.getsizeof(v) for v in value.__dict__.values())
+    return size
@@ -0,0 +1,81 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Conversions for AttributeColumn, which holds the values of one attribute of many nodes as packed
+# little-endian values (see tempest.thrift).  If numpy is installed, values and null masks are numpy
+# arrays sharing memory with the received message; otherwise they are array.arrays.
+
+from tempest_db.packed import packed_array
+from tempest_db.ttypes import AttributeType
+
+# AttributeType -> (numpy dtype, array.array typecode) of packed values
+PackedValueFormats = {
+    AttributeType.INT: ('<i4', 'i'),
+    AttributeType.BIGINT: ('<i8', 'q'),
+    AttributeType.BOOLEAN: ('?', 'B'),
+}
+
+
+class NodeAttributeColumn(object):
+    """The values of one attribute of a list of nodes, as returned by
+    TempestClient.node_attribute_columns.  type is 'int', 'bigint', 'boolean' or 'string'.
+
+    is_null[i] is true if the ith value is null.  For int, bigint and boolean attributes, values is
+    an array of int32s, int64s or bools (uint8s without numpy), with 0 for null values.  For string
+    attributes, the UTF-8 bytes of value i are data[offsets[i]:offsets[i + 1]].  column[i] returns
+    the ith value as a Python value (or None), and to_list() returns all of them."""
+
+    def __init__(self, name, type, is_null, values=None, data=None, offsets=None):
+        self.name = name
+        self.type = type
+        self.is_null = is_null
+        self.values = values
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.is_null)
+
+    def __getitem__(self, i):
+        if self.is_null[i]:
+            return None
+        if self.type == 'string':
+            return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+        if self.type == 'boolean':
+            return bool(self.values[i])
+        return int(self.values[i])
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
+
+    def to_numpy(self):
+        """ Return the values as a numpy masked array, masked where values are null (an object
+        array of strings and Nones for string attributes).  Requires numpy."""
+        import numpy
+        if self.type == 'string':
+            return numpy.array(self.to_list(), dtype=object)
+        return numpy.ma.masked_array(self.values, mask=self.is_null)
+
+    def __repr__(self):
+        return 'NodeAttributeColumn(%r, %r, %d values)' % (self.name, self.type, len(self))
+
+
+def unpack_attribute_column(column):
+    """ Convert an AttributeColumn returned by the server to a NodeAttributeColumn."""
+    is_null = packed_array(column.nullMask, '?', 'B')
+    if column.type == AttributeType.STRING:
+        return NodeAttributeColumn(column.name, 'string', is_null, data=column.values,
+                                   offsets=packed_array(column.offsets, '<i4', 'i'))
+    dtype, typecode = PackedValueFormats[column.type]
+    values = packed_array(column.values, dtype, typecode)
+    return NodeAttributeColumn(column.name, AttributeType._VALUES_TO_NAMES[column.type].lower(),
+                               is_null, values=values)
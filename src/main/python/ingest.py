@@ -0,0 +1,220 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Adds a delta of new edges to an existing binary graph (as created by create_edge_type.sh)
+# without reconverting the whole graph.  Only the ids which appear in the delta are looked up in
+# Postgres, the relabeled edges are written to a temporary "id1 id2" file, and
+# MemMappedDynamicDirectedGraphDeltaMerger appends them to the graph file in place.  Every step
+# takes time proportional to the size of the delta rather than the size of the graph.
+#
+# The server reads graph files when it starts, so stop it before ingesting and restart it
+# afterwards; to add edges to a running server, use TempestClient.bulk_load_edges instead.  The
+# nodes of the delta must already exist in Postgres (see create_node_type.sh).
+#
+# Example (inside docker, with the server stopped):
+#   python -m tempest_db.ingest follows /data/follows_2016_06_01.csv \
+#       --source-node-type user --target-node-type user --jar /root/tempest/target/scala-2.11/tempest-assembly.jar
+
+from __future__ import print_function, division
+
+import argparse
+import csv
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from tempest_db.bulk_load import read_edge_chunks
+
+MergerClass = 'co.teapot.tempest.graph.MemMappedDynamicDirectedGraphDeltaMerger'
+DefaultJar = 'target/scala-2.11/tempest-assembly.jar'
+DefaultGraphDirectory = '/data/binary_graphs'
+DefaultPsqlCommand = 'sudo -Hiu postgres psql tempest postgres'
+ReadChunkSize = 100000
+# Number of missing ids included in an IngestException's message
+MaxReportedMissingIds = 10
+
+
+class IngestException(Exception):
+    """Raised when the delta refers to nodes which don't exist, or a step of the ingest fails."""
+    pass
+
+
+class IngestStats(object):
+    """Counts and timings of an ingest.  lookup_seconds covers reading the delta and fetching the
+    tempest ids of its nodes, relabel_seconds covers writing the relabeled edges, and
+    merge_seconds covers merging them into the graph file."""
+
+    def __init__(self):
+        self.edge_count = 0
+        self.skipped_edge_count = 0
+        self.distinct_id_count = 0
+        self.lookup_seconds = 0.0
+        self.relabel_seconds = 0.0
+        self.merge_seconds = 0.0
+
+    def total_seconds(self):
+        return self.lookup_seconds + self.relabel_seconds + self.merge_seconds
+
+    def edges_per_second(self):
+        total = self.total_seconds()
+        return self.edge_count / total if total > 0 else 0.0
+
+    def __str__(self):
+        return ('%d edges (%d skipped, %d distinct ids) in %.1f seconds: %.0f edges/second '
+                '(lookup %.1fs, relabel %.1fs, merge %.1fs)') % (
+            self.edge_count, self.skipped_edge_count, self.distinct_id_count, self.total_seconds(),
+            self.edges_per_second(), self.lookup_seconds, self.relabel_seconds, self.merge_seconds)
+
+
+def print_stats(stats):
+    sys.stderr.write('(Tempest ingest: %s)\n' % stats)
+
+
+def validate_type_name(type_name):
+    # Type names are interpolated into SQL, as in the server's queries
+    if not re.match(r'^\w+$', type_name):
+        raise ValueError("Invalid node type: %r" % type_name)
+
+
+def fetch_tempest_ids(node_type, ids, psql_command=DefaultPsqlCommand):
+    """ Return a dictionary from each of the given ids of the given node type which exists in
+    Postgres to its tempest id.  The ids are copied to a temporary table, so only their rows of
+    <node_type>_nodes are read."""
+    validate_type_name(node_type)
+    id_csv = StringIO()
+    writer = csv.writer(id_csv)
+    for id in ids:
+        writer.writerow([id])
+    script = ('CREATE TEMP TABLE delta_ids (id varchar PRIMARY KEY);\n'
+              'COPY delta_ids FROM STDIN WITH CSV;\n' +
+              id_csv.getvalue() +
+              '\\.\n'
+              'COPY (SELECT n.id, n.tempest_id FROM %s_nodes n JOIN delta_ids d ON n.id = d.id) '
+              'TO STDOUT WITH CSV;\n' % node_type)
+    command = shlex.split(psql_command) + ['-q', '-v', 'ON_ERROR_STOP=1']
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    output, errors = process.communicate(script)
+    if process.returncode != 0:
+        raise IngestException("Looking up %s ids failed: %s" % (node_type, errors.strip()))
+    return dict((row[0], int(row[1])) for row in csv.reader(StringIO(output)) if row)
+
+
+def ingest_edges(edge_type, csv_path, source_node_type, target_node_type, graph_path=None,
+                 jar=DefaultJar, psql_command=DefaultPsqlCommand, java_heap='4g',
+                 skip_missing=False, progress_callback=print_stats):
+    """ Add the edges in the given headerless "sourceId,targetId" csv file to the binary graph of
+    the given edge type (by default /data/binary_graphs/<edge_type>.dat), and return the
+    IngestStats.  The server must not be running on the graph file.
+
+    If some ids in the file don't exist in Postgres, IngestException is raised before the graph
+    is changed, unless skip_missing is true, in which case their edges are skipped.  The merge
+    runs "java -Xmx<java_heap>" with the given assembly jar; psql_command runs psql connected to
+    the tempest database.  When the ingest finishes, progress_callback is called with the
+    IngestStats."""
+    if graph_path is None:
+        graph_path = os.path.join(DefaultGraphDirectory, edge_type + '.dat')
+    if not os.path.exists(graph_path):
+        raise IngestException("Graph file %s doesn't exist; create it with create_edge_type.sh" %
+                              graph_path)
+    stats = IngestStats()
+
+    start_time = time.time()
+    source_ids = set()
+    target_ids = set()
+    for _, chunk_source_ids, chunk_target_ids in read_edge_chunks(csv_path, ReadChunkSize):
+        source_ids.update(chunk_source_ids)
+        target_ids.update(chunk_target_ids)
+    if source_node_type == target_node_type:
+        source_ids.update(target_ids)
+        target_ids = source_ids
+    source_tempest_ids = fetch_tempest_ids(source_node_type, source_ids, psql_command)
+    target_tempest_ids = (source_tempest_ids if target_ids is source_ids else
+                          fetch_tempest_ids(target_node_type, target_ids, psql_command))
+    stats.distinct_id_count = len(source_ids) + (0 if target_ids is source_ids else len(target_ids))
+    if not skip_missing:
+        missing = [(source_node_type, id) for id in source_ids if id not in source_tempest_ids]
+        if target_ids is not source_ids:
+            missing += [(target_node_type, id) for id in target_ids if id not in target_tempest_ids]
+        if missing:
+            raise IngestException("%d ids in %s don't exist, for example %s" % (
+                len(missing), csv_path,
+                ', '.join('%s %r' % pair for pair in missing[:MaxReportedMissingIds])))
+    stats.lookup_seconds = time.time() - start_time
+
+    start_time = time.time()
+    mapped_file = tempfile.NamedTemporaryFile(mode='w', prefix=edge_type + '_delta_',
+                                              suffix='.txt', delete=False)
+    try:
+        with mapped_file:
+            for _, chunk_source_ids, chunk_target_ids in read_edge_chunks(csv_path, ReadChunkSize):
+                for source_id, target_id in zip(chunk_source_ids, chunk_target_ids):
+                    source_tempest_id = source_tempest_ids.get(source_id)
+                    target_tempest_id = target_tempest_ids.get(target_id)
+                    if source_tempest_id is None or target_tempest_id is None:
+                        stats.skipped_edge_count += 1
+                    else:
+                        mapped_file.write('%d %d\n' % (source_tempest_id, target_tempest_id))
+                        stats.edge_count += 1
+        stats.relabel_seconds = time.time() - start_time
+
+        start_time = time.time()
+        command = ['java', '-Xmx' + java_heap, '-cp', jar, MergerClass, mapped_file.name, graph_path]
+        status = subprocess.call(command)
+        if status != 0:
+            raise IngestException("Merging edges into %s failed with status %d" % (graph_path, status))
+        stats.merge_seconds = time.time() - start_time
+    finally:
+        os.remove(mapped_file.name)
+
+    if progress_callback is not None:
+        progress_callback(stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Add a delta of new edges to an existing binary graph file.  '
+                    'Stop the server before running this.')
+    parser.add_argument('edge_type', help='edge type, for example "follows"')
+    parser.add_argument('csv_path', help='headerless "sourceId,targetId" csv file of new edges')
+    parser.add_argument('--source-node-type', required=True)
+    parser.add_argument('--target-node-type', required=True)
+    parser.add_argument('--graph-file',
+                        help='binary graph file (default: %s/<edge type>.dat)' % DefaultGraphDirectory)
+    parser.add_argument('--jar', default=DefaultJar, help='tempest assembly jar')
+    parser.add_argument('--java-heap', default='4g', help='maximum heap size of the merge')
+    parser.add_argument('--psql', default=DefaultPsqlCommand,
+                        help='command running psql on the tempest database')
+    parser.add_argument('--skip-missing', action='store_true',
+                        help="skip edges whose nodes don't exist instead of failing")
+    args = parser.parse_args()
+    try:
+        ingest_edges(args.edge_type, args.csv_path, args.source_node_type, args.target_node_type,
+                     graph_path=args.graph_file, jar=args.jar, psql_command=args.psql,
+                     java_heap=args.java_heap, skip_missing=args.skip_missing)
+    except IngestException as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
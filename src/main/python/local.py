@@ -0,0 +1,137 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Read-only access to the binary graph files written by create_edge_type.sh (the
+# MemMappedDynamicDirectedGraph format), for jobs running on the same machine as the graph files.
+# Files are memory-mapped with numpy, so reads don't copy edge data, and every process reading the
+# same file shares the operating system's page cache.  Nodes are given by their tempest ids; use
+# TempestClient.tempest_ids_to_nodes to convert them to Nodes.
+#
+# Example:
+#   from tempest_db.local import GraphFile
+#   graph = GraphFile("/data/binary_graphs/follows.dat")
+#   for tempest_id in graph.out_neighbors(1234):
+#       ...
+#
+# Requires numpy (pip install tempest_db[numpy]).
+
+import numpy
+
+# Layout of the file (see MemoryMappedAllocator and MemMappedDynamicUnidirectionalGraph).  All
+# values use the byte order of the machine which wrote the file.
+EdgeCountOffset = 8  # MemoryMappedAllocator.GlobalApplicationDataPointer
+OutGraphDataPointerOffset = 16
+InGraphDataPointerOffset = 24
+# Offsets relative to a unidirectional graph's data pointer:
+MaxNodeIdOffset = 0
+NodeArrayOffset = 16
+# For each node, a 4-byte degree and an (unaligned) 8-byte pointer to its int32 neighbors.
+NodeDType = numpy.dtype([('degree', '=i4'), ('neighbors_pointer', '=i8')])
+
+
+class UnidirectionalGraphFile(object):
+    """The neighbors of each node in one direction, stored at the given data pointer."""
+
+    def __init__(self, data, data_pointer):
+        self.__data = data
+        self.max_node_id = int(self.__read_scalar('=i8', data_pointer + MaxNodeIdOffset))
+        self.__nodes = numpy.ndarray(shape=(self.max_node_id + 1,), dtype=NodeDType,
+                                     buffer=data, offset=data_pointer + NodeArrayOffset)
+
+    def degrees(self):
+        """ Return a read-only array of the degree of every node id from 0 to max_node_id."""
+        return self.__nodes['degree']
+
+    def neighbors_pointers(self):
+        """ Return a read-only array of the file offset of the neighbors of every node id (-1 for
+        nodes without neighbors)."""
+        return self.__nodes['neighbors_pointer']
+
+    def degree(self, id):
+        if id < 0:
+            raise IndexError("invalid id %d" % id)
+        if id > self.max_node_id:
+            return 0
+        return int(self.__nodes[id]['degree'])
+
+    def neighbors(self, id):
+        if id < 0:
+            raise IndexError("invalid id %d" % id)
+        if id > self.max_node_id:
+            return numpy.empty(0, dtype=numpy.int32)
+        node = self.__nodes[id]
+        degree = int(node['degree'])
+        if degree == 0:
+            return numpy.empty(0, dtype=numpy.int32)
+        return numpy.ndarray(shape=(degree,), dtype='=i4', buffer=self.__data,
+                             offset=int(node['neighbors_pointer']))
+
+    def __read_scalar(self, dtype, offset):
+        return numpy.ndarray(shape=(), dtype=dtype, buffer=self.__data, offset=offset)[()]
+
+
+class GraphFile(object):
+    """A read-only view of a binary graph file, giving the neighbors of nodes by tempest id.
+
+    Neighbor lists are returned as read-only numpy int32 arrays which share memory with the file.
+    As in the server, ids beyond the largest id in the graph have no neighbors.  The file is read as
+    it was when the GraphFile was opened: edges added by a running server to the same file aren't
+    guaranteed to be visible, so reopen the file (or query the server) to see new edges."""
+
+    def __init__(self, path):
+        self.path = path
+        self.__data = numpy.memmap(path, dtype=numpy.uint8, mode='r')
+        self.__edge_count = int(self.__read_scalar('=i8', EdgeCountOffset))
+        self.__out_graph = UnidirectionalGraphFile(
+            self.__data, int(self.__read_scalar('=i8', OutGraphDataPointerOffset)))
+        self.__in_graph = UnidirectionalGraphFile(
+            self.__data, int(self.__read_scalar('=i8', InGraphDataPointerOffset)))
+
+    def edge_count(self):
+        return self.__edge_count
+
+    def max_node_id(self):
+        return max(self.__out_graph.max_node_id, self.__in_graph.max_node_id)
+
+    def node_count(self):
+        """ Return max_node_id() + 1, since ids from 0 to max_node_id() are all valid."""
+        return self.max_node_id() + 1
+
+    def out_degree(self, id):
+        return self.__out_graph.degree(id)
+
+    def in_degree(self, id):
+        return self.__in_graph.degree(id)
+
+    def out_neighbors(self, id):
+        return self.__out_graph.neighbors(id)
+
+    def in_neighbors(self, id):
+        return self.__in_graph.neighbors(id)
+
+    def out_graph(self):
+        """ Return the UnidirectionalGraphFile of out-neighbors, whose degrees() and
+        neighbors_pointers() arrays support vectorized access."""
+        return self.__out_graph
+
+    def in_graph(self):
+        return self.__in_graph
+
+    def data(self):
+        """ Return the whole file as a read-only numpy uint8 array."""
+        return self.__data
+
+    def __read_scalar(self, dtype, offset):
+        return numpy.ndarray(shape=(), dtype=dtype, buffer=self.__data, offset=offset)[()]
+
+    def __repr__(self):
+        return 'GraphFile(%r, %d nodes, %d edges)' % (self.path, self.node_count(), self.__edge_count)
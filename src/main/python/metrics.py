@@ -0,0 +1,219 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Instrumentation for TempestClient.  When a ClientMetrics is passed to the client, every attempt
+# of every call records its latency in a histogram, the bytes sent and received, and the type of
+# any exception, per client method; retries and reconnects are counted too.  Results are available
+# as a dictionary (stats()) or in the Prometheus text exposition format (prometheus_text()), and an
+# optional hook receives a CallEvent for each attempt, e.g. to feed a tracer.  Clients created
+# without a ClientMetrics don't measure anything beyond what routing needs.
+#
+# Example:
+#   metrics = tempest_db.ClientMetrics(hook=lambda event: tracer.record(event.method, event.seconds))
+#   client = tempest_db.client(port=10001, metrics=metrics)
+#   ...
+#   print(metrics.stats()['out_neighbors']['latency_seconds']['p99'])
+
+import bisect
+import threading
+
+from thrift.transport import TSocket
+
+# Upper bounds of the latency histogram buckets, in seconds.
+DefaultLatencyBuckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                         2.5, 5.0, 10.0, 30.0)
+
+
+class CountingSocket(TSocket.TSocket):
+    """A TSocket which counts the bytes read and written."""
+
+    def __init__(self, *args, **kwargs):
+        TSocket.TSocket.__init__(self, *args, **kwargs)
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def read(self, sz):
+        buff = TSocket.TSocket.read(self, sz)
+        self.bytes_read += len(buff)
+        return buff
+
+    def write(self, buff):
+        TSocket.TSocket.write(self, buff)
+        self.bytes_written += len(buff)
+
+
+class CallEvent(object):
+    """A single attempt of a client call, as passed to a ClientMetrics hook.  exception is None if
+    the attempt succeeded."""
+    __slots__ = ['method', 'endpoint', 'seconds', 'request_bytes', 'response_bytes', 'exception']
+
+    def __init__(self, method, endpoint, seconds, request_bytes, response_bytes, exception):
+        self.method = method
+        self.endpoint = endpoint
+        self.seconds = seconds
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.exception = exception
+
+    def __repr__(self):
+        return 'CallEvent(%s on %s: %.6f seconds, %d/%d bytes, %r)' % (
+            self.method, self.endpoint, self.seconds, self.request_bytes, self.response_bytes,
+            self.exception)
+
+
+class MethodMetrics(object):
+    """Counters for a single client method."""
+
+    def __init__(self, bucket_count):
+        self.bucket_counts = [0] * (bucket_count + 1)  # The last bucket is unbounded
+        self.count = 0
+        self.latency_sum = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.reconnects = 0
+        self.errors = {}  # exception type name -> count
+
+
+class ClientMetrics(object):
+    """Thread-safe per-method metrics of the calls made by one or more TempestClients."""
+
+    def __init__(self, latency_buckets=DefaultLatencyBuckets, hook=None):
+        """ latency_buckets are the increasing upper bounds (in seconds) of the latency histogram
+        buckets.  If given, hook is called with a CallEvent after each attempt of each call, on the
+        calling thread; exceptions it raises are propagated to the caller."""
+        self.__latency_buckets = list(latency_buckets)
+        if self.__latency_buckets != sorted(self.__latency_buckets):
+            raise ValueError("latency_buckets must be increasing")
+        self.__hook = hook
+        self.__methods = {}  # method -> MethodMetrics
+        self.__lock = threading.Lock()
+
+    def record_call(self, method, endpoint, seconds, request_bytes, response_bytes, exception=None):
+        """ Record one attempt of the given method.  Exceptions declared by the service (e.g.
+        InvalidNodeIdException) are counted as errors as well as transport errors."""
+        bucket = bisect.bisect_left(self.__latency_buckets, seconds)
+        with self.__lock:
+            metrics = self.__method_metrics(method)
+            metrics.bucket_counts[bucket] += 1
+            metrics.count += 1
+            metrics.latency_sum += seconds
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            if exception is not None:
+                error_type = type(exception).__name__
+                metrics.errors[error_type] = metrics.errors.get(error_type, 0) + 1
+        if self.__hook is not None:
+            self.__hook(CallEvent(method, endpoint, seconds, request_bytes, response_bytes, exception))
+
+    def record_retry(self, method, reconnecting):
+        """ Record that a call of the given method is being retried, reconnecting to the same
+        endpoint if reconnecting is True (otherwise the retry goes to another endpoint)."""
+        with self.__lock:
+            metrics = self.__method_metrics(method)
+            metrics.retries += 1
+            if reconnecting:
+                metrics.reconnects += 1
+
+    def stats(self):
+        """ Return a dictionary from method to a dictionary of its metrics: call count (each
+        attempt counts), latency_seconds (sum, mean, estimated p50/p95/p99, and cumulative bucket
+        counts), request and response bytes, retries, reconnects, and errors by exception type.
+        Percentiles are the upper bound of the bucket containing them."""
+        with self.__lock:
+            snapshot = [(method, self.__copy(metrics)) for method, metrics in self.__methods.items()]
+        result = {}
+        for method, metrics in snapshot:
+            cumulative_counts = []
+            total = 0
+            for count in metrics.bucket_counts:
+                total += count
+                cumulative_counts.append(total)
+            result[method] = {
+                'count': metrics.count,
+                'latency_seconds': {
+                    'sum': metrics.latency_sum,
+                    'mean': metrics.latency_sum / metrics.count if metrics.count else 0.0,
+                    'p50': self.__percentile(cumulative_counts, 0.50),
+                    'p95': self.__percentile(cumulative_counts, 0.95),
+                    'p99': self.__percentile(cumulative_counts, 0.99),
+                    'buckets': list(zip(self.__latency_buckets + [float('inf')], cumulative_counts)),
+                },
+                'request_bytes': metrics.request_bytes,
+                'response_bytes': metrics.response_bytes,
+                'retries': metrics.retries,
+                'reconnects': metrics.reconnects,
+                'errors': dict(metrics.errors),
+            }
+        return result
+
+    def prometheus_text(self, prefix='tempest_client'):
+        """ Return the metrics in the Prometheus text exposition format, with a method label."""
+        stats = self.stats()
+        lines = []
+
+        def family(name, metric_type, help_text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, metric_type))
+
+        family('request_duration_seconds', 'histogram', 'Latency of each call attempt.')
+        for method in sorted(stats):
+            latency = stats[method]['latency_seconds']
+            for bound, count in latency['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_request_duration_seconds_bucket{method="%s",le="%s"} %d' %
+                             (prefix, method, le, count))
+            lines.append('%s_request_duration_seconds_sum{method="%s"} %r' % (prefix, method, latency['sum']))
+            lines.append('%s_request_duration_seconds_count{method="%s"} %d' %
+                         (prefix, method, stats[method]['count']))
+        for name, key, help_text in [
+                ('request_bytes_total', 'request_bytes', 'Bytes sent to the server.'),
+                ('response_bytes_total', 'response_bytes', 'Bytes received from the server.'),
+                ('retries_total', 'retries', 'Calls retried after transport errors.'),
+                ('reconnects_total', 'reconnects', 'Retries which reconnected to the same server.')]:
+            family(name, 'counter', help_text)
+            for method in sorted(stats):
+                lines.append('%s_%s{method="%s"} %d' % (prefix, name, method, stats[method][key]))
+        family('errors_total', 'counter', 'Call attempts which raised an exception, by type.')
+        for method in sorted(stats):
+            for error_type in sorted(stats[method]['errors']):
+                lines.append('%s_errors_total{method="%s",type="%s"} %d' %
+                             (prefix, method, error_type, stats[method]['errors'][error_type]))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.__lock:
+            self.__methods = {}
+
+    def __method_metrics(self, method):
+        # Called with the lock held.
+        metrics = self.__methods.get(method)
+        if metrics is None:
+            metrics = self.__methods[method] = MethodMetrics(len(self.__latency_buckets))
+        return metrics
+
+    def __percentile(self, cumulative_counts, fraction):
+        total = cumulative_counts[-1]
+        if total == 0:
+            return 0.0
+        index = bisect.bisect_left(cumulative_counts, fraction * total)
+        if index >= len(self.__latency_buckets):
+            return float('inf')
+        return self.__latency_buckets[index]
+
+    @staticmethod
+    def __copy(metrics):
+        copy = MethodMetrics(len(metrics.bucket_counts) - 1)
+        copy.__dict__.update(metrics.__dict__)
+        copy.bucket_counts = list(metrics.bucket_counts)
+        copy.errors = dict(metrics.errors)
+        return copy
@@ -0,0 +1,208 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Compact storage for large results.  A NodeTable stores each distinct (type, id) pair once and
+# gives it an int handle; NodeList and NodeMap hold results as arrays of handles (and scores), and
+# create Node objects only when they are accessed.  A 5M node result then costs a few bytes per
+# node plus one string per distinct id, rather than a Node, two strings and a dict entry per node.
+# Results are received as packed tempest ids and node ids, so no Nodes are created while decoding.
+
+import array
+
+from tempest_db.packed import packed_array
+from tempest_db.ttypes import Node
+
+
+class NodeTable(object):
+    """Interns nodes as int handles 0, 1, 2, ....  The same node always gets the same handle, so
+    handles from different results interned into the same table can be compared and joined
+    directly.  Node types are stored once each; ids are stored once per distinct node."""
+
+    __slots__ = ['_types', '_type_indexes', '_node_type_indexes', '_ids', '_handles_by_type']
+
+    def __init__(self):
+        self._types = []
+        self._type_indexes = {}
+        self._node_type_indexes = array.array('H')  # handle -> index into _types
+        self._ids = []  # handle -> id
+        self._handles_by_type = []  # type index -> {id: handle}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def intern(self, node):
+        """ Return the handle of the given node, adding it to the table if needed."""
+        return self.intern_id(node.type, node.id)
+
+    def intern_id(self, node_type, id):
+        type_index = self._type_indexes.get(node_type)
+        if type_index is None:
+            type_index = len(self._types)
+            self._types.append(node_type)
+            self._type_indexes[node_type] = type_index
+            self._handles_by_type.append({})
+        handles = self._handles_by_type[type_index]
+        handle = handles.get(id)
+        if handle is None:
+            handle = len(self._ids)
+            handles[id] = handle
+            self._ids.append(id)
+            self._node_type_indexes.append(type_index)
+        return handle
+
+    def intern_all(self, nodes):
+        """ Return an array.array('i') of the handles of the given nodes."""
+        return array.array('i', [self.intern_id(node.type, node.id) for node in nodes])
+
+    def intern_ids(self, node_type, ids):
+        """ Return an array.array('i') of the handles of the nodes of the given type with the
+        given ids."""
+        return array.array('i', [self.intern_id(node_type, id) for id in ids])
+
+    def handle(self, node):
+        """ Return the handle of the given node, or None if it has never been interned."""
+        type_index = self._type_indexes.get(node.type)
+        if type_index is None:
+            return None
+        return self._handles_by_type[type_index].get(node.id)
+
+    def node_type(self, handle):
+        return self._types[self._node_type_indexes[handle]]
+
+    def node_id(self, handle):
+        return self._ids[handle]
+
+    def node(self, handle):
+        """ Return a new Node for the given handle."""
+        return Node(self._types[self._node_type_indexes[handle]], self._ids[handle])
+
+    def nodes(self, handles):
+        return [self.node(handle) for handle in handles]
+
+    def __repr__(self):
+        return 'NodeTable(%d nodes, %d types)' % (len(self._ids), len(self._types))
+
+
+class NodeList(object):
+    """A list of nodes stored as an array.array('i') of handles into a NodeTable.  Indexing and
+    iteration return Nodes, which are created as they are accessed; use handles (e.g. with
+    numpy.asarray(nodes.handles)) to work with the nodes without creating them."""
+
+    __slots__ = ['table', 'handles', '_handle_set']
+
+    def __init__(self, table, handles):
+        self.table = table
+        self.handles = handles
+        self._handle_set = None
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return NodeList(self.table, self.handles[i])
+        return self.table.node(self.handles[i])
+
+    def __iter__(self):
+        for handle in self.handles:
+            yield self.table.node(handle)
+
+    def __contains__(self, node):
+        handle = self.table.handle(node)
+        if handle is None:
+            return False
+        if self._handle_set is None:
+            self._handle_set = frozenset(self.handles)
+        return handle in self._handle_set
+
+    def to_list(self):
+        return self.table.nodes(self.handles)
+
+    def __repr__(self):
+        return 'NodeList(%d nodes)' % len(self.handles)
+
+
+class NodeMap(object):
+    """A read-only mapping from nodes to floats, stored as parallel arrays of handles into a
+    NodeTable and scores (a numpy array of float64s, or array.array('d') without numpy).  Looking
+    up a node builds an index from handle to position the first time; items(), keys() and
+    iteration create Nodes as they are accessed."""
+
+    __slots__ = ['table', 'handles', 'scores', '_positions']
+
+    def __init__(self, table, handles, scores):
+        self.table = table
+        self.handles = handles
+        self.scores = scores
+        self._positions = None
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __position(self, node):
+        handle = self.table.handle(node)
+        if handle is None:
+            return None
+        if self._positions is None:
+            self._positions = dict((h, i) for i, h in enumerate(self.handles))
+        return self._positions.get(handle)
+
+    def __getitem__(self, node):
+        position = self.__position(node)
+        if position is None:
+            raise KeyError(node)
+        return self.scores[position]
+
+    def get(self, node, default=None):
+        position = self.__position(node)
+        return default if position is None else self.scores[position]
+
+    def __contains__(self, node):
+        return self.__position(node) is not None
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        for handle in self.handles:
+            yield self.table.node(handle)
+
+    def values(self):
+        for score in self.scores:
+            yield score
+
+    def items(self):
+        for handle, score in zip(self.handles, self.scores):
+            yield self.table.node(handle), score
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return 'NodeMap(%d nodes)' % len(self.handles)
+
+
+def packed_node_list(table, node_lists, id_lists):
+    """ Intern the nodes of the given PackedNodeLists into the given table and return them as a
+    NodeList.  id_lists[i] holds the node ids of node_lists[i], as returned by
+    tempestIdsToNodeIds."""
+    handles = array.array('i')
+    for nodes, ids in zip(node_lists, id_lists):
+        handles.extend(table.intern_ids(nodes.nodeType, ids))
+    return NodeList(table, handles)
+
+
+def packed_node_map(table, node_lists, id_lists, packed_scores):
+    """ Intern the nodes of the given PackedNodeLists as in packed_node_list, and return them as a
+    NodeMap to the given scores, packed as little-endian doubles in the same order."""
+    return NodeMap(table, packed_node_list(table, node_lists, id_lists).handles,
+                   packed_array(packed_scores, '<f8', 'd'))
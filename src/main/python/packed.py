@@ -0,0 +1,75 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Conversions for PackedNodeList, which represents a list of nodes of one type as packed
+# little-endian int32 tempest ids, and for the other packed arrays of little-endian values that the
+# server returns.  If numpy is installed, tempest ids are returned as numpy arrays
+# sharing memory with the received message; otherwise they are returned as array.array('i').
+
+import array
+import struct
+import sys
+
+
+class PackedNodes(object):
+    """A list of nodes of type node_type, given by their tempest ids.  Use
+    TempestClient.tempest_ids_to_nodes to convert (some of) the tempest ids to Nodes."""
+
+    def __init__(self, node_type, tempest_ids):
+        self.node_type = node_type
+        self.tempest_ids = tempest_ids
+
+    def __len__(self):
+        return len(self.tempest_ids)
+
+    def __repr__(self):
+        return 'PackedNodes(%r, %d nodes)' % (self.node_type, len(self.tempest_ids))
+
+
+def unpack_node_list(packed_node_list):
+    """ Convert a PackedNodeList returned by the server to PackedNodes."""
+    return PackedNodes(packed_node_list.nodeType, tempest_id_array(packed_node_list.tempestIds))
+
+
+def tempest_id_array(packed_ids):
+    """ Return the given bytes, containing little-endian int32s, as an array.  With numpy this
+    doesn't copy, so the result is read-only."""
+    return packed_array(packed_ids, '<i4', 'i')
+
+
+def packed_array(data, dtype, typecode):
+    """ Return the given bytes, containing little-endian values, as a numpy array of the given
+    dtype, or without numpy as an array.array of the given typecode.  With numpy this doesn't
+    copy, so the result is read-only."""
+    try:
+        import numpy
+    except ImportError:
+        if typecode == 'q' and array.array('l').itemsize == 8:
+            typecode = 'l'  # Python 2 has no 'q' typecode
+        result = array.array(typecode)
+        if hasattr(result, 'frombytes'):
+            result.frombytes(data)
+        else:
+            result.fromstring(data)
+        if sys.byteorder == 'big' and result.itemsize > 1:
+            result.byteswap()
+        return result
+    return numpy.frombuffer(data, dtype=dtype)
+
+
+def pack_tempest_ids(tempest_ids):
+    """ Return the given tempest ids (a numpy array or any sequence of ints) as bytes containing
+    little-endian int32s."""
+    if hasattr(tempest_ids, 'astype'):
+        return tempest_ids.astype('<i4').tobytes()
+    tempest_ids = list(tempest_ids)
+    return struct.pack('<%di' % len(tempest_ids), *tempest_ids)
@@ -0,0 +1,177 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# A thread-safe pool of thrift connections to a single Tempest server, used by TempestClient so
+# that many threads can share a bounded set of open connections.
+
+import collections
+import select
+import socket
+import threading
+import time
+
+
+class PoolTimeoutException(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+    pass
+
+
+class ConnectionPool(object):
+    """A bounded pool of connections created by the given connect function.
+
+    Connections are checked out for the duration of a single call and checked back in afterwards.
+    At most max_size connections are open at once; threads that find the pool exhausted wait for
+    a connection to be checked in.  Idle connections are health-checked before they are handed
+    out, and idle connections beyond min_size are closed after max_idle_seconds.  At most
+    max_concurrent_reconnects threads may be replacing failed connections at the same time, so a
+    server restart doesn't cause every waiting thread to reconnect at once.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=8, max_idle_seconds=300.0,
+                 max_concurrent_reconnects=1, checkout_timeout=None):
+        """ connect is a function with no arguments returning a new open thrift client (as returned
+        by get_thrift_client).  The min_size connections are opened immediately, so an exception is
+        raised here if the server isn't available."""
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        if max_concurrent_reconnects < 1:
+            raise ValueError("max_concurrent_reconnects must be positive")
+        self.__connect = connect
+        self.__min_size = min_size
+        self.__max_size = max_size
+        self.__max_idle_seconds = max_idle_seconds
+        self.__checkout_timeout = checkout_timeout
+        self.__reconnect_semaphore = threading.BoundedSemaphore(max_concurrent_reconnects)
+
+        self.__condition = threading.Condition()
+        # Idle (client, time_checked_in) pairs; the most recently used connection is at the right.
+        self.__idle = collections.deque()
+        self.__open_count = 0  # Idle connections plus checked-out connections
+        self.__closed = False
+
+        for i in range(min_size):
+            client = self.__connect()
+            self.__open_count += 1
+            self.__idle.append((client, time.time()))
+
+    def checkout(self, timeout=None):
+        """ Return an open connection, waiting up to timeout seconds (default: the pool's
+        checkout_timeout, or forever if that is None) if all max_size connections are in use."""
+        if timeout is None:
+            timeout = self.__checkout_timeout
+        deadline = None if timeout is None else time.time() + timeout
+        with self.__condition:
+            while True:
+                if self.__closed:
+                    raise IOError("Connection pool is closed")
+                while self.__idle:
+                    client, _ = self.__idle.pop()
+                    if is_healthy(client):
+                        return client
+                    # The server closed this connection (e.g. it restarted), so replace it.
+                    self.__close_quietly(client)
+                    self.__open_count -= 1
+                if self.__open_count < self.__max_size:
+                    self.__open_count += 1
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeoutException(
+                        "No Tempest connection available after %s seconds" % timeout)
+                self.__condition.wait(remaining)
+
+        # Connect outside the lock so a slow connect doesn't block other threads.
+        try:
+            return self.__connect()
+        except:
+            with self.__condition:
+                self.__open_count -= 1
+                self.__condition.notify()
+            raise
+
+    def checkin(self, client):
+        """ Return a healthy connection to the pool after a call completes."""
+        now = time.time()
+        with self.__condition:
+            if self.__closed:
+                self.__close_quietly(client)
+                self.__open_count -= 1
+                return
+            self.__idle.append((client, now))
+            self.__evict_idle(now)
+            self.__condition.notify()
+
+    def discard(self, client):
+        """ Close a connection whose state is unknown (for example after a transport error or an
+        interrupted call) instead of returning it to the pool."""
+        self.__close_quietly(client)
+        with self.__condition:
+            self.__open_count -= 1
+            self.__condition.notify()
+
+    def reconnect(self, timeout=None):
+        """ Check out a replacement for a discarded connection.  At most max_concurrent_reconnects
+        threads run this at once; the others wait, and typically then find a fresh idle
+        connection created by an earlier reconnect."""
+        with self.__reconnect_semaphore:
+            return self.checkout(timeout)
+
+    def close(self):
+        """ Close all idle connections.  Connections currently checked out are closed when they
+        are checked in."""
+        with self.__condition:
+            self.__closed = True
+            while self.__idle:
+                client, _ = self.__idle.pop()
+                self.__close_quietly(client)
+                self.__open_count -= 1
+            self.__condition.notify_all()
+
+    def size(self):
+        """ Return the number of open connections, including those checked out."""
+        with self.__condition:
+            return self.__open_count
+
+    def idle_count(self):
+        """ Return the number of open connections not currently checked out."""
+        with self.__condition:
+            return len(self.__idle)
+
+    def __evict_idle(self, now):
+        # Called with the lock held.  The least recently used connections are at the left.
+        while (len(self.__idle) > self.__min_size and
+               now - self.__idle[0][1] > self.__max_idle_seconds):
+            client, _ = self.__idle.popleft()
+            self.__close_quietly(client)
+            self.__open_count -= 1
+
+    @staticmethod
+    def __close_quietly(client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def is_healthy(client):
+    """ Return True if the given idle connection still appears to be open.  An idle connection
+    should have nothing to read, so if its socket is readable, the server has closed it (or
+    sent unexpected data) and it can't be reused."""
+    socket_transport = getattr(client, 'socket', None)
+    handle = getattr(socket_transport, 'handle', None)
+    if handle is None:
+        return socket_transport is None  # Clients without a socket can't be checked
+    try:
+        readable, _, _ = select.select([handle], [], [], 0)
+    except (select.error, socket.error, ValueError):
+        return False
+    return not readable
@@ -0,0 +1,95 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Compares the thrift protocols supported by get_thrift_client on typical Tempest responses: the
+# number of bytes each response takes on the wire, and the time to decode it.  No server is
+# needed, since responses are encoded and decoded in memory.
+#
+# Example:
+#   python -m tempest_db.protocol_benchmark --node-count 100000
+
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from thrift.transport import TTransport
+
+from tempest_db import TempestDBService, ttypes, protocol_factory
+from tempest_db.packed import pack_tempest_ids
+
+Protocols = [('binary', False), ('binary', True), ('compact', False), ('compact', True)]
+
+
+def example_results(node_count):
+    """ Return a list of (description, result struct) pairs of typical responses with the given
+    number of nodes."""
+    nodes = [ttypes.Node('user', 'user%d' % i) for i in range(node_count)]
+    tempest_ids = list(range(node_count))
+    random.shuffle(tempest_ids)
+    return [
+        ('outNeighbors', TempestDBService.outNeighbors_result(success=nodes)),
+        ('outNeighborsPacked', TempestDBService.outNeighborsPacked_result(
+            success=ttypes.PackedNodeList('user', pack_tempest_ids(tempest_ids)))),
+        ('pprUndirected', TempestDBService.pprUndirected_result(
+            success={node: random.random() / node_count for node in nodes})),
+        ('getMultiNodeAttributeAsJSON', TempestDBService.getMultiNodeAttributeAsJSON_result(
+            success={node: '"Name of %s"' % node.id for node in nodes})),
+    ]
+
+
+def encode(result, factory):
+    buffer = TTransport.TMemoryBuffer()
+    result.write(factory.getProtocol(buffer))
+    return buffer.getvalue()
+
+
+def decode_seconds(result, data, factory, repetitions):
+    """ Return the fastest time to decode the given bytes over the given number of repetitions."""
+    best = float('inf')
+    for i in range(repetitions):
+        decoded = result.__class__()
+        start = time.time()
+        decoded.read(factory.getProtocol(TTransport.TMemoryBuffer(data)))
+        best = min(best, time.time() - start)
+    return best
+
+
+def run(node_count, repetitions):
+    """ Return a list of (rpc, protocol, accelerated, byte count, decode milliseconds) tuples."""
+    rows = []
+    for rpc, result in example_results(node_count):
+        for protocol, accelerated in Protocols:
+            factory = protocol_factory(protocol, accelerated)
+            data = encode(result, factory)
+            seconds = decode_seconds(result, data, factory, repetitions)
+            rows.append((rpc, protocol, accelerated, len(data), seconds * 1000.0))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare bytes on the wire and decode time of thrift protocols on Tempest responses.')
+    parser.add_argument('--node-count', type=int, default=100000,
+                        help='number of nodes in each response')
+    parser.add_argument('--repetitions', type=int, default=3,
+                        help='number of times each response is decoded (the fastest is reported)')
+    args = parser.parse_args()
+
+    print('%-28s %-8s %-12s %12s %12s' % ('rpc', 'protocol', 'accelerated', 'bytes', 'decode ms'))
+    for rpc, protocol, accelerated, byte_count, milliseconds in run(args.node_count, args.repetitions):
+        print('%-28s %-8s %-12s %12d %12.1f' % (rpc, protocol, accelerated, byte_count, milliseconds))
+
+
+if __name__ == '__main__':
+    main()
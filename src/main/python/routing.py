@@ -0,0 +1,348 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Routes TempestClient calls across several servers serving the same graphs: a primary, which
+# receives all writes, and read replicas.  Each read goes to the endpoint with the lowest recent
+# latency (an exponentially weighted moving average), endpoints which fail repeatedly are ejected
+# for a backoff period, and a read which takes longer than a latency percentile can optionally be
+# hedged by sending a duplicate request to another endpoint and using whichever answers first.
+#
+# Example:
+#   client = tempest_db.client(endpoints=['db1:10001', 'db2:10001', 'db3:10001'],
+#                              hedge_percentile=95)
+
+import collections
+import random
+import sys
+import threading
+import time
+
+from thrift.transport import TTransport
+
+from tempest_db.pool import ConnectionPool
+
+# Errors after which a connection can't be reused, and the call may be retried elsewhere.
+TransportErrors = (TTransport.TTransportException, IOError)
+
+
+def parse_endpoint(endpoint):
+    """ Return (host, port) for an endpoint given as a (host, port) pair or a 'host:port' string."""
+    if isinstance(endpoint, tuple):
+        host, port = endpoint
+        return host, int(port)
+    host, separator, port = endpoint.rpartition(':')
+    if not separator:
+        raise ValueError("Endpoint %r should be 'host:port' or a (host, port) pair" % (endpoint,))
+    return host, int(port)
+
+
+class Endpoint(object):
+    """A server, with its connection pool and recent latency and failure history."""
+
+    def __init__(self, host, port, pool):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.latency_ewma = None  # Seconds; None until a call has completed
+        self.consecutive_failures = 0
+        self.ejection_count = 0  # Consecutive ejections, which increase the ejection time
+        self.ejected_until = 0.0
+
+    def call(self, f, reconnecting=False):
+        """ Call the given function on a pooled thrift client of this endpoint, and return whatever
+        it returns.  After a transport error, the connection is discarded and the error is
+        raised."""
+        thrift_client = self.pool.reconnect() if reconnecting else self.pool.checkout()
+        try:
+            result = f(thrift_client)
+        except TransportErrors + (KeyboardInterrupt,):
+            # The connection may have a partial response pending, so close it.
+            self.pool.discard(thrift_client)
+            raise
+        except:
+            # Exceptions declared by the service (e.g. InvalidNodeIdException) leave the
+            # connection usable.
+            self.pool.checkin(thrift_client)
+            raise
+        self.pool.checkin(thrift_client)
+        return result
+
+    def __repr__(self):
+        return '%s:%d' % (self.host, self.port)
+
+
+class Router(object):
+    """Chooses the endpoint for each call.  The first endpoint is the primary."""
+
+    def __init__(self, endpoints, latency_ewma_weight=0.2, failures_before_ejection=2,
+                 ejection_seconds=5.0, max_ejection_seconds=300.0, hedge_percentile=None,
+                 hedge_min_samples=100, latency_window_size=1000, probe_probability=0.01,
+                 metrics=None):
+        """ endpoints is a list of Endpoints, the first of which is the primary.  Each completed
+        call updates its endpoint's latency average with weight latency_ewma_weight.  After
+        failures_before_ejection consecutive transport errors, an endpoint isn't used for reads for
+        ejection_seconds, doubling with each consecutive ejection up to max_ejection_seconds.
+        If hedge_percentile (e.g. 95) is given, a read which hasn't completed after that
+        percentile of the latest latency_window_size read latencies is also sent to the next best
+        endpoint (once at least hedge_min_samples latencies are known).  A fraction
+        probe_probability of reads go to a random available endpoint, so the latency averages of
+        other endpoints stay current.  Calls are recorded in metrics, a ClientMetrics, if given."""
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        if hedge_percentile is not None and not 0 < hedge_percentile < 100:
+            raise ValueError("hedge_percentile must be between 0 and 100")
+        self.endpoints = endpoints
+        self.primary = endpoints[0]
+        self.__latency_ewma_weight = latency_ewma_weight
+        self.__failures_before_ejection = failures_before_ejection
+        self.__ejection_seconds = ejection_seconds
+        self.__max_ejection_seconds = max_ejection_seconds
+        self.__hedge_percentile = hedge_percentile
+        self.__hedge_min_samples = hedge_min_samples
+        self.__probe_probability = probe_probability
+        self.__metrics = metrics
+        self.__read_latencies = collections.deque(maxlen=latency_window_size)
+        self.__lock = threading.Lock()  # Guards endpoint statistics and __read_latencies
+
+    def read(self, method, f, max_retries):
+        """ Call the given function on a thrift client of the best endpoint, retrying on transport
+        errors (on another endpoint if one is available) up to max_retries times.  method is the
+        name of the client method, used for metrics."""
+        endpoint = self.choose_read_endpoint()
+        reconnecting = False
+        for attempt in range(max_retries):
+            try:
+                if self.__hedge_percentile is None or len(self.endpoints) == 1:
+                    return self.__timed_call(endpoint, method, f, reconnecting, is_read=True)
+                return self.__hedged_call(endpoint, method, f, reconnecting)
+            except TransportErrors:
+                if attempt == max_retries - 1:
+                    raise
+                sys.stderr.write("(Tempest client reconnecting to server...)\n")
+                next_endpoint = self.choose_read_endpoint(exclude=endpoint)
+                # Only one thread at a time reconnects to a failed endpoint
+                reconnecting = next_endpoint is endpoint
+                endpoint = next_endpoint
+                if self.__metrics is not None:
+                    self.__metrics.record_retry(method, reconnecting)
+
+    def write(self, method, f):
+        """ Call the given function on a thrift client of the primary, without retrying."""
+        return self.__timed_call(self.primary, method, f, reconnecting=False, is_read=False)
+
+    def choose_read_endpoint(self, exclude=None):
+        """ Return the available endpoint with the lowest latency average, other than exclude if
+        possible.  Endpoints without a latency average are tried first.  If every endpoint is
+        ejected, the one whose ejection ends first is returned."""
+        now = time.time()
+        with self.__lock:
+            available = [endpoint for endpoint in self.endpoints if endpoint.ejected_until <= now]
+            if len(available) > 1 and exclude in available:
+                available.remove(exclude)
+            if not available:
+                return min(self.endpoints, key=lambda endpoint: endpoint.ejected_until)
+            if len(available) > 1 and random.random() < self.__probe_probability:
+                return random.choice(available)
+            return min(available, key=lambda endpoint: endpoint.latency_ewma or 0.0)
+
+    def hedge_delay(self):
+        """ Return the number of seconds after which a read is hedged, or None if there aren't
+        enough latency samples yet."""
+        with self.__lock:
+            if len(self.__read_latencies) < self.__hedge_min_samples:
+                return None
+            latencies = sorted(self.__read_latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.__hedge_percentile / 100.0))
+        return latencies[index]
+
+    def status(self):
+        """ Return a list with a dictionary describing each endpoint."""
+        now = time.time()
+        with self.__lock:
+            return [{'endpoint': repr(endpoint),
+                     'primary': endpoint is self.primary,
+                     'latency_ewma_seconds': endpoint.latency_ewma,
+                     'consecutive_failures': endpoint.consecutive_failures,
+                     'ejected_seconds_remaining': max(0.0, endpoint.ejected_until - now)}
+                    for endpoint in self.endpoints]
+
+    def record_success(self, endpoint, seconds, is_read):
+        with self.__lock:
+            if endpoint.latency_ewma is None:
+                endpoint.latency_ewma = seconds
+            else:
+                endpoint.latency_ewma += self.__latency_ewma_weight * (seconds - endpoint.latency_ewma)
+            endpoint.consecutive_failures = 0
+            endpoint.ejection_count = 0
+            if is_read:
+                self.__read_latencies.append(seconds)
+
+    def record_failure(self, endpoint):
+        with self.__lock:
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.__failures_before_ejection:
+                self.__eject(endpoint)
+
+    def eject(self, endpoint):
+        """ Stop using the given endpoint for reads for the current ejection time."""
+        with self.__lock:
+            self.__eject(endpoint)
+
+    def __eject(self, endpoint):
+        # Called with the lock held.
+        ejection_seconds = min(self.__max_ejection_seconds,
+                               self.__ejection_seconds * 2 ** endpoint.ejection_count)
+        endpoint.ejected_until = time.time() + ejection_seconds
+        endpoint.ejection_count += 1
+        endpoint.consecutive_failures = 0
+        # When the ejection ends, measure the endpoint's latency again before trusting it.
+        endpoint.latency_ewma = None
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.pool.close()
+
+    def __timed_call(self, endpoint, method, f, reconnecting, is_read):
+        """ Call f on the given endpoint, recording its latency or failure for routing, and
+        recording the call in the metrics if there are any."""
+        if self.__metrics is None:
+            return self.__health_checked_call(endpoint, f, reconnecting, is_read)
+
+        byte_counts = [0, 0]
+
+        def counting_f(thrift_client):
+            # Connections count their bytes if created with count_bytes=True (see get_thrift_client)
+            socket = getattr(thrift_client, 'socket', None)
+            bytes_written = getattr(socket, 'bytes_written', 0)
+            bytes_read = getattr(socket, 'bytes_read', 0)
+            try:
+                return f(thrift_client)
+            finally:
+                byte_counts[0] = getattr(socket, 'bytes_written', 0) - bytes_written
+                byte_counts[1] = getattr(socket, 'bytes_read', 0) - bytes_read
+
+        start = time.time()
+        try:
+            result = self.__health_checked_call(endpoint, counting_f, reconnecting, is_read)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            self.__metrics.record_call(method, repr(endpoint), time.time() - start,
+                                       byte_counts[0], byte_counts[1], e)
+            raise
+        self.__metrics.record_call(method, repr(endpoint), time.time() - start,
+                                   byte_counts[0], byte_counts[1])
+        return result
+
+    def __health_checked_call(self, endpoint, f, reconnecting, is_read):
+        start = time.time()
+        try:
+            result = endpoint.call(f, reconnecting)
+        except TransportErrors:
+            self.record_failure(endpoint)
+            raise
+        except KeyboardInterrupt:
+            raise
+        except:
+            # The server answered, so the endpoint is healthy.
+            self.record_success(endpoint, time.time() - start, is_read)
+            raise
+        self.record_success(endpoint, time.time() - start, is_read)
+        return result
+
+    def __hedged_call(self, endpoint, method, f, reconnecting):
+        """ Call f on the given endpoint, and if it hasn't finished after hedge_delay() seconds,
+        also on the next best endpoint.  Return the first result, or raise the first exception
+        declared by the service; transport errors are raised only if every attempt fails."""
+        delay = self.hedge_delay()
+        if delay is None:
+            return self.__timed_call(endpoint, method, f, reconnecting, is_read=True)
+
+        lock = threading.Lock()
+        finished = threading.Event()
+        outcomes = []  # (is_transport_error, result or exception info) of each finished attempt
+        attempt_count = [1]
+
+        def attempt(attempt_endpoint, attempt_reconnecting):
+            try:
+                outcome = (False, (True, self.__timed_call(attempt_endpoint, method, f,
+                                                           attempt_reconnecting, is_read=True)))
+            except TransportErrors:
+                outcome = (True, sys.exc_info())
+            except Exception:
+                outcome = (False, (False, sys.exc_info()))
+            with lock:
+                outcomes.append(outcome)
+                if not outcome[0] or len(outcomes) == attempt_count[0]:
+                    finished.set()
+
+        self.__start_thread(attempt, endpoint, reconnecting)
+        if not finished.wait(delay):
+            hedge_endpoint = self.choose_read_endpoint(exclude=endpoint)
+            if hedge_endpoint is not endpoint:
+                with lock:
+                    attempt_count[0] += 1
+                self.__start_thread(attempt, hedge_endpoint, False)
+        while not finished.wait(1.0):
+            pass  # Waiting in steps lets KeyboardInterrupt through on Python 2
+
+        with lock:
+            completed = [outcome for is_transport_error, outcome in outcomes if not is_transport_error]
+            failures = [outcome for is_transport_error, outcome in outcomes if is_transport_error]
+        if completed:
+            is_result, value = completed[0]
+            if is_result:
+                return value
+            failure = value
+        else:
+            failure = failures[0]
+        raise_exc_info(failure)
+
+    @staticmethod
+    def __start_thread(target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+
+def raise_exc_info(exc_info):
+    """ Raise the exception from the given sys.exc_info() triple, with its original traceback on
+    Python 3."""
+    exc_value, exc_traceback = exc_info[1], exc_info[2]
+    if hasattr(exc_value, 'with_traceback'):
+        raise exc_value.with_traceback(exc_traceback)
+    raise exc_value
+
+
+def create_router(endpoints, connect, pool_options, router_options):
+    """ Return a Router for the given endpoints (as accepted by parse_endpoint), with a
+    ConnectionPool for each created by ConnectionPool(lambda: connect(host, port), **pool_options).
+    The primary (the first endpoint) must be available; other endpoints which can't be reached yet
+    start out ejected."""
+    def create_endpoint(host, port, min_size):
+        return Endpoint(host, port, ConnectionPool(lambda: connect(host, port),
+                                                   **dict(pool_options, min_size=min_size)))
+
+    router_endpoints = []
+    unavailable_endpoints = []
+    for index, (host, port) in enumerate(parse_endpoint(endpoint) for endpoint in endpoints):
+        try:
+            router_endpoints.append(create_endpoint(host, port, pool_options.get('min_size', 1)))
+        except TransportErrors:
+            if index == 0:
+                raise
+            router_endpoints.append(create_endpoint(host, port, 0))
+            unavailable_endpoints.append(router_endpoints[-1])
+    router = Router(router_endpoints, **router_options)
+    for endpoint in unavailable_endpoints:
+        router.eject(endpoint)
+    return router
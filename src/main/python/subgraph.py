@@ -0,0 +1,69 @@
+# Copyright 2016 Teapot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+# file except in compliance with the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+# Conversions for InducedSubgraph, which holds a subgraph in compressed sparse row (CSR) form as
+# packed little-endian int32 arrays.  If numpy is installed, the arrays are numpy arrays sharing
+# memory with the received message; otherwise they are array.array('i').
+
+from tempest_db.packed import PackedNodes, tempest_id_array
+
+
+class Subgraph(object):
+    """A subgraph of one edge type in compressed sparse row form, as returned by
+    TempestClient.induced_subgraph.  Its nodes are numbered from 0: node_lists is a list of
+    PackedNodes, one per node type, and node i is the ith node when their tempest_ids are
+    concatenated.  The out-neighbors of node i are targets[offsets[i]:offsets[i + 1]], in
+    increasing order.  truncated is True if max_nodes limited the nodes of the subgraph."""
+
+    def __init__(self, node_lists, offsets, targets, truncated):
+        self.node_lists = node_lists
+        self.offsets = offsets
+        self.targets = targets
+        self.truncated = truncated
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def edge_count(self):
+        return len(self.targets)
+
+    def node_type_and_tempest_id(self, i):
+        """ Return the (node type, tempest id) of node i."""
+        if i < 0:
+            raise IndexError('Node number out of range')
+        for nodes in self.node_lists:
+            if i < len(nodes):
+                return nodes.node_type, int(nodes.tempest_ids[i])
+            i -= len(nodes)
+        raise IndexError('Node number out of range')
+
+    def adjacency_matrix(self):
+        """ Return the subgraph as a scipy.sparse.csr_matrix, whose entry (i, j) is the number of
+        edges from node i to node j.  Requires numpy and scipy."""
+        import numpy
+        import scipy.sparse
+        n = len(self)
+        # Copy the arrays, since scipy may sort or merge entries in place
+        return scipy.sparse.csr_matrix((numpy.ones(len(self.targets)), numpy.array(self.targets, dtype='i4'),
+                                        numpy.array(self.offsets, dtype='i4')), shape=(n, n))
+
+    def __repr__(self):
+        return 'Subgraph(%d nodes, %d edges%s)' % (len(self), self.edge_count(),
+                                                   ', truncated' if self.truncated else '')
+
+
+def unpack_subgraph(induced_subgraph):
+    """ Convert an InducedSubgraph returned by the server to a Subgraph."""
+    node_lists = [PackedNodes(nodes.nodeType, tempest_id_array(nodes.tempestIds))
+                  for nodes in induced_subgraph.nodeLists]
+    return Subgraph(node_lists, tempest_id_array(induced_subgraph.offsets),
+                    tempest_id_array(induced_subgraph.targets), induced_subgraph.truncated)
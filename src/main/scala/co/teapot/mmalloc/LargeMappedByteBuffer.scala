@@ -17,10 +17,13 @@ package co.teapot.mmalloc
 import java.io.File
 import java.nio.ByteOrder
 import java.nio.channels.FileChannel
+import java.util.regex.Pattern
 
 import co.teapot.tempest.util.Util
 import com.indeed.util.mmap.{DirectMemory, MMapBuffer}
 
+import scala.io.Source
+
 /** Memory maps a file and provides access to Ints and Longs. Any write operation automatically
   * extends the length of the underlying file.
   */
@@ -48,6 +51,19 @@ trait LargeMappedByteBuffer {
     */
   def loadFileToRam(): Unit
 
+  /** Reads one byte of each page of the underlying file in order, so the operating system pages it
+    * into RAM using sequential read-ahead.  Unlike loadFileToRam, the pages aren't locked in RAM.
+    */
+  def touchAllPages(): Unit
+
+  /** The size of the underlying file, in bytes. */
+  def mappedByteCount: Long
+
+  /** The number of bytes of the underlying file which are in RAM and mapped by this process, or
+    * None if that can't be determined on this operating system.
+    */
+  def residentByteCount(): Option[Long]
+
   /** Syncs count bytes at the given index to disk and blocks until that completes.
     */
   def syncToDisk(startIndex: Pointer, count: ByteCount): Unit
@@ -112,6 +128,23 @@ class MMapByteBuffer(f: File) extends LargeMappedByteBuffer {
   def loadFileToRam(): Unit =
     buffer.mlock(0, memory.length)
 
+  // Written by touchAllPages so its reads can't be optimized away
+  @volatile private var touchedByteSum = 0
+
+  def touchAllPages(): Unit = {
+    var sum = 0
+    var i = 0L
+    while (i < memory.length) {
+      sum += memory.getByte(i)
+      i += MMapByteBuffer.PageSize
+    }
+    touchedByteSum = sum
+  }
+
+  def mappedByteCount: Long = memory.length
+
+  def residentByteCount(): Option[Long] = MMapByteBuffer.residentByteCount(f)
+
   /** Syncs the buffer containing the given indexes in the given range to disk and blocks until that completes (see
     * MappedByteBuffer.force()).
     */
@@ -125,3 +158,40 @@ class MMapByteBuffer(f: File) extends LargeMappedByteBuffer {
 
   def close(): Unit = buffer.close()
 }
+
+object MMapByteBuffer {
+  val PageSize = 4096L
+
+  private val SmapsFile = new File("/proc/self/smaps")
+  // The first line of each mapping in smaps, e.g. "7f10a2c00000-7f10a3000000 rw-s 00000000 08:01 1234 /data/follows.dat"
+  private val MappingHeaderPattern = Pattern.compile("""[0-9a-f]+-[0-9a-f]+ \S+ \S+ \S+ \S+\s*(.*)""")
+  private val RssPattern = Pattern.compile("""Rss:\s+(\d+) kB""")
+
+  /** Returns the total resident size of this process's mappings of the given file, as reported by
+    * Linux in /proc/self/smaps, or None on other operating systems.
+    */
+  def residentByteCount(f: File): Option[Long] =
+    if (!SmapsFile.exists) {
+      None
+    } else {
+      val path = f.getCanonicalPath
+      val source = Source.fromFile(SmapsFile)
+      try {
+        var inFileMapping = false
+        var residentKilobytes = 0L
+        for (line <- source.getLines()) {
+          val headerMatcher = MappingHeaderPattern.matcher(line)
+          if (headerMatcher.matches) {
+            inFileMapping = headerMatcher.group(1) == path
+          } else if (inFileMapping) {
+            val rssMatcher = RssPattern.matcher(line)
+            if (rssMatcher.matches)
+              residentKilobytes += rssMatcher.group(1).toLong
+          }
+        }
+        Some(residentKilobytes * 1024L)
+      } finally {
+        source.close()
+      }
+    }
+}
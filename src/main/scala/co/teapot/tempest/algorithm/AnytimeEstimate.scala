@@ -0,0 +1,41 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.algorithm
+
+import scala.concurrent.duration.Deadline
+
+/** The result of an estimator which may stop at a deadline.  walkCount is the number of Monte
+  * Carlo steps (for MonteCarloPPR) or forward walks (for bidirectional PPR) done, pushCount is the
+  * number of reverse pushes done, complete is false if the deadline stopped the estimator before
+  * it did all the work its parameters asked for, and errorBound is an approximate 95% bound on the
+  * additive error of each estimated value.
+  */
+case class AnytimeEstimate[A](value: A, walkCount: Long, pushCount: Long, complete: Boolean,
+                              errorBound: Double) {
+  def map[B](f: A => B): AnytimeEstimate[B] = copy(value = f(value))
+}
+
+object AnytimeEstimate {
+  // sqrt(log(2 / 0.05) / 2), for 95% Hoeffding bounds
+  val HoeffdingMultiplier95 = 1.358
+
+  /** The 95% Hoeffding bound on the error of the mean of sampleCount independent samples in
+    * [0, sampleRange]. */
+  def hoeffdingBound(sampleCount: Double, sampleRange: Double): Double =
+    if (sampleCount <= 0) sampleRange else sampleRange * HoeffdingMultiplier95 / math.sqrt(sampleCount)
+
+  /** Returns true if the given optional deadline has passed. */
+  def isOverdue(deadline: Option[Deadline]): Boolean = deadline.exists(_.isOverdue())
+}
@@ -19,24 +19,41 @@ import co.teapot.tempest.MonteCarloPageRankParams
 import co.teapot.tempest.typedgraph.{Node, TypedGraph}
 
 import scala.collection.mutable
+import scala.concurrent.duration.Deadline
 import scala.util.Random
 
 /** Computes PPR on a typed graph (which may be a union of graphs, as in the pprUndirected thrift call). */
 object MonteCarloPPRTyped {
+  // The number of steps between checks of the deadline
+  val DeadlineCheckInterval = 1024
+
   def estimatePPR(graph: TypedGraph,
                   seeds: IndexedSeq[Node],
                   params: MonteCarloPageRankParams,
                   random: Random = new Random()):
-  collection.Map[Node, Double] = {
+  collection.Map[Node, Double] =
+    estimatePPRAnytime(graph, seeds, params, None, random).value
+
+  /** Like estimatePPR, but if the deadline passes before params.numSteps steps are done, stops and
+    * returns the estimate from the steps done so far.  The error bound treats each walk (about
+    * resetProbability * walkCount of them) as an independent sample.
+    */
+  def estimatePPRAnytime(graph: TypedGraph,
+                         seeds: IndexedSeq[Node],
+                         params: MonteCarloPageRankParams,
+                         deadline: Option[Deadline],
+                         random: Random = new Random()):
+  AnytimeEstimate[collection.Map[Node, Double]] = {
     // Note: For efficiency, a future version could group nodes by type, and implement a Map[IntNode, Double] using
     // mutable.AnyRefMap[String, HashIntIntMap]
-    val pprs = new mutable.AnyRefMap[Node, Double]().withDefaultValue(0.0)
+    val visitCounts = new mutable.AnyRefMap[Node, Double]().withDefaultValue(0.0)
     def randomStart(): Node = seeds(random.nextInt(seeds.size))
 
     var v = randomStart()
-
-    for (stepIndex <- 0 until params.getNumSteps) {
-      pprs(v) += 1.0 / params.getNumSteps
+    var stepCount = 0
+    while (stepCount < params.getNumSteps &&
+      !(stepCount % DeadlineCheckInterval == 0 && AnytimeEstimate.isOverdue(deadline))) {
+      visitCounts(v) += 1.0
 
       val vDegree = graph.degree(v)
       if (random.nextDouble() < params.getResetProbability || vDegree == 0) {
@@ -44,7 +61,17 @@ object MonteCarloPPRTyped {
       } else {
         v = graph.randomNeighbor(v, random)
       }
+      stepCount += 1
     }
-    MonteCarloPPR.filterPPRResults(pprs, params)
+
+    val pprs = visitCounts map { case (node, count) => (node, count / stepCount) }
+    val paramsForSteps = params.deepCopy()
+    paramsForSteps.setNumSteps(stepCount) // So minReportedVisits applies to the steps done
+    AnytimeEstimate(
+      MonteCarloPPR.filterPPRResults(pprs, paramsForSteps),
+      walkCount = stepCount,
+      pushCount = 0,
+      complete = stepCount == params.getNumSteps,
+      errorBound = AnytimeEstimate.hoeffdingBound(stepCount * params.getResetProbability, 1.0))
   }
 }
@@ -15,12 +15,13 @@
 package co.teapot.tempest.client
 
 import co.teapot.tempest.{Node => ThriftNode, TempestDBService}
-import co.teapot.thriftbase.TeapotThriftClient
+import co.teapot.thriftbase.{TeapotThriftClient, ThriftTransportConfig}
 import org.apache.thrift.protocol.TProtocol
 
 class TempestDBClient(val server: String,
                       val port: Int,
-                      override val timeoutInMillisOption: Option[Int] = None
+                      override val timeoutInMillisOption: Option[Int] = None,
+                      override val transportConfig: ThriftTransportConfig = new ThriftTransportConfig
                      ) extends TeapotThriftClient[TempestDBService.Client] {
   def initExecutor(protocol: TProtocol) = {
     new TempestDBService.Client(protocol)
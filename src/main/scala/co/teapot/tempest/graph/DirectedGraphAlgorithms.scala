@@ -14,6 +14,10 @@
 
 package co.teapot.tempest.graph
 
+import java.util
+
+import it.unimi.dsi.fastutil.ints.IntArrayList
+import net.openhft.koloboke.collect.map.hash.{HashIntIntMap, HashIntIntMaps}
 import net.openhft.koloboke.collect.set.hash.{HashIntSet, HashIntSets}
 import scala.collection.JavaConverters._
 
@@ -40,4 +44,63 @@ object DirectedGraphAlgorithms {
       result
     }
   }
+
+  /** Returns the edges of the given graph from the nodes in sourceIds to the nodes in targetIds in
+    * compressed sparse row form, as a pair (offsets, targets): the out-neighbors of sourceIds(i)
+    * which are in targetIds are targetIds(targets(j)) for offsets(i) <= j < offsets(i + 1), in
+    * increasing order of targets(j).  The ids in each array must be distinct.  This follows the
+    * out-edges of the sources or the in-edges of the targets, whichever are fewer.
+    */
+  def inducedSubgraphCSR(graph: DirectedGraph,
+                         sourceIds: Array[Int],
+                         targetIds: Array[Int]): (Array[Int], Array[Int]) = {
+    val edgeSources = new IntArrayList()
+    val edgeTargets = new IntArrayList()
+    val outEdgeCount = (sourceIds map { id => graph.outDegree(id).toLong }).sum
+    val inEdgeCount = (targetIds map { id => graph.inDegree(id).toLong }).sum
+    if (outEdgeCount <= inEdgeCount) {
+      val targetIndex = indexMap(targetIds)
+      for (i <- sourceIds.indices; v <- graph.outNeighbors(sourceIds(i))) {
+        val j = targetIndex.getOrDefault(v, -1)
+        if (j >= 0) {
+          edgeSources.add(i)
+          edgeTargets.add(j)
+        }
+      }
+    } else {
+      val sourceIndex = indexMap(sourceIds)
+      for (j <- targetIds.indices; u <- graph.inNeighbors(targetIds(j))) {
+        val i = sourceIndex.getOrDefault(u, -1)
+        if (i >= 0) {
+          edgeSources.add(i)
+          edgeTargets.add(j)
+        }
+      }
+    }
+
+    // Bucket the edges by source
+    val offsets = new Array[Int](sourceIds.length + 1)
+    for (k <- 0 until edgeSources.size)
+      offsets(edgeSources.getInt(k) + 1) += 1
+    for (i <- sourceIds.indices)
+      offsets(i + 1) += offsets(i)
+    val targets = new Array[Int](edgeTargets.size)
+    val nextPositions = util.Arrays.copyOf(offsets, sourceIds.length)
+    for (k <- 0 until edgeSources.size) {
+      val i = edgeSources.getInt(k)
+      targets(nextPositions(i)) = edgeTargets.getInt(k)
+      nextPositions(i) += 1
+    }
+    for (i <- sourceIds.indices)
+      util.Arrays.sort(targets, offsets(i), offsets(i + 1))
+    (offsets, targets)
+  }
+
+  /** Returns a map from each of the given distinct ids to its index. */
+  private def indexMap(ids: Array[Int]): HashIntIntMap = {
+    val result = HashIntIntMaps.newMutableMap(ids.length)
+    for (i <- ids.indices)
+      result.put(ids(i), i)
+    result
+  }
 }
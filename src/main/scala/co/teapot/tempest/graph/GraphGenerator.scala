@@ -14,6 +14,8 @@
 
 package co.teapot.tempest.graph
 
+import scala.util.Random
+
 object GraphGenerator {
   def completeGraph(nodeCount: Int): DirectedGraph = {
     // For efficiency, a future version could represent the graph implicitly
@@ -22,4 +24,58 @@ object GraphGenerator {
                      if u != v) yield (u, v)
     DirectedGraph(edges)
   }
+
+  /** Calls f on each of edgeCount random edges between ids 1 to nodeCount (the tempest ids of a
+    * node table with nodeCount rows), skipping self-loops.  Sources and targets are drawn from a
+    * Zipf distribution with exponent skew over separate random orderings of the ids, so skew 0 gives
+    * uniformly random edges, while skew near 1 gives a few nodes with very high out- and in-degree,
+    * as in social networks.  The same seed always gives the same edges; duplicate edges are
+    * possible. */
+  def foreachSkewedRandomEdge(nodeCount: Int, edgeCount: Long, skew: Double, seed: Long)
+                             (f: (Int, Int) => Unit): Unit = {
+    require(nodeCount >= 2, "At least 2 nodes are needed for edges without self-loops")
+    require(skew >= 0.0, "skew must be non-negative")
+    val random = new Random(seed)
+    val sourceSampler = new ZipfIdSampler(nodeCount, skew, random)
+    val targetSampler = new ZipfIdSampler(nodeCount, skew, random)
+    var edgesGenerated = 0L
+    while (edgesGenerated < edgeCount) {
+      val source = sourceSampler.sample()
+      val target = targetSampler.sample()
+      if (source != target) {
+        f(source, target)
+        edgesGenerated += 1
+      }
+    }
+  }
+
+  /** Returns a DirectedGraph with the edges of foreachSkewedRandomEdge. */
+  def skewedRandomGraph(nodeCount: Int, edgeCount: Int, skew: Double, seed: Long): DirectedGraph = {
+    val edges = new scala.collection.mutable.ArrayBuffer[(Int, Int)](edgeCount)
+    foreachSkewedRandomEdge(nodeCount, edgeCount, skew, seed) { (u, v) => edges += ((u, v)) }
+    DirectedGraph(edges)
+  }
+}
+
+/** Samples ids 1 to nodeCount, where the id of rank r (in a random order) has probability
+  * proportional to 1 / r^skew. */
+private class ZipfIdSampler(nodeCount: Int, skew: Double, random: Random) {
+  private val idsByRank: Array[Int] = random.shuffle((1 to nodeCount).toIndexedSeq).toArray
+  private val cumulativeWeights: Array[Double] = {
+    val weights = new Array[Double](nodeCount)
+    var total = 0.0
+    for (rank <- 0 until nodeCount) {
+      total += 1.0 / math.pow(rank + 1, skew)
+      weights(rank) = total
+    }
+    weights
+  }
+
+  def sample(): Int = {
+    val x = random.nextDouble() * cumulativeWeights(nodeCount - 1)
+    val i = java.util.Arrays.binarySearch(cumulativeWeights, x)
+    // binarySearch returns -(insertion point) - 1 if x isn't found
+    val rank = if (i >= 0) i else -i - 1
+    idsByRank(math.min(rank, nodeCount - 1))
+  }
 }
@@ -38,10 +38,16 @@ import co.teapot.mmalloc.{MemoryMappedAllocator, Offset}
   * call.  If syncAllWrites is set to false, write performance
   * will improve, but the graph may be in an inconsistent state if the OS crashes or the machine loses power.
   *
+  * Neighbor arrays replaced as nodes gain neighbors are freed a minute or two later, since
+  * concurrent readers may still be reading them.  If the graph has no concurrent readers (as when
+  * merging edges offline), set freeAllocationsImmediately so the space is reused right away.
+  *
   * The binary format is currently subject to change.
   */
 
-class MemMappedDynamicDirectedGraph(file: File, syncAllWrites: Boolean = false) extends DynamicDirectedGraph {
+class MemMappedDynamicDirectedGraph(file: File,
+                                    syncAllWrites: Boolean = false,
+                                    freeAllocationsImmediately: Boolean = false) extends DynamicDirectedGraph {
   private val initializeNewGraph = !file.exists() || file.length() == 0
   private val mmAllocator = new MemoryMappedAllocator(file)
   mmAllocator.syncAllWrites = syncAllWrites
@@ -50,8 +56,12 @@ class MemMappedDynamicDirectedGraph(file: File, syncAllWrites: Boolean = false)
   private val outGraphDataPointer = MemoryMappedAllocator.GlobalApplicationDataPointer + Offset(8L)
   private val inGraphDataPointer = MemoryMappedAllocator.GlobalApplicationDataPointer + Offset(16L)
 
-  private val outGraph = new MemMappedDynamicUnidirectionalGraph(mmAllocator, outGraphDataPointer, initializeNewGraph)
-  private val inGraph = new MemMappedDynamicUnidirectionalGraph(mmAllocator, inGraphDataPointer, initializeNewGraph)
+  private val msDelayFreeingAllocations =
+    if (freeAllocationsImmediately) 0L else MemMappedDynamicUnidirectionalGraph.DefaultMsDelayFreeingAllocations
+  private val outGraph = new MemMappedDynamicUnidirectionalGraph(mmAllocator, outGraphDataPointer,
+    initializeNewGraph, msDelayFreeingAllocations)
+  private val inGraph = new MemMappedDynamicUnidirectionalGraph(mmAllocator, inGraphDataPointer,
+    initializeNewGraph, msDelayFreeingAllocations)
 
   if (initializeNewGraph) {
     setEdgeCount(0L)
@@ -125,6 +135,18 @@ class MemMappedDynamicDirectedGraph(file: File, syncAllWrites: Boolean = false)
   def loadToRam(): Unit = {
     mmAllocator.data.loadFileToRam()
   }
+
+  /** Reads the underlying memory mapped file sequentially, so the OS pages it into RAM using
+    * read-ahead rather than on random reads.  Unlike loadToRam, the OS may evict pages later. */
+  def warm(): Unit = {
+    mmAllocator.data.touchAllPages()
+  }
+
+  /** The size of the underlying memory mapped file in bytes. */
+  def fileByteCount: Long = mmAllocator.data.mappedByteCount
+
+  /** The number of bytes of the underlying file in RAM (see LargeMappedByteBuffer.residentByteCount). */
+  def residentByteCount: Option[Long] = mmAllocator.data.residentByteCount()
 }
 
 object MemMappedDynamicDirectedGraph {
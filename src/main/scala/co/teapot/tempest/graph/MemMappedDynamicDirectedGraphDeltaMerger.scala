@@ -0,0 +1,102 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.graph
+
+import java.io.File
+
+import co.teapot.tempest.io.FileUtil
+import co.teapot.tempest.util.Util
+import net.openhft.koloboke.collect.map.hash.{HashIntIntMap, HashIntIntMaps}
+
+/** The merge method adds the edges in a text file of edges "<id1><whitespace><id2>" to an existing
+  * binary graph file (as written by MemMappedDynamicDirectedGraphConverter), in time proportional to
+  * the number of new edges rather than the size of the graph.  This is used by tempest_db.ingest to
+  * apply daily edge deltas.  The graph file must not be open in a running server while it is merged
+  * into.  For example:
+  * java -cp target/scala-2.11/tempest-assembly.jar \
+  * co.teapot.tempest.graph.MemMappedDynamicDirectedGraphDeltaMerger delta_edges.txt /data/binary_graphs/follows.dat
+  */
+object MemMappedDynamicDirectedGraphDeltaMerger {
+  // Nodes gaining at least this many neighbors have their neighbor arrays grown once, to the exact
+  // size needed, before the edges are added.  Smaller increases use the usual doubling growth.
+  val MinPresizedDegreeIncrease = 16
+
+  /** Adds the edges in the given file to the given graph file, syncs it to disk, and returns the
+    * number of edges added.  Duplicate edges are added as in MemMappedDynamicDirectedGraphConverter.
+    */
+  def merge(edgeListFile: File,
+            graphFile: File,
+            log: String => Unit = System.err.println): Long = {
+    if (!graphFile.exists()) {
+      throw new IllegalArgumentException(s"Graph file $graphFile doesn't exist; " +
+        "use MemMappedDynamicDirectedGraphConverter to create it")
+    }
+    // Nothing else reads the graph during the merge, so replaced neighbor arrays can be reused at
+    // once rather than growing the file with each merge.
+    val graph = new MemMappedDynamicDirectedGraph(graphFile, freeAllocationsImmediately = true)
+    val outDegreeIncreases = HashIntIntMaps.newMutableMap()
+    val inDegreeIncreases = HashIntIntMaps.newMutableMap()
+    var maxNodeId = -1
+
+    Util.logWithRunningTime(log, "first pass: counting new neighbors", printAtStart = true) {
+      FileUtil.forEachIntPair(edgeListFile, log, linesPerMessage = 1000000) { (id1, id2) =>
+        outDegreeIncreases.addValue(id1, 1)
+        inDegreeIncreases.addValue(id2, 1)
+        maxNodeId = math.max(maxNodeId, math.max(id1, id2))
+      }
+    }
+
+    Util.logWithRunningTime(log, "Growing neighbor arrays", printAtStart = true) {
+      if (maxNodeId >= 0)
+        graph.ensureValidId(maxNodeId)
+      presize(outDegreeIncreases, graph.outDegree, graph.setOutDegreeCapacity)
+      presize(inDegreeIncreases, graph.inDegree, graph.setInDegreeCapacity)
+    }
+
+    val oldEdgeCount = graph.edgeCount
+    Util.logWithRunningTime(log, "2nd pass: Adding edges", printAtStart = true) {
+      FileUtil.forEachIntPair(edgeListFile, log, linesPerMessage = 1000000) { (id1, id2) =>
+        graph.addEdge(id1, id2)
+      }
+    }
+
+    Util.logWithRunningTime(log, "Syncing graph to disk") {
+      graph.syncToDisk()
+    }
+
+    val addedEdgeCount = graph.edgeCount - oldEdgeCount
+    log(s"added $addedEdgeCount edges; the graph now has ${graph.edgeCount} edges")
+    addedEdgeCount
+  }
+
+  private def presize(degreeIncreases: HashIntIntMap,
+                      degree: Int => Int,
+                      setCapacity: (Int, Int) => Unit): Unit = {
+    val cursor = degreeIncreases.cursor()
+    while (cursor.moveNext()) {
+      if (cursor.value >= MinPresizedDegreeIncrease)
+        setCapacity(cursor.key, degree(cursor.key) + cursor.value)
+    }
+  }
+
+  def main(args: Array[String]): Unit = {
+    if (args.length != 2) {
+      System.err.println("Usage: MemMappedDynamicDirectedGraphDeltaMerger " +
+        "<edge list filename> <existing binary graph filename>")
+      System.exit(1)
+    }
+    merge(new File(args(0)), new File(args(1)))
+  }
+}
@@ -39,13 +39,14 @@ import it.unimi.dsi.fastutil.longs.LongArrayList
 class MemMappedDynamicUnidirectionalGraph(allocator: MemoryMappedAllocator,
                                           dataPointerPointer: Pointer,
                                           initializeNewGraph: Boolean,
-                                          msDelayFreeingAllocations: Long = 1000 * 60 /* TODO: Read from config file */) {
+                                          msDelayFreeingAllocations: Long = DefaultMsDelayFreeingAllocations) {
   val log = Logger.get
   private def data = allocator.data
 
   var allocationsToFree = new LongArrayList()
   var previousAllocationsToFree = new LongArrayList()
-  setupAllocationFreeingThread()
+  if (msDelayFreeingAllocations > 0)
+    setupAllocationFreeingThread()
 
   if (initializeNewGraph) {
     setDataPointer(allocator.alloc(NodeArrayOffset.toByteCount)) // Space for graph variables and 0 nodes
@@ -146,9 +147,11 @@ class MemMappedDynamicUnidirectionalGraph(allocator: MemoryMappedAllocator,
     val newPointer = allocator.alloc(ByteCount.forNodes(newNodeCapacity))
     if (oldPointer != NullPointer) {
       allocator.data.copy(newPointer, oldPointer, ByteCount.forNodes(degree(id)))
-      allocationsToFree.push(oldPointer.raw) // For concurrent readers, don't immediately free.
     }
     setNeighborsPointer(id, newPointer)
+    if (oldPointer != NullPointer) {
+      freeOldAllocation(oldPointer)
+    }
   }
 
   /** Increases maxNodeId to be at least id, and extends the node data array if needed to ensure
@@ -163,10 +166,11 @@ class MemMappedDynamicUnidirectionalGraph(allocator: MemoryMappedAllocator,
           val newByteCountForNodes = Offset.blocks(newCapacity, BytesPerNode).toByteCount
           val newPointer = allocator.alloc(newByteCountForNodes + NodeArrayOffset.toByteCount)
           val oldByteCountForNodes = Offset.blocks(nodeCapacity, BytesPerNode).toByteCount
-          allocator.data.copy(newPointer, dataPointer, oldByteCountForNodes + NodeArrayOffset.toByteCount)
-          allocationsToFree.push(dataPointer.raw) // For concurrent readers, don't immediately free.
+          val oldPointer = dataPointer
+          allocator.data.copy(newPointer, oldPointer, oldByteCountForNodes + NodeArrayOffset.toByteCount)
           setDataPointer(newPointer) // For concurrent readers, update dataPointer after copying data.
           setNodeCapacity(newCapacity)
+          freeOldAllocation(oldPointer)
           }
         val nodeArrayCapacity = Offset.blocks(maxNodeId+1, BytesPerNode)
         assert(allocator.allocationCapacity(dataPointer) >= (NodeArrayOffset + nodeArrayCapacity).toByteCount,
@@ -183,6 +187,14 @@ class MemMappedDynamicUnidirectionalGraph(allocator: MemoryMappedAllocator,
       }
     }
 
+  /** Frees an allocation which is no longer pointed to.  If msDelayFreeingAllocations is 0, it is
+    * freed immediately, which is only safe if there are no concurrent readers. */
+  private def freeOldAllocation(pointer: Pointer): Unit =
+    if (msDelayFreeingAllocations > 0)
+      allocationsToFree.push(pointer.raw) // For concurrent readers, don't immediately free.
+    else
+      allocator.free(pointer)
+
   /* Because there might be concurrent reading threads, we don't actually free the neighbor list of a
    * node until msDelayFreeingAllocations milliseconds after the node's neighbor pointer has been
     * updated to a new neighbor list. */
@@ -223,4 +235,6 @@ object MemMappedDynamicUnidirectionalGraph {
   val NodeNeighborOffset = Offset(4L)
 
   val NullPointer = Pointer(-1L) // Used for neighbor pointer of nodes with no neighbors
+
+  val DefaultMsDelayFreeingAllocations = 1000L * 60 // TODO: Read from config file
 }
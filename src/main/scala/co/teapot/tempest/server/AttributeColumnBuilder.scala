@@ -0,0 +1,99 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.server
+
+import java.nio.charset.StandardCharsets
+import java.nio.{ByteBuffer, ByteOrder}
+import java.sql.{ResultSet, Types}
+
+import co.teapot.tempest.{AttributeColumn, AttributeType, SQLException}
+
+/** Collects the values of one attribute of nodeCount nodes from SQL result rows, and encodes them
+  * as an AttributeColumn.  Values which are never set are null. */
+class AttributeColumnBuilder(name: String, sqlType: Int, nodeCount: Int) {
+  val attributeType: AttributeType = sqlType match {
+    case Types.INTEGER => AttributeType.INT
+    case Types.BIGINT => AttributeType.BIGINT
+    case Types.VARCHAR => AttributeType.STRING
+    case Types.BOOLEAN | Types.BIT => AttributeType.BOOLEAN
+    case unexpectedCode: Int => throw new SQLException(s"Unknown column type code $unexpectedCode from DB")
+  }
+
+  private val nullMask = Array.fill[Byte](nodeCount)(1)
+  private val ints = if (attributeType == AttributeType.INT) new Array[Int](nodeCount) else null
+  private val longs = if (attributeType == AttributeType.BIGINT) new Array[Long](nodeCount) else null
+  private val booleans = if (attributeType == AttributeType.BOOLEAN) new Array[Byte](nodeCount) else null
+  private val strings = if (attributeType == AttributeType.STRING) new Array[Array[Byte]](nodeCount) else null
+
+  /** Sets the value of the nodes at the given indexes to the given column of the current row. */
+  def set(resultSet: ResultSet, column: Int, indexes: Seq[Int]): Unit = {
+    attributeType match {
+      case AttributeType.INT =>
+        val value = resultSet.getInt(column)
+        for (i <- indexes) ints(i) = value
+      case AttributeType.BIGINT =>
+        val value = resultSet.getLong(column)
+        for (i <- indexes) longs(i) = value
+      case AttributeType.BOOLEAN =>
+        val value: Byte = if (resultSet.getBoolean(column)) 1 else 0
+        for (i <- indexes) booleans(i) = value
+      case AttributeType.STRING =>
+        val value = resultSet.getString(column)
+        if (value != null) {
+          val bytes = value.getBytes(StandardCharsets.UTF_8)
+          for (i <- indexes) strings(i) = bytes
+        }
+    }
+    if (!resultSet.wasNull) {
+      for (i <- indexes) nullMask(i) = 0
+    }
+  }
+
+  def build(): AttributeColumn = {
+    val column = new AttributeColumn(name, attributeType, null, ByteBuffer.wrap(nullMask))
+    attributeType match {
+      case AttributeType.INT =>
+        val values = littleEndianBuffer(4 * nodeCount)
+        values.asIntBuffer().put(ints)
+        column.setValues(values)
+      case AttributeType.BIGINT =>
+        val values = littleEndianBuffer(8 * nodeCount)
+        values.asLongBuffer().put(longs)
+        column.setValues(values)
+      case AttributeType.BOOLEAN =>
+        column.setValues(ByteBuffer.wrap(booleans))
+      case AttributeType.STRING =>
+        val offsets = littleEndianBuffer(4 * (nodeCount + 1))
+        var offset = 0
+        offsets.putInt(0)
+        for (bytes <- strings) {
+          if (bytes != null)
+            offset += bytes.length
+          offsets.putInt(offset)
+        }
+        offsets.flip()
+        val values = ByteBuffer.allocate(offset)
+        for (bytes <- strings if bytes != null)
+          values.put(bytes)
+        values.flip()
+        column.setValues(values)
+        column.setOffsets(offsets)
+    }
+    column
+  }
+
+  private def littleEndianBuffer(size: Int): ByteBuffer =
+    ByteBuffer.allocate(size).order(ByteOrder.LITTLE_ENDIAN)
+}
@@ -0,0 +1,218 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.server
+
+import java.util.regex.Pattern
+
+import scala.collection.mutable.ArrayBuffer
+
+/** Compiles simple SQL filter clauses into predicates on tempest ids which read in-memory
+  * attribute columns.  The supported clauses are comparisons of an attribute with a literal
+  * (integers with =, <>, !=, <, <=, > and >=; strings and TRUE or FALSE with =, <> and !=),
+  * "attribute IS [NOT] NULL", "attribute IS [NOT] TRUE/FALSE", and boolean attributes on their own,
+  * combined with AND, OR, NOT and parentheses.  Nulls follow SQL's three-valued logic, so a node
+  * matches exactly when Postgres would return it.  For example
+  * "login_count > 2 AND NOT (premium_subscriber OR name IS NULL)".
+  */
+object AttributeFilter {
+  // The three truth values of SQL
+  private val False: Byte = 0
+  private val True: Byte = 1
+  private val Unknown: Byte = 2
+
+  private type Clause = Int => Byte
+
+  private class UnsupportedClauseException extends Exception
+
+  private val TokenPattern = Pattern.compile(
+    """\s*(?:('(?:[^']|'')*')|(-?\d+)|([A-Za-z_][A-Za-z0-9_]*)|(<=|>=|<>|!=|=|<|>|\(|\)))""")
+
+  private sealed trait Token
+  private case class StringToken(value: String) extends Token
+  private case class IntegerToken(value: Long) extends Token
+  private case class WordToken(word: String) extends Token // An identifier or keyword, lower-cased
+  private case class SymbolToken(symbol: String) extends Token
+
+  /** Returns a predicate which is true for the tempest ids of nodes satisfying the given clause,
+    * or None if the clause isn't supported or uses attributes which aren't in memory.  columns
+    * returns the in-memory column of a (lower-case) attribute name, if there is one. */
+  def compile(sqlClause: String, columns: String => Option[InMemoryAttributeColumn]): Option[Int => Boolean] =
+    try {
+      val parser = new Parser(tokenize(sqlClause), columns)
+      val clause = parser.parseClause()
+      if (!parser.atEnd)
+        throw new UnsupportedClauseException
+      Some(tempestId => clause(tempestId) == True)
+    } catch {
+      case e: UnsupportedClauseException => None
+      case e: NumberFormatException => None // Integer literals outside the range of bigint
+    }
+
+  private def tokenize(sqlClause: String): IndexedSeq[Token] = {
+    val tokens = new ArrayBuffer[Token]()
+    val matcher = TokenPattern.matcher(sqlClause)
+    var position = 0
+    while (position < sqlClause.length && sqlClause.substring(position).trim.nonEmpty) {
+      if (!matcher.find(position) || matcher.start != position)
+        throw new UnsupportedClauseException
+      tokens += (
+        if (matcher.group(1) != null) StringToken(matcher.group(1).drop(1).dropRight(1).replace("''", "'"))
+        else if (matcher.group(2) != null) IntegerToken(matcher.group(2).toLong)
+        else if (matcher.group(3) != null) WordToken(matcher.group(3).toLowerCase)
+        else SymbolToken(matcher.group(4)))
+      position = matcher.end
+    }
+    tokens
+  }
+
+  private def and(a: Byte, b: Byte): Byte =
+    if (a == False || b == False) False else if (a == Unknown || b == Unknown) Unknown else True
+
+  private def or(a: Byte, b: Byte): Byte =
+    if (a == True || b == True) True else if (a == Unknown || b == Unknown) Unknown else False
+
+  private def not(a: Byte): Byte =
+    if (a == Unknown) Unknown else if (a == True) False else True
+
+  private def truth(b: Boolean): Byte = if (b) True else False
+
+  private val Keywords = Set("and", "or", "not", "is", "null", "true", "false")
+
+  private class Parser(tokens: IndexedSeq[Token], columns: String => Option[InMemoryAttributeColumn]) {
+    private var i = 0
+
+    def atEnd: Boolean = i == tokens.size
+
+    private def peek: Option[Token] = if (atEnd) None else Some(tokens(i))
+
+    private def next(): Token = {
+      if (atEnd)
+        throw new UnsupportedClauseException
+      i += 1
+      tokens(i - 1)
+    }
+
+    private def acceptWord(word: String): Boolean =
+      if (peek == Some(WordToken(word))) {
+        i += 1
+        true
+      } else {
+        false
+      }
+
+    private def expect(token: Token): Unit =
+      if (next() != token)
+        throw new UnsupportedClauseException
+
+    def parseClause(): Clause = {
+      var clause = parseConjunction()
+      while (acceptWord("or")) {
+        val (left, right) = (clause, parseConjunction())
+        clause = id => or(left(id), right(id))
+      }
+      clause
+    }
+
+    private def parseConjunction(): Clause = {
+      var clause = parseNegation()
+      while (acceptWord("and")) {
+        val (left, right) = (clause, parseNegation())
+        clause = id => and(left(id), right(id))
+      }
+      clause
+    }
+
+    private def parseNegation(): Clause =
+      if (acceptWord("not")) {
+        val negated = parseNegation()
+        id => not(negated(id))
+      } else {
+        parsePrimary()
+      }
+
+    private def parsePrimary(): Clause = next() match {
+      case SymbolToken("(") =>
+        val clause = parseClause()
+        expect(SymbolToken(")"))
+        clause
+      case WordToken(name) if !Keywords.contains(name) =>
+        val column = columns(name).getOrElse(throw new UnsupportedClauseException)
+        if (acceptWord("is"))
+          parseIs(column)
+        else
+          peek match {
+            case Some(SymbolToken(op)) if op != "(" && op != ")" =>
+              i += 1
+              parseComparison(column, op, next())
+            case _ => column match {
+              case booleanColumn: BooleanAttributeColumn =>
+                id => if (booleanColumn.isNull(id)) Unknown else truth(booleanColumn.booleanValue(id))
+              case _ => throw new UnsupportedClauseException
+            }
+          }
+      case _ => throw new UnsupportedClauseException
+    }
+
+    /** Parses the rest of "attribute IS [NOT] NULL/TRUE/FALSE", which is never unknown. */
+    private def parseIs(column: InMemoryAttributeColumn): Clause = {
+      val negated = acceptWord("not")
+      val test: Int => Boolean = next() match {
+        case WordToken("null") => column.isNull
+        case WordToken(value @ ("true" | "false")) => column match {
+          case booleanColumn: BooleanAttributeColumn =>
+            val expected = value == "true"
+            id => !booleanColumn.isNull(id) && booleanColumn.booleanValue(id) == expected
+          case _ => throw new UnsupportedClauseException
+        }
+        case _ => throw new UnsupportedClauseException
+      }
+      id => truth(test(id) != negated)
+    }
+
+    private def parseComparison(column: InMemoryAttributeColumn, op: String, literal: Token): Clause =
+      (column, literal) match {
+        case (numericColumn: NumericAttributeColumn, IntegerToken(value)) =>
+          val compare = comparison(op)
+          id => if (numericColumn.isNull(id)) Unknown else truth(compare(java.lang.Long.compare(numericColumn.longValue(id), value)))
+        case (stringColumn: StringAttributeColumn, StringToken(value)) =>
+          val equal = equality(op)
+          id => if (stringColumn.isNull(id)) Unknown else truth(stringColumn.stringValue(id).equals(value) == equal)
+        case (booleanColumn: BooleanAttributeColumn, WordToken(word @ ("true" | "false"))) =>
+          val equal = equality(op)
+          val value = word == "true"
+          id => if (booleanColumn.isNull(id)) Unknown else truth((booleanColumn.booleanValue(id) == value) == equal)
+        case _ => throw new UnsupportedClauseException
+      }
+
+    /** Returns whether the given operator is = (true) or <> (false). */
+    private def equality(op: String): Boolean = op match {
+      case "=" => true
+      case "<>" | "!=" => false
+      // String ordering depends on the database's collation, so only equality is evaluated in memory
+      case _ => throw new UnsupportedClauseException
+    }
+
+    /** Returns whether a comparison result (negative, zero or positive) satisfies the given operator. */
+    private def comparison(op: String): Int => Boolean = op match {
+      case "=" => _ == 0
+      case "<>" | "!=" => _ != 0
+      case "<" => _ < 0
+      case "<=" => _ <= 0
+      case ">" => _ > 0
+      case ">=" => _ >= 0
+      case _ => throw new UnsupportedClauseException
+    }
+  }
+}
@@ -0,0 +1,158 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.server
+
+import java.util
+import java.util.concurrent.locks.ReentrantReadWriteLock
+
+import co.teapot.tempest.AttributeType
+
+import scala.collection.mutable
+
+/** The values of one attribute of the nodes of one type, indexed by tempest id.  Nodes whose value
+  * was never set are null. */
+sealed abstract class InMemoryAttributeColumn(val attributeType: AttributeType) {
+  private val nonNull = new util.BitSet()
+
+  def isNull(tempestId: Int): Boolean = tempestId < 0 || !nonNull.get(tempestId)
+
+  /** Sets the value of the given node to the given value (an Integer, Long, Boolean or String, as
+    * returned by JDBC), or to null. */
+  def set(tempestId: Int, value: Any): Unit = {
+    if (value == null) {
+      nonNull.clear(tempestId)
+    } else {
+      setValue(tempestId, value)
+      nonNull.set(tempestId)
+    }
+  }
+
+  protected def setValue(tempestId: Int, value: Any): Unit
+
+  protected def grownCapacity(capacity: Int, tempestId: Int): Int =
+    math.max(tempestId + 1, math.min(Int.MaxValue.toLong, 2L * capacity).toInt)
+}
+
+/** An int or bigint column. */
+sealed abstract class NumericAttributeColumn(attributeType: AttributeType)
+  extends InMemoryAttributeColumn(attributeType) {
+  /** The value of the given node, which must not be null. */
+  def longValue(tempestId: Int): Long
+}
+
+class IntAttributeColumn extends NumericAttributeColumn(AttributeType.INT) {
+  private var values = new Array[Int](1024)
+
+  def longValue(tempestId: Int): Long = values(tempestId)
+
+  protected def setValue(tempestId: Int, value: Any): Unit = {
+    if (tempestId >= values.length)
+      values = util.Arrays.copyOf(values, grownCapacity(values.length, tempestId))
+    values(tempestId) = value.asInstanceOf[Number].intValue
+  }
+}
+
+class BigintAttributeColumn extends NumericAttributeColumn(AttributeType.BIGINT) {
+  private var values = new Array[Long](1024)
+
+  def longValue(tempestId: Int): Long = values(tempestId)
+
+  protected def setValue(tempestId: Int, value: Any): Unit = {
+    if (tempestId >= values.length)
+      values = util.Arrays.copyOf(values, grownCapacity(values.length, tempestId))
+    values(tempestId) = value.asInstanceOf[Number].longValue
+  }
+}
+
+class BooleanAttributeColumn extends InMemoryAttributeColumn(AttributeType.BOOLEAN) {
+  private val values = new util.BitSet()
+
+  def booleanValue(tempestId: Int): Boolean = values.get(tempestId)
+
+  protected def setValue(tempestId: Int, value: Any): Unit =
+    values.set(tempestId, value.asInstanceOf[java.lang.Boolean].booleanValue)
+}
+
+class StringAttributeColumn extends InMemoryAttributeColumn(AttributeType.STRING) {
+  private var values = new Array[String](1024)
+
+  def stringValue(tempestId: Int): String = values(tempestId)
+
+  protected def setValue(tempestId: Int, value: Any): Unit = {
+    if (tempestId >= values.length)
+      values = util.Arrays.copyOf(values, grownCapacity(values.length, tempestId))
+    values(tempestId) = value.toString
+  }
+}
+
+/** Holds selected node attributes in memory as columns indexed by tempest id, so filter clauses on
+  * them can be evaluated without querying the database.  Filters may run concurrently with each
+  * other; updates wait for running filters to finish.
+  *
+  * The columns are only updated by the server's own writes (node additions and attribute updates),
+  * so changes made directly in the database, such as reloading a node table, need a restart.
+  */
+class InMemoryAttributeIndex {
+  private val columns = new mutable.HashMap[(String, String), InMemoryAttributeColumn]()
+  private val lock = new ReentrantReadWriteLock()
+
+  private def withReadLock[A](body: => A): A = {
+    lock.readLock.lock()
+    try body finally lock.readLock.unlock()
+  }
+
+  private def withWriteLock[A](body: => A): A = {
+    lock.writeLock.lock()
+    try body finally lock.writeLock.unlock()
+  }
+
+  /** Adds an empty column for the given attribute, whose type is a node type config type ("int",
+    * "bigint", "boolean" or "string"). */
+  def addColumn(nodeType: String, attributeName: String, typeName: String): Unit = {
+    val column = typeName match {
+      case "int" => new IntAttributeColumn
+      case "bigint" => new BigintAttributeColumn
+      case "boolean" => new BooleanAttributeColumn
+      case "string" => new StringAttributeColumn
+      case _ => throw new IllegalArgumentException(s"Unsupported attribute type $typeName")
+    }
+    withWriteLock {
+      columns((nodeType, attributeName.toLowerCase)) = column
+    }
+  }
+
+  def contains(nodeType: String, attributeName: String): Boolean = withReadLock {
+    columns.contains((nodeType, attributeName.toLowerCase))
+  }
+
+  /** The names of the in-memory attributes of the given node type. */
+  def attributeNames(nodeType: String): Seq[String] = withReadLock {
+    (columns.keys collect { case (`nodeType`, attributeName) => attributeName }).toSeq
+  }
+
+  /** Sets the given attribute of each given (tempest id, value) pair; see InMemoryAttributeColumn.set. */
+  def setValues(nodeType: String, attributeName: String, values: Iterable[(Int, Any)]): Unit = withWriteLock {
+    val column = columns((nodeType, attributeName.toLowerCase))
+    for ((tempestId, value) <- values)
+      column.set(tempestId, value)
+  }
+
+  /** Returns the given tempest ids of nodes of the given type which satisfy the given SQL clause,
+    * or None if the clause can't be evaluated in memory (see AttributeFilter). */
+  def filter(nodeType: String, sqlClause: String, tempestIds: Seq[Int]): Option[Seq[Int]] = withReadLock {
+    val matches = AttributeFilter.compile(sqlClause, attributeName => columns.get((nodeType, attributeName)))
+    matches map { tempestIds filter _ }
+  }
+}
@@ -9,6 +9,8 @@ import scala.collection.mutable.ArrayBuffer
 class NodeTypeConfig {
   @BeanProperty var csvFile: String = null
   @BeanProperty var nodeAttributes: util.List[util.Map[String, String]] = null
+  // The attributes indexed in Postgres (by default, all of them)
+  @BeanProperty var indexedAttributes: util.List[String] = null
 
   def attributeTypePairs: Seq[(String, String)] = {
     val result = new ArrayBuffer[(String, String)]()
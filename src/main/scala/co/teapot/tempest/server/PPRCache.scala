@@ -0,0 +1,126 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.server
+
+import java.util
+
+import co.teapot.tempest.{CacheStats, Node => ThriftNode}
+
+import scala.collection.mutable
+
+/** A cache of PPR results, holding entries whose estimated sizes total at most maxSizeBytes and
+  * evicting the least recently used entries first.  Each entry records the edge types it was
+  * computed on; invalidate(edgeType) removes every entry using that edge type, and results computed
+  * while edges were being added are never cached.  Keys must have value equality (thrift structs,
+  * case classes and collections of them do).  A maxSizeBytes of 0 disables caching.
+  */
+class PPRCache(val maxSizeBytes: Long, clock: () => Long = () => System.currentTimeMillis) {
+  private case class Entry(value: Any, edgeTypes: Seq[String], sizeBytes: Long, createdMillis: Long)
+
+  // Iterates from least to most recently used
+  private val entries = new util.LinkedHashMap[AnyRef, Entry](16, 0.75f, true)
+  private val edgeTypeVersions = new mutable.HashMap[String, Long]()
+  private var sizeBytes = 0L
+  private var hits = 0L
+  private var misses = 0L
+  private var evictions = 0L
+  private var invalidations = 0L
+
+  /** Returns the cached value for the given key if it is at most maxStalenessMillis old (if
+    * given), and otherwise computes, caches and returns it.  If useCache is false, the cache is
+    * neither read nor written, and computed values for which isCacheable is false aren't cached.
+    */
+  def getOrCompute[V](key: AnyRef, edgeTypes: Seq[String], useCache: Boolean = true,
+                      maxStalenessMillis: Option[Long] = None, isCacheable: V => Boolean = (_: Any) => true)
+                     (estimateSizeBytes: V => Long)(compute: => V): V = {
+    if (!useCache || maxSizeBytes <= 0)
+      return compute
+    val versions = synchronized {
+      val entry = entries.get(key)
+      if (entry != null && maxStalenessMillis.forall(clock() - entry.createdMillis <= _)) {
+        hits += 1
+        return entry.value.asInstanceOf[V]
+      }
+      misses += 1
+      edgeTypes map version
+    }
+    val value = compute
+    if (isCacheable(value))
+      put(key, edgeTypes, versions, value, estimateSizeBytes(value))
+    value
+  }
+
+  private def put(key: AnyRef, edgeTypes: Seq[String], versions: Seq[Long], value: Any,
+                  entrySizeBytes: Long): Unit = synchronized {
+    // If edges were added during the computation, the value may not reflect them.
+    if ((edgeTypes map version) != versions || entrySizeBytes > maxSizeBytes)
+      return
+    remove(key)
+    entries.put(key, Entry(value, edgeTypes, entrySizeBytes, clock()))
+    sizeBytes += entrySizeBytes
+    val iterator = entries.values.iterator
+    while (sizeBytes > maxSizeBytes) {
+      sizeBytes -= iterator.next().sizeBytes
+      iterator.remove()
+      evictions += 1
+    }
+  }
+
+  private def remove(key: AnyRef): Unit = {
+    val entry = entries.remove(key)
+    if (entry != null)
+      sizeBytes -= entry.sizeBytes
+  }
+
+  private def version(edgeType: String): Long = edgeTypeVersions.getOrElse(edgeType, 0L)
+
+  /** Removes all entries computed on the given edge type.  Call this after changing its graph. */
+  def invalidate(edgeType: String): Unit = synchronized {
+    edgeTypeVersions(edgeType) = version(edgeType) + 1
+    val iterator = entries.values.iterator
+    while (iterator.hasNext) {
+      val entry = iterator.next()
+      if (entry.edgeTypes.contains(edgeType)) {
+        sizeBytes -= entry.sizeBytes
+        iterator.remove()
+        invalidations += 1
+      }
+    }
+  }
+
+  def stats: CacheStats = synchronized {
+    val lookups = hits + misses
+    new CacheStats(hits, misses, evictions, invalidations, entries.size, sizeBytes, maxSizeBytes,
+      if (lookups == 0) 0.0 else hits.toDouble / lookups)
+  }
+}
+
+object PPRCache {
+  /** A rough estimate of the heap size of a thrift Node. */
+  def nodeSizeBytes(nodeType: String, id: String): Long =
+    24L + (40L + 2 * nodeType.length) + (40L + 2 * id.length)
+
+  /** A rough estimate of the heap size of a map from thrift Node to boxed double, as returned by
+    * pprUndirected. */
+  def nodeMapSizeBytes(map: util.Map[ThriftNode, java.lang.Double]): Long = {
+    var result = 64L
+    val iterator = map.keySet.iterator
+    while (iterator.hasNext) {
+      val node = iterator.next()
+      result += 64L + nodeSizeBytes(node.`type`, node.id)
+    }
+    result
+  }
+}
@@ -0,0 +1,146 @@
+/*
+ * Copyright 2016 Teapot, Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+ * file except in compliance with the License. You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software distributed
+ * under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+ * CONDITIONS OF ANY KIND, either express or implied. See the License for the
+ * specific language governing permissions and limitations under the License.
+ */
+
+package co.teapot.tempest.server
+
+import java.io.{File, PrintWriter}
+import java.nio.file.Files
+
+import co.teapot.tempest.TempestDBService
+import co.teapot.tempest.graph.{GraphGenerator, MemMappedDynamicDirectedGraphConverter}
+import co.teapot.tempest.util.{ConfigLoader, LogUtil, Util}
+import co.teapot.thriftbase.TeapotThriftLauncher
+import com.twitter.app.Flags
+import org.apache.thrift.TProcessor
+
+import scala.util.Random
+
+/** Launches a server on a synthetic "follows" graph between "user" nodes, for benchmarks (see
+  * tempest_db.bench).  Users have tempest ids 1 to nodeCount, ids "user<tempest id>" and the same
+  * attributes as the test database (name, login_count, premium_subscriber), stored in an in-memory
+  * H2 database.  The graph is generated by GraphGenerator.foreachSkewedRandomEdge, and is the same
+  * for the same flags.  For example:
+  * java -cp target/scala-2.11/tempest-assembly.jar co.teapot.tempest.server.TempestDBBenchmarkServer \
+  *   -nodeCount 100000 -averageDegree 20 -skew 0.8 -port 10021
+  */
+object TempestDBBenchmarkServer {
+  val NodeType = "user"
+  val EdgeType = "follows"
+  val InsertBatchSize = 10000
+
+  def writeGraph(graphFile: File, nodeCount: Int, averageDegree: Double, skew: Double, seed: Long,
+                 log: String => Unit): Unit = {
+    val edgeListFile = File.createTempFile("benchmark_edges", ".txt")
+    edgeListFile.deleteOnExit()
+    Util.logWithRunningTime(log, "generating edges", printAtStart = true) {
+      val writer = new PrintWriter(edgeListFile)
+      GraphGenerator.foreachSkewedRandomEdge(nodeCount, (nodeCount * averageDegree).toLong, skew, seed) {
+        (u, v) => writer.println(s"$u $v")
+      }
+      writer.close()
+    }
+    MemMappedDynamicDirectedGraphConverter.convert(edgeListFile, graphFile, log)
+    edgeListFile.delete()
+  }
+
+  def writeConfigs(directory: File): File = {
+    def write(fileName: String, contents: String): File = {
+      val file = new File(directory, fileName)
+      val writer = new PrintWriter(file)
+      writer.print(contents)
+      writer.close()
+      file
+    }
+    write(s"$NodeType.yaml",
+      """nodeAttributes:
+        |  - name: string
+        |  - id: string
+        |  - login_count: int
+        |  - premium_subscriber: boolean
+        |""".stripMargin)
+    write(s"$EdgeType.yaml",
+      s"""sourceNodeType: $NodeType
+        |targetNodeType: $NodeType
+        |""".stripMargin)
+    write("tempest.yaml",
+      s"""graphDirectory: "${directory.getAbsolutePath}/"
+        |graphConfigDirectory: "${directory.getAbsolutePath}/"
+        |""".stripMargin)
+  }
+
+  /** Creates the user_nodes table with users 1 to nodeCount. */
+  def createNodes(databaseClient: TempestSQLDatabaseClient, nodeCount: Int, seed: Long): Unit = {
+    val random = new Random(seed)
+    val connection = databaseClient.connectionSource.getConnection
+    try {
+      connection.createStatement().execute(
+        s"""DROP TABLE IF EXISTS ${NodeType}_nodes;
+           |CREATE TABLE ${NodeType}_nodes (
+           |    tempest_id SERIAL PRIMARY KEY,
+           |    name varchar,
+           |    id varchar UNIQUE NOT NULL,
+           |    login_count int,
+           |    premium_subscriber boolean
+           |);""".stripMargin)
+      val statement = connection.prepareStatement(
+        s"INSERT INTO ${NodeType}_nodes (name, id, login_count, premium_subscriber) VALUES (?, ?, ?, ?)")
+      for (tempestId <- 1 to nodeCount) {
+        statement.setString(1, s"User $tempestId")
+        statement.setString(2, s"user$tempestId")
+        statement.setInt(3, random.nextInt(100))
+        statement.setBoolean(4, random.nextDouble() < 0.1)
+        statement.addBatch()
+        if (tempestId % InsertBatchSize == 0 || tempestId == nodeCount)
+          statement.executeBatch()
+      }
+    } finally {
+      connection.close()
+    }
+  }
+
+  def main(args: Array[String]): Unit = {
+    LogUtil.configureLog4j()
+    val flags = new Flags("Tempest benchmark server")
+    val nodeCountFlag = flags[Int]("nodeCount", 100000, "number of user nodes")
+    val averageDegreeFlag = flags[Double]("averageDegree", 20.0, "average out-degree")
+    val skewFlag = flags[Double]("skew", 0.8, "Zipf exponent of node popularity (0 for uniform)")
+    val seedFlag = flags[Long]("seed", 1L, "random seed of the graph and attributes")
+    val portFlag = flags[Int]("port", 10021, "port to listen on")
+    val directoryFlag = flags[String]("directory", "",
+      "directory for the graph and config files (by default, a new temporary directory)")
+    flags.parse(args)
+
+    val directory =
+      if (directoryFlag().isEmpty) Files.createTempDirectory("tempest_benchmark").toFile
+      else new File(directoryFlag())
+    directory.mkdirs()
+    val log = (message: String) => System.err.println(message)
+    val graphFile = new File(directory, s"$EdgeType.dat")
+    graphFile.delete()
+    writeGraph(graphFile, nodeCountFlag(), averageDegreeFlag(), skewFlag(), seedFlag(), log)
+    val configFile = writeConfigs(directory)
+
+    val databaseClient = new TempestSQLDatabaseClient(new H2DatabaseConfig)
+    Util.logWithRunningTime(log, "creating nodes", printAtStart = true) {
+      createNodes(databaseClient, nodeCountFlag(), seedFlag())
+    }
+    def getProcessor(configFileName: String): TProcessor = {
+      val config = ConfigLoader.loadConfig[TempestDBServerConfig](configFileName)
+      new TempestDBService.Processor(new TempestDBServer(databaseClient, config))
+    }
+    new TeapotThriftLauncher().launch(
+      Array("-conf", configFile.getPath, "-port", portFlag().toString), getProcessor, configFile.getPath,
+      (configFileName: String) => ConfigLoader.loadConfig[TempestDBServerConfig](configFileName))
+  }
+}
@@ -15,46 +15,148 @@
 package co.teapot.tempest.server
 
 import java.io.File
+import java.nio.ByteBuffer
 import java.{lang, util}
+import java.util.concurrent.{Executors, ThreadFactory}
+import java.util.concurrent.atomic.AtomicInteger
 
 import co.teapot.tempest.{Node => ThriftNode, _}
-import co.teapot.tempest.algorithm.MonteCarloPPRTyped
+import co.teapot.tempest.algorithm.{AnytimeEstimate, MonteCarloPPRTyped}
 import co.teapot.tempest.graph._
 import co.teapot.tempest.typedgraph.{BipartiteTypedGraph, Node, TypedGraphUnion}
 import co.teapot.tempest.util.{CollectionUtil, ConfigLoader, LogUtil}
 import co.teapot.thriftbase.TeapotThriftLauncher
+import com.twitter.logging.Logger
+import net.openhft.koloboke.collect.set.hash.HashIntSets
 import org.apache.thrift.TProcessor
 import soal.ppr.BidirectionalPPREstimator
 import soal.util.UniformDistribution
 
 import scala.collection.JavaConverters._
 import scala.collection.mutable
+import scala.concurrent.ExecutionContext
+import scala.concurrent.duration._
 import scala.util.Random
 
 /** Given a graph, this thrift server responds to requests about that graph. */
 class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBServerConfig)
   extends TempestDBService.Iface {
 
-  // Load Graphs
-  val graphMap = new mutable.HashMap[String, DynamicDirectedGraph]()
+  // Load Graphs.  graphMap is used by thrift handler threads and the warmup thread, so every access
+  // holds its lock (which also ensures each graph file is opened once).
+  private val graphMap = new mutable.HashMap[String, MemMappedDynamicDirectedGraph]()
 
-  def graph(edgeType: String): DynamicDirectedGraph = {
-    if (!graphMap.contains(edgeType)) {
+  def graph(edgeType: String): MemMappedDynamicDirectedGraph = graphMap.synchronized {
+    graphMap.getOrElseUpdate(edgeType, {
       val graphFile = new File(config.graphDirectory, s"$edgeType.dat")
       if (graphFile.exists) {
-        val graph = new MemMappedDynamicDirectedGraph(
+        new MemMappedDynamicDirectedGraph(
           graphFile,
           syncAllWrites = false /* Graph persistence is handled by database.*/) {
           // If we add a node, it won't exist in the graph until we add edges to it,
           // so assume nodes that don't exist in the graph have no neighbors.
           override def defaultNeighbors(id: Int): IndexedSeq[Int] = IndexedSeq.empty
         }
-        graphMap(edgeType) = graph
       } else {
         throw new InvalidArgumentException(s"Invalid edge type $edgeType")
       }
+    })
+  }
+
+  val pprCache = new PPRCache(config.pprCacheSizeMegabytes.toLong * 1024 * 1024)
+
+  val log = Logger.get
+
+  // Reads graphs into RAM in the background, one at a time so each file is read sequentially
+  private val warmupExecutor = Executors.newSingleThreadExecutor(daemonThreadFactory("graph-warmup"))
+
+  // Runs the reverse pushes of pprMultiTarget requests, which share one thread per processor
+  // rather than each starting its own threads
+  private val pprThreadCount = Runtime.getRuntime.availableProcessors
+  private val pprExecutionContext = ExecutionContext.fromExecutorService(
+    Executors.newFixedThreadPool(pprThreadCount, daemonThreadFactory("ppr-multi-target")))
+
+  private def daemonThreadFactory(name: String): ThreadFactory = new ThreadFactory {
+    private val threadCount = new AtomicInteger(0)
+    override def newThread(runnable: Runnable): Thread = {
+      val thread = new Thread(runnable, s"$name-${threadCount.incrementAndGet()}")
+      thread.setDaemon(true) // Don't keep the server running
+      thread
+    }
+  }
+  // The number of queued or running warmups of each edge type
+  private val pendingWarmupCounts = new mutable.HashMap[String, Int]()
+  private val pinnedEdgeTypes = new mutable.HashSet[String]()
+  warmGraphs(config.warmupEdgeTypes.asScala, pin = false)
+  warmGraphs(config.pinnedEdgeTypes.asScala, pin = true)
+
+  /** Queues reading the graphs of the given edge types into RAM, then locking them there if pin is
+    * true.  Throws InvalidArgumentException (before queuing any) if an edge type doesn't exist. */
+  def warmGraphs(edgeTypes: Seq[String], pin: Boolean): Unit = {
+    val graphs = edgeTypes map { edgeType => (edgeType, graph(edgeType)) }
+    for ((edgeType, edgeTypeGraph) <- graphs) {
+      pendingWarmupCounts.synchronized {
+        pendingWarmupCounts(edgeType) = pendingWarmupCounts.getOrElse(edgeType, 0) + 1
+      }
+      warmupExecutor.execute(new Runnable {
+        override def run(): Unit = try {
+          val startTime = System.nanoTime
+          edgeTypeGraph.warm()
+          if (pin) {
+            edgeTypeGraph.loadToRam()
+            pinnedEdgeTypes.synchronized { pinnedEdgeTypes += edgeType }
+          }
+          log.info(f"Warmed $edgeType graph (${edgeTypeGraph.fileByteCount}%d bytes) in " +
+            f"${(System.nanoTime - startTime) / 1.0e9}%.1f seconds")
+        } catch {
+          case e: Exception => log.error(e, s"Failed to warm $edgeType graph")
+        } finally {
+          pendingWarmupCounts.synchronized {
+            val remainingCount = pendingWarmupCounts(edgeType) - 1
+            if (remainingCount == 0)
+              pendingWarmupCounts.remove(edgeType)
+            else
+              pendingWarmupCounts(edgeType) = remainingCount
+          }
+        }
+      })
+    }
+  }
+
+  val attributeIndex = new InMemoryAttributeIndex()
+  loadInMemoryAttributes()
+
+  /** Loads the attributes listed in the inMemoryAttributes config into attributeIndex. */
+  def loadInMemoryAttributes(): Unit = {
+    for ((nodeType, attributeNames) <- config.inMemoryAttributes.asScala;
+         attributeName <- attributeNames.asScala) {
+      val attributeTypes = loadNodeConfig(nodeType).attributeTypePairs.toMap
+      val typeName = attributeTypes.getOrElse(attributeName,
+        throw new IllegalArgumentException(s"Node type $nodeType does not have an attribute named $attributeName"))
+      attributeIndex.addColumn(nodeType, attributeName, typeName)
+      val values = new mutable.ArrayBuffer[(Int, Any)]()
+      databaseClient.forEachNodeAttributeValue(nodeType, attributeName) { (tempestId, value) =>
+        values += ((tempestId, value))
+        if (values.size == TempestServerConstants.InMemoryAttributeLoadBatchSize) {
+          attributeIndex.setValues(nodeType, attributeName, values)
+          values.clear()
+        }
+      }
+      attributeIndex.setValues(nodeType, attributeName, values)
+    }
+  }
+
+  /** Reloads the given in-memory attributes of the nodes of the given type with the given ids from
+    * the database. */
+  def refreshInMemoryAttributes(nodeType: String, nodeIds: Seq[String], attributeNames: Seq[String]): Unit = {
+    for (attributeName <- attributeNames;
+         ids <- nodeIds.distinct.grouped(TempestServerConstants.MaxTempestIdQuerySize)) {
+      val values = new mutable.ArrayBuffer[(Int, Any)]()
+      databaseClient.forEachNodeAttributeValue(nodeType, attributeName, Some(ids)) { (tempestId, value) =>
+        values += ((tempestId, value))
+      }
+      attributeIndex.setValues(nodeType, attributeName, values)
     }
-    graphMap(edgeType)
   }
 
   def loadNodeConfig(nodeType: String): NodeTypeConfig = {
@@ -118,6 +220,60 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
   override def inNeighbors(edgeType: String, thriftNode: ThriftNode): util.List[ThriftNode] =
     neighbors(edgeType, thriftNode, EdgeDirIn)
 
+  def multiDegree(edgeType: String, thriftNodesJava: util.List[ThriftNode], direction: EdgeDir): util.List[Integer] = {
+    val thriftNodes = thriftNodesJava.asScala
+    val thriftNodeToNode = databaseClient.thriftNodeToNodeMap(thriftNodes)
+    val degrees = thriftNodes map { thriftNode =>
+      new Integer(graph(edgeType).degree(thriftNodeToNode(thriftNode).tempestId, direction))
+    }
+    degrees.asJava
+  }
+
+  override def multiOutDegree(edgeType: String, nodes: util.List[ThriftNode]): util.List[Integer] =
+    multiDegree(edgeType, nodes, EdgeDirOut)
+
+  override def multiInDegree(edgeType: String, nodes: util.List[ThriftNode]): util.List[Integer] =
+    multiDegree(edgeType, nodes, EdgeDirIn)
+
+  /** Returns the neighbors of each of the given nodes, using one query to convert all the given
+    * nodes to tempest ids and one query to convert all their neighbors back to ThriftNodes. */
+  def multiNeighbors(edgeType: String,
+                     thriftNodesJava: util.List[ThriftNode],
+                     direction: EdgeDir): util.List[util.List[ThriftNode]] = {
+    val thriftNodes = thriftNodesJava.asScala
+    val thriftNodeToNode = databaseClient.thriftNodeToNodeMap(thriftNodes)
+    val resultType = edgeEndpointType(edgeType, direction)
+    val neighborIdSeqs = thriftNodes map { thriftNode =>
+      graph(edgeType).neighbors(thriftNodeToNode(thriftNode).tempestId, direction)
+    }
+    val distinctNeighborIds = CollectionUtil.toHashIntSet(neighborIdSeqs.flatten)
+    val neighborToThriftNode = databaseClient.nodeToThriftNodeMap(
+      distinctNeighborIds.asScala map { id => Node(resultType, id.toInt) })
+    val neighborLists = neighborIdSeqs map { neighborIds =>
+      (neighborIds flatMap { id => neighborToThriftNode.get(Node(resultType, id)) }).asJava
+    }
+    neighborLists.asJava
+  }
+
+  override def multiOutNeighbors(edgeType: String, nodes: util.List[ThriftNode]): util.List[util.List[ThriftNode]] =
+    multiNeighbors(edgeType, nodes, EdgeDirOut)
+
+  override def multiInNeighbors(edgeType: String, nodes: util.List[ThriftNode]): util.List[util.List[ThriftNode]] =
+    multiNeighbors(edgeType, nodes, EdgeDirIn)
+
+  def neighborsPacked(edgeType: String, thriftNode: ThriftNode, direction: EdgeDir): PackedNodeList = {
+    val tempestId = databaseClient.toNode(thriftNode).tempestId
+    val resultType = edgeEndpointType(edgeType, direction)
+    val neighborTempestIds = graph(edgeType).neighbors(tempestId, direction)
+    new PackedNodeList(resultType, CollectionUtil.toPackedInts(neighborTempestIds))
+  }
+
+  override def outNeighborsPacked(edgeType: String, thriftNode: ThriftNode): PackedNodeList =
+    neighborsPacked(edgeType, thriftNode, EdgeDirOut)
+
+  override def inNeighborsPacked(edgeType: String, thriftNode: ThriftNode): PackedNodeList =
+    neighborsPacked(edgeType, thriftNode, EdgeDirIn)
+
   def neighbor(edgeType: String, thriftNode: ThriftNode, i: Int, direction: EdgeDir): ThriftNode = {
     val tempestId = databaseClient.toNode(thriftNode).tempestId
     val degree = graph(edgeType).degree(tempestId, direction)
@@ -137,6 +293,15 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
 
 
   override def connectedComponent(sourceNode: ThriftNode, edgeTypes: util.List[String], maxSize: Int): util.List[ThriftNode] = {
+    val resultNodes = databaseClient.nodeToThriftNodeMap(connectedComponentNodes(sourceNode, edgeTypes, maxSize)).values
+    new util.ArrayList(resultNodes.asJavaCollection)
+  }
+
+  override def connectedComponentPacked(sourceNode: ThriftNode, edgeTypes: util.List[String],
+                                        maxSize: Int): util.List[PackedNodeList] =
+    toPackedNodeLists(connectedComponentNodes(sourceNode, edgeTypes, maxSize).toSeq)
+
+  def connectedComponentNodes(sourceNode: ThriftNode, edgeTypes: util.List[String], maxSize: Int): collection.Set[Node] = {
     val source = databaseClient.toNode(sourceNode)
 
     val typedGraphs = edgeTypes.asScala map typedGraph
@@ -155,8 +320,97 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
         }
       }
     }
-    val resultNodes = databaseClient.nodeToThriftNodeMap(reachedNodes).values
-    new util.ArrayList(resultNodes.asJavaCollection)
+    reachedNodes
+  }
+
+  /** Returns the given nodes as a PackedNodeList per node type, in order of type.  Nodes of the
+    * same type keep their order. */
+  def toPackedNodeLists(nodes: Seq[Node]): util.List[PackedNodeList] = {
+    val nodeLists = (nodes groupBy (_.`type`)).toSeq sortBy (_._1) map { case (nodeType, typeNodes) =>
+      new PackedNodeList(nodeType, CollectionUtil.toPackedInts(typeNodes map (_.tempestId)))
+    }
+    nodeLists.asJava
+  }
+
+  def validateMaxNodes(maxNodes: Int): Unit = {
+    if (maxNodes <= 0 || maxNodes > TempestServerConstants.MaxSubgraphNodeCount)
+      throw new InvalidArgumentException(
+        s"maxNodes must be between 1 and ${TempestServerConstants.MaxSubgraphNodeCount}")
+  }
+
+  /** Checks that the given nodes have the source or target node type of the given edge type. */
+  def validateEndpointTypes(edgeType: String, nodes: Iterable[ThriftNode]): Unit = {
+    val edgeConfig = loadEdgeConfig(edgeType)
+    for (nodeType <- (nodes map (_.`type`)).toSet[String]) {
+      if (nodeType != edgeConfig.sourceNodeType && nodeType != edgeConfig.targetNodeType)
+        throw new InvalidArgumentException(
+          s"Edge type $edgeType connects ${edgeConfig.sourceNodeType} and ${edgeConfig.targetNodeType} nodes, not $nodeType nodes")
+    }
+  }
+
+  override def inducedSubgraph(edgeType: String, nodes: util.List[ThriftNode], maxNodes: Int): InducedSubgraph = {
+    validateMaxNodes(maxNodes)
+    validateEndpointTypes(edgeType, nodes.asScala)
+    val distinctNodes = nodes.asScala.distinct
+    val subgraphNodes = distinctNodes take maxNodes
+    val thriftNodeToNode = new mutable.HashMap[ThriftNode, Node]()
+    for (batch <- subgraphNodes.grouped(TempestServerConstants.MaxTempestIdQuerySize))
+      thriftNodeToNode ++= databaseClient.thriftNodeToNodeMap(batch)
+    toInducedSubgraph(edgeType, subgraphNodes map thriftNodeToNode, truncated = distinctNodes.size > maxNodes)
+  }
+
+  override def egoSubgraph(edgeType: String, seed: ThriftNode, hops: Int, maxNodes: Int): InducedSubgraph = {
+    validateMaxNodes(maxNodes)
+    if (hops < 0)
+      throw new InvalidArgumentException(s"Invalid hop count $hops")
+    validateEndpointTypes(edgeType, Seq(seed))
+    val edgeTypeGraph = typedGraph(edgeType)
+    val seedNode = databaseClient.toNode(seed)
+
+    // Breadth-first search, until maxNodes are reached and another node is found
+    val reachedNodes = new mutable.HashSet[Node]()
+    reachedNodes += seedNode
+    var frontier: Seq[Node] = Seq(seedNode)
+    var truncated = false
+    for (hop <- 1 to hops) {
+      val nextFrontier = new mutable.ArrayBuffer[Node]()
+      for (u <- frontier if !truncated; v <- edgeTypeGraph.neighbors(u) if !truncated) {
+        if (!reachedNodes.contains(v)) {
+          if (reachedNodes.size < maxNodes) {
+            reachedNodes += v
+            nextFrontier += v
+          } else {
+            truncated = true
+          }
+        }
+      }
+      frontier = nextFrontier
+    }
+    toInducedSubgraph(edgeType, reachedNodes, truncated)
+  }
+
+  /** Returns the subgraph of the given edge type induced by the given distinct nodes, which must
+    * have its source or target node type, as an InducedSubgraph. */
+  def toInducedSubgraph(edgeType: String, nodes: Iterable[Node], truncated: Boolean): InducedSubgraph = {
+    val edgeConfig = loadEdgeConfig(edgeType)
+    def sortedTempestIds(nodeType: String): Array[Int] =
+      (nodes collect { case Node(`nodeType`, tempestId) => tempestId }).toArray.sorted
+    val sourceIds = sortedTempestIds(edgeConfig.sourceNodeType)
+    val (nodeLists, offsets, targets) = if (edgeConfig.sourceNodeType == edgeConfig.targetNodeType) {
+      val (offsets, targets) = DirectedGraphAlgorithms.inducedSubgraphCSR(graph(edgeType), sourceIds, sourceIds)
+      (Seq(new PackedNodeList(edgeConfig.sourceNodeType, CollectionUtil.toPackedInts(sourceIds))), offsets, targets)
+    } else {
+      val targetIds = sortedTempestIds(edgeConfig.targetNodeType)
+      val (sourceOffsets, sourceTargets) =
+        DirectedGraphAlgorithms.inducedSubgraphCSR(graph(edgeType), sourceIds, targetIds)
+      // Target nodes are numbered after the source nodes, and have no out-edges
+      (Seq(new PackedNodeList(edgeConfig.sourceNodeType, CollectionUtil.toPackedInts(sourceIds)),
+           new PackedNodeList(edgeConfig.targetNodeType, CollectionUtil.toPackedInts(targetIds))),
+        sourceOffsets ++ Array.fill(targetIds.length)(sourceOffsets.last),
+        sourceTargets map { _ + sourceIds.length })
+    }
+    new InducedSubgraph(nodeLists.asJava, CollectionUtil.toPackedInts(offsets),
+      CollectionUtil.toPackedInts(targets), truncated)
   }
 
   type DegreeFilter = collection.Map[DegreeFilterTypes, Int]
@@ -199,27 +453,134 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
                              edgeDir: EdgeDir,
                              degreeFilter: DegreeFilter,
                              alternating: Boolean): util.List[ThriftNode] = {
+    val targetNodeType = kStepNodeType(edgeType, edgeDir, k)
+    val resultTempestIds = kStepNeighborTempestIds(edgeType, source, k, sqlClause, edgeDir, degreeFilter, alternating)
+    val resultNodes = databaseClient.tempestIdToThriftNodeMulti(targetNodeType, resultTempestIds)
+    resultNodes.asJava
+  }
+
+  /** Returns the tempest ids of the nodes kStepNeighborsFiltered returns. */
+  def kStepNeighborTempestIds(edgeType: String,
+                              source: ThriftNode,
+                              k: Int,
+                              sqlClause: String,
+                              edgeDir: EdgeDir,
+                              degreeFilter: DegreeFilter,
+                              alternating: Boolean): Seq[Int] =
+    kStepNeighborTempestIdsWithStats(edgeType, source, k, sqlClause, edgeDir, degreeFilter, alternating)._1
+
+  /** Returns the tempest ids of the nodes kStepNeighborsFiltered returns, and FilterStats saying
+    * how the sqlClause was applied. */
+  def kStepNeighborTempestIdsWithStats(edgeType: String,
+                                       source: ThriftNode,
+                                       k: Int,
+                                       sqlClause: String,
+                                       edgeDir: EdgeDir,
+                                       degreeFilter: DegreeFilter,
+                                       alternating: Boolean): (Seq[Int], FilterStats) = {
     val sourceTempestId = databaseClient.toNode(source).tempestId
     val targetNodeType = kStepNodeType(edgeType, edgeDir, k)
+    val neighborhood = kStepNeighborhood(edgeType, sourceTempestId, k, edgeDir, alternating)
+    val filterStartTime = System.nanoTime
+    val (resultPreFilter, path) = filterBySQLClause(targetNodeType, sqlClause, neighborhood)
+    val filterMillis = (System.nanoTime - filterStartTime) / 1.0e6
+    val result = resultPreFilter filter { id => satisfiesFilters(edgeType, id, degreeFilter) }
+    (result, new FilterStats(path, neighborhood.length, result.size, filterMillis))
+  }
+
+  /** Returns the given tempest ids of nodes of the given type which satisfy the given SQL clause
+    * (all of them if it is empty), and how the clause was applied.  Clauses on in-memory
+    * attributes are evaluated without querying the database. */
+  def filterBySQLClause(nodeType: String, sqlClause: String, tempestIds: Seq[Int]): (Seq[Int], FilterPath) =
+    if (sqlClause.isEmpty || tempestIds.isEmpty) {
+      (tempestIds, FilterPath.NONE)
+    } else {
+      attributeIndex.filter(nodeType, sqlClause, tempestIds) match {
+        case Some(matchingIds) => (matchingIds, FilterPath.MEMORY)
+        case None =>
+          val matchingIds = if (tempestIds.size < TempestServerConstants.MaxNeighborhoodAttributeQuerySize) {
+            databaseClient.tempestIdsMatchingClause(nodeType, sqlClause + " AND tempest_id in " + tempestIds.mkString("(", ",", ")"))
+          } else {
+            val candidates = databaseClient.tempestIdsMatchingClause(nodeType, sqlClause)
+            candidates filter tempestIds.contains
+          }
+          (matchingIds, FilterPath.SQL)
+      }
+    }
+
+  /** Returns the tempest ids of nodes k steps from the given source, before any filtering. */
+  def kStepNeighborhood(edgeType: String, sourceTempestId: Int, k: Int, edgeDir: EdgeDir,
+                        alternating: Boolean): Array[Int] = {
     val effectiveGraph = edgeDir match {
       case EdgeDirOut => graph(edgeType)
       case EdgeDirIn => graph(edgeType).transposeView
     }
-    val neighborhood = DirectedGraphAlgorithms.kStepOutNeighbors(effectiveGraph, sourceTempestId, k, alternating).toIntArray
-    val resultPreFilter: Seq[Int] = if (sqlClause.isEmpty || neighborhood.isEmpty) {
-      neighborhood
+    DirectedGraphAlgorithms.kStepOutNeighbors(effectiveGraph, sourceTempestId, k, alternating).toIntArray
+  }
+
+  /** Returns the page of kStepNeighborsFiltered results after the given page token, in order of
+    * tempest id.  The neighborhood is recomputed for each page, but only candidates after the page
+    * token are filtered and only the returned page is converted to ThriftNodes, so memory use is
+    * bounded by the neighborhood's tempest ids and the page size. */
+  def kStepNeighborsFilteredPage(edgeType: String,
+                                 source: ThriftNode,
+                                 k: Int,
+                                 sqlClause: String,
+                                 edgeDir: EdgeDir,
+                                 degreeFilter: DegreeFilter,
+                                 alternating: Boolean,
+                                 pageSize: Int,
+                                 pageToken: String): NodePage = {
+    validatePageSize(pageSize)
+    val afterTempestId = parsePageToken(pageToken)
+    val sourceTempestId = databaseClient.toNode(source).tempestId
+    val targetNodeType = kStepNodeType(edgeType, edgeDir, k)
+    val neighborhood = kStepNeighborhood(edgeType, sourceTempestId, k, edgeDir, alternating)
+    util.Arrays.sort(neighborhood)
+
+    val resultTempestIds = new mutable.ArrayBuffer[Int]()
+    var candidateIndex = util.Arrays.binarySearch(neighborhood, afterTempestId) match {
+      case i if i >= 0 => i + 1
+      case i => -i - 1 // The insertion point
+    }
+    while (resultTempestIds.size < pageSize && candidateIndex < neighborhood.length) {
+      val candidates = neighborhood.slice(candidateIndex,
+        candidateIndex + TempestServerConstants.MaxTempestIdQuerySize)
+      candidateIndex += candidates.length
+      val matchingCandidates = filterBySQLClause(targetNodeType, sqlClause, candidates)._1.sorted
+      val remainingPageSize = pageSize - resultTempestIds.size
+      resultTempestIds ++= matchingCandidates.iterator.filter { id =>
+        satisfiesFilters(edgeType, id, degreeFilter)
+      }.take(remainingPageSize)
+    }
+
+    val tempestIdToThriftNode = databaseClient.nodeToThriftNodeMap(
+      resultTempestIds map { id => Node(targetNodeType, id) })
+    val page = new NodePage((resultTempestIds flatMap { id =>
+      tempestIdToThriftNode.get(Node(targetNodeType, id))
+    }).asJava)
+    if (resultTempestIds.size == pageSize)
+      page.setNextPageToken(resultTempestIds.last.toString)
+    page
+  }
+
+  def validatePageSize(pageSize: Int): Unit = {
+    if (pageSize <= 0)
+      throw new InvalidArgumentException(s"Invalid page size $pageSize")
+  }
+
+  /** Page tokens are the last tempest id of the previous page; an empty token starts at the
+    * beginning. */
+  def parsePageToken(pageToken: String): Int =
+    if (pageToken == null || pageToken.isEmpty) {
+      0
     } else {
-      if (neighborhood.size < TempestServerConstants.MaxNeighborhoodAttributeQuerySize) {
-        databaseClient.tempestIdsMatchingClause(targetNodeType, sqlClause + " AND tempest_id in " + neighborhood.mkString("(", ",", ")"))
-      } else {
-        val candidates = databaseClient.tempestIdsMatchingClause(targetNodeType, sqlClause)
-        candidates filter neighborhood.contains
+      try {
+        pageToken.toInt
+      } catch {
+        case e: NumberFormatException => throw new InvalidArgumentException(s"Invalid page token '$pageToken'")
       }
     }
-    val resultTempestIds = resultPreFilter filter { id => satisfiesFilters(edgeType, id, degreeFilter) }
-    val resultNodes = databaseClient.tempestIdToThriftNodeMulti(targetNodeType, resultTempestIds)
-    resultNodes.asJava
-  }
 
   override def kStepOutNeighborsFiltered(edgeType: String,
                                          source: ThriftNode,
@@ -240,6 +601,90 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
     kStepNeighborsFiltered(edgeType, source, k, sqlClause, EdgeDirIn,
       CollectionUtil.toScala(filter), alternating)
 
+  def kStepNeighborsFilteredWithStats(edgeType: String,
+                                      source: ThriftNode,
+                                      k: Int,
+                                      sqlClause: String,
+                                      edgeDir: EdgeDir,
+                                      degreeFilter: DegreeFilter,
+                                      alternating: Boolean): FilteredNodeList = {
+    val targetNodeType = kStepNodeType(edgeType, edgeDir, k)
+    val (resultTempestIds, stats) =
+      kStepNeighborTempestIdsWithStats(edgeType, source, k, sqlClause, edgeDir, degreeFilter, alternating)
+    val resultNodes = databaseClient.tempestIdToThriftNodeMulti(targetNodeType, resultTempestIds)
+    new FilteredNodeList(resultNodes.asJava, stats)
+  }
+
+  override def kStepOutNeighborsFilteredWithStats(edgeType: String,
+                                                  source: ThriftNode,
+                                                  k: Int,
+                                                  sqlClause: String,
+                                                  filter: java.util.Map[DegreeFilterTypes, Integer],
+                                                  alternating: Boolean): FilteredNodeList =
+    kStepNeighborsFilteredWithStats(edgeType, source, k, sqlClause, EdgeDirOut,
+      CollectionUtil.toScala(filter), alternating)
+
+  override def kStepInNeighborsFilteredWithStats(edgeType: String,
+                                                 source: ThriftNode,
+                                                 k: Int,
+                                                 sqlClause: String,
+                                                 filter: java.util.Map[DegreeFilterTypes, Integer],
+                                                 alternating: Boolean): FilteredNodeList =
+    kStepNeighborsFilteredWithStats(edgeType, source, k, sqlClause, EdgeDirIn,
+      CollectionUtil.toScala(filter), alternating)
+
+  def kStepNeighborsFilteredPacked(edgeType: String,
+                                   source: ThriftNode,
+                                   k: Int,
+                                   sqlClause: String,
+                                   edgeDir: EdgeDir,
+                                   degreeFilter: DegreeFilter,
+                                   alternating: Boolean): PackedNodeList = {
+    val targetNodeType = kStepNodeType(edgeType, edgeDir, k)
+    val resultTempestIds = kStepNeighborTempestIds(edgeType, source, k, sqlClause, edgeDir, degreeFilter, alternating)
+    new PackedNodeList(targetNodeType, CollectionUtil.toPackedInts(resultTempestIds))
+  }
+
+  override def kStepOutNeighborsFilteredPacked(edgeType: String,
+                                               source: ThriftNode,
+                                               k: Int,
+                                               sqlClause: String,
+                                               filter: java.util.Map[DegreeFilterTypes, Integer],
+                                               alternating: Boolean): PackedNodeList =
+    kStepNeighborsFilteredPacked(edgeType, source, k, sqlClause, EdgeDirOut,
+      CollectionUtil.toScala(filter), alternating)
+
+  override def kStepInNeighborsFilteredPacked(edgeType: String,
+                                              source: ThriftNode,
+                                              k: Int,
+                                              sqlClause: String,
+                                              filter: java.util.Map[DegreeFilterTypes, Integer],
+                                              alternating: Boolean): PackedNodeList =
+    kStepNeighborsFilteredPacked(edgeType, source, k, sqlClause, EdgeDirIn,
+      CollectionUtil.toScala(filter), alternating)
+
+  override def kStepOutNeighborsFilteredPage(edgeType: String,
+                                             source: ThriftNode,
+                                             k: Int,
+                                             sqlClause: String,
+                                             filter: java.util.Map[DegreeFilterTypes, Integer],
+                                             alternating: Boolean,
+                                             pageSize: Int,
+                                             pageToken: String): NodePage =
+    kStepNeighborsFilteredPage(edgeType, source, k, sqlClause, EdgeDirOut,
+      CollectionUtil.toScala(filter), alternating, pageSize, pageToken)
+
+  override def kStepInNeighborsFilteredPage(edgeType: String,
+                                            source: ThriftNode,
+                                            k: Int,
+                                            sqlClause: String,
+                                            filter: java.util.Map[DegreeFilterTypes, Integer],
+                                            alternating: Boolean,
+                                            pageSize: Int,
+                                            pageToken: String): NodePage =
+    kStepNeighborsFilteredPage(edgeType, source, k, sqlClause, EdgeDirIn,
+      CollectionUtil.toScala(filter), alternating, pageSize, pageToken)
+
   def validateMonteCarloParams(params: MonteCarloPageRankParams): Unit = {
     if (params.resetProbability >= 1.0 || params.resetProbability <= 0.0) {
       throw new InvalidArgumentException("resetProbability must be between 0.0 and 1.0")
@@ -250,29 +695,236 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
     if (params.isSetMaxResultCount && params.maxResultCount <= 0) {
       throw new InvalidArgumentException("maxResultCount must be positive")
     }
+    if (params.isSetDeadlineMillis && params.deadlineMillis <= 0) {
+      throw new InvalidArgumentException("deadlineMillis must be positive")
+    }
   }
 
   override def pprUndirected(edgeTypes: util.List[String],
                              seedNodesJava: util.List[ThriftNode],
-                             pageRankParams: MonteCarloPageRankParams): util.Map[ThriftNode, lang.Double] = {
+                             pageRankParams: MonteCarloPageRankParams): util.Map[ThriftNode, lang.Double] =
+    pprUndirectedEstimate(edgeTypes, seedNodesJava, pageRankParams).value
+
+  override def pprUndirectedWithStats(edgeTypes: util.List[String],
+                                      seedNodesJava: util.List[ThriftNode],
+                                      pageRankParams: MonteCarloPageRankParams): PPRMapEstimate = {
+    val estimate = pprUndirectedEstimate(edgeTypes, seedNodesJava, pageRankParams)
+    new PPRMapEstimate(estimate.value, estimateStats(estimate))
+  }
+
+  override def pprUndirectedPacked(edgeTypes: util.List[String],
+                                   seedNodesJava: util.List[ThriftNode],
+                                   pageRankParams: MonteCarloPageRankParams): PackedPPRMapEstimate = {
+    val estimate = cachedPPRUndirected[(util.List[PackedNodeList], ByteBuffer)](
+        "pprUndirectedPacked", edgeTypes, seedNodesJava, pageRankParams)(
+        // 4 bytes of tempest id and 8 bytes of PPR per node
+        result => 64L + result.value._2.remaining / 8 * 12L) { typedEstimate =>
+      typedEstimate map { pprMap =>
+        // A stable sort, so the nodes of each type are in the order of toPackedNodeLists
+        val pprs = pprMap.toSeq sortBy (_._1.`type`)
+        (toPackedNodeLists(pprs map (_._1)), CollectionUtil.toPackedDoubles(pprs map (_._2)))
+      }
+    }
+    val (nodeLists, pprs) = estimate.value
+    new PackedPPRMapEstimate(nodeLists, pprs, estimateStats(estimate))
+  }
+
+  def pprUndirectedEstimate(edgeTypes: util.List[String],
+                            seedNodesJava: util.List[ThriftNode],
+                            pageRankParams: MonteCarloPageRankParams): AnytimeEstimate[util.Map[ThriftNode, lang.Double]] =
+    cachedPPRUndirected[util.Map[ThriftNode, lang.Double]](
+        "pprUndirected", edgeTypes, seedNodesJava, pageRankParams)(
+        estimate => PPRCache.nodeMapSizeBytes(estimate.value)) { typedEstimate =>
+      val intNodeToNodeMap = databaseClient.nodeToThriftNodeMap(typedEstimate.value.keys)
+      typedEstimate map { pprMap =>
+        (pprMap map { case (intNode, value) =>
+          (intNodeToNodeMap(intNode), new lang.Double(value))
+        }).asJava
+      }
+    }
+
+  /** Estimates pprUndirected, and returns the estimate converted by toResult, caching results by
+    * the given method name, edge types, seeds and parameters. */
+  def cachedPPRUndirected[A](methodName: String,
+                             edgeTypes: util.List[String],
+                             seedNodesJava: util.List[ThriftNode],
+                             pageRankParams: MonteCarloPageRankParams)
+                            (estimateSizeBytes: AnytimeEstimate[A] => Long)
+                            (toResult: AnytimeEstimate[collection.Map[Node, Double]] => AnytimeEstimate[A]):
+  AnytimeEstimate[A] = {
+    val deadline = if (pageRankParams.isSetDeadlineMillis) Some(pageRankParams.deadlineMillis.millis.fromNow) else None
     validateMonteCarloParams(pageRankParams)
     val seedNodes = seedNodesJava.asScala
-    val seeds = databaseClient.thriftNodeToNodeMap(seedNodes).values.toIndexedSeq
-
-    val typedGraphs = edgeTypes.asScala map typedGraph
-    val unionGraph = new TypedGraphUnion(typedGraphs)
-    val pprMap = MonteCarloPPRTyped.estimatePPR(unionGraph, seeds, pageRankParams)
-    val intNodeToNodeMap = databaseClient.nodeToThriftNodeMap(pprMap.keys)
-    (pprMap map { case (intNode, value) =>
-      (intNodeToNodeMap(intNode), new lang.Double(value))
-    }).asJava
+    val keyParams = pageRankParams.deepCopy()
+    keyParams.unsetUseCache()
+    keyParams.unsetMaxStalenessMillis()
+    keyParams.unsetDeadlineMillis()
+    val edgeTypeList = edgeTypes.asScala.toList
+    val cacheKey = (methodName, edgeTypeList, sortedNodes(seedNodes), keyParams)
+    val maxStalenessMillis =
+      if (pageRankParams.isSetMaxStalenessMillis) Some(pageRankParams.maxStalenessMillis) else None
+    pprCache.getOrCompute[AnytimeEstimate[A]](
+        cacheKey, edgeTypeList, pageRankParams.useCache, maxStalenessMillis, _.complete)(estimateSizeBytes) {
+      val seeds = databaseClient.thriftNodeToNodeMap(seedNodes).values.toIndexedSeq
+
+      val typedGraphs = edgeTypeList map typedGraph
+      val unionGraph = new TypedGraphUnion(typedGraphs)
+      toResult(MonteCarloPPRTyped.estimatePPRAnytime(unionGraph, seeds, pageRankParams, deadline))
+    }
   }
 
+  def estimateStats(estimate: AnytimeEstimate[_]): PPREstimateStats =
+    new PPREstimateStats(estimate.walkCount, estimate.pushCount, estimate.complete, estimate.errorBound)
+
+  /** Returns the given nodes in a canonical order, so equal seed sets give equal cache keys. */
+  def sortedNodes(nodes: Seq[ThriftNode]): List[ThriftNode] =
+    nodes.sortBy(node => (node.`type`, node.id)).toList
+
 
   override def pprSingleTarget(edgeType: String, seedNodesJava: util.List[ThriftNode],
                                targetThriftNode: ThriftNode,
-                               params: BidirectionalPPRParams): Double = {
-    val seedIntNodes = databaseClient.thriftNodeToNodeMap(seedNodesJava.asScala).values
+                               params: BidirectionalPPRParams): Double =
+    pprSingleTargetEstimate(edgeType, seedNodesJava, targetThriftNode, params).value
+
+  override def pprSingleTargetWithStats(edgeType: String, seedNodesJava: util.List[ThriftNode],
+                                        targetThriftNode: ThriftNode,
+                                        params: BidirectionalPPRParams): PPRSingleTargetEstimate = {
+    val estimate = pprSingleTargetEstimate(edgeType, seedNodesJava, targetThriftNode, params)
+    new PPRSingleTargetEstimate(estimate.value, estimateStats(estimate))
+  }
+
+  def pprSingleTargetEstimate(edgeType: String, seedNodesJava: util.List[ThriftNode],
+                              targetThriftNode: ThriftNode,
+                              params: BidirectionalPPRParams): AnytimeEstimate[Double] = {
+    val deadline = if (params.isSetDeadlineMillis) Some(params.deadlineMillis.millis.fromNow) else None
+    val startDistribution = bidirectionalPPRStartDistribution(edgeType, seedNodesJava.asScala)
+    val targetTempestId = databaseClient.toNode(targetThriftNode).tempestId
+    validateBidirectionalPPRParams(params)
+
+    val keyParams = params.deepCopy()
+    keyParams.unsetUseCache()
+    keyParams.unsetMaxStalenessMillis()
+    keyParams.unsetDeadlineMillis()
+    val cacheKey = ("pprSingleTarget", edgeType, sortedNodes(seedNodesJava.asScala), targetThriftNode, keyParams)
+    val maxStalenessMillis = if (params.isSetMaxStalenessMillis) Some(params.maxStalenessMillis) else None
+    pprCache.getOrCompute[AnytimeEstimate[Double]](
+        cacheKey, Seq(edgeType), params.useCache, maxStalenessMillis, _.complete)(_ => 64L) {
+      val estimator = new BidirectionalPPREstimator(graph(edgeType), params.resetProbability.toFloat)
+      val minimumPPR = bidirectionalMinimumPPR(edgeType, params)
+
+      // TODO: Modify estimator to incorporate maxIntermediateNodeId if it ever becomes an issue
+      val estimate = estimator.estimatePPRAnytime(
+        startDistribution,
+        targetTempestId,
+        deadline,
+        minimumPPR,
+        params.relativeError.toFloat)
+      estimate map { value =>
+        if (value >= minimumPPR)
+          value.toDouble
+        else
+          0.0 // Return a clean 0.0 rather than noise if PPR value is too small
+      }
+    }
+  }
+
+  override def pprMultiTarget(edgeType: String, seedNodesJava: util.List[ThriftNode],
+                              targetNodesJava: util.List[ThriftNode],
+                              params: BidirectionalPPRParams): util.Map[ThriftNode, lang.Double] = {
+    val targetNodes = targetNodesJava.asScala.toIndexedSeq
+    if (targetNodes.size > TempestServerConstants.MaxTempestIdQuerySize) {
+      throw new InvalidArgumentException(
+        s"At most ${TempestServerConstants.MaxTempestIdQuerySize} targets are supported")
+    }
+    val startDistribution = bidirectionalPPRStartDistribution(edgeType, seedNodesJava.asScala)
+    val targetNodeMap = databaseClient.thriftNodeToNodeMap(targetNodes)
+    validateBidirectionalPPRParams(params)
+
+    val estimator = new BidirectionalPPREstimator(graph(edgeType), params.resetProbability.toFloat)
+    val minimumPPR = bidirectionalMinimumPPR(edgeType, params)
+    val distinctTargets = targetNodes.distinct
+    val estimates = estimator.estimatePPRMultiTarget(
+      startDistribution,
+      distinctTargets map { node => targetNodeMap(node).tempestId },
+      minimumPPR,
+      params.relativeError.toFloat,
+      threadCount = pprThreadCount)(pprExecutionContext)
+    (distinctTargets zip estimates).map { case (node, estimate) =>
+      // Return a clean 0.0 rather than noise if PPR value is too small
+      (node, new lang.Double(if (estimate >= minimumPPR) estimate else 0.0))
+    }.toMap.asJava
+  }
+
+  override def pprCacheStats(): CacheStats = pprCache.stats
+
+  override def recommend(edgeType: String,
+                         seedThriftNode: ThriftNode,
+                         pageRankParams: MonteCarloPageRankParams,
+                         recParams: RecommendParams): util.List[Recommendation] = {
+    validateMonteCarloParams(pageRankParams)
+    if (recParams.maxResults <= 0 || recParams.maxResults > TempestServerConstants.MaxTempestIdQuerySize) {
+      throw new InvalidArgumentException(
+        s"maxResults must be between 1 and ${TempestServerConstants.MaxTempestIdQuerySize}")
+    }
+    val edgeConfig = loadEdgeConfig(edgeType)
+    val candidateType = edgeConfig.targetNodeType
+    val attributeNames = if (recParams.isSetAttributeNames) recParams.attributeNames.asScala else Seq.empty
+    for (attributeName <- attributeNames) {
+      if (!doesNodeTypeHaveAttribute(candidateType, attributeName)) {
+        throw new InvalidArgumentException(s"Node type $candidateType does not have an attribute named $attributeName")
+      }
+    }
+    if (seedThriftNode.`type` != edgeConfig.sourceNodeType) {
+      throw new InvalidArgumentException(
+        s"The seed of $edgeType recommendations must have type ${edgeConfig.sourceNodeType}")
+    }
+    val seed = databaseClient.toNode(seedThriftNode)
+    if (recParams.isSetSeedDegreeFilter &&
+      !satisfiesFilters(edgeType, seed.tempestId, CollectionUtil.toScala(recParams.seedDegreeFilter))) {
+      return new util.ArrayList[Recommendation]()
+    }
+
+    val excludedTempestIds = HashIntSets.newMutableSet()
+    if (recParams.excludeSeed && candidateType == seed.`type`)
+      excludedTempestIds.add(seed.tempestId)
+    if (recParams.excludeOutNeighbors)
+      graph(edgeType).outNeighbors(seed.tempestId) foreach { id => excludedTempestIds.add(id) }
+    if (recParams.excludeInNeighbors && candidateType == seed.`type`)
+      graph(edgeType).inNeighbors(seed.tempestId) foreach { id => excludedTempestIds.add(id) }
+    val degreeFilter: DegreeFilter =
+      if (recParams.isSetDegreeFilter) CollectionUtil.toScala(recParams.degreeFilter) else Map.empty
+    def isCandidate(node: Node): Boolean =
+      node.`type` == candidateType && !excludedTempestIds.contains(node.tempestId) &&
+        satisfiesFilters(edgeType, node.tempestId, degreeFilter)
+
+    // Exclusions are applied while choosing the top results (maxResultCount would apply before them)
+    val walkParams = pageRankParams.deepCopy()
+    walkParams.unsetMaxResultCount()
+    val pprMap = MonteCarloPPRTyped.estimatePPR(new TypedGraphUnion(Seq(typedGraph(edgeType))),
+      IndexedSeq(seed), walkParams)
+    val topNodes = CollectionUtil.topK(pprMap.iterator filter { case (node, ppr) => isCandidate(node) },
+      recParams.maxResults)
+
+    val intNodeToNodeMap = databaseClient.nodeToThriftNodeMap(topNodes map (_._1))
+    val recommendations = topNodes map { case (intNode, ppr) =>
+      new Recommendation(intNodeToNodeMap(intNode), ppr)
+    }
+    for (attributeName <- attributeNames) {
+      val nodeToJSON = databaseClient.getMultiNodeAttributeAsJSON(recommendations map (_.node), attributeName)
+      for (recommendation <- recommendations; json <- nodeToJSON.get(recommendation.node) if json != "null") {
+        if (!recommendation.isSetAttributesAsJSON)
+          recommendation.setAttributesAsJSON(new util.HashMap[String, String]())
+        recommendation.attributesAsJSON.put(attributeName, json)
+      }
+    }
+    recommendations.asJava
+  }
+
+  /** Returns the uniform distribution over the given seeds, which must have the source node type of the given
+    * edge type. */
+  private def bidirectionalPPRStartDistribution(edgeType: String,
+                                                seedNodes: Iterable[ThriftNode]): UniformDistribution = {
+    val seedIntNodes = databaseClient.thriftNodeToNodeMap(seedNodes).values
 
     val expectedSeedType = loadEdgeConfig(edgeType).sourceNodeType
     for (u <- seedIntNodes) {
@@ -281,28 +933,15 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
     }
 
     val seedTempestIds = seedIntNodes map (_.tempestId)
-    val targetTempestId = databaseClient.toNode(targetThriftNode).tempestId
-    validateBidirectionalPPRParams(params)
+    new UniformDistribution(seedTempestIds.toArray[Int], new Random())
+  }
 
-    val estimator = new BidirectionalPPREstimator(graph(edgeType), params.resetProbability.toFloat)
-    val startDistribution = new UniformDistribution(seedTempestIds.toArray[Int], new Random())
-    val minimumPPR = if (params.isSetMinProbability)
+  private def bidirectionalMinimumPPR(edgeType: String, params: BidirectionalPPRParams): Float =
+    if (params.isSetMinProbability)
       params.minProbability.toFloat
     else
       0.25f / graph(edgeType).maxNodeId // nodeCount would be more natural but isn't available for GraphUnion
 
-    // TODO: Modify estimator to incorporate maxIntermediateNodeId if it ever becomes an issue
-    val estimate = estimator.estimatePPR(
-      startDistribution,
-      targetTempestId,
-      minimumPPR,
-      params.relativeError.toFloat)
-    if (estimate >= minimumPPR)
-      estimate
-    else
-      0.0 // Return a clean 0.0 rather than noise if PPR value is too small
-  }
-
   def validateBidirectionalPPRParams(params: BidirectionalPPRParams): Unit = {
     if (params.resetProbability >= 1.0 || params.resetProbability <= 0.0) {
       throw new InvalidArgumentException("resetProbability must be between 0.0 and 1.0")
@@ -313,6 +952,9 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
     if (params.isSetMinProbability && params.minProbability <= 0.0) {
       throw new InvalidArgumentException("minProbability must be positive")
     }
+    if (params.isSetDeadlineMillis && params.deadlineMillis <= 0) {
+      throw new InvalidArgumentException("deadlineMillis must be positive")
+    }
   }
 
 
@@ -321,11 +963,53 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
 
   override def edgeCount(edgeType: String): Long = graph(edgeType).edgeCount
 
+  override def warm(edgeTypes: util.List[String], pin: Boolean): Unit =
+    warmGraphs(edgeTypes.asScala, pin)
+
+  override def residency(edgeType: String): GraphResidency = {
+    val edgeTypeGraph = graph(edgeType)
+    val fileBytes = edgeTypeGraph.fileByteCount
+    val residentBytes = edgeTypeGraph.residentByteCount.getOrElse(-1L)
+    val residentFraction =
+      if (residentBytes < 0) -1.0
+      else if (fileBytes == 0) 1.0
+      else math.min(1.0, residentBytes.toDouble / fileBytes)
+    val warming = pendingWarmupCounts.synchronized { pendingWarmupCounts.contains(edgeType) }
+    val pinned = pinnedEdgeTypes.synchronized { pinnedEdgeTypes.contains(edgeType) }
+    new GraphResidency(edgeType, fileBytes, residentBytes, residentFraction, warming, pinned)
+  }
+
   def nodes(nodeType: String, sqlClause: String): util.List[ThriftNode] = {
     val nodeIds = databaseClient.nodeIdsMatchingClause(nodeType, sqlClause)
     (nodeIds map { id => new ThriftNode(nodeType, id) }).asJava
   }
 
+  override def nodesPage(nodeType: String, sqlClause: String, pageSize: Int, pageToken: String): NodePage = {
+    validatePageSize(pageSize)
+    val rows = databaseClient.nodeIdsMatchingClausePage(nodeType, sqlClause, parsePageToken(pageToken), pageSize)
+    val page = new NodePage((rows map { case (tempestId, id) => new ThriftNode(nodeType, id) }).asJava)
+    if (rows.size == pageSize)
+      page.setNextPageToken(rows.last._1.toString)
+    page
+  }
+
+  override def tempestIdsToNodeIds(nodeType: String, packedTempestIds: ByteBuffer): util.List[String] = {
+    val tempestIds = try {
+      CollectionUtil.fromPackedInts(packedTempestIds)
+    } catch {
+      case e: IllegalArgumentException => throw new InvalidArgumentException(e.getMessage)
+    }
+    val tempestIdToId = new mutable.HashMap[Int, String]()
+    for (tempestIdGroup <- tempestIds.distinct.grouped(TempestServerConstants.MaxTempestIdQuerySize)) {
+      tempestIdToId ++= databaseClient.tempestIdToIdPairMulti(nodeType, tempestIdGroup)
+    }
+    val ids = tempestIds map { tempestId =>
+      tempestIdToId.getOrElse(tempestId,
+        throw new InvalidNodeIdException(s"No node in $nodeType has tempest id $tempestId"))
+    }
+    ids.toSeq.asJava
+  }
+
   override def getMultiNodeAttributeAsJSON(nodesJava: util.List[ThriftNode], attributeName: String): util.Map[ThriftNode, String] = {
     val nodeTypes = (nodesJava.asScala map (_.`type`)).toSet
     for (nodeType <- nodeTypes) {
@@ -336,20 +1020,68 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
     databaseClient.getMultiNodeAttributeAsJSON(nodesJava.asScala, attributeName).asJava
   }
 
+  override def getNodeAttributeColumns(nodeType: String,
+                                       nodeIdsJava: util.List[String],
+                                       attributeNamesJava: util.List[String]): util.List[AttributeColumn] = {
+    val attributeNames = attributeNamesJava.asScala
+    for (attributeName <- attributeNames) {
+      if (!doesNodeTypeHaveAttribute(nodeType, attributeName)) {
+        throw new InvalidArgumentException(s"Node type $nodeType does not have an attribute named $attributeName")
+      }
+    }
+    if (nodeIdsJava.size > TempestServerConstants.MaxNeighborhoodAttributeQuerySize) {
+      throw new InvalidArgumentException(s"The number ${nodeIdsJava.size} of node ids exceeds the limit of " +
+        s"${TempestServerConstants.MaxNeighborhoodAttributeQuerySize}")
+    }
+    databaseClient.getNodeAttributeColumns(nodeType, nodeIdsJava.asScala, attributeNames).asJava
+  }
+
   override def addNode(node: ThriftNode): Unit = {
     databaseClient.addNode(node)
+    refreshAddedNodes(Seq(node))
   }
 
   override def addNodes(nodes: util.List[ThriftNode]): Unit = {
     databaseClient.addNodes(nodes.asScala)
+    refreshAddedNodes(nodes.asScala)
   }
 
-  override def addNewNodes(nodes: util.List[ThriftNode]): Unit = {
-    databaseClient.addNewNodes(nodes.asScala)
+  override def addNewNodes(nodes: util.List[ThriftNode]): Unit =
+    addNewNodesInternal(nodes.asScala)
+
+  def addNewNodesInternal(nodes: Seq[ThriftNode]): Unit = {
+    databaseClient.addNewNodes(nodes)
+    refreshAddedNodes(nodes)
   }
 
-  def setNodeAttribute(node: ThriftNode, attributeName: String, attributeValue: String): Unit =
+  /** Loads the in-memory attributes (such as id) which the given nodes were created with. */
+  def refreshAddedNodes(nodes: Seq[ThriftNode]): Unit =
+    for ((nodeType, nodesOfType) <- nodes groupBy (_.`type`)) {
+      val attributeNames = attributeIndex.attributeNames(nodeType)
+      if (attributeNames.nonEmpty)
+        refreshInMemoryAttributes(nodeType, nodesOfType map (_.id), attributeNames)
+    }
+
+  def setNodeAttribute(node: ThriftNode, attributeName: String, attributeValue: String): Unit = {
     databaseClient.setNodeAttribute(node, attributeName, attributeValue)
+    if (attributeIndex.contains(node.`type`, attributeName))
+      refreshInMemoryAttributes(node.`type`, Seq(node.id), Seq(attributeName))
+  }
+
+  override def setNodeAttributes(nodes: util.List[ThriftNode],
+                                 attributeNames: util.List[String],
+                                 attributeValues: util.List[String]): Unit = {
+    if (nodes.size != attributeNames.size || nodes.size != attributeValues.size) {
+      throw new UnequalListSizeException()
+    }
+    val updates = (0 until nodes.size) map { i => (nodes.get(i), attributeNames.get(i), attributeValues.get(i)) }
+    databaseClient.setNodeAttributes(updates)
+    val inMemoryUpdates = updates filter { case (node, attributeName, _) =>
+      attributeIndex.contains(node.`type`, attributeName)
+    }
+    for (((nodeType, attributeName), group) <- inMemoryUpdates groupBy { case (node, name, _) => (node.`type`, name) })
+      refreshInMemoryAttributes(nodeType, group map (_._1.id), Seq(attributeName))
+  }
 
 
   override def addEdges(edgeType: String,
@@ -386,8 +1118,8 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
 
     if (addNewNodes) {
       // Add nodes that do not yet exist to the DB
-      databaseClient.addNewNodes(sourceNodes)
-      databaseClient.addNewNodes(targetNodes)
+      addNewNodesInternal(sourceNodes)
+      addNewNodesInternal(targetNodes)
     }
 
     val (sourceTempestIds, targetTempestIds) = if (checkForDuplicates) {
@@ -401,6 +1133,7 @@ class TempestDBServer(databaseClient: TempestDatabaseClient, config: TempestDBSe
     for ((sourceId, targetId) <- sourceTempestIds zip targetTempestIds) {
       graph(edgeType).addEdge(sourceId, targetId) // Future optimization: efficient Multi-add
     }
+    pprCache.invalidate(edgeType)
   }
 
   def getEdgeIds(sourceNodes: Seq[ThriftNode],
@@ -458,11 +1191,18 @@ object TempestDBServer {
 
   def main(args: Array[String]): Unit = {
     LogUtil.configureLog4j()
-    new TeapotThriftLauncher().launch(args, getProcessor, "/root/tempest/system/tempest.yaml")
+    new TeapotThriftLauncher().launch(args, getProcessor, "/root/tempest/system/tempest.yaml",
+      (configFileName: String) => ConfigLoader.loadConfig[TempestDBServerConfig](configFileName))
   }
 }
 
 object TempestServerConstants {
   // Note: This should be moved to a config file.
   val MaxNeighborhoodAttributeQuerySize = 1000 * 1000
+  // The maximum number of tempest ids converted to node ids in a single SQL query
+  val MaxTempestIdQuerySize = 10 * 1000
+  // The number of loaded in-memory attribute values added to the index at a time
+  val InMemoryAttributeLoadBatchSize = 10 * 1000
+  // The maximum number of nodes in the result of inducedSubgraph or egoSubgraph
+  val MaxSubgraphNodeCount = 10 * 1000 * 1000
 }
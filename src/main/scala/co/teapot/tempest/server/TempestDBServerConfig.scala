@@ -15,12 +15,25 @@
 package co.teapot.tempest.server
 
 import java.io.File
+import java.util
+
+import co.teapot.thriftbase.ThriftTransportConfig
 
 import scala.beans.BeanProperty
 
-class TempestDBServerConfig {
+/** Also contains the thriftProtocol and framedTransport settings of ThriftTransportConfig. */
+class TempestDBServerConfig extends ThriftTransportConfig {
   @BeanProperty var graphDirectory: String = ""
   @BeanProperty var graphConfigDirectory: String = ""
+  // The maximum estimated size of cached pprUndirected and pprSingleTarget results (0 disables caching)
+  @BeanProperty var pprCacheSizeMegabytes: Int = 256
+  // Edge types whose graphs are read into RAM in the background when the server starts
+  @BeanProperty var warmupEdgeTypes: util.List[String] = new util.ArrayList[String]()
+  // Edge types whose graphs are read into RAM when the server starts, then locked there
+  @BeanProperty var pinnedEdgeTypes: util.List[String] = new util.ArrayList[String]()
+  // Node type -> attributes held in memory (loaded at startup) to evaluate multi-hop query filters
+  @BeanProperty var inMemoryAttributes: util.Map[String, util.List[String]] =
+    new util.HashMap[String, util.List[String]]()
 
   // These are lazy vals to allow the config to load before they are evaluated.
   lazy val graphDirectoryFile: File = new File(graphDirectory)
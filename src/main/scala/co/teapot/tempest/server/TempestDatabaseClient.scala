@@ -102,6 +102,17 @@ trait TempestDatabaseClient {
     nodeToAttribute
   }
 
+  /** Returns one AttributeColumn for each of the given attribute names, whose ith value is the
+    * attribute of the node of the given type with id nodeIds(i) (null if there is no such node). */
+  def getNodeAttributeColumns(nodeType: String,
+                              nodeIds: Seq[String],
+                              attributeNames: Seq[String]): Seq[AttributeColumn]
+
+  /** Calls f with the tempest id and the value (an Integer, Long, Boolean or String, or null) of the
+    * given attribute of each node of the given type, or of the nodes with the given ids (at most 10000). */
+  def forEachNodeAttributeValue(nodeType: String, attributeName: String, nodeIds: Option[Seq[String]] = None)
+                               (f: (Int, Any) => Unit): Unit
+
   def addNode(node: ThriftNode): Unit
 
   def addNodes(nodes: Seq[ThriftNode]): Unit
@@ -112,6 +123,10 @@ trait TempestDatabaseClient {
                        attributeName: String,
                        attributeValue: String): Unit
 
+  /** Applies the given (node, attributeName, attributeValue) updates.  Updates of the same node
+    * and attribute are applied in order, so the last value wins. */
+  def setNodeAttributes(updates: Seq[(ThriftNode, String, String)]): Unit
+
   def getTempestIdsWithAttributeValue(nodeType: String,
                                       attributeName: String,
                                       attributeValue: String): Seq[Int]
@@ -122,6 +137,11 @@ trait TempestDatabaseClient {
 
   def nodeIdsMatchingClause(nodeType: String, sqlClause: String): Seq[String]
 
+  /** Returns (tempestId, id) pairs of at most limit nodes satisfying the given SQL clause (which
+    * may be empty) with tempest id greater than afterTempestId, in increasing order of tempest id. */
+  def nodeIdsMatchingClausePage(nodeType: String, sqlClause: String,
+                                afterTempestId: Int, limit: Int): Seq[(Int, String)]
+
   def addEdges(nodeType: String, ids1: Seq[String], ids2: Seq[String]): Unit
 }
 
@@ -223,6 +243,80 @@ class TempestSQLDatabaseClient(config: DatabaseConfig) extends TempestDatabaseCl
       result
     }
 
+  def getNodeAttributeColumns(nodeType: String,
+                              nodeIds: Seq[String],
+                              attributeNames: Seq[String]): Seq[AttributeColumn] =
+    withConnection { implicit connection =>
+      if (attributeNames.isEmpty)
+        throw new InvalidArgumentException("At least one attribute name is required")
+      attributeNames foreach validateAttributeName
+
+      // A node id may be requested more than once
+      val idToIndexes = new mutable.HashMap[String, mutable.ArrayBuffer[Int]]()
+      for ((id, i) <- nodeIds.zipWithIndex)
+        idToIndexes.getOrElseUpdate(id, new mutable.ArrayBuffer[Int](1)) += i
+      val distinctIds = idToIndexes.keys.toIndexedSeq
+      // Even without ids, run a query so the column types are known
+      val idGroups =
+        if (distinctIds.isEmpty) Iterator(IndexedSeq.empty[String])
+        else distinctIds.grouped(TempestServerConstants.MaxTempestIdQuerySize)
+
+      var builders: Seq[AttributeColumnBuilder] = Seq.empty
+      for (ids <- idGroups) {
+        val whereClause =
+          if (ids.isEmpty) "1 = 0"
+          else "id in " + Iterator.fill(ids.size)("?").mkString("(", ",", ")")
+        val sql = s"SELECT id, ${attributeNames.mkString(", ")} FROM ${nodesTable(nodeType)} WHERE $whereClause"
+        val pstmt = connection.prepareStatement(sql)
+        for ((id, i) <- ids.zipWithIndex)
+          pstmt.setString(i + 1, id)
+        val resultSet = pstmt.executeQuery()
+        if (builders.isEmpty) {
+          val metaData = resultSet.getMetaData
+          builders = attributeNames.indices map { j =>
+            // Result columns are indexed from 1, and the first is the id
+            new AttributeColumnBuilder(attributeNames(j), metaData.getColumnType(j + 2), nodeIds.size)
+          }
+        }
+        while (resultSet.next()) {
+          val indexes = idToIndexes(resultSet.getString(1))
+          for ((builder, j) <- builders.zipWithIndex)
+            builder.set(resultSet, j + 2, indexes)
+        }
+        pstmt.close()
+      }
+      builders map (_.build())
+    }
+
+  def forEachNodeAttributeValue(nodeType: String, attributeName: String, nodeIds: Option[Seq[String]] = None)
+                               (f: (Int, Any) => Unit): Unit =
+    withConnection { implicit connection =>
+      validateAttributeName(attributeName)
+      val ids = nodeIds.getOrElse(Seq.empty)
+      val whereClause = nodeIds match {
+        case Some(_) if ids.isEmpty => return
+        case Some(_) =>
+          validateNodeIds(ids)
+          "WHERE id in " + Iterator.fill(ids.size)("?").mkString("(", ",", ")")
+        case None => ""
+      }
+      // Postgres only fetches rows fetchSize at a time (rather than all at once) within a transaction
+      connection.setAutoCommit(false)
+      try {
+        val pstmt = connection.prepareStatement(
+          s"SELECT tempest_id, $attributeName FROM ${nodesTable(nodeType)} $whereClause")
+        pstmt.setFetchSize(10000)
+        for ((id, i) <- ids.zipWithIndex)
+          pstmt.setString(i + 1, id)
+        val resultSet = pstmt.executeQuery()
+        while (resultSet.next())
+          f(resultSet.getInt(1), resultSet.getObject(2))
+        pstmt.close()
+      } finally {
+        connection.setAutoCommit(true)
+      }
+    }
+
   def addNode(node: ThriftNode): Unit =
     withConnection { implicit connection =>
       SQL(s"INSERT INTO ${nodesTable(node.`type`)} (id) VALUES ({id})")
@@ -281,6 +375,40 @@ class TempestSQLDatabaseClient(config: DatabaseConfig) extends TempestDatabaseCl
         .on("attributeValue" -> attributeValue, "id" -> node.id).execute()
     }
 
+  /** Runs one batched UPDATE per node type and attribute, all in a single transaction. */
+  def setNodeAttributes(updates: Seq[(ThriftNode, String, String)]): Unit = {
+    if (updates.isEmpty)
+      return
+    val updateGroups = updates groupBy { case (node, attributeName, _) => (node.`type`, attributeName) }
+    for ((_, attributeName) <- updateGroups.keys)
+      validateAttributeName(attributeName)
+
+    try {
+      withConnection { implicit connection =>
+        connection.setAutoCommit(false)
+        try {
+          for (((nodeType, attributeName), group) <- updateGroups) {
+            val parameters = group map { case (node, _, attributeValue) =>
+              Seq[NamedParameter]("attributeValue" -> attributeValue, "id" -> node.id)
+            }
+            BatchSql(s"UPDATE ${nodesTable(nodeType)} SET $attributeName = {attributeValue} WHERE id = {id}",
+              parameters.head, parameters.tail:_*
+            ).execute()
+          }
+          connection.commit()
+        } catch {
+          case e: Exception =>
+            connection.rollback()
+            throw e
+        } finally {
+          connection.setAutoCommit(true)
+        }
+      }
+    } catch {
+      case e: BatchUpdateException => throw new SQLException(e.getMessage)
+    }
+  }
+
   def getTempestIdsWithAttributeValue(nodeType: String, attributeName: String,
                                       attributeValue: String): Seq[Int] =
     withConnection { implicit connection =>
@@ -304,6 +432,18 @@ class TempestSQLDatabaseClient(config: DatabaseConfig) extends TempestDatabaseCl
         .as(SqlParser.str(1).*)
     }
 
+  def nodeIdsMatchingClausePage(nodeType: String, sqlClause: String,
+                                afterTempestId: Int, limit: Int): Seq[(Int, String)] =
+    withConnection { implicit connection =>
+      rejectUnsafeSQL(sqlClause)
+      val clauseCondition = if (sqlClause.trim.isEmpty) "" else s"($sqlClause) AND "
+      val rowParser = SqlParser.int("tempest_id") ~ SqlParser.str("id") map { case x ~ y => (x, y) }
+      SQL(s"SELECT tempest_id, id FROM ${nodesTable(nodeType)} " +
+        s"WHERE ${clauseCondition}tempest_id > {afterTempestId} ORDER BY tempest_id LIMIT {limit}")
+        .on("afterTempestId" -> afterTempestId, "limit" -> limit)
+        .as(rowParser.*)
+    }
+
   /** Returns all node ids in the given Seq which have the given attribute value. */
   def filterNodeIds(nodeType: String, nodeIds: Seq[String], sqlClause: String): Seq[String] =
     withConnection { implicit connection =>
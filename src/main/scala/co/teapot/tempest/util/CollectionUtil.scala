@@ -1,5 +1,6 @@
 package co.teapot.tempest.util
 
+import java.nio.{ByteBuffer, ByteOrder}
 import java.{lang, util}
 
 import co.teapot.tempest.DegreeFilterTypes
@@ -66,6 +67,51 @@ object CollectionUtil {
   def efficientIntDoubleMapWithDefault0(): mutable.Map[Int, Double] =
     efficientIntDoubleMap().withDefaultValue(0.0)
 
+  /** Returns the k pairs with the largest values, in decreasing order of value. */
+  def topK[A](pairs: Iterator[(A, Double)], k: Int): IndexedSeq[(A, Double)] = {
+    // A min-heap of the best pairs seen so far
+    val heap = mutable.PriorityQueue.empty[(A, Double)](Ordering.by[(A, Double), Double](-_._2))
+    for (pair <- pairs) {
+      if (heap.size < k) {
+        heap.enqueue(pair)
+      } else if (pair._2 > heap.head._2) {
+        heap.dequeue()
+        heap.enqueue(pair)
+      }
+    }
+    val result = new mutable.ArrayBuffer[(A, Double)](heap.size)
+    while (heap.nonEmpty)
+      result += heap.dequeue()
+    result.reverse
+  }
+
+  /** Returns the given ints packed as consecutive little-endian 32-bit values, the format of the
+    * tempestIds field of PackedNodeList. */
+  def toPackedInts(xs: Seq[Int]): ByteBuffer = {
+    val result = ByteBuffer.allocate(4 * xs.size).order(ByteOrder.LITTLE_ENDIAN)
+    for (x <- xs)
+      result.putInt(x)
+    result.flip()
+    result
+  }
+
+  /** Returns the given doubles packed as consecutive little-endian 64-bit values. */
+  def toPackedDoubles(xs: Seq[Double]): ByteBuffer = {
+    val result = ByteBuffer.allocate(8 * xs.size).order(ByteOrder.LITTLE_ENDIAN)
+    for (x <- xs)
+      result.putDouble(x)
+    result.flip()
+    result
+  }
+
+  /** Inverse of toPackedInts. */
+  def fromPackedInts(buffer: ByteBuffer): Array[Int] = {
+    val ints = buffer.duplicate().order(ByteOrder.LITTLE_ENDIAN)
+    if (ints.remaining % 4 != 0)
+      throw new IllegalArgumentException(s"Packed ints have length ${ints.remaining}, which is not a multiple of 4")
+    Array.fill(ints.remaining / 4)(ints.getInt())
+  }
+
   def longRange(startInclusive: Long, endExclusive: Long): Iterator[Long] = new Iterator[Long] {
     var i: Long = startInclusive
     override def hasNext: Boolean = i < endExclusive
@@ -1,7 +1,7 @@
 package co.teapot.thriftbase
 
 import org.apache.thrift.TServiceClient
-import org.apache.thrift.protocol.{TBinaryProtocol, TProtocol}
+import org.apache.thrift.protocol.TProtocol
 import org.apache.thrift.transport.TSocket
 
 trait TeapotThriftClient[ClientClass <:  TServiceClient] {
@@ -17,13 +17,16 @@ trait TeapotThriftClient[ClientClass <:  TServiceClient] {
     */
   def timeoutInMillisOption: Option[Int] = None
 
+  /** The protocol and framing, which must match the server's. */
+  def transportConfig: ThriftTransportConfig = new ThriftTransportConfig
+
   def initProtocol(): TProtocol = {
     val transport = timeoutInMillisOption match {
       case Some(timeout) => new TSocket(server, port, timeout)
       case None => new TSocket(server, port)
     }
     transport.open()
-    new TBinaryProtocol(transport)
+    transportConfig.clientProtocol(transport)
   }
 
   def initExecutor(protocol: TProtocol): ClientClass
@@ -7,16 +7,24 @@ import org.apache.thrift.transport.TServerSocket
 
 class TeapotThriftLauncher {
 
-  def createServer(getProcessor: String => TProcessor, configFile: String, port: Int)
+  def createServer(getProcessor: String => TProcessor, configFile: String, port: Int,
+                   transportConfig: ThriftTransportConfig = new ThriftTransportConfig)
   : TThreadPoolServer = {
     val processor = getProcessor(configFile)
     val serverTransport = new TServerSocket(port)
-    val serverArgs = new TThreadPoolServer.Args(serverTransport).processor(processor)
+    val serverArgs = new TThreadPoolServer.Args(serverTransport)
+      .processor(processor)
+      .protocolFactory(transportConfig.protocolFactory)
+      .transportFactory(transportConfig.transportFactory)
     new TThreadPoolServer(serverArgs)
   }
 
+  /** Parses the command line flags and serves the processor returned by getProcessor.  The
+    * optional getTransportConfig function loads the protocol and framing to use from the same
+    * config file passed to getProcessor. */
   def launch(args: Array[String], getProcessor: String => TProcessor,
-             defaultConfFilename: String = ""): Unit = {
+             defaultConfFilename: String = "",
+             getTransportConfig: String => ThriftTransportConfig = _ => new ThriftTransportConfig): Unit = {
     try {
       val flags = new Flags("The Teapot Thrift Launcher")
       val configFileFlag = flags[String]("conf", defaultConfFilename, "Thrift server specific config file")
@@ -27,8 +35,10 @@ class TeapotThriftLauncher {
       if (helpFlag()) {
         println(flags.usage)
       } else {
-        val server = createServer(getProcessor, configFileFlag(), portFlag())
-        println("starting server at port " + portFlag())
+        val transportConfig = getTransportConfig(configFileFlag())
+        val server = createServer(getProcessor, configFileFlag(), portFlag(), transportConfig)
+        println(s"starting server at port ${portFlag()} using ${transportConfig.thriftProtocol} protocol" +
+          (if (transportConfig.framedTransport) " with framed transport" else ""))
         server.serve()
       }
     } catch {
@@ -0,0 +1,43 @@
+package co.teapot.thriftbase
+
+import org.apache.thrift.protocol.{TBinaryProtocol, TCompactProtocol, TProtocol, TProtocolFactory}
+import org.apache.thrift.transport.{TFramedTransport, TTransport, TTransportFactory}
+
+import scala.beans.BeanProperty
+
+/** The wire format used between a thrift server and its clients.  Clients must be configured
+  * with the same protocol and framing as the server.  Server config classes extend this so the
+  * format can be set in their yaml config file. */
+class ThriftTransportConfig {
+  /** Either "binary" (the default, which clients may decode with an accelerated binary protocol
+    * implementation) or "compact". */
+  @BeanProperty var thriftProtocol: String = ThriftTransportConfig.BinaryProtocol
+  @BeanProperty var framedTransport: Boolean = false
+
+  def protocolFactory: TProtocolFactory = thriftProtocol match {
+    case ThriftTransportConfig.BinaryProtocol => new TBinaryProtocol.Factory()
+    case ThriftTransportConfig.CompactProtocol => new TCompactProtocol.Factory()
+    case other => throw new IllegalArgumentException(
+      s"Unknown thrift protocol $other (expected ${ThriftTransportConfig.BinaryProtocol} or " +
+        s"${ThriftTransportConfig.CompactProtocol})")
+  }
+
+  def transportFactory: TTransportFactory =
+    if (framedTransport) new TFramedTransport.Factory() else new TTransportFactory()
+
+  /** Wraps the given open client transport (e.g. a TSocket) in this config's framing and protocol. */
+  def clientProtocol(transport: TTransport): TProtocol =
+    protocolFactory.getProtocol(transportFactory.getTransport(transport))
+}
+
+object ThriftTransportConfig {
+  val BinaryProtocol = "binary"
+  val CompactProtocol = "compact"
+
+  def apply(thriftProtocol: String = BinaryProtocol, framedTransport: Boolean = false): ThriftTransportConfig = {
+    val result = new ThriftTransportConfig
+    result.thriftProtocol = thriftProtocol
+    result.framedTransport = framedTransport
+    result
+  }
+}
@@ -2,10 +2,13 @@ package soal.ppr
 
 import java.util.Random
 
+import co.teapot.tempest.algorithm.AnytimeEstimate
 import co.teapot.tempest.graph.DirectedGraph
 import soal.util._
 
 import scala.collection.mutable
+import scala.concurrent.duration.{Deadline, Duration}
+import scala.concurrent.{Await, ExecutionContext, Future}
 
 /**
  * Contains methods related to personalized PageRank estimation.  All methods operate in the
@@ -17,6 +20,9 @@ import scala.collection.mutable
 class BidirectionalPPREstimator (val graph: DirectedGraph,
                                  val teleportProbability: Float,
                                  val random: Random = new Random) {
+  // The number of forward walks between checks of the deadline
+  private val WalksPerDeadlineCheck = 64
+
   /**
    * Estimates the personalized PageRank score from the given source to the given target.  The the
    * true score is greater than the given minimumPPR, then the result will have mean relative
@@ -29,30 +35,108 @@ class BidirectionalPPREstimator (val graph: DirectedGraph,
                   targetId: Int,
                   minimumPPR: Float = 1.0f / graph.nodeCountOption.getOrElse(graph.maxNodeId),
                   relativeError: Float = 0.1f,
-                  guaranteeRelativeError: Boolean = false): Float = {
-    val chernoffConstant = if (guaranteeRelativeError)
-      3 * math.log(2 / 1.0e-9) // guarantees the given relative error with probability 1 - 1.0e-9
-    else
-      0.07 // Found in experiments to give mean relative error less than 10% when relativeError=10%
+                  guaranteeRelativeError: Boolean = false): Float =
+    estimatePPRAnytime(sourceDistribution, targetId, None, minimumPPR, relativeError,
+      guaranteeRelativeError).value
 
-    val chernoffMultiplier = chernoffConstant / math.pow(relativeError, 2.0).toFloat
+  /**
+   * Like estimatePPR, but if the given deadline passes, stops and returns the estimate from the
+   * reverse pushes and forward walks done so far.  Reverse pushes use at most half the time left
+   * before the deadline, so forward walks have time to correct their estimate.  The error bound
+   * is the Hoeffding bound of the walks, each of which adds a residual between 0 and the maximum
+   * residual.
+   */
+  def estimatePPRAnytime(sourceDistribution: DiscreteDistribution,
+                         targetId: Int,
+                         deadline: Option[Deadline],
+                         minimumPPR: Float = 1.0f / graph.nodeCountOption.getOrElse(graph.maxNodeId),
+                         relativeError: Float = 0.1f,
+                         guaranteeRelativeError: Boolean = false): AnytimeEstimate[Float] = {
+    val chernoffMultiplier = computeChernoffMultiplier(relativeError, guaranteeRelativeError)
 
     def computeWalkCount(maxResidual: Float): Int =
       (chernoffMultiplier * maxResidual / minimumPPR).toInt
     val msPerWalk = estimateMsPerWalk(sourceDistribution)
     def estimateForwardTimeInMillis(maxResidual: Float): Float =
       computeWalkCount(maxResidual) * msPerWalk
-    val (estimates, residuals, maxResidual) =
-      computeContributionsBalanced(targetId, estimateForwardTimeInMillis)
+    val maxPushMillis = deadline map { _.timeLeft.toMillis / 2.0 } getOrElse Double.PositiveInfinity
+    val (estimates, residuals, maxResidual, pushCount) =
+      computeContributionsBalanced(targetId, estimateForwardTimeInMillis, maxPushMillis)
 
     val walkCount = computeWalkCount(maxResidual)
+    var residualSum = 0.0
+    var walkIndex = 0
+    while (walkIndex < walkCount &&
+      !(walkIndex % WalksPerDeadlineCheck == 0 && AnytimeEstimate.isOverdue(deadline))) {
+      residualSum += residuals(samplePPR(sourceDistribution))
+      walkIndex += 1
+    }
     var estimate = sourceDistribution.expectation(estimates)
+    if (walkIndex > 0)
+      estimate += (residualSum / walkIndex).toFloat
+
+    AnytimeEstimate(estimate, walkIndex, pushCount, complete = walkIndex == walkCount,
+      errorBound = AnytimeEstimate.hoeffdingBound(walkIndex, maxResidual))
+  }
+
+  /**
+   * Estimates the personalized PageRank score from the given source to each of the given targets,
+   * with the same error bounds as estimatePPR.  The forward walks are shared by all targets, and
+   * the reverse pushes for different targets run in parallel on the given execution context, which
+   * should have threadCount threads, so the cost of ranking many targets is close to the cost of a
+   * single estimate.
+   */
+  def estimatePPRMultiTarget(sourceDistribution: DiscreteDistribution,
+                             targetIds: IndexedSeq[Int],
+                             minimumPPR: Float = 1.0f / graph.nodeCountOption.getOrElse(graph.maxNodeId),
+                             relativeError: Float = 0.1f,
+                             guaranteeRelativeError: Boolean = false,
+                             threadCount: Int = Runtime.getRuntime.availableProcessors)
+                            (implicit executionContext: ExecutionContext): IndexedSeq[Float] = {
+    if (targetIds.isEmpty)
+      return IndexedSeq.empty
+    val chernoffMultiplier = computeChernoffMultiplier(relativeError, guaranteeRelativeError)
+
+    def computeWalkCount(maxResidual: Float): Int =
+      (chernoffMultiplier * maxResidual / minimumPPR).toInt
+    val msPerWalk = estimateMsPerWalk(sourceDistribution)
+    // The forward walks are shared, so each target's reverse pushes are balanced against only
+    // its share of the forward time.
+    val forwardTimeShare = math.min(1.0f, threadCount.toFloat / targetIds.size)
+    def estimateForwardTimeInMillis(maxResidual: Float): Float =
+      computeWalkCount(maxResidual) * msPerWalk * forwardTimeShare
+
+    val contributionsFutures = targetIds map { targetId =>
+      Future(computeContributionsBalanced(targetId, estimateForwardTimeInMillis))
+    }
+    val contributions = Await.result(Future.sequence(contributionsFutures), Duration.Inf)
+
+    // Enough walks for the target with the largest maxResidual are enough for all targets.
+    val walkCount = (contributions map { case (_, _, maxResidual, _) => computeWalkCount(maxResidual) }).max
+    val walkEndCounts = CollectionsUtil.efficientIntDoubleMapWithDefault0()
     for (walkIndex <- 0 until walkCount) {
-      val v = samplePPR(sourceDistribution)
-      estimate += residuals(v) / walkCount
+      walkEndCounts(samplePPR(sourceDistribution)) += 1.0
     }
 
-    estimate
+    val estimateFutures = contributions map { case (estimates, residuals, _, _) =>
+      Future {
+        var estimate = sourceDistribution.expectation(estimates).toDouble
+        for ((v, count) <- walkEndCounts) {
+          estimate += residuals(v) * count / walkCount
+        }
+        estimate.toFloat
+      }
+    }
+    Await.result(Future.sequence(estimateFutures), Duration.Inf)
+  }
+
+  private def computeChernoffMultiplier(relativeError: Float, guaranteeRelativeError: Boolean): Double = {
+    val chernoffConstant = if (guaranteeRelativeError)
+      3 * math.log(2 / 1.0e-9) // guarantees the given relative error with probability 1 - 1.0e-9
+    else
+      0.07 // Found in experiments to give mean relative error less than 10% when relativeError=10%
+
+    chernoffConstant / math.pow(relativeError, 2.0).toFloat
   }
 
   /**
@@ -109,13 +193,14 @@ class BidirectionalPPREstimator (val graph: DirectedGraph,
   /**
    * Variant of computeContributions used in balanced Bidirectional-PPR.  Does reverse pushes,
    * decreasing maxResidual incrementally, until the time spent equals the remaining time required
-   * for forward walks, as estimated by the given function.
+   * for forward walks, as estimated by the given function, or maxMillis have passed.
    *
-   * Returns estimates, residuals, and maximum residual.
+   * Returns estimates, residuals, maximum residual, and the number of pushes done.
    */
   private def computeContributionsBalanced(targetId: Int,
-                                             forwardMillisGivenMaxResidual: Float => Double
-      ): (collection.Map[Int, Float], collection.Map[Int, Float], Float) = {
+                                             forwardMillisGivenMaxResidual: Float => Double,
+                                             maxMillis: Double = Double.PositiveInfinity
+      ): (collection.Map[Int, Float], collection.Map[Int, Float], Float, Long) = {
     val priorityQueue = new HeapMappedIntPriorityQueue()
     priorityQueue.insert(targetId, 1.0f)
 
@@ -123,10 +208,12 @@ class BidirectionalPPREstimator (val graph: DirectedGraph,
     val estimates = CollectionsUtil.efficientIntFloatMapWithDefault0()
     val startTime = System.currentTimeMillis()
     def elapsedTime(): Double = System.currentTimeMillis() - startTime
+    var pushCount = 0L
     while (!priorityQueue.isEmpty &&
-      elapsedTime() < forwardMillisGivenMaxResidual(priorityQueue.maxPriority)) {
+      elapsedTime() < math.min(maxMillis, forwardMillisGivenMaxResidual(priorityQueue.maxPriority))) {
       val vResidual = priorityQueue.maxPriority
       val vId = priorityQueue.extractMax()
+      pushCount += 1
       estimates(vId) += teleportProbability * vResidual
       for (uId <- graph.inNeighbors(vId)) {
         val residualChange = (1.0f - teleportProbability) * vResidual / graph.outDegree(uId)
@@ -135,7 +222,7 @@ class BidirectionalPPREstimator (val graph: DirectedGraph,
     }
     val maxResidual = if (priorityQueue.isEmpty) 0.0f else priorityQueue.maxPriority
     val residuals = priorityQueue.currentPriorities()
-    (estimates, residuals, maxResidual)
+    (estimates, residuals, maxResidual, pushCount)
   }
 
   /**
@@ -24,6 +24,60 @@ struct Node {
   2: required string id;
 }
 
+/* A list of nodes of a single type, given by their tempest ids packed as consecutive little-endian
+   32-bit ints.  For large neighborhoods this is much smaller and cheaper to decode than list<Node>.
+   Use tempestIdsToNodeIds to convert tempest ids back to node ids.
+*/
+struct PackedNodeList {
+  1: required string nodeType;
+  2: required binary tempestIds;
+}
+
+/* The subgraph of one edge type induced by a set of nodes, in compressed sparse row (CSR) form.
+   The n nodes are numbered from 0 in the order of nodeLists: the tempest ids of the edge type's
+   source node type, then (if different) those of its target node type, each in increasing order.
+   offsets holds n + 1 little-endian int32s, and targets holds little-endian int32 node numbers:
+   the out-neighbors of node i in the subgraph are targets[offsets[i]] to targets[offsets[i + 1] - 1],
+   in increasing order (an edge added twice appears twice).  truncated is true if maxNodes limited
+   the set of nodes.
+*/
+struct InducedSubgraph {
+  1: required list<PackedNodeList> nodeLists;
+  2: required binary offsets;
+  3: required binary targets;
+  4: required bool truncated;
+}
+
+/* One page of the results of nodesPage or kStep*NeighborsFilteredPage.  To get the next page, repeat
+   the call passing nextPageToken, which is absent on the last page.
+*/
+struct NodePage {
+  1: required list<Node> nodes;
+  2: optional string nextPageToken;
+}
+
+enum AttributeType {
+  INT = 0,
+  BIGINT = 1,
+  STRING = 2,
+  BOOLEAN = 3
+}
+
+/* The values of one attribute for a list of nodes, in the order of the nodes.  nullMask has one
+   byte per node, 1 if the value is null (or the node doesn't exist) and 0 otherwise.  values holds
+   little-endian int32s for INT attributes, little-endian int64s for BIGINT attributes, and one byte
+   (0 or 1) per node for BOOLEAN attributes, with 0 for null values.  For STRING attributes, values
+   holds the UTF-8 bytes of all values concatenated, and offsets holds one more little-endian int32
+   than there are nodes: value i is bytes offsets[i] to offsets[i + 1] of values (empty if null).
+*/
+struct AttributeColumn {
+  1: required string name;
+  2: required AttributeType type;
+  3: required binary values;
+  4: required binary nullMask;
+  5: optional binary offsets;
+}
+
 struct MonteCarloPageRankParams {
   1: required i32 numSteps; // The number of Monte Carlo steps
   2: required double resetProbability;
@@ -31,6 +85,13 @@ struct MonteCarloPageRankParams {
   3: optional i32 maxIntermediateNodeDegree = 1000;
   4: optional i32 minReportedVisits;
   5: optional i32 maxResultCount; // If set, only the top maxResultCount nodes will be returned.
+  // If false, the result is neither read from nor stored in the server's PPR cache.
+  6: optional bool useCache = true;
+  // If set, cached results computed more than this many milliseconds ago are recomputed.
+  7: optional i64 maxStalenessMillis;
+  // If set, the walk stops after this many milliseconds and the estimate from the steps done so
+  // far is returned.
+  8: optional i32 deadlineMillis;
 }
 
 struct BidirectionalPPRParams {
@@ -39,6 +100,42 @@ struct BidirectionalPPRParams {
   // The minimum PPR value we detect (smaller values are set to 0.0).
   // Currently defaults to 0.25 / maxNodeId
   3: optional double minProbability;
+  // As in MonteCarloPageRankParams (used by pprSingleTarget)
+  4: optional bool useCache = true;
+  5: optional i64 maxStalenessMillis;
+  // If set, the estimator stops after this many milliseconds and returns its estimate so far.
+  6: optional i32 deadlineMillis;
+}
+
+/* How much work a PPR estimate did.  walkCount is the number of Monte Carlo steps (for
+   pprUndirected) or forward walks (for pprSingleTarget), and pushCount the number of reverse pushes
+   (for pprSingleTarget).  complete is false if the deadline stopped the estimator early.
+   errorBound is an approximate 95% bound on the additive error of each PPR value.
+*/
+struct PPREstimateStats {
+  1: required i64 walkCount;
+  2: required i64 pushCount;
+  3: required bool complete;
+  4: required double errorBound;
+}
+
+struct PPRMapEstimate {
+  1: required map<Node, double> pprs;
+  2: required PPREstimateStats stats;
+}
+
+/* Like PPRMapEstimate, but the nodes are given as packed tempest ids, one PackedNodeList per node
+   type, and pprs holds a little-endian 64-bit double for each node, in the order of nodeLists.
+*/
+struct PackedPPRMapEstimate {
+  1: required list<PackedNodeList> nodeLists;
+  2: required binary pprs;
+  3: required PPREstimateStats stats;
+}
+
+struct PPRSingleTargetEstimate {
+  1: required double ppr;
+  2: required PPREstimateStats stats;
 }
 
 enum DegreeFilterTypes { // Filters to apply to the results of a call that retrieves node neighborhoods
@@ -50,6 +147,82 @@ enum DegreeFilterTypes { // Filters to apply to the results of a call that retri
 
 typedef map<DegreeFilterTypes, i32> DegreeFilter
 
+/* How a filtered multi-hop query applied its sqlClause: not at all (the clause was empty or there
+   were no candidates), against the server's in-memory attribute columns, or by querying Postgres.
+*/
+enum FilterPath {
+  NONE = 0,
+  MEMORY = 1,
+  SQL = 2
+}
+
+/* What a filtered multi-hop query did.  candidateCount is the number of nodes k steps from the
+   source before filtering, and filterMillis the time spent applying the sqlClause.
+*/
+struct FilterStats {
+  1: required FilterPath path;
+  2: required i32 candidateCount;
+  3: required i32 resultCount;
+  4: required double filterMillis;
+}
+
+struct FilteredNodeList {
+  1: required list<Node> nodes;
+  2: required FilterStats stats;
+}
+
+/* Which nodes recommend may return, and what it returns about them. */
+struct RecommendParams {
+  1: required i32 maxResults;
+  2: optional bool excludeSeed = true;
+  // Exclude nodes the seed already has an edge to (or from)
+  3: optional bool excludeOutNeighbors = true;
+  4: optional bool excludeInNeighbors = false;
+  // Only recommend nodes whose degrees satisfy this filter
+  5: optional DegreeFilter degreeFilter;
+  // If the seed's degrees don't satisfy this filter, return no recommendations
+  6: optional DegreeFilter seedDegreeFilter;
+  // Attributes of each recommended node to return
+  7: optional list<string> attributeNames;
+}
+
+struct Recommendation {
+  1: required Node node;
+  2: required double score;
+  // Attribute values in the format of getMultiNodeAttributeAsJSON, with null attributes omitted
+  3: optional map<string, string> attributesAsJSON;
+}
+
+
+/* Counters of the server's PPR result cache since it started.  hitRatio is hits / (hits + misses);
+   calls with useCache = false are not counted.  Entries are evicted least recently used first when
+   their estimated total size exceeds maxSizeBytes, and invalidated when edges are added to an edge
+   type they were computed on.
+*/
+struct CacheStats {
+  1: required i64 hits;
+  2: required i64 misses;
+  3: required i64 evictions;
+  4: required i64 invalidations;
+  5: required i32 entryCount;
+  6: required i64 sizeBytes;
+  7: required i64 maxSizeBytes;
+  8: required double hitRatio;
+}
+
+/* How much of the graph of an edge type is in the server's RAM.  residentBytes is the number of
+   bytes of the graph's file in RAM and mapped by the server, or -1 if the server's operating system
+   doesn't report it (then residentFraction is also -1).  warming is true while a warmup of the
+   graph is queued or running, and pinned is true once the graph is locked in RAM.
+*/
+struct GraphResidency {
+  1: required string edgeType;
+  2: required i64 fileBytes;
+  3: required i64 residentBytes;
+  4: required double residentFraction;
+  5: required bool warming;
+  6: required bool pinned;
+}
 
 exception InvalidNodeIdException {
   1:string message
@@ -81,6 +254,20 @@ service TempestDBService {
   list<Node> outNeighbors(1:string edgeType, 2:Node node) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
   list<Node> inNeighbors(1:string edgeType, 2:Node node) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
 
+  /* Batched versions of outDegree, inDegree, outNeighbors and inNeighbors, so expanding a
+     frontier of nodes costs one round trip.  The ith element of the result corresponds to the
+     ith given node.
+  */
+  list<int> multiOutDegree(1:string edgeType, 2:list<Node> nodes) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+  list<int> multiInDegree(1:string edgeType, 2:list<Node> nodes) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+
+  list<list<Node>> multiOutNeighbors(1:string edgeType, 2:list<Node> nodes) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+  list<list<Node>> multiInNeighbors(1:string edgeType, 2:list<Node> nodes) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+
+  /* Versions of outNeighbors and inNeighbors returning a PackedNodeList. */
+  PackedNodeList outNeighborsPacked(1:string edgeType, 2:Node node) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+  PackedNodeList inNeighborsPacked(1:string edgeType, 2:Node node) throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+
   /* Returns the ith out-neighbor of the given node.
      Throws an exception unless 0 <= i < outDegree(node).
   */
@@ -101,6 +288,11 @@ service TempestDBService {
     throws (1: UndefinedGraphException error1, 2: InvalidNodeIdException error2,
             3: InvalidArgumentException error3)
 
+  /* Version of connectedComponent returning a PackedNodeList per node type. */
+  list<PackedNodeList> connectedComponentPacked(1:Node source, 2:list<string> edgeTypes, 3:i32 maxSize)
+    throws (1: UndefinedGraphException error1, 2: InvalidNodeIdException error2,
+            3: InvalidArgumentException error3)
+
   list<Node> kStepOutNeighborsFiltered(1:string edgeType, 2:Node source, 3:i32 k,
                                       4:string sqlClause,
                                       5:DegreeFilter filter,
@@ -115,6 +307,78 @@ service TempestDBService {
     throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
             3: SQLException error3, 4: InvalidNodeIdException error4)
 
+  /* Versions of kStepOutNeighborsFiltered and kStepInNeighborsFiltered which also return
+     FilterStats.  sqlClauses made of comparisons of in-memory attributes (see inMemoryAttributes in
+     tempest.yaml) with literals, IS [NOT] NULL and boolean attributes, combined with AND, OR, NOT
+     and parentheses, are evaluated in memory; other clauses are sent to Postgres.  The other
+     kStep*NeighborsFiltered calls choose the same way.
+  */
+  FilteredNodeList kStepOutNeighborsFilteredWithStats(1:string edgeType, 2:Node source, 3:i32 k,
+                                                      4:string sqlClause,
+                                                      5:DegreeFilter filter,
+                                                      6:bool alternating)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: SQLException error3, 4: InvalidNodeIdException error4)
+
+  FilteredNodeList kStepInNeighborsFilteredWithStats(1:string edgeType, 2:Node source, 3:i32 k,
+                                                     4:string sqlClause,
+                                                     5:DegreeFilter filter,
+                                                     6:bool alternating)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: SQLException error3, 4: InvalidNodeIdException error4)
+
+  /* Versions of kStepOutNeighborsFiltered and kStepInNeighborsFiltered returning one page of at
+     most pageSize nodes, in order of tempest id.  Pass an empty pageToken for the first page.
+  */
+  NodePage kStepOutNeighborsFilteredPage(1:string edgeType, 2:Node source, 3:i32 k,
+                                         4:string sqlClause,
+                                         5:DegreeFilter filter,
+                                         6:bool alternating,
+                                         7:i32 pageSize,
+                                         8:string pageToken)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: SQLException error3, 4: InvalidNodeIdException error4)
+
+  NodePage kStepInNeighborsFilteredPage(1:string edgeType, 2:Node source, 3:i32 k,
+                                        4:string sqlClause,
+                                        5:DegreeFilter filter,
+                                        6:bool alternating,
+                                        7:i32 pageSize,
+                                        8:string pageToken)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: SQLException error3, 4: InvalidNodeIdException error4)
+
+  /* Versions of kStepOutNeighborsFiltered and kStepInNeighborsFiltered returning a PackedNodeList. */
+  PackedNodeList kStepOutNeighborsFilteredPacked(1:string edgeType, 2:Node source, 3:i32 k,
+                                                 4:string sqlClause,
+                                                 5:DegreeFilter filter,
+                                                 6:bool alternating)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: SQLException error3, 4: InvalidNodeIdException error4)
+
+  PackedNodeList kStepInNeighborsFilteredPacked(1:string edgeType, 2:Node source, 3:i32 k,
+                                                4:string sqlClause,
+                                                5:DegreeFilter filter,
+                                                6:bool alternating)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: SQLException error3, 4: InvalidNodeIdException error4)
+
+  /* Returns the subgraph of the given edge type induced by the given nodes, which must have the
+     edge type's source or target node type.  If there are more than maxNodes distinct nodes, only
+     the first maxNodes are used.
+  */
+  InducedSubgraph inducedSubgraph(1:string edgeType, 2:list<Node> nodes, 3:i32 maxNodes)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: InvalidNodeIdException error3)
+
+  /* Returns the subgraph of the given edge type induced by the nodes at most hops steps from the
+     seed, following edges in either direction (the seed's ego network).  If there are more than
+     maxNodes such nodes, only the first maxNodes reached by breadth-first search are used.
+  */
+  InducedSubgraph egoSubgraph(1:string edgeType, 2:Node seed, 3:i32 hops, 4:i32 maxNodes)
+    throws (1: UndefinedGraphException error1, 2: InvalidArgumentException error2,
+            3: InvalidNodeIdException error3)
+
   /* Runs PPR on the union of the given edge types, treating them as undirected.  More precicely, at each step of the walk,
      considers all in-neighbors and out-neighbors of the given node across edge types, and chooses one uniformly at random.
      Parameters in pageRankParams control the length of the walk and parameters to only return the top-k nodes found,
@@ -136,15 +400,83 @@ service TempestDBService {
                          4:BidirectionalPPRParams biPPRParams)
     throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
 
+  /* Versions of pprUndirected and pprSingleTarget which also return how much work the estimate
+     did and its error bound, for callers which set deadlineMillis.
+  */
+  PPRMapEstimate pprUndirectedWithStats(1:list<string> edgeTypes, 2:list<Node> seeds,
+                                        3:MonteCarloPageRankParams pageRankParams)
+    throws (1: UndefinedGraphException error1, 2: InvalidNodeIdException error2,
+            3: InvalidArgumentException error3)
+
+  /* Version of pprUndirectedWithStats returning packed tempest ids and PPRs, which are much
+     smaller and cheaper to decode for large results.
+  */
+  PackedPPRMapEstimate pprUndirectedPacked(1:list<string> edgeTypes, 2:list<Node> seeds,
+                                           3:MonteCarloPageRankParams pageRankParams)
+    throws (1: UndefinedGraphException error1, 2: InvalidNodeIdException error2,
+            3: InvalidArgumentException error3)
+
+  PPRSingleTargetEstimate pprSingleTargetWithStats(1:string edgeType,
+                                                   2:list<Node> seedNodes,
+                                                   3:Node targetNode,
+                                                   4:BidirectionalPPRParams biPPRParams)
+    throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+
+  /* Returns the top recommendations for the seed node: the nodes of the target type of the given
+     edge type with the highest PPR personalized to the seed (estimated as by pprUndirected), in
+     decreasing order of score, after excluding nodes as given by recParams.  Exclusions are
+     applied before the top maxResults are chosen, so exactly maxResults recommendations are
+     returned if enough nodes were visited.
+  */
+  list<Recommendation> recommend(1:string edgeType,
+                                 2:Node seed,
+                                 3:MonteCarloPageRankParams pageRankParams,
+                                 4:RecommendParams recParams)
+    throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2, 3:UndefinedGraphException ex3)
+
+  /* Like pprSingleTarget, but returns the PPR of each of the given target nodes (at most 10000).
+     The forward random walks are shared by all targets, so this is much faster than calling
+     pprSingleTarget for each target.
+  */
+  map<Node, double> pprMultiTarget(1:string edgeType,
+                                   2:list<Node> seedNodes,
+                                   3:list<Node> targetNodes,
+                                   4:BidirectionalPPRParams biPPRParams)
+    throws (1:InvalidNodeIdException ex1, 2:InvalidArgumentException ex2)
+
+  /* Returns the counters of the cache of pprUndirected and pprSingleTarget results. */
+  CacheStats pprCacheStats()
+
 
   int nodeCount(1:string edgeType) throws (1:InvalidArgumentException ex)
 
   long edgeCount(1:string edgeType) throws (1:InvalidArgumentException ex)
 
+  /* Reads the graphs of the given edge types into RAM in the background, one after another and
+     sequentially, so later queries on them don't wait for page faults.  If pin is true, the graphs
+     are then locked in RAM (which needs a large enough memlock limit).  Returns immediately; use
+     residency to follow the progress.
+  */
+  void warm(1:list<string> edgeTypes, 2:bool pin) throws (1:InvalidArgumentException ex)
+
+  GraphResidency residency(1:string edgeType) throws (1:InvalidArgumentException ex)
+
   /* Returns all nodes statisfying the given SQL clause. */
   list<Node> nodes(1:string nodeType, 2:string sqlClause)
     throws (1: UndefinedGraphException error1, 2: SQLException error2)
 
+  /* Returns one page of at most pageSize nodes satisfying the given SQL clause (which may be
+     empty), in order of tempest id.  Pass an empty pageToken for the first page.
+  */
+  NodePage nodesPage(1:string nodeType, 2:string sqlClause, 3:i32 pageSize, 4:string pageToken)
+    throws (1: UndefinedGraphException error1, 2: SQLException error2, 3: InvalidArgumentException error3)
+
+  /* Returns the node ids of the given nodes of the given type, whose tempest ids are packed as in
+     PackedNodeList.  The ith element of the result corresponds to the ith tempest id.
+  */
+  list<string> tempestIdsToNodeIds(1:string nodeType, 2:binary tempestIds)
+    throws (1: InvalidNodeIdException error1, 2: InvalidArgumentException error2, 3: SQLException error3)
+
   /* Returns a map from node id to attribute, with null attributes omitted.
      Returns attributes in "JSON" format, meaning simply that strings are wrapped in double-quotes,
      booleans are "true" or "false", and ints are returned as standard base-10 strings.
@@ -154,6 +486,15 @@ service TempestDBService {
   map<Node, string> getMultiNodeAttributeAsJSON(1:list<Node> nodes, 2:string attributeName)
     throws (1: UndefinedGraphException error1, 2:InvalidArgumentException error2)
 
+  /* Returns the given attributes of the nodes of the given type with the given ids (at most
+     1000000), as one typed AttributeColumn per attribute name.  Element i of each column
+     corresponds to the ith node id.  This fetches many attributes of many nodes in one round trip,
+     and avoids per-value conversion to and from JSON.
+  */
+  list<AttributeColumn> getNodeAttributeColumns(1:string nodeType, 2:list<string> nodeIds,
+                                                3:list<string> attributeNames)
+    throws (1: UndefinedGraphException error1, 2:InvalidArgumentException error2, 3:SQLException error3)
+
 
   /* Adds the given node to the attribute store, so it's attributes can be set, and edges can be added to it.
     Throws SQLException if the node already exists.
@@ -170,6 +511,14 @@ service TempestDBService {
   void setNodeAttribute(1:Node node, 2:string attributeName, 3:string attributeValue)
     throws (1: UndefinedGraphException error1, 2:InvalidArgumentException error2, 3:SQLException error3)
 
+  /* Sets attribute attributeNames[i] of nodes[i] to attributeValues[i] for each i, using one batched
+     statement per node type and attribute name.  The lists must have equal size.  If any update
+     fails, none are applied.
+  */
+  void setNodeAttributes(1:list<Node> nodes, 2:list<string> attributeNames, 3:list<string> attributeValues)
+    throws (1: UndefinedGraphException error1, 2:InvalidArgumentException error2, 3:SQLException error3,
+            4: UnequalListSizeException error4)
+
   /* Add the given edges to the given graph.  Every source node must match the source type of the given edgeType,
      and similarly for targetNodes and the target type of the given edgeType.
      Since thrift doesn't have pairs, pass in parallel lists, which must have equal size or an
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Test of the asyncio Tempest client (Python 3.5+)
+# This file is run by TempestDBServerClientSpec, after tempest_test.py.
+
+import asyncio
+
+from thrift.transport import TTransport
+
+import tempest_db
+from tempest_db import Node
+from tempest_db.async_client import _PipelinedConnection
+
+def expect_equal(actual, expected):
+    assert expected == actual, "expected " + str(expected) + " but actual " + str(actual)
+
+alice = Node("user", "alice")
+bob = Node("user", "bob")
+carol = Node("user", "carol")
+
+# Read a few bytes at a time, so every response spans many reads and is larger than the size of
+# the data when decoding it is first attempted.
+_PipelinedConnection.ReadBytes = 16
+
+async def expect_exception(awaitable, exception_type):
+    try:
+        await awaitable
+        assert False, "exception " + str(exception_type) + " not raised"
+    except exception_type:
+        pass
+
+async def forward(reader, writer):
+    while True:
+        data = await reader.read(1 << 16)
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+async def start_proxy(stalled_connection_count=0, delay_seconds=0):
+    """ Start a proxy to the server, which never forwards requests on its first
+    stalled_connection_count connections, and starts forwarding on later ones after delay_seconds.
+    Return the proxy's port and a list to which the index of each connection is appended."""
+    connection_indexes = []
+
+    async def proxy(reader, writer):
+        connection_indexes.append(len(connection_indexes))
+        if connection_indexes[-1] < stalled_connection_count:
+            while await reader.read(1 << 16):
+                pass
+            writer.close()
+            return
+        await asyncio.sleep(delay_seconds)
+        server_reader, server_writer = await asyncio.open_connection("localhost", 10011)
+        await asyncio.gather(forward(reader, server_writer), forward(server_reader, writer))
+
+    proxy_server = await asyncio.start_server(proxy, "localhost", 0)
+    return proxy_server, proxy_server.sockets[0].getsockname()[1], connection_indexes
+
+async def test_client():
+    # The timeout makes a response that is never decoded fail the test instead of hanging it
+    client = tempest_db.AsyncTempestClient(port=10011, connection_count=2, timeout_ms=10000)
+    expect_equal(await client.out_neighbors("follows", alice), [bob])
+    expect_equal(await client.multi_out_neighbors("follows", [alice, bob]), {alice: [bob], bob: [carol]})
+    # Pipelined requests on the same connections are answered in order
+    degrees = await asyncio.gather(*[client.in_degree("follows", node) for node in [alice, bob, carol] * 10])
+    expect_equal(degrees, [0, 2, 1] * 10)
+    # Declared exceptions are raised to the caller, and the connection stays usable
+    await expect_exception(client.out_degree("follows", Node("user", "foo")),
+                           tempest_db.InvalidNodeIdException)
+    await expect_exception(client.multi_hop_out_neighbors("nonexistent_graph", alice, 3),
+                           tempest_db.UndefinedGraphException)
+    expect_equal(await client.out_degree("follows", alice), 1)
+    await client.close()
+
+async def test_paused_writes():
+    # The proxy doesn't read requests at first, so these (about 10MB) fill the socket buffers, and
+    # the writes of the later ones wait for them to drain.
+    proxy_server, proxy_port, _ = await start_proxy(delay_seconds=0.5)
+    client = tempest_db.AsyncTempestClient(port=proxy_port, connection_count=1, timeout_ms=30000)
+    unknown_nodes = [Node("user", "x" * 1000)] * 100
+    results = await asyncio.gather(*[client.multi_in_degree("follows", unknown_nodes)
+                                     for _ in range(100)], return_exceptions=True)
+    for result in results:
+        assert isinstance(result, tempest_db.InvalidNodeIdException), result
+    await client.close()
+    proxy_server.close()
+    await proxy_server.wait_closed()
+
+async def test_timeout():
+    proxy_server, proxy_port, connection_indexes = await start_proxy(stalled_connection_count=1)
+    client = tempest_db.AsyncTempestClient(port=proxy_port, connection_count=1, timeout_ms=500)
+    # Both requests are sent on the first connection.  When the first times out, both fail, and
+    # in_degree is retried on a new connection while add_node (which isn't retried) raises.
+    results = await asyncio.gather(client.add_node(alice), client.in_degree("follows", bob),
+                                   return_exceptions=True)
+    assert isinstance(results[0], TTransport.TTransportException), results[0]
+    expect_equal(results[0].type, TTransport.TTransportException.TIMED_OUT)
+    expect_equal(results[1], 2)
+    expect_equal(len(connection_indexes), 2)
+    await client.close()
+    proxy_server.close()
+    await proxy_server.wait_closed()
+
+asyncio.get_event_loop().run_until_complete(test_client())
+asyncio.get_event_loop().run_until_complete(test_paused_writes())
+asyncio.get_event_loop().run_until_complete(test_timeout())
+print("Python asyncio client tests passed :)")
@@ -6,6 +6,9 @@
 
 import tempest_db
 from tempest_db import Node
+import os
+import tempfile
+import threading
 
 def expect_equal(actual, expected):
     assert expected == actual, "expected " + str(expected) + " but actual " + str(actual)
@@ -31,6 +34,17 @@ carol = Node("user", "carol")
 expect_equal(client.out_degree("follows", alice), 1)
 expect_equal(client.out_neighbors("follows", alice), [bob])
 
+expect_equal(client.multi_out_degree("follows", [alice, bob, carol]), {alice: 1, bob: 1, carol: 1})
+expect_equal(client.multi_in_degree("follows", [alice, bob]), {alice: 0, bob: 2})
+expect_equal(client.multi_out_neighbors("follows", [alice, bob]), {alice: [bob], bob: [carol]})
+expect_equal(client.multi_in_neighbors("follows", [alice, carol]), {alice: [], carol: [bob]})
+
+[follows_residency] = client.warm(["follows"], wait=True, poll_seconds=0.01)
+expect_equal(follows_residency.warming, False)
+assert follows_residency.fileBytes > 0, follows_residency
+expect_equal(client.residency("follows").pinned, False)
+expect_exception(lambda: client.residency("nonexistent_graph"), tempest_db.InvalidArgumentException)
+
 # I haven't verified PPR_alice[bob] analytically, but 0.41 seems reasonable
 expect_approx_equal(client.ppr_undirected(["follows"], [alice], num_steps=10000, reset_probability=0.3)[bob], 0.41, 0.02)
 
@@ -39,6 +53,27 @@ ppr_alice_carol = client.ppr_single_target("follows", [alice], bob, relative_err
 # I haven't verified PPR_alice[bob] analytically, but 0.41 seems reasonable
 expect_approx_equal(ppr_alice_carol, 0.41, tol=0.01)
 
+# Repeated PPR calls are answered from the server's cache unless cache=False
+hits = client.ppr_cache_stats().hits
+expect_equal(client.ppr_single_target("follows", [alice], bob, relative_error=0.01, reset_probability=0.3,
+                                      max_staleness=60.0), ppr_alice_carol)
+expect_equal(client.ppr_cache_stats().hits, hits + 1)
+client.ppr_single_target("follows", [alice], bob, relative_error=0.01, reset_probability=0.3, cache=False)
+expect_equal(client.ppr_cache_stats().hits, hits + 1)
+
+# Deadlines stop the estimators early with a partial result
+pprs, stats = client.ppr_undirected_with_stats(["follows"], [alice], deadline_ms=50, num_steps=2000000000)
+expect_equal(stats.complete, False)
+expect_approx_equal(sum(pprs.values()), 1.0, 1.0e-6)
+ppr, stats = client.ppr_single_target_with_stats("follows", [alice], bob, deadline_ms=10000,
+                                                 relative_error=0.01, reset_probability=0.3, cache=False)
+expect_equal(stats.complete, True)
+expect_approx_equal(ppr, 0.41, 0.02)
+
+ppr_alice_targets = client.ppr_multi_target("follows", [alice], [bob, carol], relative_error=0.01, reset_probability=0.3)
+expect_equal(set(ppr_alice_targets.keys()), set([bob, carol]))
+expect_approx_equal(ppr_alice_targets[bob], 0.41, tol=0.01)
+
 expect_equal(client.node_attribute(alice, "name"), "Alice Johnson")
 expect_equal(client.node_attribute(alice, "login_count"), 5)
 expect_equal(client.node_attribute(alice, "premium_subscriber"), False)
@@ -76,11 +111,99 @@ expect_equal(
         [alice])
 expect_equal(set(client.multi_hop_in_neighbors("follows", bob, 1)), set([alice, carol]))
 
+filtered, filter_stats = client.multi_hop_out_neighbors_with_stats("follows", alice, 2, "login_count > 2")
+expect_equal(filtered, client.multi_hop_out_neighbors("follows", alice, 2, "login_count > 2"))
+expect_equal(filter_stats.resultCount, len(filtered))
+assert filter_stats.path in [tempest_db.FilterPath.MEMORY, tempest_db.FilterPath.SQL], filter_stats
+followers, filter_stats = client.multi_hop_in_neighbors_with_stats("follows", bob, 1)
+expect_equal(set(followers), set([alice, carol]))
+expect_equal(filter_stats.path, tempest_db.FilterPath.NONE)
+
+expect_equal(list(client.iter_nodes("user", "login_count > 2", page_size=1)), [alice, carol])
+expect_equal(list(client.iter_multi_hop_in_neighbors("follows", bob, 1, page_size=1)), [alice, carol])
+expect_equal(list(client.iter_multi_hop_out_neighbors("follows", alice, 2, alternating=False)), [carol])
+
+# The follows edges alice -> bob, bob -> carol and carol -> bob, with nodes numbered 0, 1 and 2
+subgraph = client.induced_subgraph("follows", nodes=[carol, alice, bob])
+expect_equal([(nodes.node_type, list(nodes.tempest_ids)) for nodes in subgraph.node_lists], [("user", [1, 2, 3])])
+expect_equal(list(subgraph.offsets), [0, 1, 2, 3])
+expect_equal(list(subgraph.targets), [1, 2, 1])
+expect_equal(subgraph.node_type_and_tempest_id(2), ("user", 3))
+ego_subgraph = client.induced_subgraph("follows", seed=alice, hops=1)
+expect_equal(list(ego_subgraph.offsets), [0, 1, 1])
+expect_equal(ego_subgraph.truncated, False)
+expect_equal(client.induced_subgraph("follows", seed=alice, hops=2, max_nodes=2).truncated, True)
+expect_exception(lambda: client.induced_subgraph("follows"), ValueError)
+
+packed_followers = client.in_neighbors_packed("follows", bob)
+expect_equal(packed_followers.node_type, "user")
+expect_equal(sorted(packed_followers.tempest_ids), [1, 3])
+expect_equal(set(client.tempest_ids_to_nodes("user", packed_followers.tempest_ids)), set([alice, carol]))
+expect_equal(list(client.out_neighbors_packed("follows", alice).tempest_ids), [2])
+packed_two_hop = client.multi_hop_out_neighbors_packed("follows", alice, 2, alternating=False)
+expect_equal(client.tempest_ids_to_nodes(packed_two_hop.node_type, packed_two_hop.tempest_ids), [carol])
+
+try:
+    from tempest_db.local import GraphFile
+except ImportError:
+    GraphFile = None # numpy isn't installed
+if GraphFile:
+    # Read the graph file the server is using directly (the server hasn't added edges yet)
+    follows_file = GraphFile("src/test/resources/binary_graphs/follows.dat")
+    expect_equal(follows_file.edge_count(), client.edge_count("follows"))
+    expect_equal(list(follows_file.out_neighbors(1)), [2])
+    expect_equal(sorted(follows_file.in_neighbors(2)), [1, 3])
+    expect_equal(follows_file.out_degree(2), 1)
+    expect_equal(list(follows_file.out_neighbors(follows_file.max_node_id() + 1)), [])
+
+    # Batch PPR over the graph file should agree with the server's estimate
+    from tempest_db import batch_ppr
+    batch_pprs = batch_ppr.ppr_undirected([follows_file.path], [1, [1, 3]], num_steps=100000,
+                                          reset_probability=0.3, processes=2, batch_size=1)
+    server_pprs = client.ppr_undirected(["follows"], [alice], num_steps=100000, reset_probability=0.3)
+    for node, tempest_id in [(alice, 1), (bob, 2), (carol, 3)]:
+        expect_approx_equal(server_pprs[node], batch_pprs[0][tempest_id], 0.02)
+    expect_equal(set(batch_pprs[1].keys()), set([1, 2, 3]))
+    # A missing graph file raises before any worker processes start
+    expect_exception(lambda: batch_ppr.ppr_undirected([follows_file.path + ".missing"], [1],
+                                                      processes=2),
+                     IOError)
+
+# Results interned into a NodeTable share handles
+table = tempest_db.NodeTable()
+component = client.connected_component(alice, ["has_read"], node_table=table)
+expect_equal(set(component), set(client.connected_component(alice, ["has_read"])))
+expect_equal(Node("book", "102") in component, True)
+pprs = client.ppr_undirected(["follows"], [alice], num_steps=10000, reset_probability=0.3, node_table=table)
+expect_approx_equal(pprs[bob], 0.41, 0.02)
+expect_approx_equal(sum(pprs.values()), 1.0, 1.0e-6)
+expect_equal(table.handle(bob) in set(pprs.handles) & set(component.handles), True)
+
 # id 4 exists but has null name
 nameless = Node("user", "nameless")
 expect_equal(client.node_attribute(nameless, "name"), None)
 expect_equal(client.multi_node_attribute([nameless], "name").get(4), None)
 
+# Recommendations exclude the seed and its existing neighbors before the top results are chosen
+expect_equal([(node, attributes) for node, score, attributes in
+              client.recommend("has_read", alice, max_results=5, attribute_names=["title"])],
+             [(Node("book", "102"), {"title": "The Grapes of Wrath"})])
+expect_equal([node for node, score, attributes in client.recommend("follows", alice)], [carol])
+expect_equal([node for node, score, attributes in
+              client.recommend("follows", alice, exclude_out_neighbors=False)], [bob, carol])
+expect_equal(client.recommend("follows", alice, min_seed_out_degree=2), [])
+
+# Several attributes of several nodes are returned as typed columns in one request
+columns = client.node_attribute_columns([carol, nameless, Node("user", "missing"), alice],
+                                        ["login_count", "premium_subscriber", "name"])
+expect_equal(columns["login_count"].to_list(), [3, 0, None, 5])
+expect_equal(columns["premium_subscriber"].to_list(), [True, False, None, False])
+expect_equal(columns["name"].to_list(), ['Carol "ninja" Coder', None, None, "Alice Johnson"])
+expect_equal(columns["login_count"].type, "int")
+expect_equal(list(columns["name"].is_null), [False, True, True, False])
+expect_exception(lambda: client.node_attribute_columns([alice], ["nonexistent_attribute"]),
+                 tempest_db.InvalidArgumentException)
+
 expect_equal(
         client.nodes("user", "name = 'non_existent_name'"),
         [])
@@ -94,6 +217,72 @@ expect_exception(lambda: client.multi_hop_out_neighbors("nonexistent_graph", ali
 expect_exception(lambda: client.out_neighbor("follows", alice, 2),
                  tempest_db.InvalidIndexException)
 
+# A single client shared by several threads should use a bounded number of pooled connections
+pooled_client = tempest_db.client(port=port, pool_min_size=1, pool_max_size=2)
+thread_errors = []
+def read_repeatedly():
+    try:
+        for i in range(20):
+            expect_equal(pooled_client.out_neighbors("follows", alice), [bob])
+    except Exception as e:
+        thread_errors.append(e)
+threads = [threading.Thread(target=read_repeatedly) for i in range(6)]
+for t in threads: t.start()
+for t in threads: t.join()
+expect_equal(thread_errors, [])
+pooled_client.close()
+
+# Reads are routed across endpoints, and an unreachable replica is ejected rather than failing reads
+routed_client = tempest_db.client(endpoints=["localhost:%d" % port, ("localhost", port), "localhost:1"],
+                                  hedge_percentile=90, hedge_min_samples=5)
+for i in range(20):
+    expect_equal(routed_client.out_neighbors("follows", alice), [bob])
+endpoint_status = routed_client.endpoint_status()
+expect_equal([status['primary'] for status in endpoint_status], [True, False, False])
+assert endpoint_status[2]['ejected_seconds_remaining'] > 0
+routed_client.close()
+
+# Client metrics record each call's latency, bytes and errors
+call_events = []
+metrics = tempest_db.ClientMetrics(hook=call_events.append)
+measured_client = tempest_db.client(port=port, metrics=metrics)
+for i in range(5):
+    expect_equal(measured_client.out_neighbors("follows", alice), [bob])
+expect_exception(lambda: measured_client.out_degree("follows", Node("user", "foo")),
+                 tempest_db.InvalidNodeIdException)
+stats = metrics.stats()
+expect_equal(stats["out_neighbors"]["count"], 5)
+assert stats["out_neighbors"]["request_bytes"] > 0
+assert stats["out_neighbors"]["response_bytes"] > 0
+assert stats["out_neighbors"]["latency_seconds"]["p99"] > 0
+expect_equal(stats["out_degree"]["errors"], {"InvalidNodeIdException": 1})
+expect_equal(len(call_events), 6)
+assert 'tempest_client_request_duration_seconds_count{method="out_neighbors"} 5' in metrics.prometheus_text()
+measured_client.close()
+
+# The benchmark workload runs on any graph, here with read-only operations on the test users
+from tempest_db import bench
+workload = bench.Workload([alice, bob, carol], mix=[(name, 1) for name in bench.ReadOnlyOperations],
+                          ppr_steps=1000)
+bench_results = bench.run(lambda concurrency: tempest_db.client(port=port, pool_max_size=concurrency),
+                          workload, [1, 3], 30)
+expect_equal([result['concurrency'] for result in bench_results], [1, 3])
+expect_equal([result['count'] for result in bench_results], [30, 30])
+expect_equal([result['errors'] for result in bench_results], [0, 0])
+assert bench_results[1]['p99_ms'] >= bench_results[1]['p50_ms'] > 0
+
+# Repeated reads through a caching client should be answered without a server round trip
+cache = tempest_db.ClientCache(max_bytes=1024 * 1024)
+cached_client = tempest_db.client(port=port, cache=cache)
+for i in range(3):
+    expect_equal(cached_client.out_degree("follows", alice), 1)
+    expect_equal(cached_client.out_neighbors("follows", alice), [bob])
+    expect_equal(cached_client.node_attribute(alice, "name"), "Alice Johnson")
+expect_equal(cached_client.multi_node_attribute([alice, nameless], "name"),
+             {alice: "Alice Johnson"})
+expect_equal(cache.stats()['misses'], 4)
+expect_equal(cache.stats()['hits'], 7)
+
 # TODO: Update twitter_2010_example
 #expect_equal(sorted(twitter_2010_example.get_influencers("follows", 'alice', client)),
 #             sorted(['bob', 'carol']))
@@ -177,5 +366,46 @@ if test_safe_addition:
     expect_equal(client.in_degree("follows", fred), 1)
     expect_equal(client.in_degree("follows", george), 2)
 
+    # Bulk loading streams a csv file in parallel chunks, creating missing nodes
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as edge_file:
+        edge_file.write("ivy,jack\nivy,kate\njack,kate\nivy,jack\n")
+    progress = client.bulk_load_edges("follows", edge_file.name, "user", "user",
+                                      chunk_size=2, parallelism=2, progress_callback=None)
+    expect_equal(progress.edges_loaded, 4)
+    expect_equal(set(client.out_neighbors("follows", Node("user", "ivy"))),
+                 set([Node("user", "jack"), Node("user", "kate")]))
+    expect_equal(client.in_degree("follows", Node("user", "kate")), 2)
+    # The server looks up both nodes of a user -> user edge, so such chunks are limited to 5000
+    expect_exception(lambda: client.bulk_load_edges("follows", edge_file.name, "user", "user",
+                                                    chunk_size=5001, progress_callback=None),
+                     ValueError)
+    os.remove(edge_file.name)
+
+    # A buffered writer sends its writes in batches, at the latest when it is closed
+    lily = Node("user", "lily")
+    with client.buffered_writer(max_batch_size=100) as writer:
+        writer.add_edge("follows", lily, ed)
+        writer.set_node_attribute(lily, "name", "Lily")
+        writer.set_node_attribute(lily, "name", "Lily Jones")
+        expect_equal(writer.pending_count(), 2)
+    expect_equal(client.out_neighbors("follows", lily), [ed])
+    expect_equal(client.node_attribute(lily, "name"), "Lily Jones")
+
+    # Writes through a caching client invalidate its cached results for the touched nodes
+    expect_equal(cached_client.out_degree("follows", george), 0)
+    cached_client.add_nodes_and_edges("follows", [george], [ed], True)
+    expect_equal(cached_client.out_degree("follows", george), 1)
+    cached_client.set_node_attribute(george, "name", "George")
+    expect_equal(cached_client.node_attribute(george, "name"), "George")
+
+# The default benchmark mix includes writes, so it runs last, on users the tests above don't follow
+writable_workload = bench.Workload([nameless, Node("user", "; DROP TABLE user;")], ppr_steps=1000)
+bench_results = bench.run(lambda concurrency: tempest_db.client(port=port, pool_max_size=concurrency),
+                          writable_workload, [2], 100)
+expect_equal(bench_results[0]['count'], 100)
+expect_equal(bench_results[0]['errors'], 0)
+assert bench_results[0]['operations']['set_node_attribute']['count'] > 0
+
+cached_client.close()
 client.close()
 print "Python client tests passed :)"
@@ -75,4 +75,15 @@ class LargeMappedByteBufferSpec extends FlatSpec with Matchers {
     b.copy(dest, start, ByteCount(8 * longs.size))
     b.longSeq(dest, longs.size) should contain theSameElementsInOrderAs (longs)
   }
+
+  it should "page in the file" in {
+    val f = File.createTempFile("test", ".dat")
+    f.deleteOnExit()
+    val b = new MMapByteBuffer(f)
+    b.putInt(Pointer(3L << 20), 42)
+    b.touchAllPages()
+    b.mappedByteCount shouldEqual f.length
+    for (residentByteCount <- b.residentByteCount()) // Only reported on Linux
+      residentByteCount shouldEqual b.mappedByteCount
+  }
 }
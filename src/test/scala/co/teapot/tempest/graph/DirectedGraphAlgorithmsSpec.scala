@@ -0,0 +1,26 @@
+package co.teapot.tempest.graph
+
+import org.scalatest.{FlatSpec, Matchers}
+
+class DirectedGraphAlgorithmsSpec extends FlatSpec with Matchers {
+  val graph = DirectedGraph(1 -> 2, 1 -> 3, 2 -> 3, 3 -> 1, 4 -> 1, 1 -> 5)
+
+  "inducedSubgraphCSR" should "follow out-edges of the sources" in {
+    // Nodes 3, 1 and 2 are numbered 0, 1 and 2
+    val (offsets, targets) = DirectedGraphAlgorithms.inducedSubgraphCSR(graph, Array(3, 1, 2), Array(3, 1, 2))
+    offsets shouldEqual Array(0, 1, 3, 4)
+    targets shouldEqual Array(1, 0, 2, 0)
+  }
+
+  it should "follow in-edges of the targets when they are fewer" in {
+    val (offsets, targets) = DirectedGraphAlgorithms.inducedSubgraphCSR(graph, Array(1, 2, 3, 4), Array(1))
+    offsets shouldEqual Array(0, 0, 0, 1, 2)
+    targets shouldEqual Array(0, 0)
+  }
+
+  it should "handle empty node sets" in {
+    val (offsets, targets) = DirectedGraphAlgorithms.inducedSubgraphCSR(graph, Array(1, 2), Array[Int]())
+    offsets shouldEqual Array(0, 0, 0)
+    targets shouldEqual Array[Int]()
+  }
+}
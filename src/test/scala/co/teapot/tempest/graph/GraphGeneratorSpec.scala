@@ -0,0 +1,27 @@
+package co.teapot.tempest.graph
+
+import org.scalatest.{Matchers, FlatSpec}
+
+class GraphGeneratorSpec extends FlatSpec with Matchers {
+  "GraphGenerator" should "generate reproducible skewed random graphs" in {
+    val graph = GraphGenerator.skewedRandomGraph(nodeCount = 1000, edgeCount = 10000, skew = 1.0, seed = 1L)
+    graph.edgeCount should equal (10000)
+    graph.maxNodeId should be <= 1000
+    for (id <- graph.nodeIds) {
+      id should be >= 1
+      graph.outNeighbors(id) should not contain (id)
+    }
+
+    val sameGraph = GraphGenerator.skewedRandomGraph(nodeCount = 1000, edgeCount = 10000, skew = 1.0, seed = 1L)
+    for (id <- graph.nodeIds) {
+      sameGraph.outNeighbors(id) should equal (graph.outNeighbors(id))
+    }
+
+    // With skew 1, the most popular of 1000 nodes receives about 1/7.5 of all edges, while with
+    // uniform edges every in-degree is close to 10.
+    val maxInDegree = graph.nodeIds.map(graph.inDegree).max
+    maxInDegree should be > 500
+    val uniformGraph = GraphGenerator.skewedRandomGraph(nodeCount = 1000, edgeCount = 10000, skew = 0.0, seed = 1L)
+    uniformGraph.nodeIds.map(uniformGraph.inDegree).max should be < 50
+  }
+}
@@ -0,0 +1,49 @@
+package co.teapot.tempest.graph
+
+import java.io.{File, PrintWriter}
+
+import org.scalatest.{FlatSpec, Matchers}
+
+class MemMappedDynamicDirectedGraphDeltaMergerSpec extends FlatSpec with Matchers {
+  def writeEdges(edges: Seq[(Int, Int)]): File = {
+    val f = File.createTempFile("delta", ".txt")
+    f.deleteOnExit()
+    val writer = new PrintWriter(f)
+    for ((id1, id2) <- edges)
+      writer.println(s"$id1 $id2")
+    writer.close()
+    f
+  }
+
+  "MemMappedDynamicDirectedGraphDeltaMerger" should "add new edges to an existing graph file" in {
+    val graphFile = File.createTempFile("graph", ".dat")
+    graphFile.deleteOnExit()
+    val initialEdges = Seq((1, 2), (2, 3), (3, 1))
+    val g = MemMappedDynamicDirectedGraph(graphFile)
+    for ((id1, id2) <- initialEdges)
+      g.addEdge(id1, id2)
+    g.syncToDisk()
+
+    // Node 1 gains enough out-neighbors to be presized; node 7 is new
+    val deltaEdges = (10 until 40).map(v => (1, v)) ++ Seq((7, 2), (3, 7))
+    val addedCount = MemMappedDynamicDirectedGraphDeltaMerger.merge(
+      writeEdges(deltaEdges), graphFile, log = (_: String) => ())
+    addedCount should equal (deltaEdges.size)
+
+    val merged = MemMappedDynamicDirectedGraph(graphFile)
+    val expected = DynamicDirectedGraph(initialEdges ++ deltaEdges)
+    merged.edgeCount should equal (initialEdges.size + deltaEdges.size)
+    merged.maxNodeId should equal (39)
+    for (u <- expected.nodeIds) {
+      merged.outNeighbors(u) should contain theSameElementsAs (expected.outNeighbors(u))
+      merged.inNeighbors(u) should contain theSameElementsAs (expected.inNeighbors(u))
+    }
+  }
+
+  it should "reject a missing graph file" in {
+    an[IllegalArgumentException] should be thrownBy {
+      MemMappedDynamicDirectedGraphDeltaMerger.merge(
+        writeEdges(Seq((1, 2))), new File("/nonexistent/graph.dat"), log = (_: String) => ())
+    }
+  }
+}
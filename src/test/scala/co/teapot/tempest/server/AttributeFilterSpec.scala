@@ -0,0 +1,56 @@
+package co.teapot.tempest.server
+
+import org.scalatest.{FlatSpec, Matchers}
+
+class AttributeFilterSpec extends FlatSpec with Matchers {
+  // Nodes 0 to 4; nodes 3 and 4 have only null attributes
+  val index = new InMemoryAttributeIndex()
+  index.addColumn("user", "login_count", "int")
+  index.addColumn("user", "premium_subscriber", "boolean")
+  index.addColumn("user", "name", "string")
+  index.setValues("user", "login_count", Seq(0 -> 5, 1 -> 2, 2 -> 3, 3 -> null))
+  index.setValues("user", "premium_subscriber", Seq(0 -> false, 1 -> false, 2 -> true))
+  index.setValues("user", "name", Seq(0 -> "Alice", 1 -> "Bob", 2 -> "O'Neil"))
+  val allNodes = 0 to 4
+
+  def matches(sqlClause: String): Option[Seq[Int]] = index.filter("user", sqlClause, allNodes)
+
+  "An InMemoryAttributeIndex" should "evaluate comparisons and boolean attributes" in {
+    matches("login_count > 2") shouldEqual Some(Seq(0, 2))
+    matches("LOGIN_COUNT <= 3") shouldEqual Some(Seq(1, 2))
+    matches("login_count != 5") shouldEqual Some(Seq(1, 2))
+    matches("premium_subscriber") shouldEqual Some(Seq(2))
+    matches("premium_subscriber = false") shouldEqual Some(Seq(0, 1))
+    matches("name = 'O''Neil'") shouldEqual Some(Seq(2))
+    matches("name <> 'Bob'") shouldEqual Some(Seq(0, 2))
+  }
+
+  it should "combine clauses using SQL's treatment of nulls" in {
+    matches("login_count > 2 AND NOT premium_subscriber") shouldEqual Some(Seq(0))
+    matches("(login_count = 2 OR premium_subscriber) and name is not null") shouldEqual Some(Seq(1, 2))
+    matches("NOT login_count > 2") shouldEqual Some(Seq(1))
+    matches("NOT (login_count > 2 AND premium_subscriber)") shouldEqual Some(Seq(0, 1))
+    matches("login_count IS NULL") shouldEqual Some(Seq(3, 4))
+    matches("premium_subscriber IS NOT TRUE") shouldEqual Some(Seq(0, 1, 3, 4))
+    matches("login_count > 2 OR premium_subscriber IS NULL") shouldEqual Some(Seq(0, 2, 3, 4))
+  }
+
+  it should "reject clauses it can't evaluate" in {
+    matches("title = 'Roots'") shouldEqual None // Not in memory
+    matches("name < 'Bob'") shouldEqual None // Depends on collation
+    matches("name LIKE 'A%'") shouldEqual None
+    matches("login_count > 2.5") shouldEqual None
+    matches("login_count = '2'") shouldEqual None
+    matches("login_count") shouldEqual None
+    matches("login_count > 2 AND") shouldEqual None
+    matches("(login_count > 2") shouldEqual None
+    matches("login_count > 2; DROP TABLE user_nodes") shouldEqual None
+    index.filter("book", "login_count > 2", allNodes) shouldEqual None
+  }
+
+  it should "reflect updated values" in {
+    index.setValues("user", "login_count", Seq(1 -> 7))
+    matches("login_count > 2") shouldEqual Some(Seq(0, 1, 2))
+    index.setValues("user", "login_count", Seq(1 -> 2))
+  }
+}
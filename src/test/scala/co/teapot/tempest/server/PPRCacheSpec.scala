@@ -0,0 +1,70 @@
+package co.teapot.tempest.server
+
+import org.scalatest.{FlatSpec, Matchers}
+
+class PPRCacheSpec extends FlatSpec with Matchers {
+  "A PPRCache" should "evict the least recently used entries" in {
+    val cache = new PPRCache(maxSizeBytes = 30)
+    var computeCount = 0
+    def get(key: String): String = cache.getOrCompute[String](key, Seq("follows"))(_ => 10L) {
+      computeCount += 1
+      key + computeCount
+    }
+    get("a") shouldEqual "a1"
+    get("b") shouldEqual "b2"
+    get("c") shouldEqual "c3"
+    get("a") shouldEqual "a1" // Now b is the least recently used
+    get("d") shouldEqual "d4"
+    get("b") shouldEqual "b5"
+    computeCount shouldEqual 5
+    val stats = cache.stats
+    stats.hits shouldEqual 1
+    stats.misses shouldEqual 5
+    stats.evictions shouldEqual 2
+    stats.entryCount shouldEqual 3
+    stats.sizeBytes shouldEqual 30
+    stats.hitRatio shouldEqual (1.0 / 6 +- 1.0e-9)
+  }
+
+  it should "invalidate entries by edge type and respect staleness and useCache" in {
+    var now = 0L
+    val cache = new PPRCache(maxSizeBytes = 1000, clock = () => now)
+    var computeCount = 0
+    def get(key: String, edgeTypes: Seq[String], useCache: Boolean = true,
+            maxStalenessMillis: Option[Long] = None): Int =
+      cache.getOrCompute[Int](key, edgeTypes, useCache, maxStalenessMillis)(_ => 10L) {
+        computeCount += 1
+        computeCount
+      }
+    get("a", Seq("follows")) shouldEqual 1
+    get("b", Seq("follows", "has_read")) shouldEqual 2
+    get("c", Seq("has_read")) shouldEqual 3
+    cache.invalidate("follows")
+    cache.stats.invalidations shouldEqual 2
+    get("a", Seq("follows")) shouldEqual 4
+    get("b", Seq("follows", "has_read")) shouldEqual 5
+    get("c", Seq("has_read")) shouldEqual 3
+
+    get("c", Seq("has_read"), useCache = false) shouldEqual 6
+    now = 100L
+    get("c", Seq("has_read"), maxStalenessMillis = Some(100L)) shouldEqual 3
+    get("c", Seq("has_read"), maxStalenessMillis = Some(99L)) shouldEqual 7
+    get("c", Seq("has_read")) shouldEqual 7
+  }
+
+  it should "not cache values computed while edges were added" in {
+    val cache = new PPRCache(maxSizeBytes = 1000)
+    cache.getOrCompute[Int]("a", Seq("follows"))(_ => 10L) {
+      cache.invalidate("follows")
+      1
+    } shouldEqual 1
+    cache.stats.entryCount shouldEqual 0
+  }
+
+  it should "not cache when its size is 0" in {
+    val cache = new PPRCache(maxSizeBytes = 0)
+    cache.getOrCompute[Int]("a", Seq("follows"))(_ => 10L)(1)
+    cache.getOrCompute[Int]("a", Seq("follows"))(_ => 10L)(2) shouldEqual 2
+    cache.stats.misses shouldEqual 0
+  }
+}
@@ -56,6 +56,12 @@ class TempestDBServerClientSpec extends FlatSpec with Matchers with H2DatabaseBa
       extraEnv = ("PYTHONPATH", "python-package")).!
     pythonResult shouldEqual 0
 
+    val asyncPythonResult = Process(
+      "src/test/python/async_client_test.py",
+      cwd = new File("."),
+      extraEnv = ("PYTHONPATH", "python-package")).!
+    asyncPythonResult shouldEqual 0
+
     server.stop()
   }
 }
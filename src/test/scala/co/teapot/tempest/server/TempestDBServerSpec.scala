@@ -2,17 +2,18 @@ package co.teapot.tempest.server
 
 import java.util
 
-import co.teapot.tempest.util.ConfigLoader
-import co.teapot.tempest.{MonteCarloPageRankParams, Node => ThriftNode}
+import co.teapot.tempest.util.{CollectionUtil, ConfigLoader}
+import co.teapot.tempest.{BidirectionalPPRParams, DegreeFilterTypes, FilterPath, InducedSubgraph, InvalidArgumentException, InvalidNodeIdException, MonteCarloPageRankParams, RecommendParams, Node => ThriftNode}
 import org.scalatest.{FlatSpec, Matchers}
 
 import scala.collection.JavaConverters._
 
 
 class TempestDBServerSpec extends FlatSpec with Matchers with H2DatabaseBasedTest with SyntheticDatabaseData {
-  def make_server(): TempestDBServer = {
+  def make_server(inMemoryAttributes: Map[String, Seq[String]] = Map.empty): TempestDBServer = {
     val configFileName = "src/test/resources/config/tempest.yaml"
     val config = ConfigLoader.loadConfig[TempestDBServerConfig](configFileName)
+    config.setInMemoryAttributes((inMemoryAttributes map { case (nodeType, names) => (nodeType, names.asJava) }).asJava)
     val dbConfig = new H2DatabaseConfig
     val databaseClient: TempestDatabaseClient = new TempestSQLDatabaseClient(dbConfig)
     new TempestDBServer( databaseClient, config)
@@ -37,7 +38,274 @@ class TempestDBServerSpec extends FlatSpec with Matchers with H2DatabaseBasedTes
     pprMap(new ThriftNode("book", "101")) should be > pprMap(new ThriftNode("book", "103"))
     pprMap(new ThriftNode("book", "103")) should be > pprMap(new ThriftNode("book", "102"))
 
+    val biPPRParams = new BidirectionalPPRParams(0.05, 0.3)
+    val followTargets = Seq(new ThriftNode("user", "bob"), new ThriftNode("user", "carol"))
+    val multiTargetPPRs = server.pprMultiTarget("follows", seeds, followTargets.asJava, biPPRParams).asScala
+    multiTargetPPRs.keySet shouldEqual followTargets.toSet
+    for (target <- followTargets) {
+      val singleTargetPPR = server.pprSingleTarget("follows", seeds, target, biPPRParams)
+      multiTargetPPRs(target).doubleValue should equal (singleTargetPPR +- singleTargetPPR * 0.2)
+    }
+
     // Note: Many more tempest calls are tested in TempestDBServerClientSpec
     // Going forward, tests for new calls can go here or there (or both!)
   }
+
+  it should "answer batched degree and neighbor calls" in {
+    val server = make_server()
+    val alice = new ThriftNode("user", "alice")
+    val bob = new ThriftNode("user", "bob")
+    val carol = new ThriftNode("user", "carol")
+    val users = Seq(alice, bob, carol).asJava
+
+    server.multiOutDegree("has_read", users).asScala shouldEqual Seq(2, 3, 1)
+    server.multiInDegree("follows", users).asScala shouldEqual Seq(0, 2, 1)
+
+    val bookLists = server.multiOutNeighbors("has_read", users).asScala map (_.asScala)
+    bookLists(0) should contain theSameElementsAs Seq(new ThriftNode("book", "101"), new ThriftNode("book", "103"))
+    bookLists(2) shouldEqual Seq(new ThriftNode("book", "101"))
+
+    val readerLists = server.multiInNeighbors("has_read", Seq(new ThriftNode("book", "102")).asJava).asScala
+    readerLists.head.asScala shouldEqual Seq(bob)
+  }
+
+  it should "recommend nodes with exclusions applied before the top results" in {
+    val server = make_server()
+    val alice = new ThriftNode("user", "alice")
+    val pageRankParams = new MonteCarloPageRankParams(10000, 0.3)
+
+    val recParams = new RecommendParams(5)
+    recParams.setAttributeNames(Seq("title").asJava)
+    // Alice has read books 101 and 103, so 102 is the only candidate
+    val books = server.recommend("has_read", alice, pageRankParams, recParams).asScala
+    books map (_.node) shouldEqual Seq(new ThriftNode("book", "102"))
+    books.head.score should be > 0.0
+    books.head.attributesAsJSON.asScala shouldEqual Map("title" -> "\"The Grapes of Wrath\"")
+
+    // Alice follows Bob, so Carol is the only other user she can be recommended
+    val users = server.recommend("follows", alice, pageRankParams, new RecommendParams(1)).asScala
+    users map (_.node) shouldEqual Seq(new ThriftNode("user", "carol"))
+    val withNeighbors = new RecommendParams(5)
+    withNeighbors.setExcludeOutNeighbors(false)
+    (server.recommend("follows", alice, pageRankParams, withNeighbors).asScala map (_.node)) shouldEqual
+      Seq(new ThriftNode("user", "bob"), new ThriftNode("user", "carol"))
+
+    val inactiveSeed = new RecommendParams(5)
+    inactiveSeed.setSeedDegreeFilter(Map(DegreeFilterTypes.OUTDEGREE_MIN -> new Integer(2)).asJava)
+    server.recommend("follows", alice, pageRankParams, inactiveSeed).asScala shouldEqual Seq.empty
+
+    an [InvalidArgumentException] should be thrownBy {
+      server.recommend("follows", alice, pageRankParams, new RecommendParams(0))
+    }
+  }
+
+  it should "cache PPR results until their edge type changes" in {
+    val server = make_server()
+    val seeds = Seq(new ThriftNode("user", "alice")).asJava
+    val prParams = new MonteCarloPageRankParams(1000, 0.3)
+    val edgeTypes = util.Arrays.asList("has_read")
+    val pprMap = server.pprUndirected(edgeTypes, seeds, prParams)
+    server.pprUndirected(edgeTypes, seeds, prParams.deepCopy().setMaxStalenessMillis(60000L)) should be theSameInstanceAs (pprMap)
+    server.pprUndirected(edgeTypes, seeds, prParams.deepCopy().setUseCache(false)) should not be theSameInstanceAs (pprMap)
+    server.pprCacheStats().hits shouldEqual 1
+    server.pprCacheStats().misses shouldEqual 1
+
+    server.pprCache.invalidate("has_read")
+    server.pprUndirected(edgeTypes, seeds, prParams) should not be theSameInstanceAs (pprMap)
+    val stats = server.pprCacheStats()
+    stats.invalidations shouldEqual 1
+    stats.misses shouldEqual 2
+    stats.hitRatio shouldEqual (1.0 / 3 +- 1.0e-9)
+  }
+
+  it should "stop PPR estimates at their deadline" in {
+    val server = make_server()
+    val seeds = Seq(new ThriftNode("user", "alice")).asJava
+    val edgeTypes = util.Arrays.asList("has_read")
+
+    val estimate = server.pprUndirectedWithStats(edgeTypes, seeds, new MonteCarloPageRankParams(1000, 0.3))
+    estimate.stats.complete shouldBe true
+    estimate.stats.walkCount shouldEqual 1000L
+
+    val longParams = new MonteCarloPageRankParams(Int.MaxValue, 0.3).setDeadlineMillis(50)
+    val partialEstimate = server.pprUndirectedWithStats(edgeTypes, seeds, longParams)
+    partialEstimate.stats.complete shouldBe false
+    partialEstimate.stats.walkCount should (be > 0L and be < Int.MaxValue.toLong)
+    partialEstimate.pprs.asScala.values.map(_.doubleValue).sum should equal (1.0 +- 1.0e-6)
+    server.pprCacheStats().entryCount shouldEqual 1 // Partial estimates aren't cached
+
+    val biPPRParams = new BidirectionalPPRParams(0.05, 0.3).setDeadlineMillis(10000)
+    val singleTargetEstimate = server.pprSingleTargetWithStats("follows", seeds, new ThriftNode("user", "bob"), biPPRParams)
+    singleTargetEstimate.stats.complete shouldBe true
+    singleTargetEstimate.ppr should be > 0.0
+
+    an [InvalidArgumentException] should be thrownBy {
+      server.pprUndirected(edgeTypes, seeds, new MonteCarloPageRankParams(1000, 0.3).setDeadlineMillis(0))
+    }
+  }
+
+  it should "answer packed neighbor calls" in {
+    val server = make_server()
+    val alice = new ThriftNode("user", "alice")
+
+    val packedBooks = server.outNeighborsPacked("has_read", alice)
+    packedBooks.nodeType shouldEqual "book"
+    val bookIds = server.tempestIdsToNodeIds("book", packedBooks.bufferForTempestIds).asScala
+    bookIds should contain theSameElementsAs Seq("101", "103")
+
+    val packedReaders = server.kStepInNeighborsFilteredPacked("has_read", new ThriftNode("book", "102"), 1, "",
+      new util.HashMap[DegreeFilterTypes, Integer](), true)
+    packedReaders.nodeType shouldEqual "user"
+    server.tempestIdsToNodeIds("user", packedReaders.bufferForTempestIds).asScala shouldEqual Seq("bob")
+
+    an [InvalidNodeIdException] should be thrownBy {
+      server.tempestIdsToNodeIds("book", CollectionUtil.toPackedInts(Seq(1000)))
+    }
+  }
+
+  it should "answer packed component and PPR calls" in {
+    val server = make_server()
+    val alice = new ThriftNode("user", "alice")
+    val edgeTypes = util.Arrays.asList("has_read")
+
+    val componentLists = server.connectedComponentPacked(alice, edgeTypes, Int.MaxValue).asScala
+    componentLists map (_.nodeType) shouldEqual Seq("book", "user")
+    server.tempestIdsToNodeIds("book", componentLists(0).bufferForTempestIds).asScala should contain theSameElementsAs
+      Seq("101", "102", "103")
+    server.tempestIdsToNodeIds("user", componentLists(1).bufferForTempestIds).asScala should contain theSameElementsAs
+      Seq("alice", "bob", "carol")
+
+    val estimate = server.pprUndirectedPacked(edgeTypes, Seq(alice).asJava, new MonteCarloPageRankParams(1000, 0.3))
+    estimate.stats.complete shouldBe true
+    val nodes = estimate.nodeLists.asScala flatMap { nodeList =>
+      server.tempestIdsToNodeIds(nodeList.nodeType, nodeList.bufferForTempestIds).asScala map
+        (id => new ThriftNode(nodeList.nodeType, id))
+    }
+    val pprBuffer = estimate.bufferForPprs.order(java.nio.ByteOrder.LITTLE_ENDIAN)
+    val pprs = Array.fill(pprBuffer.remaining / 8)(pprBuffer.getDouble())
+    nodes.size shouldEqual pprs.length
+    val pprMap = (nodes zip pprs).toMap
+    pprs.sum should equal (1.0 +- 1.0e-6)
+    pprMap(alice) should be > pprMap(new ThriftNode("user", "bob"))
+    pprMap(new ThriftNode("book", "101")) should be > pprMap(new ThriftNode("book", "102"))
+  }
+
+  it should "page through node and neighborhood results" in {
+    val server = make_server()
+    val alice = new ThriftNode("user", "alice")
+    val bob = new ThriftNode("user", "bob")
+    val carol = new ThriftNode("user", "carol")
+
+    val firstPage = server.nodesPage("user", "login_count >= 2", 2, "")
+    firstPage.nodes.asScala shouldEqual Seq(alice, bob)
+    val lastPage = server.nodesPage("user", "login_count >= 2", 2, firstPage.nextPageToken)
+    lastPage.nodes.asScala shouldEqual Seq(carol)
+    lastPage.isSetNextPageToken shouldEqual false
+
+    val noFilter = new util.HashMap[DegreeFilterTypes, Integer]()
+    val followerPage1 = server.kStepInNeighborsFilteredPage("follows", bob, 1, "", noFilter, true, 1, "")
+    followerPage1.nodes.asScala shouldEqual Seq(alice)
+    val followerPage2 = server.kStepInNeighborsFilteredPage("follows", bob, 1, "", noFilter, true, 1,
+      followerPage1.nextPageToken)
+    followerPage2.nodes.asScala shouldEqual Seq(carol)
+    val followerPage3 = server.kStepInNeighborsFilteredPage("follows", bob, 1, "", noFilter, true, 1,
+      followerPage2.nextPageToken)
+    followerPage3.nodes.asScala shouldEqual Seq.empty
+    followerPage3.isSetNextPageToken shouldEqual false
+
+    server.kStepInNeighborsFilteredPage("follows", bob, 1, "login_count = 3", noFilter, true, 10, "")
+      .nodes.asScala shouldEqual Seq(carol)
+
+    an [InvalidArgumentException] should be thrownBy {
+      server.nodesPage("user", "", 0, "")
+    }
+  }
+
+  it should "filter multi-hop results using in-memory attributes" in {
+    val server = make_server(Map("user" -> Seq("login_count", "premium_subscriber")))
+    val alice = new ThriftNode("user", "alice")
+    val bob = new ThriftNode("user", "bob")
+    val carol = new ThriftNode("user", "carol")
+    val noFilter = new util.HashMap[DegreeFilterTypes, Integer]()
+
+    val followers = server.kStepInNeighborsFilteredWithStats("follows", bob, 1, "login_count > 2", noFilter, true)
+    followers.nodes.asScala should contain theSameElementsAs Seq(alice, carol)
+    followers.stats.path shouldEqual FilterPath.MEMORY
+    followers.stats.candidateCount shouldEqual 2
+    followers.stats.resultCount shouldEqual 2
+    server.kStepInNeighborsFiltered("follows", bob, 1, "premium_subscriber AND NOT login_count >= 5", noFilter, true)
+      .asScala shouldEqual Seq(carol)
+
+    // Clauses on other attributes are sent to the database
+    val byName = server.kStepInNeighborsFilteredWithStats("follows", bob, 1, "name LIKE 'Alice%'", noFilter, true)
+    byName.nodes.asScala shouldEqual Seq(alice)
+    byName.stats.path shouldEqual FilterPath.SQL
+    server.kStepInNeighborsFilteredWithStats("follows", bob, 1, "", noFilter, true).stats.path shouldEqual
+      FilterPath.NONE
+
+    server.setNodeAttribute(carol, "login_count", "1")
+    server.kStepInNeighborsFiltered("follows", bob, 1, "login_count > 2", noFilter, true).asScala shouldEqual Seq(alice)
+  }
+
+  it should "warm graphs and report their residency" in {
+    val server = make_server()
+    server.warm(util.Arrays.asList("has_read"), false)
+    var residency = server.residency("has_read")
+    while (residency.warming) {
+      Thread.sleep(10)
+      residency = server.residency("has_read")
+    }
+    residency.fileBytes should be > 0L
+    residency.pinned shouldEqual false
+    if (residency.residentBytes >= 0) // Only reported on Linux
+      residency.residentFraction shouldEqual 1.0
+
+    an [InvalidArgumentException] should be thrownBy {
+      server.warm(util.Arrays.asList("has_read", "nonexistent"), false)
+    }
+    an [InvalidArgumentException] should be thrownBy {
+      server.residency("nonexistent")
+    }
+  }
+
+  it should "return induced subgraphs in CSR form" in {
+    val server = make_server()
+    val alice = new ThriftNode("user", "alice")
+    val bob = new ThriftNode("user", "bob")
+    val carol = new ThriftNode("user", "carol")
+    def unpack(subgraph: InducedSubgraph): (Seq[(String, Seq[Int])], Seq[Int], Seq[Int]) =
+      (subgraph.nodeLists.asScala map { nodes => (nodes.nodeType, CollectionUtil.fromPackedInts(nodes.tempestIds).toSeq) },
+        CollectionUtil.fromPackedInts(subgraph.offsets).toSeq,
+        CollectionUtil.fromPackedInts(subgraph.targets).toSeq)
+
+    // Edges alice -> bob, bob -> carol and carol -> bob, with nodes numbered 0, 1 and 2
+    val subgraph = server.inducedSubgraph("follows", util.Arrays.asList(carol, alice, bob, alice), 10)
+    unpack(subgraph) shouldEqual ((Seq(("user", Seq(1, 2, 3))), Seq(0, 1, 2, 3), Seq(1, 2, 1)))
+    subgraph.truncated shouldEqual false
+
+    val truncatedSubgraph = server.inducedSubgraph("follows", util.Arrays.asList(alice, bob, carol), 2)
+    unpack(truncatedSubgraph) shouldEqual ((Seq(("user", Seq(1, 2))), Seq(0, 1, 1), Seq(1)))
+    truncatedSubgraph.truncated shouldEqual true
+
+    unpack(server.egoSubgraph("follows", alice, 0, 10)) shouldEqual ((Seq(("user", Seq(1))), Seq(0, 0), Seq()))
+    unpack(server.egoSubgraph("follows", alice, 1, 10)) shouldEqual ((Seq(("user", Seq(1, 2))), Seq(0, 1, 1), Seq(1)))
+    val egoSubgraph = server.egoSubgraph("follows", alice, 2, 10)
+    unpack(egoSubgraph) shouldEqual unpack(subgraph)
+    egoSubgraph.truncated shouldEqual false
+    server.egoSubgraph("follows", alice, 2, 2).truncated shouldEqual true
+
+    // Books are numbered after users, and have no out-edges
+    val (nodeLists, offsets, targets) = unpack(server.egoSubgraph("has_read", alice, 1, 10))
+    nodeLists map (_._1) shouldEqual Seq("user", "book")
+    nodeLists(1)._2.size shouldEqual 2
+    offsets shouldEqual Seq(0, 2, 2, 2)
+    targets shouldEqual Seq(1, 2)
+
+    an [InvalidArgumentException] should be thrownBy {
+      server.inducedSubgraph("follows", util.Arrays.asList(new ThriftNode("book", "101")), 10)
+    }
+    an [InvalidArgumentException] should be thrownBy {
+      server.egoSubgraph("follows", alice, 2, 0)
+    }
+  }
 }
@@ -16,7 +16,8 @@ object TempestDBTestServer {
 
   def launch(args: Array[String]): Unit = {
     LogUtil.configureLog4j()
-    new TeapotThriftLauncher().launch(args ++ Array("-port", "10011"), getProcessor, "src/test/resources/config/tempest.yaml")
+    new TeapotThriftLauncher().launch(args ++ Array("-port", "10011"), getProcessor, "src/test/resources/config/tempest.yaml",
+      (configFileName: String) => ConfigLoader.loadConfig[TempestDBServerConfig](configFileName))
   }
 
   def main(args: Array[String]): Unit = launch(args)
@@ -1,7 +1,8 @@
 package co.teapot.tempest.server
 
 import co.teapot.tempest.typedgraph.Node
-import co.teapot.tempest.{SQLException, InvalidArgumentException, Node => ThriftNode}
+import co.teapot.tempest.util.CollectionUtil
+import co.teapot.tempest.{AttributeType, SQLException, InvalidArgumentException, Node => ThriftNode}
 import org.scalatest.{BeforeAndAfterEach, FlatSpec, Matchers, Suite}
 
 trait H2DatabaseBasedTest {
@@ -106,6 +107,11 @@ class TempestSQLDatabaseClientSpec extends FlatSpec with Matchers with H2Databas
       c.nodeIdsMatchingClause("user", "Bizzare * %")
     }
 
+    c.nodeIdsMatchingClausePage("user", "login_count >= 2", 0, 2) shouldEqual Seq((1, "alice"), (2, "bob"))
+    c.nodeIdsMatchingClausePage("user", "login_count >= 2", 2, 2) shouldEqual Seq((3, "carol"))
+    c.nodeIdsMatchingClausePage("user", "login_count >= 2", 3, 2) shouldEqual Seq.empty
+    c.nodeIdsMatchingClausePage("user", "", 4, 10) shouldEqual Seq((5, "; DROP TABLE user;"))
+
 
     // Test node update
     // TODO: Restore after implementing addNode
@@ -198,4 +204,49 @@ class TempestSQLDatabaseClientSpec extends FlatSpec with Matchers with H2Databas
     }
   }
 
+  it should "set attributes of several nodes in one batch" in {
+    val c = createTempestSQLDatabaseClient()
+    val alice = new ThriftNode("user", "alice")
+    val bob = new ThriftNode("user", "bob")
+    val book = new ThriftNode("book", "101")
+    c.setNodeAttributes(Seq(
+      (alice, "name", "Alice Smith"),
+      (bob, "name", "Robert Smith"),
+      (book, "title", "The Hobbit"),
+      (alice, "name", "Alice Jones")))
+    c.getNodeAttributeAsJSON("user", "alice", "name") shouldEqual "\"Alice Jones\""
+    c.getNodeAttributeAsJSON("user", "bob", "name") shouldEqual "\"Robert Smith\""
+    c.getNodeAttributeAsJSON("book", "101", "title") shouldEqual "\"The Hobbit\""
+
+    an[InvalidArgumentException] should be thrownBy {
+      c.setNodeAttributes(Seq((alice, "name = 'x'; --", "y")))
+    }
+  }
+
+  it should "return typed attribute columns" in {
+    val c = createTempestSQLDatabaseClient()
+    val columns = c.getNodeAttributeColumns("user", Seq("carol", "nameless", "missing", "alice", "carol"),
+      Seq("login_count", "premium_subscriber", "name"))
+    columns map (_.name) shouldEqual Seq("login_count", "premium_subscriber", "name")
+    columns map (_.`type`) shouldEqual Seq(AttributeType.INT, AttributeType.BOOLEAN, AttributeType.STRING)
+    def bytes(buffer: java.nio.ByteBuffer): Seq[Byte] = {
+      val result = new Array[Byte](buffer.remaining)
+      buffer.duplicate().get(result)
+      result.toSeq
+    }
+
+    CollectionUtil.fromPackedInts(columns(0).values).toSeq shouldEqual Seq(3, 0, 0, 5, 3)
+    bytes(columns(0).nullMask) shouldEqual Seq[Byte](0, 0, 1, 0, 0)
+    bytes(columns(1).values) shouldEqual Seq[Byte](1, 0, 0, 0, 1)
+    bytes(columns(2).nullMask) shouldEqual Seq[Byte](0, 1, 1, 0, 0)
+    val offsets = CollectionUtil.fromPackedInts(columns(2).offsets)
+    val names = new String(bytes(columns(2).values).toArray, "UTF-8")
+    (0 until 5) map { i => names.substring(offsets(i), offsets(i + 1)) } shouldEqual
+      Seq("Carol \"ninja\" Coder", "", "", "Alice Johnson", "Carol \"ninja\" Coder")
+
+    c.getNodeAttributeColumns("user", Seq.empty, Seq("login_count")).head.values.remaining shouldEqual 0
+    an[InvalidArgumentException] should be thrownBy {
+      c.getNodeAttributeColumns("user", Seq("alice"), Seq("name, id"))
+    }
+  }
 }
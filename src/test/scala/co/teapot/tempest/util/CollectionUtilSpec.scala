@@ -6,4 +6,28 @@ class CollectionUtilSpec extends FlatSpec with Matchers {
   "CollectionUtil" should "support LongRange" in {
     CollectionUtil.longRange(1L, 3L).toSeq should contain theSameElementsAs (Seq(1, 2))
   }
+
+  it should "pack ints in little-endian order" in {
+    val packed = CollectionUtil.toPackedInts(Seq(1, 258, -1))
+    packed.remaining should equal (12)
+    packed.get(0) should equal (1.toByte)
+    packed.get(4) should equal (2.toByte)
+    packed.get(5) should equal (1.toByte)
+    CollectionUtil.fromPackedInts(packed) should equal (Array(1, 258, -1))
+    packed.remaining should equal (12) // Unpacking doesn't consume the buffer
+  }
+
+  it should "pack doubles in little-endian order" in {
+    val packed = CollectionUtil.toPackedDoubles(Seq(0.5, -2.0))
+    packed.remaining should equal (16)
+    packed.order(java.nio.ByteOrder.LITTLE_ENDIAN).getDouble(8) should equal (-2.0)
+    packed.get(7) should equal (0x3f.toByte) // The high byte of 0.5
+  }
+
+  it should "find the top k pairs" in {
+    val pairs = Seq("a" -> 0.1, "b" -> 0.4, "c" -> 0.2, "d" -> 0.3)
+    CollectionUtil.topK(pairs.iterator, 2) shouldEqual Seq("b" -> 0.4, "d" -> 0.3)
+    CollectionUtil.topK(pairs.iterator, 10) map (_._1) shouldEqual Seq("b", "d", "c", "a")
+    CollectionUtil.topK(Iterator.empty, 3) shouldEqual Seq.empty
+  }
 }
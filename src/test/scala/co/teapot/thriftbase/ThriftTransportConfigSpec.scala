@@ -0,0 +1,16 @@
+package co.teapot.thriftbase
+
+import org.apache.thrift.protocol.{TBinaryProtocol, TCompactProtocol}
+import org.apache.thrift.transport.TFramedTransport
+import org.scalatest.{FlatSpec, Matchers}
+
+class ThriftTransportConfigSpec extends FlatSpec with Matchers {
+  "A ThriftTransportConfig" should "select the configured protocol and framing" in {
+    new ThriftTransportConfig().protocolFactory shouldBe a [TBinaryProtocol.Factory]
+    ThriftTransportConfig("compact").protocolFactory shouldBe a [TCompactProtocol.Factory]
+    ThriftTransportConfig(framedTransport = true).transportFactory shouldBe a [TFramedTransport.Factory]
+    an [IllegalArgumentException] should be thrownBy {
+      ThriftTransportConfig("json").protocolFactory
+    }
+  }
+}
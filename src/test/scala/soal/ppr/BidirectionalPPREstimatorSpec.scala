@@ -1,11 +1,15 @@
 package soal.ppr
 
 import java.util.Random
+import java.util.concurrent.Executors
 
 import co.teapot.tempest.graph.ConcurrentHashMapDynamicGraph
 import org.scalatest.{FlatSpec, Matchers}
+import soal.util.ConstantDistribution
 
 import scala.collection.mutable
+import scala.concurrent.ExecutionContext
+import scala.concurrent.duration._
 import scala.io.Source
 
 class BidirectionalPPREstimatorSpec extends FlatSpec with Matchers {
@@ -36,6 +40,39 @@ class BidirectionalPPREstimatorSpec extends FlatSpec with Matchers {
       }
     }
   }
+
+  "BidirectionalPPRSearcher.estimatePPRMultiTarget" should "be correct on the test graph" in {
+    val relativeError = 0.01f
+    val s = 0
+    val targets = IndexedSeq(0, 1, 3, 9)
+    implicit val executionContext = ExecutionContext.fromExecutorService(Executors.newFixedThreadPool(2))
+    val estimates = estimator.estimatePPRMultiTarget(new ConstantDistribution(s), targets, 0.03f, relativeError,
+      threadCount = 2)
+    for ((t, estimate) <- targets zip estimates) {
+      withClue (s"Testing Pair ($s, $t)") {
+        if (truePPRs((s, t)) >= 0.03f)
+          estimate should equal (truePPRs((s, t)) +- truePPRs((s, t)) * relativeError * 2)
+      }
+    }
+    estimator.estimatePPRMultiTarget(new ConstantDistribution(s), IndexedSeq.empty) shouldBe empty
+    executionContext.shutdown()
+  }
+
+  "BidirectionalPPRSearcher.estimatePPRAnytime" should "stop at the deadline" in {
+    val (s, t) = (0, 1)
+    val estimate = estimator.estimatePPRAnytime(new ConstantDistribution(s), t, None, 0.03f, 0.01f)
+    estimate.complete shouldBe true
+    estimate.walkCount should be > 0L
+    estimate.pushCount should be > 0L
+    estimate.value.toDouble should equal (truePPRs((s, t)).toDouble +- estimate.errorBound)
+
+    val overdueEstimate = estimator.estimatePPRAnytime(new ConstantDistribution(s), t,
+      Some(Deadline.now - 1.second), 0.03f, 0.01f)
+    overdueEstimate.complete shouldBe false
+    overdueEstimate.walkCount shouldEqual 0L
+    overdueEstimate.pushCount shouldEqual 0L
+    overdueEstimate.errorBound shouldEqual 1.0
+  }
 }
 
 object BidirectionalPPREstimatorSpec {
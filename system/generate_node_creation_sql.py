@@ -3,10 +3,24 @@
 # 1) create the node table
 # 2) add an auto-increment id field if an id field isn't already present
 # 3) import the nodes CSV file
+#
+# With --parallel-load <n>, it instead loads the nodes itself, in stages:
+# 1) split the nodes CSV file into n chunks
+# 2) copy the chunks in parallel (one psql process each) into an UNLOGGED staging table
+# 3) build the indexes in parallel
+# 4) in one transaction, replace the node table with the staging table
+# The old node table stays readable until the last step, so a running server isn't interrupted.
+# Tempest ids are assigned in file order, as they are by a single COPY.
 
+import argparse
+import os
+import shlex
+import shutil
+import subprocess
 import sys
+import tempfile
+import time
 import yaml
-import os
 type_to_postgres = {
     "int": "int",
     "bigint": "bigint",
@@ -15,10 +29,169 @@ type_to_postgres = {
     "serial": "serial" # Used when id is auto-generated
 }
 
-if len(sys.argv) != 2:
-    print "Usage: python " + sys.argv[0] + " <node_type_config>.yaml"
-    sys.exit(1)
-config_filename = sys.argv[1]
+copy_options = "DELIMITER ',' QUOTE '\"' ESCAPE '\\' CSV"
+
+
+def quote_state_after(line, in_quotes):
+    """ Returns whether the csv parser is inside a quoted value after the given line, if it was
+    inside one (in_quotes) before the line.  Quoted values may contain newlines."""
+    if not in_quotes and '"' not in line:
+        return False
+    escaped = False
+    for c in line:
+        if escaped:
+            escaped = False
+        elif in_quotes and c == '\\':
+            escaped = True
+        elif c == '"':
+            in_quotes = not in_quotes
+    return in_quotes
+
+
+def split_csv(node_csv, chunk_count, chunk_directory):
+    """ Splits the given csv file into at most chunk_count files of similar size in chunk_directory,
+    prefixing each record with its tempest id (its position in the file, starting at 1).  Returns
+    the list of chunk files and the number of records."""
+    target_chunk_bytes = os.path.getsize(node_csv) / chunk_count + 1
+    chunk_paths = []
+    chunk_file = None
+    chunk_bytes = 0
+    row_count = 0
+    in_quotes = False
+    with open(node_csv) as csv_file:
+        for line in csv_file:
+            if not in_quotes:
+                if not line.strip():
+                    continue
+                if chunk_file is None or chunk_bytes >= target_chunk_bytes:
+                    if chunk_file is not None:
+                        chunk_file.close()
+                    chunk_paths.append(os.path.join(chunk_directory, "chunk%d.csv" % len(chunk_paths)))
+                    chunk_file = open(chunk_paths[-1], 'w')
+                    chunk_bytes = 0
+                row_count += 1
+                chunk_file.write(str(row_count) + ",")
+            chunk_file.write(line)
+            chunk_bytes += len(line)
+            in_quotes = quote_state_after(line, in_quotes)
+    if chunk_file is not None:
+        chunk_file.close()
+    return chunk_paths, row_count
+
+
+def start_psql(psql_command, sql, stdin=None):
+    return subprocess.Popen(shlex.split(psql_command) + ["-q", "-v", "ON_ERROR_STOP=1", "-c", sql],
+                            stdin=stdin)
+
+
+def run_psql_in_parallel(psql_command, sqls_and_inputs, parallelism):
+    """ Runs each (sql, input file path or None) pair in its own psql process, with at most
+    parallelism processes at a time.  Exits if any of them fails."""
+    pending = list(reversed(sqls_and_inputs))
+    running = []
+    failed = False
+    while pending or running:
+        while pending and len(running) < parallelism and not failed:
+            sql, input_path = pending.pop()
+            input_file = open(input_path) if input_path is not None else None
+            running.append((start_psql(psql_command, sql, input_file), input_file, sql))
+        if not running:
+            break
+        process, input_file, sql = running.pop(0)
+        if process.wait() != 0:
+            print "Error: psql failed running: " + sql
+            failed = True
+        if input_file is not None:
+            input_file.close()
+    if failed:
+        sys.exit(1)
+
+
+def run_psql(psql_command, sql):
+    run_psql_in_parallel(psql_command, [(sql, None)], 1)
+
+
+def staged_load(table_name, node_attributes, node_attribute_types, indexed_attributes, node_csv,
+                parallelism, psql_command):
+    staging_table = table_name + "_staging"
+    start_time = time.time()
+
+    columns = ["    tempest_id SERIAL"]
+    for (attribute, attribute_type) in zip(node_attributes, node_attribute_types):
+        constraint = " NOT NULL" if attribute == "id" else ""
+        columns.append('    "' + attribute + '" ' + type_to_postgres[attribute_type] + constraint)
+    columns.append("    json_attributes jsonb")
+    run_psql(psql_command,
+             "DROP TABLE IF EXISTS " + staging_table + ";\n" +
+             "CREATE UNLOGGED TABLE " + staging_table + " (\n" + ",\n".join(columns) + "\n);")
+
+    chunk_directory = tempfile.mkdtemp(prefix=table_name + "_chunks_")
+    try:
+        print "Splitting " + node_csv + " into " + str(parallelism) + " chunks..."
+        chunk_paths, row_count = split_csv(node_csv, parallelism, chunk_directory)
+        split_seconds = time.time() - start_time
+
+        print "Copying " + str(row_count) + " rows into " + staging_table + "..."
+        copy_start_time = time.time()
+        attribute_list = "(tempest_id, " + ", ".join('"' + a + '"' for a in node_attributes) + ")"
+        copy_sql = "COPY " + staging_table + " " + attribute_list + " FROM STDIN " + copy_options + ";"
+        run_psql_in_parallel(psql_command, [(copy_sql, path) for path in chunk_paths], parallelism)
+        copy_seconds = time.time() - copy_start_time
+    finally:
+        shutil.rmtree(chunk_directory)
+
+    print "Building indexes..."
+    index_start_time = time.time()
+    # New nodes added by the server continue from the last tempest id
+    run_psql(psql_command,
+             "SELECT setval(pg_get_serial_sequence('" + staging_table + "', 'tempest_id'), " +
+             "COALESCE(max(tempest_id), 0) + 1, false) FROM " + staging_table + ";\n" +
+             "ALTER TABLE " + staging_table + " SET LOGGED;\n" +
+             "ALTER TABLE " + staging_table + " OWNER TO tempest;")
+    # Plain CREATE INDEX statements on one table don't block each other, so they can run in
+    # parallel.  The unique indexes become constraints when the table is swapped in.
+    index_sqls = ["CREATE UNIQUE INDEX " + staging_table + "_pkey ON " + staging_table + " (tempest_id);",
+                  "CREATE UNIQUE INDEX " + staging_table + "_id_key ON " + staging_table + " (id);"]
+    for attribute in indexed_attributes:
+        if attribute != "id":
+            index_sqls.append("CREATE INDEX " + staging_table + "_" + attribute + "_idx ON " +
+                              staging_table + ' ("' + attribute + '");')
+    run_psql_in_parallel(psql_command, [(sql, None) for sql in index_sqls], parallelism)
+    index_seconds = time.time() - index_start_time
+
+    print "Replacing " + table_name + "..."
+    swap_sql = ["BEGIN;",
+                "DROP TABLE IF EXISTS " + table_name + ";",
+                "ALTER TABLE " + staging_table + " RENAME TO " + table_name + ";",
+                "ALTER SEQUENCE " + staging_table + "_tempest_id_seq RENAME TO " + table_name + "_tempest_id_seq;",
+                "ALTER TABLE " + table_name + " ADD CONSTRAINT " + table_name + "_pkey PRIMARY KEY USING INDEX " +
+                staging_table + "_pkey;",
+                "ALTER TABLE " + table_name + " ADD CONSTRAINT " + table_name + "_id_key UNIQUE USING INDEX " +
+                staging_table + "_id_key;"]
+    for attribute in indexed_attributes:
+        if attribute != "id":
+            swap_sql.append("ALTER INDEX " + staging_table + "_" + attribute + "_idx RENAME TO " +
+                            table_name + "_" + attribute + "_idx;")
+    swap_sql.append("COMMIT;")
+    run_psql(psql_command, "\n".join(swap_sql))
+
+    total_seconds = time.time() - start_time
+    print "Loaded %d rows in %.1f seconds: %.0f rows/second (split %.1fs, copy %.1fs, indexes %.1fs)" % (
+        row_count, total_seconds, row_count / total_seconds if total_seconds > 0 else 0.0,
+        split_seconds, copy_seconds, index_seconds)
+    # The server loads inMemoryAttributes only at startup, so they would keep the old table's values
+    print "If a running server has inMemoryAttributes for this node type, restart it to reload them."
+
+
+parser = argparse.ArgumentParser(
+    description="Print the sql to create a node table, or with --parallel-load, load it.")
+parser.add_argument("config_filename", help="<node_type_config>.yaml")
+parser.add_argument("--parallel-load", type=int, metavar="N",
+                    help="load the nodes with N parallel psql processes instead of printing sql")
+parser.add_argument("--psql", default="sudo -Hiu postgres psql tempest postgres",
+                    help="command running psql on the tempest database (with --parallel-load)")
+args = parser.parse_args()
+config_filename = args.config_filename
 
 with open(config_filename, 'r') as config_file:
     try:
@@ -33,6 +206,8 @@ with open(config_filename, 'r') as config_file:
             assert(len(m) == 1)
         node_attributes = [m.keys()[0] for m in node_attribute_maps]
         node_attribute_types = [m.values()[0] for m in node_attribute_maps]
+        # If indexedAttributes isn't given, every attribute is indexed
+        indexed_attributes = config.get('indexedAttributes', node_attributes)
 
         if "id" not in node_attributes:
             print "Error: config file " + config_filename + " is missing an id column.  Please choose a column to" + \
@@ -42,18 +217,31 @@ with open(config_filename, 'r') as config_file:
         if node_attribute_types[id_index] != "string":
             print "Error: in " + config_filename + ", id must have type string"
             sys.exit(1)
+        for attribute_type in node_attribute_types:
+            if attribute_type not in type_to_postgres:
+                print "Invalid attribute type \"" + attribute_type + "\" in " + config_filename
+                sys.exit(1)
+        for attribute in indexed_attributes:
+            if attribute not in node_attributes:
+                print "Error: in " + config_filename + ", indexed attribute " + attribute + " is not a node attribute"
+                sys.exit(1)
+
+        if args.parallel_load is not None:
+            if args.parallel_load < 1:
+                print "Error: --parallel-load must be positive"
+                sys.exit(1)
+            staged_load(table_name, node_attributes, node_attribute_types, indexed_attributes, node_csv,
+                        args.parallel_load, args.psql)
+            sys.exit(0)
+
         print "DROP TABLE IF EXISTS " + table_name + ";"
         print "CREATE TABLE " + table_name + " ("
         print "    tempest_id SERIAL PRIMARY KEY,"
 
         for (attribute, attribute_type) in zip(node_attributes, node_attribute_types):
-            if attribute_type in type_to_postgres:
-                postgres_type = type_to_postgres[attribute_type]
-                constraint = " UNIQUE NOT NULL" if attribute == "id" else ""
-                print '    "' + attribute + '" ' + postgres_type + constraint + ","
-            else:
-                print "Invalid attribute type \"" + attribute_type + "\" in " + config_filename
-                sys.exit(1)
+            postgres_type = type_to_postgres[attribute_type]
+            constraint = " UNIQUE NOT NULL" if attribute == "id" else ""
+            print '    "' + attribute + '" ' + postgres_type + constraint + ","
         print "    json_attributes jsonb"
         print ");"
 
@@ -61,10 +249,9 @@ with open(config_filename, 'r') as config_file:
         #print "ALTER TABLE " + table_name + " ADD PRIMARY KEY (id);"
 
         attribute_list = "(" + ", ".join(node_attributes) + ")"
-        print "COPY %(table_name)s %(attribute_list)s FROM '%(node_csv)s' "  % locals() + \
-              "DELIMITER ',' QUOTE '\"' ESCAPE '\\' CSV;"
+        print "COPY %(table_name)s %(attribute_list)s FROM '%(node_csv)s' "  % locals() + copy_options + ";"
 
-        for attribute in node_attributes:
+        for attribute in indexed_attributes:
             print "CREATE INDEX ON " + table_name + " (" + attribute + ");"
 
     except yaml.YAMLError as exc: